@@ -0,0 +1,45 @@
+import os
+import random
+import sys
+import time
+
+# Simulated cost of a KiCad process, shared by the fake pcbnew and kicad-cli.
+#
+# FAKE_KICAD_LATENCY       seconds to sleep: "0.5", or "0.2:1.5" for a uniform range (default 0)
+# FAKE_KICAD_MEMORY_MB     megabytes to allocate and touch while sleeping (default 0)
+# FAKE_KICAD_FAILURE_RATE  probability (0-1) that the process exits with an error (default 0)
+# FAKE_KICAD_SEED          seed for the random draws (default: unseeded)
+#
+# Each setting can be overridden per tool with a suffix, e.g.
+# FAKE_KICAD_LATENCY_PCBNEW=2 FAKE_KICAD_LATENCY_CLI=0.3.
+
+
+def _setting(name: str, tool: str, default: str) -> str:
+    return os.getenv(f"{name}_{tool.upper()}", os.getenv(name, default))
+
+
+def _latency(spec: str, rng: random.Random) -> float:
+    if ":" in spec:
+        low, high = (float(v) for v in spec.split(":", 1))
+        return rng.uniform(low, high)
+    return float(spec)
+
+
+def simulate(tool: str) -> None:
+    """
+    Sleeps, holds memory and maybe fails the way the settings say. tool is
+    "pcbnew" or "cli".
+    """
+    seed = os.getenv("FAKE_KICAD_SEED")
+    rng = random.Random(int(seed) if seed else None)
+
+    memory_mb = int(_setting("FAKE_KICAD_MEMORY_MB", tool, "0"))
+    # Written, not just reserved, so it shows up as resident memory
+    ballast = b"\x01" * (memory_mb * 1024 * 1024) if memory_mb > 0 else b""
+
+    time.sleep(max(0.0, _latency(_setting("FAKE_KICAD_LATENCY", tool, "0"), rng)))
+
+    if rng.random() < float(_setting("FAKE_KICAD_FAILURE_RATE", tool, "0")):
+        print(f"fake {tool}: simulated failure", file=sys.stderr)
+        sys.exit(1)
+    del ballast
@@ -0,0 +1,419 @@
+import math
+import os
+import re
+import sys
+import uuid
+
+from fake_load import simulate
+
+# Stand-in for KiCad's pcbnew module, for load tests and CI without KiCad.
+#
+# Implements the part of the pcbnew API src/kicad_script.py uses, with the
+# same units (integer nanometres) and rotation convention. Footprints are
+# made up from their names (pad count from "-3" / "2x20" / "Arduino", 2.54 mm
+# pitch), so placement and routing do the same amount of work as with the
+# real libraries. SaveBoard writes a .kicad_pcb that the web service's own
+# readers (ratsnest, preview, deterministic output) and the fake kicad-cli
+# understand, and LoadBoard reads it back for incremental revisions.
+#
+# Run kicad_script.py with this directory on PYTHONPATH (kicad-python does
+# that); SaveBoard also applies the FAKE_KICAD_* costs (see fake_load.py).
+
+F_Cu = 0
+B_Cu = 31
+F_SilkS = 37
+Edge_Cuts = 44
+SHAPE_T_SEGMENT = 0
+VIATYPE_THROUGH = 3
+IU = 1000000
+
+_LAYER_NAMES = {F_Cu: "F.Cu", B_Cu: "B.Cu", F_SilkS: "F.SilkS", Edge_Cuts: "Edge.Cuts"}
+_LAYER_IDS = {name: layer for layer, name in _LAYER_NAMES.items()}
+_PAD_PITCH = 2540000
+_PAD_SIZE = 1700000
+
+
+def FromMM(mm):
+    return int(round(mm * IU))
+
+
+def ToMM(iu):
+    return iu / IU
+
+
+def _mm(iu):
+    return f"{ToMM(iu):.6f}".rstrip("0").rstrip(".")
+
+
+class VECTOR2I:
+    def __init__(self, x=0, y=0):
+        self.x = int(x)
+        self.y = int(y)
+
+
+class BOX2I:
+    def __init__(self, left, top, right, bottom):
+        self.l, self.t, self.r, self.b = left, top, right, bottom
+
+    def GetLeft(self): return self.l
+    def GetTop(self): return self.t
+    def GetRight(self): return self.r
+    def GetBottom(self): return self.b
+    def GetWidth(self): return self.r - self.l
+    def GetHeight(self): return self.b - self.t
+
+    def Merge(self, other):
+        if isinstance(other, VECTOR2I):
+            other = BOX2I(other.x, other.y, other.x, other.y)
+        self.l, self.t = min(self.l, other.l), min(self.t, other.t)
+        self.r, self.b = max(self.r, other.r), max(self.b, other.b)
+
+    def Inflate(self, d):
+        self.l, self.t, self.r, self.b = self.l - d, self.t - d, self.r + d, self.b + d
+
+
+class NETINFO_ITEM:
+    def __init__(self, board, name):
+        self.name = name
+        self.code = 0
+
+    def GetNetname(self): return self.name
+    def GetNetCode(self): return self.code
+
+
+class _Item:
+    def __init__(self, board=None):
+        self.m_Uuid = str(uuid.uuid4())
+        self.net = None
+        self.layer = F_Cu
+
+    def SetNet(self, net): self.net = net
+    def GetNet(self): return self.net
+    def GetNetname(self): return self.net.name if self.net else ""
+    def SetLayer(self, layer): self.layer = layer
+    def GetLayer(self): return self.layer
+
+
+class PCB_TRACK(_Item):
+    def __init__(self, board=None):
+        super().__init__(board)
+        self.start = VECTOR2I()
+        self.end = VECTOR2I()
+        self.width = FromMM(0.25)
+
+    def SetStart(self, p): self.start = VECTOR2I(p.x, p.y)
+    def SetEnd(self, p): self.end = VECTOR2I(p.x, p.y)
+    def GetStart(self): return self.start
+    def GetEnd(self): return self.end
+    def SetWidth(self, w): self.width = w
+    def GetWidth(self): return self.width
+
+    def GetLength(self):
+        return math.hypot(self.end.x - self.start.x, self.end.y - self.start.y)
+
+
+class PCB_VIA(PCB_TRACK):
+    def __init__(self, board=None):
+        super().__init__(board)
+        self.drill = FromMM(0.4)
+        self.width = FromMM(0.8)
+
+    def SetPosition(self, p):
+        self.start = VECTOR2I(p.x, p.y)
+        self.end = VECTOR2I(p.x, p.y)
+
+    def GetPosition(self): return self.start
+    def SetDrill(self, d): self.drill = d
+    def SetViaType(self, t): pass
+    def SetLayerPair(self, top, bottom): pass
+
+
+def _rotate(dx, dy, degrees):
+    # KiCad: positive angles turn counter-clockwise on screen (Y points down)
+    if not degrees % 360:
+        return dx, dy
+    theta = math.radians(degrees)
+    c, s = math.cos(theta), math.sin(theta)
+    return int(round(dx * c + dy * s)), int(round(-dx * s + dy * c))
+
+
+class PAD(_Item):
+    def __init__(self, footprint, number, dx, dy, sx=_PAD_SIZE, sy=_PAD_SIZE):
+        super().__init__()
+        self.fp = footprint
+        self.number = number
+        self.dx, self.dy, self.sx, self.sy = dx, dy, sx, sy
+
+    def GetNumber(self): return self.number
+    def GetParentFootprint(self): return self.fp
+    def GetSize(self): return VECTOR2I(self.sx, self.sy)
+    def IsOnLayer(self, layer): return True
+    def SetNetCode(self, code): self.net = None
+
+    def GetPosition(self):
+        dx, dy = _rotate(self.dx, self.dy, self.fp.orient)
+        return VECTOR2I(self.fp.pos.x + dx, self.fp.pos.y + dy)
+
+    def GetBoundingBox(self):
+        p = self.GetPosition()
+        return BOX2I(p.x - self.sx // 2, p.y - self.sy // 2, p.x + self.sx // 2, p.y + self.sy // 2)
+
+
+class FOOTPRINT(_Item):
+    def __init__(self, lib="", name=""):
+        super().__init__()
+        self.lib, self.name = lib, name
+        self.ref = self.value = ""
+        self.pos = VECTOR2I()
+        self.orient = 0.0
+        self.pads = []
+        self.ext = (FromMM(2), FromMM(2)) # Half width / height of the courtyard
+
+    def SetReference(self, ref): self.ref = ref
+    def GetReference(self): return self.ref
+    def SetValue(self, value): self.value = value
+    def GetValue(self): return self.value
+    def SetPosition(self, p): self.pos = VECTOR2I(p.x, p.y)
+    def GetPosition(self): return self.pos
+    def SetOrientationDegrees(self, degrees): self.orient = degrees % 360
+    def GetOrientationDegrees(self): return self.orient
+    def GetFPIDAsString(self): return f"{self.lib}:{self.name}"
+    def IsFlipped(self): return False
+    def GetLayer(self): return F_Cu
+    def Pads(self): return self.pads
+
+    def FindPadByNumber(self, number):
+        return next((p for p in self.pads if p.number == str(number)), None)
+
+    def GetBoundingBox(self, *args):
+        hx, hy = self.ext
+        if self.orient % 180:
+            hx, hy = hy, hx
+        return BOX2I(self.pos.x - hx, self.pos.y - hy, self.pos.x + hx, self.pos.y + hy)
+
+    def Duplicate(self):
+        copy = FOOTPRINT(self.lib, self.name)
+        copy.ref, copy.value, copy.orient, copy.ext = self.ref, self.value, self.orient, self.ext
+        copy.pos = VECTOR2I(self.pos.x, self.pos.y)
+        copy.pads = [PAD(copy, p.number, p.dx, p.dy, p.sx, p.sy) for p in self.pads]
+        return copy
+
+
+def _pad_count(name):
+    grid = re.search(r"(\d+)x(\d+)", name)
+    if grid:
+        return int(grid.group(1)) * int(grid.group(2))
+    pins = re.search(r"-(\d+)", name)
+    if pins and int(pins.group(1)) < 64:
+        return int(pins.group(1))
+    return 32 if "Arduino" in name else 2
+
+
+def FootprintLoad(lib_path, name):
+    lib = os.path.basename(lib_path).replace(".pretty", "")
+    if lib == "Unknown":
+        return None
+    fp = FOOTPRINT(lib, name)
+    n = _pad_count(name)
+    # Rows of up to 16 pads, centred on the origin
+    per_row = min(n, 16)
+    for i in range(n):
+        dx = (i % 16) * _PAD_PITCH - (per_row - 1) * _PAD_PITCH // 2
+        fp.pads.append(PAD(fp, str(i + 1), dx, (i // 16) * _PAD_PITCH))
+    fp.ext = (max(FromMM(3), per_row * _PAD_PITCH // 2 + FromMM(1)),
+              max(FromMM(2), ((n - 1) // 16 + 1) * _PAD_PITCH // 2 + FromMM(1)))
+    return fp
+
+
+class _Outline:
+    def __init__(self):
+        self.pts = []
+
+    def NewOutline(self): return 0
+    def Append(self, x, y): self.pts.append((int(x), int(y)))
+
+
+class ZONE(_Item):
+    def __init__(self, board=None):
+        super().__init__(board)
+        self.poly = _Outline()
+
+    def Outline(self): return self.poly
+    def SetMinThickness(self, t): pass
+
+
+class PCB_SHAPE(_Item):
+    def __init__(self, board=None):
+        super().__init__(board)
+        self.start = VECTOR2I()
+        self.end = VECTOR2I()
+        self.width = FromMM(0.1)
+        self.layer = Edge_Cuts
+
+    def SetShape(self, shape): pass
+    def SetStart(self, p): self.start = VECTOR2I(p.x, p.y)
+    def SetEnd(self, p): self.end = VECTOR2I(p.x, p.y)
+    def SetWidth(self, w): self.width = w
+
+
+class _DesignSettings:
+    pass
+
+
+class BOARD:
+    def __init__(self):
+        self.footprints, self.tracks, self.zones, self.drawings = [], [], [], []
+        self.nets = {}
+        self.settings = _DesignSettings()
+
+    def GetDesignSettings(self): return self.settings
+    def FindNet(self, name): return self.nets.get(name)
+    def GetFootprints(self): return list(self.footprints)
+    def GetTracks(self): return list(self.tracks)
+    def Zones(self): return list(self.zones)
+    def GetDrawings(self): return list(self.drawings)
+
+    def Add(self, item):
+        if isinstance(item, NETINFO_ITEM):
+            item.code = len(self.nets) + 1
+            self.nets[item.name] = item
+        elif isinstance(item, FOOTPRINT):
+            self.footprints.append(item)
+        elif isinstance(item, PCB_TRACK):
+            self.tracks.append(item)
+        elif isinstance(item, ZONE):
+            self.zones.append(item)
+        else:
+            self.drawings.append(item)
+
+    def Remove(self, item):
+        for items in (self.footprints, self.tracks, self.zones, self.drawings):
+            if item in items:
+                items.remove(item)
+
+    def GetBoardEdgesBoundingBox(self):
+        points = [p for s in self.drawings if s.layer == Edge_Cuts for p in (s.start, s.end)]
+        if not points:
+            return BOX2I(0, 0, FromMM(100), FromMM(100))
+        return BOX2I(min(p.x for p in points), min(p.y for p in points),
+                     max(p.x for p in points), max(p.y for p in points))
+
+
+# --- Files ----------------------------------------------------------------------
+
+def _net_ref(item):
+    return f' (net {item.net.code} "{item.net.name}")' if item.net else ""
+
+
+def SaveBoard(path, board):
+    out = ['(kicad_pcb (version 20240108) (generator "pcbnew") (generator_version "fake")']
+    for name, net in board.nets.items():
+        out.append(f'  (net {net.code} "{name}")')
+    for fp in board.footprints:
+        rot = f" {fp.orient:g}" if fp.orient else ""
+        hx, hy = fp.ext
+        out.append(f'  (footprint "{fp.lib}:{fp.name}" (layer "F.Cu") (uuid "{fp.m_Uuid}")')
+        out.append(f'    (at {_mm(fp.pos.x)} {_mm(fp.pos.y)}{rot})')
+        out.append(f'    (property "Reference" "{fp.ref}") (property "Value" "{fp.value}")')
+        out.append(f'    (fp_rect (start {_mm(-hx)} {_mm(-hy)}) (end {_mm(hx)} {_mm(hy)}) (layer "F.CrtYd") (width 0.05))')
+        for p in fp.pads:
+            # Like KiCad, the pad angle includes the footprint's
+            out.append(f'    (pad "{p.number}" thru_hole circle (at {_mm(p.dx)} {_mm(p.dy)}{rot})'
+                       f' (size {_mm(p.sx)} {_mm(p.sy)}) (drill 1) (layers "*.Cu" "*.Mask"){_net_ref(p)}'
+                       f' (uuid "{p.m_Uuid}"))')
+        out.append('  )')
+    for s in board.drawings:
+        out.append(f'  (gr_line (start {_mm(s.start.x)} {_mm(s.start.y)}) (end {_mm(s.end.x)} {_mm(s.end.y)})'
+                   f' (layer "{_LAYER_NAMES.get(s.layer, "Edge.Cuts")}") (width {_mm(s.width)}) (uuid "{s.m_Uuid}"))')
+    for t in board.tracks:
+        if isinstance(t, PCB_VIA):
+            out.append(f'  (via (at {_mm(t.start.x)} {_mm(t.start.y)}) (size {_mm(t.width)}) (drill {_mm(t.drill)})'
+                       f' (layers "F.Cu" "B.Cu") (net {t.net.code if t.net else 0}) (uuid "{t.m_Uuid}"))')
+        else:
+            out.append(f'  (segment (start {_mm(t.start.x)} {_mm(t.start.y)}) (end {_mm(t.end.x)} {_mm(t.end.y)})'
+                       f' (width {_mm(t.width)}) (layer "{_LAYER_NAMES.get(t.layer, "F.Cu")}")'
+                       f' (net {t.net.code if t.net else 0}) (uuid "{t.m_Uuid}"))')
+    for z in board.zones:
+        pts = " ".join(f"(xy {_mm(x)} {_mm(y)})" for x, y in z.poly.pts)
+        out.append(f'  (zone (net {z.net.code if z.net else 0}) (net_name "{z.GetNetname()}")'
+                   f' (layer "{_LAYER_NAMES.get(z.layer, "B.Cu")}") (uuid "{z.m_Uuid}") (polygon (pts {pts})))')
+    out.append(")")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(out) + "\n")
+    simulate("pcbnew")
+    return True
+
+
+def LoadBoard(path):
+    """
+    Reads back a board SaveBoard wrote (also after deterministic.py rewrote it).
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+    import sexpr
+
+    with open(path, "r", encoding="utf-8") as f:
+        root = sexpr.parse(f.read())
+
+    def mm_point(node):
+        values = sexpr.floats(node)
+        return VECTOR2I(FromMM(values[0]), FromMM(values[1]))
+
+    board = BOARD()
+    codes = {}
+    for node in sexpr.children(root, "net"):
+        if int(node[1]) > 0:
+            net = NETINFO_ITEM(board, str(node[2]))
+            board.Add(net)
+            codes[int(node[1])] = net
+    for node in sexpr.children(root, "footprint"):
+        lib, _, name = str(node[1]).partition(":")
+        fp = FOOTPRINT(lib, name)
+        at = sexpr.floats(sexpr.find(node, "at")) + [0.0, 0.0, 0.0]
+        fp.pos = VECTOR2I(FromMM(at[0]), FromMM(at[1]))
+        fp.orient = at[2]
+        for prop in sexpr.children(node, "property"):
+            if prop[1] == "Reference":
+                fp.ref = str(prop[2])
+            elif prop[1] == "Value":
+                fp.value = str(prop[2])
+        rect = sexpr.find(node, "fp_rect")
+        if rect is not None:
+            end = sexpr.floats(sexpr.find(rect, "end"))
+            fp.ext = (FromMM(end[0]), FromMM(end[1]))
+        for pad_node in sexpr.children(node, "pad"):
+            pad_at = sexpr.floats(sexpr.find(pad_node, "at"))
+            size = sexpr.floats(sexpr.find(pad_node, "size"))
+            pad = PAD(fp, str(pad_node[1]), FromMM(pad_at[0]), FromMM(pad_at[1]), FromMM(size[0]), FromMM(size[1]))
+            net = sexpr.find(pad_node, "net")
+            if net is not None:
+                pad.net = codes.get(int(net[1]))
+            fp.pads.append(pad)
+        board.Add(fp)
+    for node in sexpr.children(root, "gr_line"):
+        shape = PCB_SHAPE(board)
+        shape.start, shape.end = mm_point(sexpr.find(node, "start")), mm_point(sexpr.find(node, "end"))
+        shape.layer = _LAYER_IDS.get(str(sexpr.value(node, "layer")), Edge_Cuts)
+        shape.width = FromMM(float(sexpr.value(node, "width", "0.1")))
+        board.Add(shape)
+    for node in sexpr.children(root, "segment"):
+        track = PCB_TRACK(board)
+        track.start, track.end = mm_point(sexpr.find(node, "start")), mm_point(sexpr.find(node, "end"))
+        track.width = FromMM(float(sexpr.value(node, "width")))
+        track.layer = _LAYER_IDS.get(str(sexpr.value(node, "layer")), F_Cu)
+        track.net = codes.get(int(sexpr.value(node, "net", "0")))
+        board.Add(track)
+    for node in sexpr.children(root, "via"):
+        via = PCB_VIA(board)
+        via.SetPosition(mm_point(sexpr.find(node, "at")))
+        via.width = FromMM(float(sexpr.value(node, "size")))
+        via.drill = FromMM(float(sexpr.value(node, "drill")))
+        via.net = codes.get(int(sexpr.value(node, "net", "0")))
+        board.Add(via)
+    for node in sexpr.children(root, "zone"):
+        zone = ZONE(board)
+        zone.net = codes.get(int(sexpr.value(node, "net", "0")))
+        zone.layer = _LAYER_IDS.get(str(sexpr.value(node, "layer")), B_Cu)
+        pts = sexpr.find(sexpr.find(node, "polygon"), "pts")
+        zone.poly.pts = [(FromMM(p[0]), FromMM(p[1])) for p in (sexpr.floats(xy) for xy in sexpr.children(pts, "xy"))]
+        board.Add(zone)
+    return board
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# Open-loop load generator for POST /generate.
+#
+# Replays a corpus of prompts at a target rate and reports latency
+# percentiles, throughput, error rate and a per-stage breakdown (from the
+# "timings" every result carries). Requests are started on schedule whether
+# or not earlier ones have finished, and latency is measured from the
+# scheduled start, so a server that falls behind shows up as growing latency
+# instead of a silently lower request rate (no coordinated omission).
+#
+# Against a server without KiCad, run the server with the stand-ins in
+# loadtest/fake_kicad (see DEPLOYMENT_GUIDE.md, "Load testing"):
+#
+#   python loadtest/load_generator.py --url http://127.0.0.1:8000 --rps 2 --duration 60
+
+DEFAULT_PROMPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.txt")
+PERCENTILES = (50, 95, 99)
+
+
+def load_prompts(path: str) -> List[str]:
+    """
+    One prompt per line; blank lines and lines starting with # are skipped.
+    A literal \\n in a line becomes a newline (for multi-line BOM prompts).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    prompts = [line.replace("\\n", "\n") for line in lines if line and not line.startswith("#")]
+    if not prompts:
+        raise ValueError(f"No prompts in {path}")
+    return prompts
+
+
+def arrival_times(rps: float, count: int, pattern: str = "constant",
+                  rng: Optional[random.Random] = None) -> List[float]:
+    """
+    Start offsets (s) of count requests at rps: evenly spaced, or a Poisson
+    process with the same mean rate.
+    """
+    if rps <= 0:
+        raise ValueError("rps must be positive")
+    if pattern == "constant":
+        return [i / rps for i in range(count)]
+    rng = rng or random.Random()
+    times, t = [], 0.0
+    for _ in range(count):
+        times.append(t)
+        t += rng.expovariate(rps)
+    return times
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of values (None if empty).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def _distribution(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    stats = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+    stats["mean"] = sum(values) / len(values) if values else None
+    stats["max"] = max(values) if values else None
+    return {k: (round(v, 4) if v is not None else None) for k, v in stats.items()}
+
+
+def summarize(samples: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """
+    Report over the samples of one run. A sample is {"latency", "status",
+    "error", "timings", "coalesced"}; status 200 without an error is a success.
+    """
+    ok, errors = [], {}
+    for s in samples:
+        if s["status"] == 200 and not s["error"]:
+            ok.append(s)
+        else:
+            kind = s["error"] or f"http_{s['status']}"
+            errors[kind] = errors.get(kind, 0) + 1
+
+    stages: Dict[str, List[float]] = {}
+    for s in ok:
+        for stage, seconds in (s["timings"] or {}).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 4) if wall_seconds > 0 else 0.0,
+        "coalesced": sum(1 for s in ok if s["coalesced"]),
+        "latency": _distribution([s["latency"] for s in ok]),
+        "stages": {stage: _distribution(values) for stage, values in sorted(stages.items())},
+    }
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    def row(name, stats):
+        cells = [f"{stats[k]:>9.3f}" if stats[k] is not None else f"{'-':>9}"
+                 for k in ("p50", "p95", "p99", "mean", "max")]
+        return f"{name:<12}" + "".join(cells)
+
+    lines = [
+        f"Requests:    {summary['requests']} ({summary['succeeded']} ok, error rate {summary['error_rate']:.2%})",
+        f"Throughput:  {summary['throughput_rps']:.3f} req/s over {summary['wall_seconds']:.1f} s"
+        f" ({summary['coalesced']} coalesced)",
+    ]
+    for kind, count in sorted(summary["errors"].items()):
+        lines.append(f"  {kind}: {count}")
+    lines += ["", f"{'seconds':<12}" + "".join(f"{h:>9}" for h in ("p50", "p95", "p99", "mean", "max")),
+              row("latency", summary["latency"])]
+    lines += [row(stage, stats) for stage, stats in summary["stages"].items()]
+    return "\n".join(lines)
+
+
+async def _one(client, endpoint: str, prompt: str, scheduled: float, timeout: float,
+               slots: asyncio.Semaphore) -> Dict[str, Any]:
+    import httpx
+
+    sample = {"latency": None, "status": None, "error": None, "timings": None, "coalesced": False}
+    async with slots:
+        try:
+            response = await client.post(endpoint, json={"prompt": prompt}, timeout=timeout)
+            sample["status"] = response.status_code
+            if response.status_code == 200:
+                body = response.json()
+                sample["timings"] = body.get("timings")
+                sample["coalesced"] = bool(body.get("coalesced"))
+        except httpx.TimeoutException:
+            sample["error"] = "timeout"
+        except httpx.HTTPError as e:
+            sample["error"] = type(e).__name__
+    sample["latency"] = time.monotonic() - scheduled
+    return sample
+
+
+async def run_load(url: str, prompts: Sequence[str], rps: float, count: int,
+                   pattern: str = "constant", concurrency: int = 256, timeout: float = 600.0,
+                   endpoint: str = "/generate", seed: Optional[int] = None,
+                   transport=None) -> Dict[str, Any]:
+    """
+    Sends count requests at rps and returns the summary. Prompts are used
+    round-robin from a seeded shuffle. concurrency caps requests in flight
+    (beyond it, requests wait and their wait counts as latency). transport
+    is passed to httpx (tests use an ASGI transport).
+    """
+    import httpx
+
+    rng = random.Random(seed)
+    order = list(prompts)
+    rng.shuffle(order)
+    offsets = arrival_times(rps, count, pattern, rng)
+    slots = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=url, transport=transport) as client:
+        started = time.monotonic()
+        tasks = []
+        for i, offset in enumerate(offsets):
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(
+                _one(client, endpoint, order[i % len(order)], started + offset, timeout, slots)))
+        samples = await asyncio.gather(*tasks)
+        wall = time.monotonic() - started
+    return summarize(list(samples), wall)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay prompts against /generate at a target rate")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--prompts", default=DEFAULT_PROMPTS, help="Prompt corpus, one per line")
+    parser.add_argument("--rps", type=float, default=1.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of requests to send")
+    parser.add_argument("--requests", type=int, help="Number of requests (overrides --duration)")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--concurrency", type=int, default=256, help="Max requests in flight")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout (s)")
+    parser.add_argument("--endpoint", default="/generate")
+    parser.add_argument("--seed", type=int, help="Seed for prompt order and Poisson arrivals")
+    parser.add_argument("--json", help="Also write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    count = args.requests if args.requests is not None else max(1, int(args.rps * args.duration))
+    summary = asyncio.run(run_load(args.url, load_prompts(args.prompts), args.rps, count, args.arrival,
+                                   args.concurrency, args.timeout, args.endpoint, args.seed))
+    summary["target_rps"] = args.rps
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["succeeded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from src import metrics
+
+# Admission control for KiCad work.
+#
+# Every board build runs a KiCad Python process that loads pcbnew and the
+# footprint libraries (hundreds of MB each), so only a fixed number may run at
+# once. Builds beyond that wait in a bounded FIFO; when the FIFO is full new
+# requests are rejected immediately with 429 + Retry-After instead of piling
+# up and taking the container down. Throughput stays at max_running builds.
+
+QUEUE_WAIT = metrics.Histogram(
+    "admission_queue_wait_seconds", "Time a build waited for a KiCad worker slot")
+ADMITTED = metrics.Counter(
+    "admission_admitted_total", "Builds that got a KiCad worker slot")
+REJECTED = metrics.Counter(
+    "admission_rejected_total", "Requests rejected by admission control", ("reason",))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _mem_available_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def default_workers() -> int:
+    """
+    MAX_KICAD_WORKERS if set, else one per core, capped by how many KiCad
+    processes (KICAD_WORKER_MB each, default 500) fit in available memory.
+    """
+    configured = os.getenv("MAX_KICAD_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    workers = os.cpu_count() or 1
+    mem_mb = _mem_available_mb()
+    if mem_mb is not None:
+        workers = min(workers, mem_mb // int(os.getenv("KICAD_WORKER_MB", "500")))
+    return max(1, workers)
+
+
+class AdmissionController:
+    def __init__(self, max_running: Optional[int] = None, max_queued: Optional[int] = None,
+                 per_client: Optional[int] = None):
+        self.max_running = max_running or default_workers()
+        if max_queued is None:
+            max_queued = int(os.getenv("MAX_QUEUED_BUILDS", str(self.max_running * 4)))
+        self.max_queued = max_queued
+        self.per_client = per_client or int(os.getenv("MAX_JOBS_PER_CLIENT", "2"))
+
+        self.running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._clients: Dict[str, int] = {}
+        # Moving average of how long a build holds its slot, for Retry-After
+        self._service_time = 30.0
+
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        # Roughly when a slot frees up for someone joining the back of the queue
+        waves = (len(self._waiters) + 1) / self.max_running
+        return max(1, min(300, math.ceil(self._service_time * waves)))
+
+    def _reject(self, reason: str):
+        REJECTED.inc(reason=reason)
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def check(self) -> None:
+        """
+        Cheap pre-check at request entry, so we don't parse a prompt only to
+        reject its build a moment later.
+        """
+        if self.running >= self.max_running and len(self._waiters) >= self.max_queued:
+            self._reject("queue_full")
+
+    def enter_client(self, client: str) -> None:
+        if self._clients.get(client, 0) >= self.per_client:
+            self._reject("client_limit")
+        self._clients[client] = self._clients.get(client, 0) + 1
+
+    def leave_client(self, client: str) -> None:
+        remaining = self._clients.get(client, 0) - 1
+        if remaining > 0:
+            self._clients[client] = remaining
+        else:
+            self._clients.pop(client, None)
+
+    async def acquire(self) -> float:
+        """
+        Waits for a KiCad worker slot. Returns a ticket for release().
+        Raises AdmissionRejected if the queue is full.
+        """
+        start = time.monotonic()
+        if self.running < self.max_running and not self._waiters:
+            self.running += 1
+        else:
+            if len(self._waiters) >= self.max_queued:
+                self._reject("queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # The slot was handed to us just as we were cancelled
+                    self._release_slot()
+                raise
+
+        now = time.monotonic()
+        QUEUE_WAIT.observe(now - start)
+        ADMITTED.inc()
+        return now
+
+    def try_acquire(self) -> Optional[float]:
+        """
+        A worker slot only if one is idle right now (nobody waiting), else
+        None. For optional extra work, such as building more design variants
+        in parallel; release() it like any other.
+        """
+        if self.running >= self.max_running or self._waiters:
+            return None
+        self.running += 1
+        return time.monotonic()
+
+    def release(self, ticket: float) -> None:
+        held = time.monotonic() - ticket
+        self._service_time = 0.8 * self._service_time + 0.2 * held
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the next waiter (running stays the same)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
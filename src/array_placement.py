@@ -0,0 +1,66 @@
+import math
+from typing import List, Sequence, Tuple
+
+# Array placement patterns for repeated parts.
+#
+# generate_schematic tags the N parts of one entry ("64 LEDs", "8x8 LED
+# matrix", "a ring of 16 LEDs") in netlist["arrays"] as {"refs", "pattern",
+# "rows", "cols"}. The board places each array in one pass: the positions of
+# all members come from one footprint's extents and the pattern, instead of
+# each part taking its own grid slot, so a 256-part matrix costs one footprint
+# load and one slot rectangle.
+#
+# Coordinates are millimetres relative to the array origin (the first
+# member); rotations follow KiCad's convention (degrees, counter-clockwise).
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+ARRAY_GAP_MM = 1.0 # Between neighbouring footprint extents
+PATTERNS = ("row", "grid", "circular")
+
+
+def array_shape(count: int, pattern: str, rows: int = 0, cols: int = 0) -> Tuple[int, int]:
+    """
+    (rows, cols) of an array: one row, the rows / cols given with the
+    prompt if they hold count, else a near-square grid.
+    """
+    if pattern in ("row", "circular"):
+        return 1, count
+    if rows > 0 and cols > 0 and rows * cols >= count:
+        return rows, cols
+    cols = int(math.ceil(math.sqrt(count)))
+    return int(math.ceil(count / cols)), cols
+
+
+def array_layout(pattern: str, count: int, bbox: Sequence[float], rows: int = 0, cols: int = 0,
+                 gap: float = ARRAY_GAP_MM) -> Tuple[List[Tuple[float, float, float]], Tuple[float, float, float, float]]:
+    """
+    Positions [(x, y, rotation)] of count copies of a footprint with local
+    extents bbox = [x0, y0, x1, y1], and the extents of the whole array.
+
+    row / grid: left to right, top to bottom at the footprint pitch.
+    circular: evenly spaced on a ring, clockwise from the top, each copy
+    turned to face the centre the same way.
+    """
+    x0, y0, x1, y1 = bbox
+    pitch_x, pitch_y = x1 - x0 + gap, y1 - y0 + gap
+
+    if pattern == "circular" and count > 2:
+        # Chord between neighbours at least the larger pitch
+        pitch = max(pitch_x, pitch_y)
+        radius = pitch / (2 * math.sin(math.pi / count))
+        step = 2 * math.pi / count
+        positions = [(round(radius * math.sin(i * step), 6), round(radius - radius * math.cos(i * step), 6),
+                      round(-math.degrees(i * step) % 360, 6)) for i in range(count)]
+        # Any rotation of the footprint stays within its circumscribed circle
+        reach = max(math.hypot(x, y) for x in (x0, x1) for y in (y0, y1))
+        extent = (-radius - reach, -reach, radius + reach, 2 * radius + reach)
+        return positions, extent
+
+    rows, cols = array_shape(count, "row" if pattern == "circular" else pattern, rows, cols)
+    positions = [(round((i % cols) * pitch_x, 6), round((i // cols) * pitch_y, 6), 0.0) for i in range(count)]
+    used_rows = (count - 1) // cols + 1
+    used_cols = min(count, cols)
+    extent = (x0, y0, x0 + used_cols * pitch_x - gap, y0 + used_rows * pitch_y - gap)
+    return positions, extent
+
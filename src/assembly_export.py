@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Assembly files: bill of materials and pick-and-place (centroid / CPL).
+#
+# Both come from what the pipeline already wrote into the job directory: the
+# netlist (values and footprints) and the placement the board script saves
+# next to the board (see write_placement() in kicad_script.py). Nothing
+# reloads the board or starts KiCad, so a request costs a netlist decode and
+# one pass over the parts. Rows are streamed as CSV or as a JSON array.
+#
+# Pick-and-place coordinates are millimetres from the bottom-left corner of
+# the board outline with Y up, the convention assembly houses expect (the
+# board itself has Y down). Rotation is KiCad's, counter-clockwise degrees.
+
+BOM_COLUMNS = ("value", "footprint", "quantity", "refs")
+CPL_COLUMNS = ("ref", "value", "footprint", "x", "y", "rotation", "side")
+FORMATS = {"csv": "text/csv; charset=utf-8", "json": "application/json"}
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def ref_key(ref: str):
+    # R2 before R10
+    return [int(part) if part.isdigit() else part for part in _DIGITS.split(ref)]
+
+
+def load_placement(path: str) -> Optional[Dict[str, Any]]:
+    """
+    The board script's placement file, or None if the job has none.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def bom_rows(netlist: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    One row per (value, footprint) with its quantity and references, in the
+    order each group's first part appears in the netlist.
+    """
+    groups: Dict[tuple, List[str]] = {}
+    for comp in netlist.get("components", []):
+        groups.setdefault((comp.get("value", ""), comp.get("footprint", "")), []).append(comp["ref"])
+    return [{"value": value, "footprint": footprint, "quantity": len(refs),
+             "refs": ",".join(sorted(refs, key=ref_key))}
+            for (value, footprint), refs in groups.items()]
+
+
+def cpl_rows(netlist: Dict[str, Any], placement: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    One row per placed netlist part, sorted by reference. Parts the board
+    does not have (and footprints that are not parts, like mounting holes)
+    are left out.
+    """
+    left, _, _, bottom = placement.get("outline") or (0.0, 0.0, 0.0, 0.0)
+    placed = {part["ref"]: part for part in placement.get("parts", [])}
+    rows = []
+    for comp in netlist.get("components", []):
+        part = placed.get(comp["ref"])
+        if part is None:
+            continue
+        rows.append({
+            "ref": comp["ref"],
+            "value": comp.get("value", ""),
+            "footprint": part.get("footprint") or comp.get("footprint", ""),
+            "x": round(part["x"] - left, 4),
+            "y": round(bottom - part["y"], 4),
+            "rotation": part.get("rotation", 0.0),
+            "side": part.get("side", "top"),
+        })
+    rows.sort(key=lambda row: ref_key(row["ref"]))
+    return rows
+
+
+def stream_csv(rows: Iterable[Dict[str, Any]], columns: Iterable[str]) -> Iterator[str]:
+    """
+    Header line, then one line per row.
+    """
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([row[c] for c in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue() # Header only
+
+
+def stream_json(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    A JSON array, one row per chunk.
+    """
+    separator = "["
+    for row in rows:
+        yield separator + json.dumps(row)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def stream_rows(rows: Iterable[Dict[str, Any]], columns: Iterable[str], fmt: str) -> Iterator[str]:
+    return stream_csv(rows, columns) if fmt == "csv" else stream_json(rows)
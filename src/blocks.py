@@ -0,0 +1,272 @@
+import hashlib
+import json
+import math
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Pre-routed sub-circuit blocks.
+#
+# generate_schematic tags the sub-circuits its heuristics build (LED + series
+# resistor, motor driver + motors + battery feed) in netlist["blocks"]. Every
+# instance whose parts, footprints and internal nets match is the same block:
+# it is laid out and routed once, cached by content key, and every copy is
+# placed by translating / rotating that layout and renaming its nets. Only the
+# nets that leave a block (GND, explicit connections) are left to the board
+# router, so N identical channels cost about one block plus the stitching.
+#
+# Coordinates are millimetres, footprint-local as loaded (origin, unrotated);
+# rotations follow KiCad's convention (positive = counter-clockwise on screen).
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+LAYOUT_VERSION = 1 # Bump when the layout / routing below changes, to invalidate caches
+MEMBER_GAP_MM = 2.0 # Between footprint extents inside a block
+ROUTE_MARGIN_MM = 1.0 # Block copper stays this close to the member extents
+
+
+def _router():
+    try:
+        import router # kicad_script.py: the script directory is on sys.path
+    except ImportError:
+        from src import router
+    return router
+
+
+def rotate(x: float, y: float, rotation: float) -> Tuple[float, float]:
+    if not rotation % 360:
+        return x, y
+    theta = math.radians(rotation)
+    c, s = math.cos(theta), math.sin(theta)
+    return x * c + y * s, -x * s + y * c
+
+
+class BlockInstance:
+    """
+    One tagged sub-circuit of a netlist: members [(role, ref, footprint)] and
+    the nets wholly inside it [(net name, [(role, pin)], net class)], in a
+    canonical order so identical instances line up net by net.
+    """
+    __slots__ = ("type", "members", "nets")
+
+    def __init__(self, block_type: str, members: List[Tuple[str, str, str]],
+                 nets: List[Tuple[str, List[Tuple[str, str]], str]]):
+        self.type = block_type
+        self.members = members
+        self.nets = sorted(nets, key=lambda n: (n[1], n[2]))
+
+    def refs(self) -> Dict[str, str]:
+        return {ref: role for role, ref, _ in self.members}
+
+    def signature(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "members": [[role, footprint] for role, _, footprint in self.members],
+            "nets": [[[list(node) for node in nodes], net_class] for _, nodes, net_class in self.nets],
+        }
+
+
+def block_instances(netlist: Dict[str, Any]) -> List[BlockInstance]:
+    """
+    Resolves netlist["blocks"] ([{"type", "members": [[role, ref], ...]}])
+    against the components and nets. Instances without an internal net, or
+    reusing a part already claimed by an earlier block, are dropped.
+    """
+    components = {c["ref"]: c for c in netlist.get("components", [])}
+    claimed = set()
+    instances = []
+    for spec in netlist.get("blocks", []):
+        members = [(str(role), str(ref), str(components[ref].get("footprint", "")))
+                   for role, ref in spec.get("members", []) if ref in components]
+        refs = {ref: role for role, ref, _ in members}
+        if len(members) < 2 or len(refs) < len(members) or claimed & set(refs):
+            continue
+
+        nets = []
+        for net in netlist.get("nets", []):
+            nodes = [(node["ref"], str(node["pin"])) for node in net.get("nodes", [])]
+            if len(nodes) > 1 and all(ref in refs for ref, _ in nodes):
+                nets.append((net["name"], sorted((refs[ref], pin) for ref, pin in nodes), net.get("class", "signal")))
+        if not nets:
+            continue
+        claimed.update(refs)
+        instances.append(BlockInstance(str(spec.get("type", "block")), members, nets))
+    return instances
+
+
+class BlockLayout:
+    """
+    Member offsets and internal copper of a block, relative to the block
+    origin (the first member's position). Copper refers to nets by index into
+    BlockInstance.nets; only nets listed in routed have copper.
+    """
+    __slots__ = ("offsets", "bbox", "segments", "vias", "routed")
+
+    def __init__(self, offsets: Dict[str, Tuple[float, float]], bbox: Tuple[float, float, float, float],
+                 segments: Optional[List[Tuple[int, int, float, float, float, float]]] = None,
+                 vias: Optional[List[Tuple[int, float, float]]] = None,
+                 routed: Optional[List[int]] = None):
+        self.offsets = offsets
+        self.bbox = bbox
+        self.segments = segments or []
+        self.vias = vias or []
+        self.routed = routed or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"offsets": {k: list(v) for k, v in self.offsets.items()}, "bbox": list(self.bbox),
+                "segments": [list(s) for s in self.segments], "vias": [list(v) for v in self.vias],
+                "routed": list(self.routed)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BlockLayout":
+        return cls({k: tuple(v) for k, v in data["offsets"].items()}, tuple(data["bbox"]),
+                   [tuple(s) for s in data["segments"]], [tuple(v) for v in data["vias"]],
+                   list(data["routed"]))
+
+    def extent(self, rotation: float = 0) -> Tuple[float, float, float, float]:
+        """
+        Bounding box after rotating about the block origin.
+        """
+        x0, y0, x1, y1 = self.bbox
+        corners = [rotate(x, y, rotation) for x, y in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))]
+        xs, ys = [c[0] for c in corners], [c[1] for c in corners]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def place(self, instance: BlockInstance, x: float, y: float, rotation: float = 0):
+        """
+        One copy of the block at (x, y): ({ref: (x, y)}, {net name: ([(layer,
+        x0, y0, x1, y1)], [(x, y)])}) in board coordinates.
+        """
+        def xf(px, py):
+            rx, ry = rotate(px, py, rotation)
+            return round(rx + x, 6), round(ry + y, 6)
+
+        positions = {ref: xf(*self.offsets[role]) for role, ref, _ in instance.members}
+        copper = {instance.nets[i][0]: ([], []) for i in self.routed}
+        for net_index, layer, x0, y0, x1, y1 in self.segments:
+            copper[instance.nets[net_index][0]][0].append((layer,) + xf(x0, y0) + xf(x1, y1))
+        for net_index, vx, vy in self.vias:
+            copper[instance.nets[net_index][0]][1].append(xf(vx, vy))
+        return positions, copper
+
+
+def block_key(instance: BlockInstance, geometry: Dict[str, Dict[str, Any]], widths: Sequence[float]) -> str:
+    """
+    Content key of a block layout: everything the layout depends on.
+    """
+    router = _router()
+    data = {
+        "version": LAYOUT_VERSION,
+        "signature": instance.signature(),
+        "geometry": [geometry[role] for role, _, _ in instance.members],
+        "widths": list(widths),
+        "layout": [MEMBER_GAP_MM, ROUTE_MARGIN_MM, router.GRID_PITCH_MM, router.CLEARANCE_MM],
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def layout_block(instance: BlockInstance, geometry: Dict[str, Dict[str, Any]], widths: Sequence[float]) -> BlockLayout:
+    """
+    Places the members in a row (left to right, centred vertically) and routes
+    the internal nets once with the grid router.
+
+    geometry[role] = {"bbox": [x0, y0, x1, y1],
+                      "pads": [[number, x, y, x0, y0, x1, y1, [layers]], ...]}
+    """
+    offsets: Dict[str, Tuple[float, float]] = {}
+    cursor = centre = None
+    for role, _, _ in instance.members:
+        x0, y0, x1, y1 = geometry[role]["bbox"]
+        if cursor is None:
+            offsets[role] = (0.0, 0.0)
+            cursor, centre = x1 + MEMBER_GAP_MM, (y0 + y1) / 2
+            continue
+        offsets[role] = (round(cursor - x0, 6), round(centre - (y0 + y1) / 2, 6))
+        cursor += x1 - x0 + MEMBER_GAP_MM
+
+    boxes = []
+    for role, _, _ in instance.members:
+        dx, dy = offsets[role]
+        x0, y0, x1, y1 = geometry[role]["bbox"]
+        boxes.append((x0 + dx, y0 + dy, x1 + dx, y1 + dy))
+    bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    layout = BlockLayout(offsets, bbox)
+
+    # Pads on an internal net belong to it; every other pad is its own (unrouted) net
+    pad_net = {}
+    for index, (_, nodes, _) in enumerate(instance.nets):
+        for node in nodes:
+            pad_net[node] = f"n{index}"
+
+    m = ROUTE_MARGIN_MM
+    router = _router().Router((bbox[0] - m, bbox[1] - m, bbox[2] + m, bbox[3] + m))
+    pads = {}
+    for role, _, _ in instance.members:
+        dx, dy = offsets[role]
+        for number, px, py, x0, y0, x1, y1, layers in geometry[role]["pads"]:
+            owner = pad_net.get((role, str(number)), f"pad:{role}:{number}")
+            router.add_obstacle(x0 + dx, y0 + dy, x1 + dx, y1 + dy, owner, layers)
+            pads.setdefault((role, str(number)), ((px + dx, py + dy), layers))
+    for index, (_, nodes, _) in enumerate(instance.nets):
+        terminals = [pads[node] for node in nodes if node in pads]
+        if len(terminals) > 1:
+            router.add_net(f"n{index}", [t[0] for t in terminals], widths[index], [t[1] for t in terminals])
+    if not router.nets:
+        return layout
+
+    # Blocks are small: routing in-process beats starting a pool
+    stats = router.route(workers=1)
+    for net in router.nets:
+        if net.name in stats["unrouted"]:
+            continue
+        index = int(net.name[1:])
+        segments, vias = router.tracks(net.name)
+        layout.segments += [(index,) + tuple(s) for s in segments]
+        layout.vias += [(index, x, y) for x, y in vias]
+        layout.routed.append(index)
+    return layout
+
+
+class BlockLibrary:
+    """
+    Block layouts by content key: in memory, and as JSON files in directory
+    (if given) so later boards, in other processes, reuse them too.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.layouts: Dict[str, BlockLayout] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.directory, f"{key}.json") if self.directory else None
+
+    def layout(self, instance: BlockInstance, geometry: Dict[str, Dict[str, Any]], widths: Sequence[float],
+               build: Callable[..., BlockLayout] = layout_block) -> BlockLayout:
+        key = block_key(instance, geometry, widths)
+        layout = self.layouts.get(key)
+        path = self._path(key)
+        if layout is None and path and os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    layout = BlockLayout.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Ignoring unreadable block cache {path}: {e}")
+        if layout is not None:
+            self.hits += 1
+            self.layouts[key] = layout
+            return layout
+
+        self.misses += 1
+        layout = build(instance, geometry, widths)
+        self.layouts[key] = layout
+        if path:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(layout.to_dict(), f, separators=(",", ":"))
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Warning: Could not write block cache {path}: {e}")
+        return layout
@@ -0,0 +1,472 @@
+import math
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src import jobs
+from src import sexpr
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+# Board preview renderer: .kicad_pcb -> SVG (and PNG when cairosvg is installed).
+#
+# The board is parsed once into per-layer batches: every stroke of one layer
+# and width becomes a single <path> (round caps / joins), every filled shape of
+# a layer another <path>, so even large boards render to a handful of SVG
+# elements. Results are cached on disk by board content hash and layer, so a
+# board is only rendered the first time it is previewed.
+
+MARGIN_MM = 2.0
+DEFAULT_PNG_SCALE = 8.0 # pixels per mm
+MAX_PNG_PIXELS = 4096 # longest side
+# Rendered previews kept on disk; the oldest are deleted past this
+PREVIEW_CACHE_MAX_FILES = int(os.getenv("PREVIEW_CACHE_MAX_FILES", "2000"))
+
+# Drawing order bottom to top, with the colours KiCad's default theme uses
+LAYER_COLORS = OrderedDict([
+    ("B.Cu", "#4d7fc4"),
+    ("B.SilkS", "#e8b2a7"),
+    ("F.Cu", "#c83434"),
+    ("F.SilkS", "#f2eda1"),
+    ("Edge.Cuts", "#d0d2cd"),
+])
+BACKGROUND = "#001023"
+HOLE_COLOR = "#1a1a1a"
+LAYERS = tuple(LAYER_COLORS)
+
+
+class PreviewError(Exception):
+    pass
+
+
+def _n(value: float) -> str:
+    text = f"{value:.3f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _circle_path(cx: float, cy: float, r: float) -> str:
+    return (f"M{_n(cx - r)} {_n(cy)}a{_n(r)} {_n(r)} 0 1 0 {_n(2 * r)} 0"
+            f"a{_n(r)} {_n(r)} 0 1 0 {_n(-2 * r)} 0Z")
+
+
+def _poly_path(points: Sequence[Tuple[float, float]], close: bool = True) -> str:
+    if not points:
+        return ""
+    head = f"M{_n(points[0][0])} {_n(points[0][1])}"
+    body = "".join(f"L{_n(x)} {_n(y)}" for x, y in points[1:])
+    return head + body + ("Z" if close else "")
+
+
+def _arc_path(start, mid, end) -> str:
+    """
+    Three-point arc -> SVG elliptical arc command.
+    """
+    (x1, y1), (x2, y2), (x3, y3) = start, mid, end
+    d = 2 * (x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+    if abs(d) < 1e-12:
+        return _poly_path([start, end], close=False)
+    ux = ((x1 * x1 + y1 * y1) * (y2 - y3) + (x2 * x2 + y2 * y2) * (y3 - y1) + (x3 * x3 + y3 * y3) * (y1 - y2)) / d
+    uy = ((x1 * x1 + y1 * y1) * (x3 - x2) + (x2 * x2 + y2 * y2) * (x1 - x3) + (x3 * x3 + y3 * y3) * (x2 - x1)) / d
+    r = math.hypot(x1 - ux, y1 - uy)
+    cross = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+    sweep = 1 if cross > 0 else 0
+    # The arc passes through mid: it is the large arc if mid is on the far side of the chord
+    large = 1 if ((x3 - x1) * (uy - y1) - (y3 - y1) * (ux - x1)) * cross > 0 else 0
+    return f"M{_n(x1)} {_n(y1)}A{_n(r)} {_n(r)} 0 {large} {sweep} {_n(x3)} {_n(y3)}"
+
+
+def _placement(x: float, y: float, rotation: float):
+    """
+    Footprint-local -> board coordinates (KiCad's rotation convention).
+    """
+    if not rotation % 360:
+        return lambda px, py: (px + x, py + y)
+    theta = math.radians(rotation)
+    c, s = math.cos(theta), math.sin(theta)
+    return lambda px, py: (px * c + py * s + x, -px * s + py * c + y)
+
+
+def _layers_of(node) -> List[str]:
+    single = sexpr.value(node, "layer")
+    if single is not None:
+        names = [str(single)]
+    else:
+        names = [str(l) for l in (sexpr.find(node, "layers") or ["layers"])[1:]]
+    out = []
+    for name in names:
+        if name.startswith("*."):
+            out += [side + name[1:] for side in ("F", "B") if side + name[1:] in LAYER_COLORS]
+        elif name in LAYER_COLORS:
+            out.append(name)
+    return out
+
+
+class BoardScene:
+    """
+    Per-layer primitive batches for one board.
+    """
+
+    def __init__(self):
+        # layer -> width -> [path pieces]
+        self.strokes: Dict[str, Dict[float, List[str]]] = defaultdict(lambda: defaultdict(list))
+        # layer -> [path pieces]
+        self.fills: Dict[str, List[str]] = defaultdict(list)
+        self.zones: Dict[str, List[str]] = defaultdict(list)
+        self.holes: List[str] = []
+        self.texts: Dict[str, List[Tuple[float, float, float, float, str]]] = defaultdict(list)
+        self.bbox = [math.inf, math.inf, -math.inf, -math.inf]
+        self.edge_bbox = [math.inf, math.inf, -math.inf, -math.inf]
+
+    def _grow(self, box, x, y, r=0.0):
+        box[0] = min(box[0], x - r)
+        box[1] = min(box[1], y - r)
+        box[2] = max(box[2], x + r)
+        box[3] = max(box[3], y + r)
+
+    def stroke(self, layer: str, width: float, piece: str, points) -> None:
+        self.strokes[layer][round(width, 4)].append(piece)
+        box = self.edge_bbox if layer == "Edge.Cuts" else self.bbox
+        for x, y in points:
+            self._grow(box, x, y, width / 2)
+
+    def fill(self, layer: str, piece: str, points, zone: bool = False) -> None:
+        (self.zones if zone else self.fills)[layer].append(piece)
+        for x, y in points:
+            self._grow(self.bbox, x, y)
+
+    # --- Building -----------------------------------------------------------
+
+    def add_graphic(self, node, xf) -> None:
+        """
+        fp_* / gr_* drawing item.
+        """
+        layers = _layers_of(node)
+        if not layers:
+            return
+        layer = layers[0]
+        kind = node[0].split("_", 1)[1]
+        stroke = sexpr.find(node, "stroke")
+        width = sexpr.floats(sexpr.find(stroke, "width") if stroke else sexpr.find(node, "width"))
+        width = width[0] if width else 0.1
+        filled = str(sexpr.value(node, "fill", "no")) in ("yes", "solid")
+
+        def pt(name):
+            p = sexpr.floats(sexpr.find(node, name))
+            return xf(p[0], p[1]) if len(p) >= 2 else None
+
+        if kind == "line":
+            a, b = pt("start"), pt("end")
+            if a and b:
+                self.stroke(layer, width, _poly_path([a, b], close=False), (a, b))
+        elif kind == "rect":
+            a, b = sexpr.floats(sexpr.find(node, "start")), sexpr.floats(sexpr.find(node, "end"))
+            if len(a) >= 2 and len(b) >= 2:
+                corners = [xf(a[0], a[1]), xf(b[0], a[1]), xf(b[0], b[1]), xf(a[0], b[1])]
+                self.stroke(layer, width, _poly_path(corners), corners)
+                if filled:
+                    self.fill(layer, _poly_path(corners), corners)
+        elif kind == "circle":
+            c, e = pt("center"), pt("end")
+            if c and e:
+                r = math.hypot(e[0] - c[0], e[1] - c[1])
+                box = [(c[0] - r, c[1] - r), (c[0] + r, c[1] + r)]
+                self.stroke(layer, width, _circle_path(c[0], c[1], r), box)
+                if filled:
+                    self.fill(layer, _circle_path(c[0], c[1], r), box)
+        elif kind == "arc":
+            a, m, b = pt("start"), pt("mid"), pt("end")
+            if a and m and b:
+                self.stroke(layer, width, _arc_path(a, m, b), (a, m, b))
+        elif kind == "poly":
+            pts = sexpr.find(node, "pts")
+            points = [xf(*sexpr.floats(p)[:2]) for p in sexpr.children(pts, "xy")] if pts else []
+            if len(points) > 1:
+                if filled:
+                    self.fill(layer, _poly_path(points), points)
+                else:
+                    self.stroke(layer, width, _poly_path(points), points)
+
+    def add_pad(self, node, fx: float, fy: float, frot: float) -> None:
+        at = sexpr.floats(sexpr.find(node, "at")) + [0.0, 0.0, 0.0]
+        size = sexpr.floats(sexpr.find(node, "size")) or [0.0, 0.0]
+        w, h = size[0], size[1] if len(size) > 1 else size[0]
+        cx, cy = _placement(fx, fy, frot)(at[0], at[1])
+        # The pad angle in the file already includes the footprint rotation
+        pad_xf = _placement(cx, cy, at[2])
+        shape = str(node[3]) if len(node) > 3 else "circle"
+        layers = _layers_of(node)
+
+        if shape == "circle":
+            r = w / 2
+            piece, points, stroke = _circle_path(cx, cy, r), [(cx - r, cy - r), (cx + r, cy + r)], None
+        elif shape == "oval":
+            # Stadium: a round-capped stroke along the long axis
+            half = abs(w - h) / 2
+            a, b = (pad_xf(-half, 0), pad_xf(half, 0)) if w >= h else (pad_xf(0, -half), pad_xf(0, half))
+            piece, points, stroke = _poly_path([a, b], close=False), [a, b], min(w, h)
+        else:
+            # rect / roundrect / trapezoid / custom: drawn as the bounding rectangle
+            corners = [pad_xf(-w / 2, -h / 2), pad_xf(w / 2, -h / 2), pad_xf(w / 2, h / 2), pad_xf(-w / 2, h / 2)]
+            piece, points, stroke = _poly_path(corners), corners, None
+        for layer in layers:
+            if layer.endswith(".Cu"):
+                if stroke:
+                    self.stroke(layer, stroke, piece, points)
+                else:
+                    self.fill(layer, piece, points)
+
+        drill = sexpr.floats(sexpr.find(node, "drill"))
+        if drill and drill[0] > 0:
+            self.holes.append(_circle_path(cx, cy, drill[0] / 2))
+
+    def add_footprint(self, fp) -> None:
+        at = sexpr.floats(sexpr.find(fp, "at")) + [0.0, 0.0, 0.0]
+        fx, fy, frot = at[0], at[1], at[2]
+        xf = _placement(fx, fy, frot)
+        for child in fp[2:]:
+            if not isinstance(child, list) or not child:
+                continue
+            if child[0] in ("fp_line", "fp_rect", "fp_circle", "fp_arc", "fp_poly"):
+                self.add_graphic(child, xf)
+            elif child[0] == "pad":
+                self.add_pad(child, fx, fy, frot)
+            elif child[0] == "property" and len(child) > 2 and child[1] == "Reference":
+                self.add_text(child, str(child[2]), xf)
+            elif child[0] == "fp_text" and len(child) > 2 and child[1] == "reference":
+                self.add_text(child, str(child[2]), xf)
+
+    def add_text(self, node, text: str, xf) -> None:
+        layers = _layers_of(node)
+        effects = sexpr.find(node, "effects") or []
+        if not layers or not text or sexpr.find(node, "hide") or "hide" in node or "hide" in effects:
+            return
+        at = sexpr.floats(sexpr.find(node, "at")) + [0.0, 0.0, 0.0]
+        font = sexpr.find(effects, "font") if effects else None
+        size = sexpr.floats(sexpr.find(font, "size")) if font else []
+        x, y = xf(at[0], at[1])
+        self.texts[layers[0]].append((x, y, at[2], size[0] if size else 1.0, text))
+
+    def add_track(self, node) -> None:
+        start = sexpr.floats(sexpr.find(node, "start"))
+        end = sexpr.floats(sexpr.find(node, "end"))
+        width = sexpr.floats(sexpr.find(node, "width")) or [0.25]
+        layers = _layers_of(node)
+        if len(start) >= 2 and len(end) >= 2 and layers:
+            a, b = (start[0], start[1]), (end[0], end[1])
+            self.stroke(layers[0], width[0], _poly_path([a, b], close=False), (a, b))
+
+    def add_via(self, node) -> None:
+        at = sexpr.floats(sexpr.find(node, "at"))
+        size = sexpr.floats(sexpr.find(node, "size")) or [0.8]
+        drill = sexpr.floats(sexpr.find(node, "drill")) or [0.4]
+        if len(at) < 2:
+            return
+        r = size[0] / 2
+        for layer in ("F.Cu", "B.Cu"):
+            self.fill(layer, _circle_path(at[0], at[1], r), [(at[0] - r, at[1] - r), (at[0] + r, at[1] + r)])
+        self.holes.append(_circle_path(at[0], at[1], drill[0] / 2))
+
+    def add_zone(self, node) -> None:
+        if sexpr.find(node, "keepout"):
+            return
+        layers = _layers_of(node)
+        filled = list(sexpr.children(node, "filled_polygon"))
+        # Unfilled zones (KiCad fills on DRC / plot) are drawn as their outline
+        polygons = filled or list(sexpr.children(node, "polygon"))
+        for poly in polygons:
+            pts = sexpr.find(poly, "pts")
+            points = [tuple(sexpr.floats(p)[:2]) for p in sexpr.children(pts, "xy")] if pts else []
+            poly_layers = _layers_of(poly) or layers
+            for layer in poly_layers:
+                if len(points) > 2:
+                    self.fill(layer, _poly_path(points), points, zone=True)
+
+    @classmethod
+    def from_tree(cls, tree) -> "BoardScene":
+        scene = cls()
+        identity = _placement(0.0, 0.0, 0.0)
+        for child in tree[1:]:
+            if not isinstance(child, list) or not child:
+                continue
+            kind = child[0]
+            if kind == "footprint":
+                scene.add_footprint(child)
+            elif kind == "segment":
+                scene.add_track(child)
+            elif kind == "arc":
+                start, mid, end = (sexpr.floats(sexpr.find(child, k)) for k in ("start", "mid", "end"))
+                layers = _layers_of(child)
+                width = sexpr.floats(sexpr.find(child, "width")) or [0.25]
+                if layers and len(start) >= 2 and len(mid) >= 2 and len(end) >= 2:
+                    pts = [tuple(start[:2]), tuple(mid[:2]), tuple(end[:2])]
+                    scene.stroke(layers[0], width[0], _arc_path(*pts), pts)
+            elif kind == "via":
+                scene.add_via(child)
+            elif kind == "zone":
+                scene.add_zone(child)
+            elif kind in ("gr_line", "gr_rect", "gr_circle", "gr_arc", "gr_poly"):
+                scene.add_graphic(child, identity)
+        return scene
+
+    @classmethod
+    def from_text(cls, text: str) -> "BoardScene":
+        return cls.from_tree(sexpr.parse(text))
+
+    # --- Output -------------------------------------------------------------
+
+    def view_box(self) -> Tuple[float, float, float, float]:
+        box = self.edge_bbox if self.edge_bbox[0] < math.inf else self.bbox
+        if box[0] == math.inf:
+            return (0.0, 0.0, 10.0, 10.0)
+        return (box[0] - MARGIN_MM, box[1] - MARGIN_MM,
+                box[2] - box[0] + 2 * MARGIN_MM, box[3] - box[1] + 2 * MARGIN_MM)
+
+    def svg(self, layers: Optional[Sequence[str]] = None) -> str:
+        layers = [l for l in LAYERS if l in (layers or LAYERS)]
+        x, y, w, h = self.view_box()
+        out = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{_n(x)} {_n(y)} {_n(w)} {_n(h)}" '
+               f'width="{_n(w)}mm" height="{_n(h)}mm">',
+               f'<rect x="{_n(x)}" y="{_n(y)}" width="{_n(w)}" height="{_n(h)}" fill="{BACKGROUND}"/>']
+        copper = False
+        for layer in layers:
+            if not (self.zones.get(layer) or self.fills.get(layer) or self.strokes.get(layer) or self.texts.get(layer)):
+                continue
+            color = LAYER_COLORS[layer]
+            opacity = ' opacity="0.85"' if layer.endswith(".Cu") else ""
+            out.append(f'<g id="{layer}" fill="{color}" stroke="{color}"{opacity}>')
+            if self.zones.get(layer):
+                out.append(f'<path d="{"".join(self.zones[layer])}" stroke="none" fill-opacity="0.35"/>')
+            if self.fills.get(layer):
+                out.append(f'<path d="{"".join(self.fills[layer])}" stroke="none"/>')
+            for width, pieces in sorted(self.strokes.get(layer, {}).items()):
+                out.append(f'<path d="{"".join(pieces)}" fill="none" stroke-width="{_n(width)}" '
+                           f'stroke-linecap="round" stroke-linejoin="round"/>')
+            for tx, ty, angle, size, text in self.texts.get(layer, []):
+                escaped = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                rotate = f' transform="rotate({_n(-angle)} {_n(tx)} {_n(ty)})"' if angle % 360 else ""
+                out.append(f'<text x="{_n(tx)}" y="{_n(ty)}" font-size="{_n(size)}" stroke="none" '
+                           f'text-anchor="middle" dominant-baseline="central" font-family="sans-serif"{rotate}>{escaped}</text>')
+            out.append("</g>")
+            copper = copper or layer.endswith(".Cu")
+        if copper and self.holes:
+            out.append(f'<path d="{"".join(self.holes)}" fill="{HOLE_COLOR}"/>')
+        out.append("</svg>")
+        return "".join(out)
+
+
+def render_svg(text: str, layers: Optional[Sequence[str]] = None) -> str:
+    return BoardScene.from_text(text).svg(layers)
+
+
+def render_png(svg: str, scale: float = DEFAULT_PNG_SCALE) -> bytes:
+    """
+    Rasterizes an SVG from render_svg; needs the optional cairosvg package.
+    """
+    if cairosvg is None:
+        raise PreviewError("PNG previews need the cairosvg package")
+    return cairosvg.svg2png(bytestring=svg.encode("utf-8"), scale=scale / (96 / 25.4))
+
+
+# Parsed scenes by content hash, so other layers / formats of a board skip the parse
+_scenes: "OrderedDict[str, BoardScene]" = OrderedDict()
+_scenes_lock = threading.Lock()
+SCENE_CACHE_SIZE = 16
+
+
+def _scene(pcb_path: str, digest: str) -> BoardScene:
+    with _scenes_lock:
+        scene = _scenes.get(digest)
+        if scene is not None:
+            _scenes.move_to_end(digest)
+            return scene
+    with open(pcb_path, "r", encoding="utf-8") as f:
+        scene = BoardScene.from_text(f.read())
+    with _scenes_lock:
+        _scenes[digest] = scene
+        while len(_scenes) > SCENE_CACHE_SIZE:
+            _scenes.popitem(last=False)
+    return scene
+
+
+def cache_dir() -> str:
+    return os.getenv("PREVIEW_CACHE_DIR", os.path.join(jobs.JOBS_ROOT, "_previews"))
+
+
+def prune_cache(directory: str, max_files: int) -> int:
+    """
+    Deletes the oldest previews until at most max_files are left. Returns how
+    many were deleted.
+    """
+    try:
+        with os.scandir(directory) as it:
+            files = [(e.stat().st_mtime_ns, e.path) for e in it if e.is_file() and not e.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return 0
+    files.sort()
+    removed = 0
+    for _, path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass # Pruned by another worker
+    return removed
+
+
+def parse_layers(layer: str) -> List[str]:
+    """
+    "all", one layer ("F.Cu") or a comma list -> validated layer names, once
+    each and in LAYERS order, so every spelling of a selection shares one
+    cache file.
+    """
+    if not layer or layer == "all":
+        return list(LAYERS)
+    names = set(l.strip() for l in layer.split(",") if l.strip())
+    unknown = sorted(l for l in names if l not in LAYER_COLORS)
+    if unknown or not names:
+        raise PreviewError(f"Unknown layer(s): {', '.join(unknown) or layer}. Choose from {', '.join(LAYERS)}")
+    return [l for l in LAYERS if l in names]
+
+
+def board_preview(pcb_path: str, layer: str = "all", fmt: str = "svg", scale: float = DEFAULT_PNG_SCALE) -> str:
+    """
+    Returns the path of a cached preview for the board, rendering it on first
+    use. Cache files are named by board content hash, layers and format.
+    """
+    from src.downloads import file_etag
+
+    if fmt not in ("svg", "png"):
+        raise PreviewError(f"Unknown preview format: {fmt}")
+    layers = parse_layers(layer)
+    digest = file_etag(pcb_path).strip('"')
+    slug = "all" if layers == list(LAYERS) else "+".join(l.replace(".", "_") for l in layers)
+    suffix = f"@{_n(scale)}x.png" if fmt == "png" else ".svg"
+    path = os.path.join(cache_dir(), f"{digest}-{slug}{suffix}")
+    if os.path.isfile(path):
+        try:
+            os.utime(path) # Recently used: pruned last
+        except OSError:
+            pass
+        return path
+
+    if fmt == "png" and cairosvg is None:
+        raise PreviewError("PNG previews need the cairosvg package")
+    scene = _scene(pcb_path, digest)
+    svg = scene.svg(layers)
+    if fmt == "png":
+        _, _, w, h = scene.view_box()
+        data = render_png(svg, min(scale, MAX_PNG_PIXELS / max(w, h, 1e-6)))
+    else:
+        data = svg.encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    prune_cache(os.path.dirname(path), PREVIEW_CACHE_MAX_FILES)
+    return path
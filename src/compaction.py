@@ -0,0 +1,258 @@
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Area-minimizing placement compaction.
+#
+# The board script first puts every part (or block / array) on a 25 mm grid
+# slot, which leaves most of the board empty and the board is priced by its
+# area. compact() re-packs those placement units as rectangles with a
+# skyline bottom-left packer (each part may be turned 90 degrees), trying a
+# handful of strip widths and keeping the smallest board:
+#
+# - Units are packed cluster by cluster (parts sharing a signal net, see
+#   clusters()), so connected parts end up next to each other and the router
+#   still has short nets to route.
+# - spacing is kept between units as a routing channel.
+# - corner x corner squares at the four corners of the packed area stay free
+#   for the mounting holes, which are placed relative to the final outline.
+#
+# Skyline packing is O(units x skyline segments) per strip width: tens of
+# milliseconds for hundreds of parts. Coordinates are millimetres, Y down,
+# relative to the top-left corner of the packed area.
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+COMPACT_SPACING_MM = 2.0 # Routing channel between packed units
+COMPACT_MAX_FANOUT = 8 # Nets touching more units (GND, VCC) do not cluster
+WIDTH_FACTORS = (1.0, 1.1, 1.25, 1.4, 1.6, 1.8, 2.0, 2.5) # Strip widths tried, x sqrt(area)
+ASPECT_FACTORS = (1.0, 1.05, 1.1, 1.2) # The same around a target aspect ratio (packing leaves gaps)
+
+
+class Unit:
+    """
+    One rectangle to pack: a part, or a block / array moved as a whole.
+    """
+
+    def __init__(self, key, width: float, height: float, rotatable: bool = True):
+        self.key = key
+        self.width = width
+        self.height = height
+        self.rotatable = rotatable
+
+
+class Packing:
+    """
+    Result of compact(): positions {key: (x, y, rotated)} of each unit's
+    top-left corner (after turning it 90 degrees if rotated), and the size
+    of the packed area. Spacing is included around every unit.
+    """
+
+    def __init__(self, positions: Dict, width: float, height: float, strip: float):
+        self.positions = positions
+        self.width = width
+        self.height = height
+        self.strip = strip
+
+    @property
+    def area(self) -> float:
+        return self.width * self.height
+
+
+def clusters(keys: Sequence, nets: Iterable[Sequence], max_fanout: int = COMPACT_MAX_FANOUT) -> List[List]:
+    """
+    Groups keys connected by nets (each a list of the keys it touches),
+    ignoring nets that touch more than max_fanout distinct keys. Clusters
+    keep the order of their first key in keys.
+    """
+    parent = {key: key for key in keys}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for net in nets:
+        members = [k for k in dict.fromkeys(net) if k in parent]
+        if len(members) < 2 or len(members) > max_fanout:
+            continue
+        first = root(members[0])
+        for other in members[1:]:
+            other = root(other)
+            if other != first:
+                parent[other] = first
+
+    groups: Dict = {}
+    for key in keys:
+        groups.setdefault(root(key), []).append(key)
+    return list(groups.values())
+
+
+class _Skyline:
+    """
+    Bottom-left skyline of a strip of the given width: [x, width, y]
+    segments, left to right. The top-left / top-right corner squares start
+    raised so nothing is packed into them.
+    """
+
+    def __init__(self, width: float, corner: float):
+        self.width = width
+        if corner > 0 and width > 2 * corner:
+            self.segments = [[0.0, corner, corner], [corner, width - 2 * corner, 0.0],
+                             [width - corner, corner, corner]]
+        else:
+            self.segments = [[0.0, width, 0.0]]
+
+    def fit(self, w: float, h: float) -> Optional[Tuple[float, float, int]]:
+        # Lowest top edge (then leftmost) for a w x h rectangle: (y, x, segment index)
+        best = None
+        limit = math.inf # Any higher y cannot win: x only grows along the skyline
+        segments = self.segments
+        for i, (x, _, _) in enumerate(segments):
+            if x + w > self.width + 1e-9:
+                break
+            y, j, covered = 0.0, i, x
+            while covered < x + w - 1e-9 and y < limit:
+                if segments[j][2] > y:
+                    y = segments[j][2]
+                covered = segments[j][0] + segments[j][1]
+                j += 1
+            if y < limit:
+                best, limit = (y, x, i), y
+        return best
+
+    def add(self, x: float, w: float, top: float):
+        # Raises [x, x + w) to top; x is the start of a segment (see fit())
+        segments = self.segments
+        i = next(k for k, seg in enumerate(segments) if seg[0] >= x - 1e-9)
+        j = i
+        while j < len(segments) and segments[j][0] + segments[j][1] <= x + w + 1e-9:
+            j += 1
+        pieces = [[x, w, top]]
+        if j < len(segments) and segments[j][0] < x + w - 1e-9:
+            # Partly covered: keep its right part
+            end = segments[j][0] + segments[j][1]
+            pieces.append([x + w, end - x - w, segments[j][2]])
+            j += 1
+        segments[i:j] = pieces
+        # Merge with level neighbours
+        if i + 1 < len(segments) and abs(segments[i + 1][2] - top) < 1e-9:
+            segments[i][1] += segments.pop(i + 1)[1]
+        if i > 0 and abs(segments[i - 1][2] - top) < 1e-9:
+            segments[i - 1][1] += segments.pop(i)[1]
+
+
+def _pack_strip(units: Sequence[Unit], strip: float, corner: float, spacing: float) -> Optional[Packing]:
+    sky = _Skyline(strip, corner)
+    positions = {}
+    boxes = [] # (x0, y0, x1, y1) with spacing
+    for unit in units:
+        w, h = unit.width + spacing, unit.height + spacing
+        options = [(w, h, False)]
+        if unit.rotatable and abs(w - h) > 1e-9:
+            options.append((h, w, True))
+        best = None
+        for ow, oh, rotated in options:
+            fit = sky.fit(ow, oh)
+            if fit and (best is None or (fit[0] + oh, fit[1]) < (best[0][0] + best[2], best[0][1])):
+                best = (fit, ow, oh, rotated)
+        if best is None:
+            return None
+        (y, x, _), ow, oh, rotated = best
+        sky.add(x, ow, y + oh)
+        positions[unit.key] = (x, y, rotated)
+        boxes.append((x, y, x + ow, y + oh))
+
+    width = max(b[2] for b in boxes)
+    height = max(b[3] for b in boxes)
+    width, height = _clear_corners(boxes, width, height, corner)
+    return Packing(positions, width, height, strip)
+
+
+def _clear_corners(boxes, width: float, height: float, corner: float) -> Tuple[float, float]:
+    """
+    Grows the packed area until no box is inside a corner square: the top
+    corners are kept free while packing, but the right edge (and the bottom)
+    are only known afterwards. Growing moves a corner into empty space.
+    """
+    if corner <= 0:
+        return width, height
+    for _ in range(4):
+        grow_w = grow_h = 0.0
+        for x0, y0, x1, y1 in boxes:
+            right = x1 > width - corner + 1e-9
+            bottom = y1 > height - corner + 1e-9
+            left = x0 < corner - 1e-9
+            top = y0 < corner - 1e-9
+            if right and top:
+                grow_w = max(grow_w, x1 + corner - width)
+            if bottom and (left or right):
+                grow_h = max(grow_h, y1 + corner - height)
+        if not grow_w and not grow_h:
+            break
+        width += grow_w
+        height += grow_h
+    return width, height
+
+
+def compact(units: Sequence[Unit], corner: float = 0.0, spacing: float = COMPACT_SPACING_MM,
+            aspect: float = 0.0) -> Packing:
+    """
+    Packs units (in the given order, see pack_order()) into the smallest
+    area over a few strip widths. corner is the size of the keep-out squares
+    at the corners of the packed area. aspect > 0 aims for that width /
+    height ratio instead (strip widths around sqrt(area x aspect)).
+    """
+    if not units:
+        return Packing({}, 0.0, 0.0, 0.0)
+    area = sum((u.width + spacing) * (u.height + spacing) for u in units)
+    # Narrowest strip that still takes every unit (turned if that helps)
+    narrowest = max(min(u.width, u.height) if u.rotatable else u.width for u in units) + spacing
+    widest = sum(max(u.width, u.height) for u in units) + spacing * len(units) + 2 * corner
+
+    factors = WIDTH_FACTORS
+    if aspect > 0:
+        factors = tuple(math.sqrt(aspect) * f for f in ASPECT_FACTORS)
+
+    best = None
+    for factor in factors:
+        strip = min(max(math.sqrt(area) * factor + 2 * corner, narrowest), widest)
+        packing = _pack_strip(units, strip, corner, spacing)
+        if packing and (best is None or (round(packing.area, 6), abs(packing.width - packing.height))
+                        < (round(best.area, 6), abs(best.width - best.height))):
+            best = packing
+    return best
+
+
+def pack_order(units: Sequence[Unit], nets: Iterable[Sequence] = (), seed: int = 0) -> List[Unit]:
+    """
+    Packing order: clusters of connected units, largest cluster first, and
+    within a cluster the tallest units first (a level skyline wastes less).
+    A non-zero seed shuffles the cluster order instead, for another placement.
+    """
+    by_key = {u.key: u for u in units}
+    groups = clusters([u.key for u in units], nets)
+
+    def size(unit):
+        return max(unit.width, unit.height) if unit.rotatable else unit.height
+
+    if seed:
+        random.Random(seed).shuffle(groups)
+    else:
+        groups.sort(key=lambda g: -sum(by_key[k].width * by_key[k].height for k in g))
+    ordered = []
+    for group in groups:
+        ordered += sorted((by_key[k] for k in group), key=lambda u: -size(u))
+    return ordered
+
+
+def area_report(before: Tuple[float, float], after: Tuple[float, float]) -> str:
+    """
+    "95.0 x 70.0 mm -> 42.0 x 38.0 mm, saved 5054.0 mm2 (76%)" for two board sizes.
+    """
+    area_before, area_after = before[0] * before[1], after[0] * after[1]
+    saved = area_before - area_after
+    share = abs(saved) / area_before * 100 if area_before else 0.0
+    return (f"{before[0]:.1f} x {before[1]:.1f} mm -> {after[0]:.1f} x {after[1]:.1f} mm, "
+            f"{'saved' if saved >= 0 else 'added'} {abs(saved):.1f} mm2 ({share:.0f}%)")
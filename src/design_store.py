@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src import jobs
+
+# Design history.
+#
+# Every successful job is recorded in one SQLite file: prompt, parsed data,
+# netlist, artifact paths / sizes / hashes and stage timings. Listing is
+# keyset-paginated on the row id (newest first) and component search goes
+# through a (component, design) index table, so a page costs the same at a few
+# hundred rows as at a few hundred thousand. Rows are written once; a job that
+# is recorded again (a shared build) keeps its first record.
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS designs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    netlist_hash TEXT NOT NULL,
+    component_set TEXT NOT NULL,
+    component_count INTEGER NOT NULL,
+    net_count INTEGER NOT NULL,
+    total_seconds REAL NOT NULL,
+    parsed TEXT NOT NULL,
+    netlist TEXT NOT NULL,
+    artifacts TEXT NOT NULL,
+    timings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS designs_prompt_hash ON designs (prompt_hash, id);
+CREATE INDEX IF NOT EXISTS designs_created ON designs (created_at, id);
+CREATE INDEX IF NOT EXISTS designs_component_set ON designs (component_set, id);
+CREATE TABLE IF NOT EXISTS design_components (
+    component TEXT NOT NULL,
+    design_id INTEGER NOT NULL,
+    PRIMARY KEY (component, design_id)
+) WITHOUT ROWID;
+"""
+
+# Columns of a listing entry; the JSON blobs are only read for a single design
+_SUMMARY = ("id", "job_id", "created_at", "prompt", "component_set", "component_count",
+            "net_count", "total_seconds")
+
+
+def prompt_hash(prompt: str) -> str:
+    from src.singleflight import normalize_prompt
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def component_term(name: str) -> str:
+    """
+    Search key of a part name: lower case, single spaces, naive singular
+    ("LEDs" and "led" both give "led").
+    """
+    words = re.sub(r"\s+", " ", (name or "").strip().lower()).split(" ")
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_artifacts(paths: Dict[str, Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    {name: path} -> {name: {"path", "size", "sha256"}} for the files that exist.
+    """
+    artifacts = {}
+    for name, path in paths.items():
+        if path and os.path.isfile(path):
+            artifacts[name] = {"path": path, "size": os.path.getsize(path), "sha256": file_sha256(path)}
+    return artifacts
+
+
+class DesignStore:
+    """
+    SQLite design history. Like the job queue, the default rollback journal
+    works on shared volumes; DESIGN_STORE_JOURNAL=WAL is faster on one host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_mode = os.getenv("DESIGN_STORE_JOURNAL", "DELETE").upper()
+        self._local = threading.local()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def record(self, job_id: str, prompt: str, parsed: Dict[str, Any], netlist: Dict[str, Any],
+               artifacts: Dict[str, Dict[str, Any]], timings: Dict[str, float],
+               created_at: Optional[float] = None) -> bool:
+        """
+        Stores one design. Returns False if the job was already recorded.
+        """
+        from src.singleflight import netlist_key
+
+        terms = sorted(set(component_term(c.get("value", "")) for c in netlist.get("components", [])))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO designs (job_id, created_at, prompt, prompt_hash, netlist_hash, component_set,"
+                " component_count, net_count, total_seconds, parsed, netlist, artifacts, timings)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_id) DO NOTHING",
+                (job_id, created_at or time.time(), prompt, prompt_hash(prompt), netlist_key(netlist),
+                 ",".join(terms), len(netlist.get("components", [])), len(netlist.get("nets", [])),
+                 round(sum(timings.values()), 4), json.dumps(parsed), json.dumps(netlist),
+                 json.dumps(artifacts), json.dumps(timings))
+            )
+            if cursor.rowcount != 1:
+                conn.execute("COMMIT")
+                return False
+            conn.executemany("INSERT OR IGNORE INTO design_components (component, design_id) VALUES (?, ?)",
+                             [(term, cursor.lastrowid) for term in terms])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def page(self, limit: int = PAGE_SIZE, cursor: Optional[int] = None,
+             components: Sequence[str] = (), prompt: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        One page of designs, newest first: (summaries, cursor of the next page
+        or None). components must all be in a design; prompt matches the
+        normalized prompt exactly.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        terms = sorted(set(component_term(c) for c in components if c and c.strip()))
+        columns = ", ".join(f"d.{c}" for c in _SUMMARY)
+        where, params = [], []
+        if terms:
+            # Walk the first component's index entries; the rest are point lookups
+            sql = f"SELECT {columns} FROM design_components c JOIN designs d ON d.id = c.design_id"
+            where.append("c.component = ?")
+            params.append(terms[0])
+            for term in terms[1:]:
+                where.append("EXISTS (SELECT 1 FROM design_components x WHERE x.component = ? AND x.design_id = d.id)")
+                params.append(term)
+            order = "c.design_id"
+        else:
+            sql = f"SELECT {columns} FROM designs d"
+            order = "d.id"
+        if cursor is not None:
+            where.append(f"{order} < ?")
+            params.append(int(cursor))
+        if prompt is not None:
+            where.append("d.prompt_hash = ?")
+            params.append(prompt_hash(prompt))
+        # Rows are appended in time order, so a time range is also an id range:
+        # bounding the id keeps a component search on its index entries
+        for bound, op, time_op in ((since, ">=", ">="), (until, "<", "<")):
+            if bound is None:
+                continue
+            where.append(f"d.created_at {time_op} ?")
+            params.append(float(bound))
+            first = self._first_id_since(float(bound))
+            if first is not None:
+                where.append(f"{order} {op} ?")
+                params.append(first)
+            elif op == ">=":
+                return [], None
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        designs = [self._summary(r) for r in rows[:limit]]
+        return designs, (designs[-1]["id"] if len(rows) > limit else None)
+
+    def _first_id_since(self, when: float) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT id FROM designs WHERE created_at >= ? ORDER BY created_at, id LIMIT 1", (when,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _summary(self, row: sqlite3.Row) -> Dict[str, Any]:
+        summary = dict(row)
+        summary["components"] = summary.pop("component_set").split(",") if row["component_set"] else []
+        return summary
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM designs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        design = self._summary(row)
+        for key in ("parsed", "netlist", "artifacts", "timings"):
+            design[key] = json.loads(design[key])
+        return design
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM designs").fetchone()[0]
+
+
+_store = None
+_store_path = None
+_store_lock = threading.Lock()
+
+
+def get_design_store() -> Optional[DesignStore]:
+    """
+    The store at DESIGN_STORE_PATH (default JOBS_DIR/designs.sqlite3), or
+    None if DESIGN_STORE_PATH is set to an empty string.
+    """
+    global _store, _store_path
+    path = os.getenv("DESIGN_STORE_PATH", os.path.join(jobs.JOBS_ROOT, "designs.sqlite3"))
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None or _store_path != path:
+            _store, _store_path = DesignStore(path), path
+        return _store
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+import zipfile
+from typing import Dict, List
+
+try:
+    import sexpr # kicad_script.py: the script directory is on sys.path
+except ImportError:
+    from src import sexpr
+
+# Byte-stable output.
+#
+# pcbnew gives every item a random UUID and sorts footprints / tracks by it
+# when saving, kicad-cli stamps Gerber and drill files with the export time,
+# and zip entries carry file mtimes. So the same netlist used to give
+# different bytes on every run, which defeats content-hash caching, ETags and
+# diffing. With DETERMINISTIC_OUTPUT=1 (the default):
+#
+# - the saved .kicad_pcb is rewritten: UUIDs come from stable seeds (a
+#   footprint's reference, other items' content, then the child's position
+#   inside its item), top-level items are sorted canonically and the file is
+#   laid out one item per line;
+# - Gerber / drill / job file timestamps are pinned to SOURCE_DATE_EPOCH
+#   (default 1980-01-01, the earliest date a zip can hold);
+# - the Gerber zip has sorted entries with pinned dates and permissions.
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+ENABLED = os.getenv("DETERMINISTIC_OUTPUT", "1") == "1"
+PINNED_EPOCH = int(os.getenv("SOURCE_DATE_EPOCH", "315532800"))
+
+# uuid5 namespace of every generated UUID
+NAMESPACE = uuid.UUID("6f1d2a4e-3b5c-5d7e-8f90-a1b2c3d4e5f6")
+
+# Top-level board items that are sorted, in this order; anything else
+# (header, layers, setup, nets) keeps its place at the top
+_RANKS = {
+    "footprint": 0,
+    "gr_line": 1, "gr_rect": 1, "gr_circle": 1, "gr_arc": 1, "gr_poly": 1, "gr_curve": 1,
+    "gr_text": 1, "gr_text_box": 1, "dimension": 1, "target": 1, "image": 1,
+    "segment": 2, "arc": 2,
+    "via": 3,
+    "zone": 4,
+    "group": 5,
+}
+_UUID_NODES = ("uuid", "tstamp")
+_NATURAL = re.compile(r"(\d+)")
+# Export times written by kicad-cli: "2025-01-20T12:34:56+01:00", "2025-01-20 12:34:56"
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[+-]\d{2}:?\d{2}|Z)?")
+_STAMPED_LINE = re.compile(r'^(?:G04|%TF\.CreationDate|;|\s*"CreationDate")')
+
+
+def stable_uuid(*parts) -> str:
+    return str(uuid.uuid5(NAMESPACE, "/".join(str(p) for p in parts)))
+
+
+def _natural_key(text: str):
+    return [int(p) if p.isdigit() else p for p in _NATURAL.split(text)]
+
+
+def _reference(footprint: List) -> str:
+    # KiCad 8+: (property "Reference" "R1"); KiCad 6/7: (fp_text reference "R1")
+    for child in sexpr.children(footprint, "property"):
+        if len(child) > 2 and child[1] == "Reference":
+            return child[2]
+    for child in sexpr.children(footprint, "fp_text"):
+        if len(child) > 2 and child[1] == "reference":
+            return child[2]
+    return ""
+
+
+def _strip_uuids(node):
+    if not isinstance(node, list):
+        return node
+    return [_strip_uuids(c) for c in node if not (isinstance(c, list) and c and c[0] in _UUID_NODES)]
+
+
+def _assign_uuids(node: List, seed: str, mapping: Dict[str, str], path: str = "") -> None:
+    # The item's own UUID is the seed's; children's follow their position in it
+    for i, child in enumerate(node):
+        if not isinstance(child, list) or not child:
+            continue
+        if child[0] in _UUID_NODES and len(child) > 1:
+            new = stable_uuid(seed, path)
+            mapping[child[1]] = new
+            child[1] = sexpr.QStr(new)
+        else:
+            _assign_uuids(child, seed, mapping, f"{path}/{i}")
+
+
+def _remap_members(node: List, mapping: Dict[str, str]) -> None:
+    for child in sexpr.children(node, "members"):
+        child[1:] = [sexpr.QStr(mapping.get(m, m)) for m in child[1:]]
+
+
+def _normalize_numbers(node: List) -> None:
+    for i, child in enumerate(node):
+        if isinstance(child, list):
+            _normalize_numbers(child)
+        elif child in ("-0", "-0.0") and not isinstance(child, sexpr.QStr):
+            node[i] = "0"
+
+
+def _format(node, depth: int = 0) -> str:
+    # The board and its top-level items get one child per line, the rest inline
+    if not isinstance(node, list) or depth > 1 or not any(isinstance(c, list) for c in node):
+        return sexpr.dumps(node)
+    indent = "  " * (depth + 1)
+    head = [sexpr.dumps(c) for c in node if not isinstance(c, list)]
+    lines = ["(" + " ".join(head)]
+    lines += [indent + _format(c, depth + 1) for c in node if isinstance(c, list)]
+    return "\n".join(lines) + "\n" + "  " * depth + ")"
+
+
+def canonical_board(text: str) -> str:
+    """
+    The .kicad_pcb text with stable UUIDs, canonically ordered top-level items
+    and a fixed layout. Equal boards give equal bytes whatever UUIDs and item
+    order pcbnew produced.
+    """
+    board = sexpr.parse(text)
+    header = [c for c in board[1:] if not (isinstance(c, list) and c and c[0] in _RANKS)]
+    items = [c for c in board[1:] if isinstance(c, list) and c and c[0] in _RANKS]
+    for item in items:
+        _normalize_numbers(item)
+
+    mapping: Dict[str, str] = {}
+    seen: Dict[str, int] = {}
+    # Item text without its UUIDs, written once per item
+    content = {id(item): sexpr.dumps(_strip_uuids(item)) for item in items}
+
+    def seed_of(item):
+        if item[0] == "footprint":
+            key = "footprint/" + _reference(item)
+        else:
+            key = item[0] + "/" + hashlib.sha256(content[id(item)].encode("utf-8")).hexdigest()
+        # Identical items are interchangeable, so numbering them in file order is stable
+        seen[key] = seen.get(key, 0) + 1
+        return f"{key}#{seen[key]}"
+
+    # Footprints sharing a reference (or none) are told apart by their content
+    for item in sorted((i for i in items if i[0] != "group"),
+                       key=lambda i: (i[0], _reference(i), content[id(i)])):
+        _assign_uuids(item, seed_of(item), mapping)
+    # Groups name other items by UUID: seed them after their members are renamed
+    for item in (i for i in items if i[0] == "group"):
+        _remap_members(item, mapping)
+        for child in sexpr.children(item, "members"):
+            child[1:] = sorted(child[1:])
+        content[id(item)] = sexpr.dumps(_strip_uuids(item))
+    for item in (i for i in items if i[0] == "group"):
+        _assign_uuids(item, seed_of(item), mapping)
+
+    def order(item):
+        # Identical items keep the order their #n seeds were given in
+        if item[0] == "footprint":
+            return (0, _natural_key(_reference(item)), content[id(item)])
+        return (_RANKS[item[0]], [], content[id(item)])
+
+    board[1:] = header + sorted(items, key=order)
+    return _format(board) + "\n"
+
+
+def canonicalize_board_file(path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        text = canonical_board(f.read())
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _pin(match: re.Match) -> str:
+    # Same shape as the stamp it replaces: "T" or " ", with or without a zone
+    stamp = match.group(0)
+    pinned = time.strftime("%Y-%m-%d", time.gmtime(PINNED_EPOCH)) + stamp[10] + \
+        time.strftime("%H:%M:%S", time.gmtime(PINNED_EPOCH))
+    zone = stamp[19:]
+    if zone:
+        pinned += "Z" if zone == "Z" else ("+00:00" if ":" in zone else "+0000")
+    return pinned
+
+
+def pin_timestamps(directory: str) -> int:
+    """
+    Pins the export times kicad-cli writes into Gerber, drill and job files
+    (comment and CreationDate lines only). Returns the number of files changed.
+    """
+    changed = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+        lines = text.split("\n")
+        for i, line in enumerate(lines):
+            if _STAMPED_LINE.match(line):
+                lines[i] = _TIMESTAMP.sub(_pin, line)
+        pinned = "\n".join(lines)
+        if pinned != text:
+            with open(path, "wb") as f:
+                f.write(pinned.encode("utf-8"))
+            changed += 1
+    return changed
+
+
+def zip_directory(base_name: str, root_dir: str) -> str:
+    """
+    Like shutil.make_archive(base_name, "zip", root_dir) but byte-stable:
+    sorted entries, pinned dates and permissions. Returns the zip path.
+    """
+    date_time = time.gmtime(PINNED_EPOCH)[:6]
+    entries = []
+    for parent, dirs, files in os.walk(root_dir):
+        dirs.sort()
+        for name in files:
+            path = os.path.join(parent, name)
+            entries.append((os.path.relpath(path, root_dir).replace(os.sep, "/"), path))
+    zip_path = base_name + ".zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for arcname, path in sorted(entries):
+            info = zipfile.ZipInfo(arcname, date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(path, "rb") as f:
+                archive.writestr(info, f.read())
+    return zip_path
+
+
+def make_archive(base_name: str, root_dir: str) -> str:
+    """
+    Zips root_dir into base_name.zip: byte-stable when ENABLED, else plain
+    shutil.make_archive.
+    """
+    if ENABLED:
+        return zip_directory(base_name, root_dir)
+    import shutil
+    return shutil.make_archive(base_name, "zip", root_dir)
@@ -0,0 +1,293 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Artifacts worth compressing: KiCad S-expressions, Gerber/Excellon text, JSON/CSV/SVG
+COMPRESSIBLE_EXTENSIONS = {
+    ".kicad_pcb", ".kicad_pro", ".kicad_prl", ".json", ".csv", ".svg", ".txt",
+    ".gbr", ".gtl", ".gbl", ".gto", ".gbo", ".gts", ".gbs", ".gm1", ".drl", ".gbrjob"
+}
+
+# Job-scoped URLs never change content once written
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (path, size, mtime_ns) -> sha256 hex, so repeat requests don't rehash.
+# Least recently used first; job files come and go, so the cache is bounded.
+_etag_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "4096"))
+_etag_lock = threading.Lock()
+_compress_lock = threading.Lock()
+
+# Compressed copies of job files sit next to them and go when the job does.
+# Files outside job directories (legacy /download serves the working
+# directory) get theirs in sidecar_dir() instead, named by the original's
+# path, with a "<name>.src" file recording that path. Copies whose original
+# changed or is gone are pruned at most once per interval.
+SIDECAR_PRUNE_INTERVAL = 60.0
+_next_sidecar_prune = 0.0
+
+
+def file_etag(path: str) -> str:
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _etag_lock:
+        cached = _etag_cache.get(key)
+        if cached:
+            _etag_cache.move_to_end(key)
+    if cached:
+        return cached
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    etag = f'"{h.hexdigest()[:32]}"'
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def is_compressible(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def sidecar_dir() -> str:
+    from src import jobs
+    return os.getenv("DOWNLOAD_CACHE_DIR", os.path.join(jobs.JOBS_ROOT, "_downloads"))
+
+
+def prune_sidecars(directory: str) -> int:
+    """
+    Deletes the compressed copies in directory whose original was modified
+    after them or no longer exists. Returns how many were deleted.
+    """
+    try:
+        with os.scandir(directory) as it:
+            records = [e.path for e in it if e.is_file() and e.name.endswith(".src")]
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    # Copies are (re)written under the same lock, so a fresh one is never taken
+    with _compress_lock:
+        for record in records:
+            try:
+                with open(record, "r", encoding="utf-8") as f:
+                    source_mtime = os.stat(f.read()).st_mtime_ns
+            except FileNotFoundError:
+                source_mtime = None
+            for suffix in (".gz", ".br"):
+                target = record[:-len(".src")] + suffix
+                try:
+                    if source_mtime is None or os.stat(target).st_mtime_ns < source_mtime:
+                        os.remove(target)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            if source_mtime is None:
+                try:
+                    os.remove(record)
+                except FileNotFoundError:
+                    pass # Pruned by another process
+    return removed
+
+
+def _maybe_prune_sidecars(directory: str) -> None:
+    global _next_sidecar_prune
+    now = time.monotonic()
+    if now >= _next_sidecar_prune:
+        _next_sidecar_prune = now + SIDECAR_PRUNE_INTERVAL
+        prune_sidecars(directory)
+
+
+def precompressed_path(path: str, encoding: str, cache_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Returns a cached compressed copy of path, creating or refreshing it if the
+    original is newer: path.gz / path.br next to it, or a copy in cache_dir.
+    None if unsupported.
+    """
+    if encoding == "br":
+        if brotli is None:
+            return None
+        suffix, compress = ".br", lambda data: brotli.compress(data, quality=9)
+    elif encoding == "gzip":
+        # mtime=0 keeps the compressed bytes (and their ETag) stable
+        suffix, compress = ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    else:
+        return None
+
+    target = path + suffix
+    if cache_dir:
+        _maybe_prune_sidecars(cache_dir)
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:32]
+        target = os.path.join(cache_dir, name + suffix)
+    src_mtime = os.stat(path).st_mtime_ns
+    if os.path.exists(target) and os.stat(target).st_mtime_ns >= src_mtime:
+        return target
+
+    with _compress_lock:
+        if os.path.exists(target) and os.stat(target).st_mtime_ns >= src_mtime:
+            return target
+        with open(path, "rb") as f:
+            data = compress(f.read())
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(os.path.join(cache_dir, name + ".src"), "w", encoding="utf-8") as f:
+                f.write(os.path.abspath(path))
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+    return target
+
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        if not part.strip():
+            continue
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def _negotiate_encoding(request: Request) -> Optional[str]:
+    accepted = _accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single "bytes=a-b" range into an inclusive (start, end).
+    Returns None if unsatisfiable; raises ValueError if malformed/multi-range.
+    """
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        raise ValueError("Unsupported range")
+    first, last = m.groups()
+    if first == "" and last == "":
+        raise ValueError("Unsupported range")
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison (ignore the W/ prefix), as allowed for GET
+    candidates = [t.strip().replace("W/", "", 1) for t in header.split(",")]
+    return etag in candidates
+
+
+def file_response(request: Request, path: str, filename: str,
+                  immutable: bool = False,
+                  media_type: str = "application/octet-stream",
+                  disposition: str = "attachment",
+                  sidecar_dir: Optional[str] = None) -> Response:
+    """
+    Serves a file with a content-hash ETag, conditional GET (304), single
+    byte-range requests (206/416) and precompressed gzip/br variants (kept
+    in sidecar_dir if given, else next to the file).
+    """
+    encoding = None
+    if is_compressible(path) and "range" not in request.headers:
+        encoding = _negotiate_encoding(request)
+    serve_path = path
+    if encoding:
+        serve_path = precompressed_path(path, encoding, sidecar_dir) or path
+        if serve_path == path:
+            encoding = None
+
+    etag = file_etag(path)
+    if encoding:
+        # Each representation needs its own validator
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
+    }
+    if is_compressible(path):
+        headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+
+    size = os.path.getsize(serve_path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or _etag_matches(if_range, etag)):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            # Malformed or multi-range: ignore the header and send the whole file
+            byte_range = (0, size - 1)
+            range_header = None
+    if range_header and (not if_range or _etag_matches(if_range, etag)):
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        start, end = byte_range
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(_iter_file(serve_path, start, length), status_code=206,
+                                 headers=headers, media_type=media_type)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(serve_path, 0, size), status_code=200,
+                             headers=headers, media_type=media_type)
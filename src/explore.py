@@ -0,0 +1,333 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src import jobs
+from src import metrics
+from src import pipeline
+
+# Design-space exploration: several variants of one board, best first.
+#
+# One placement + routing run is one sample. With "explore": K on /generate,
+# K variants of the board stage run side by side, each in its own KiCad
+# process and job directory, with different kicad_script knobs: packing seed,
+# board aspect ratio, GND plane layer and track widths per net class. Every
+# finished board is scored from its file on wirelength, board area, via count
+# and DRC violations. The violations are copper of different nets closer than
+# the clearance, plus connections left unrouted. The best variant goes on to
+# the Gerber export; the others are returned as alternatives, each with its
+# own download / preview URLs.
+#
+# Variants still running when the time budget runs out are stopped (once at
+# least one has finished) and variants not yet started are skipped.
+
+EXPLORE_MAX_VARIANTS = int(os.getenv("EXPLORE_MAX_VARIANTS", "8"))
+EXPLORE_BUDGET_SECONDS = float(os.getenv("EXPLORE_BUDGET_SECONDS", "120"))
+# Variants built at once by a queue worker (the web process uses its idle KiCad slots)
+EXPLORE_WORKERS = int(os.getenv("EXPLORE_WORKERS", "1"))
+POLL_SECONDS = 0.2
+
+# Lower is better. DRC violations count in full, the other metrics relative
+# to the best variant (1.0 for the best one).
+SCORE_WEIGHTS = {"drc": 10.0, "area": 1.0, "wirelength": 1.0, "vias": 0.25}
+
+DRC_CLEARANCE_MM = 0.2 # Same as the router's
+VIA_RADIUS_MM = 0.4 # kicad_script vias are 0.8 mm
+COPPER_LAYERS = ("F.Cu", "B.Cu")
+
+# Knob values the variants cycle through (variant 0 is the default board)
+ASPECTS = (0.0, 1.0, 1.6, 0.625) # width / height, 0: smallest area
+GND_LAYERS = ("B.Cu", "F.Cu")
+TRACK_WIDTHS = {
+    "standard": {},
+    "wide": {"signal": 0.3, "power": 1.0, "motor": 1.5},
+    "narrow": {"signal": 0.2, "power": 0.6, "motor": 1.0},
+}
+
+VARIANT_COUNT = metrics.Counter(
+    "explore_variants_total", "Design variants built by exploration, by outcome", ("outcome",))
+
+
+def explore_options(variants: Optional[int], budget: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Normalized exploration options of a request, or None for a single build.
+    """
+    if not variants or variants < 2:
+        return None
+    budget = budget if budget and budget > 0 else EXPLORE_BUDGET_SECONDS
+    return {"variants": min(int(variants), EXPLORE_MAX_VARIANTS), "budget": float(budget)}
+
+
+def make_variants(count: int) -> List[Dict[str, Any]]:
+    """
+    count variant parameter sets: the default board first, then every knob
+    stepping at a different rate so neighbouring variants differ in several.
+    """
+    profiles = list(TRACK_WIDTHS)
+    variants = []
+    for i in range(count):
+        variants.append({
+            "name": f"v{i}",
+            "placement_seed": i,
+            "aspect": ASPECTS[i % len(ASPECTS)],
+            "gnd_layer": GND_LAYERS[(i // 2) % len(GND_LAYERS)],
+            "track_widths": profiles[(i // len(ASPECTS)) % len(profiles)] if i else "standard",
+        })
+    return variants
+
+
+def variant_env(variant: Dict[str, Any]) -> Dict[str, str]:
+    # kicad_script knobs of a variant
+    widths = TRACK_WIDTHS[variant["track_widths"]]
+    return {
+        "PLACEMENT_SEED": str(variant["placement_seed"]),
+        "BOARD_ASPECT": str(variant["aspect"]),
+        "GND_PLANE_LAYER": variant["gnd_layer"],
+        "TRACK_WIDTHS": ",".join(f"{cls}={mm}" for cls, mm in sorted(widths.items())),
+    }
+
+
+# --- Scoring ----------------------------------------------------------------
+
+def _point_segment(px: float, py: float, x0: float, y0: float, x1: float, y1: float) -> float:
+    dx, dy = x1 - x0, y1 - y0
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / length2))
+    return math.hypot(x0 + t * dx - px, y0 + t * dy - py)
+
+
+def segment_distance(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    Distance between segments a and b, each (x0, y0, x1, y1); 0 if they cross.
+    """
+    def side(x0, y0, x1, y1, px, py):
+        return (x1 - x0) * (py - y0) - (y1 - y0) * (px - x0)
+
+    d1, d2 = side(*a, b[0], b[1]), side(*a, b[2], b[3])
+    d3, d4 = side(*b, a[0], a[1]), side(*b, a[2], a[3])
+    if ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 and d2 and d3 and d4:
+        return 0.0
+    return min(_point_segment(a[0], a[1], *b), _point_segment(a[2], a[3], *b),
+               _point_segment(b[0], b[1], *a), _point_segment(b[2], b[3], *a))
+
+
+def clearance_violations(rats, clearance: float = DRC_CLEARANCE_MM) -> int:
+    """
+    Pairs of copper shapes of different nets, on a shared layer, closer than
+    clearance. Tracks are capsules; pads (circles of their smaller side) and
+    vias are round. Pad-to-pad pairs are the footprints' own business and
+    are not checked. Candidate pairs come from a 2 mm spatial hash.
+    """
+    shapes = [] # (x0, y0, x1, y1, radius, net, layers, is_pad)
+    for net, segments in rats.segments.items():
+        for layer, x0, y0, x1, y1, width in segments:
+            shapes.append((x0, y0, x1, y1, width / 2, net, (layer,), False))
+    for net, vias in rats.vias.items():
+        for x, y in vias:
+            shapes.append((x, y, x, y, VIA_RADIUS_MM, net, COPPER_LAYERS, False))
+    for i, (x, y) in enumerate(rats.pad_xy):
+        # A pad without a net is its own net
+        shapes.append((float(x), float(y), float(x), float(y), rats.pad_size[i] / 2,
+                       rats.pad_net[i] or f"#pad{i}", COPPER_LAYERS, True))
+
+    cell = 2.0
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for index, (x0, y0, x1, y1, radius, _, _, _) in enumerate(shapes):
+        reach = radius + clearance
+        for cx in range(int(math.floor((min(x0, x1) - reach) / cell)), int(math.floor((max(x0, x1) + reach) / cell)) + 1):
+            for cy in range(int(math.floor((min(y0, y1) - reach) / cell)), int(math.floor((max(y0, y1) + reach) / cell)) + 1):
+                grid.setdefault((cx, cy), []).append(index)
+
+    checked = set()
+    violations = 0
+    for members in grid.values():
+        for i in range(len(members)):
+            a = shapes[members[i]]
+            for j in range(i + 1, len(members)):
+                b = shapes[members[j]]
+                pair = (members[i], members[j])
+                if a[5] == b[5] or (a[7] and b[7]) or pair in checked or not set(a[6]) & set(b[6]):
+                    continue
+                checked.add(pair)
+                if segment_distance(a[:4], b[:4]) - a[4] - b[4] < clearance - 1e-6:
+                    violations += 1
+    return violations
+
+
+def _outline_area(tree) -> Optional[float]:
+    from src import sexpr
+
+    points = []
+    for kind in ("gr_line", "gr_rect"):
+        for node in sexpr.children(tree, kind):
+            if str(sexpr.value(node, "layer", "")) == "Edge.Cuts":
+                for key in ("start", "end"):
+                    xy = sexpr.floats(sexpr.find(node, key))
+                    if len(xy) >= 2:
+                        points.append(xy[:2])
+    if not points:
+        return None
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    return (max(xs) - min(xs)) * (max(ys) - min(ys))
+
+
+def score_board(pcb_path: str) -> Dict[str, Any]:
+    """
+    Metrics of a finished board: wirelength (mm), area (mm2, of the outline,
+    else of the pads), via count, clearance violations and unrouted
+    connections (the two together are drc_violations).
+    """
+    from src import sexpr
+    from src.ratsnest import Ratsnest
+
+    with open(pcb_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    rats = Ratsnest.from_board_text(text)
+
+    wirelength = sum(math.hypot(x1 - x0, y1 - y0)
+                     for segments in rats.segments.values() for _, x0, y0, x1, y1, _ in segments)
+    area = _outline_area(sexpr.parse(text))
+    if area is None:
+        xy = rats.pad_xy
+        area = float((xy[:, 0].max() - xy[:, 0].min()) * (xy[:, 1].max() - xy[:, 1].min())) if len(xy) else 0.0
+    clearance = clearance_violations(rats)
+    unrouted = sum(len(open_wires) for _, open_wires in rats.results.values())
+    return {
+        "wirelength_mm": round(wirelength, 3),
+        "area_mm2": round(area, 3),
+        "vias": sum(len(v) for v in rats.vias.values()),
+        "clearance_violations": clearance,
+        "unrouted": unrouted,
+        "drc_violations": clearance + unrouted,
+    }
+
+
+def rank(variants: List[Dict[str, Any]], weights: Dict[str, float] = SCORE_WEIGHTS) -> List[Dict[str, Any]]:
+    """
+    Scores the finished variants and returns all of them, finished ones best
+    first, then the rest in their original order.
+    """
+    done = [v for v in variants if v["status"] == "done"]
+    if done:
+        best = {key: min(v["metrics"][key] for v in done) for key in ("area_mm2", "wirelength_mm", "vias")}
+        for v in done:
+            m = v["metrics"]
+            v["score"] = round(weights["drc"] * m["drc_violations"]
+                               + weights["area"] * m["area_mm2"] / (best["area_mm2"] or 1)
+                               + weights["wirelength"] * m["wirelength_mm"] / (best["wirelength_mm"] or 1)
+                               + weights["vias"] * m["vias"] / max(best["vias"], 1), 4)
+    done.sort(key=lambda v: v["score"])
+    return done + [v for v in variants if v["status"] != "done"]
+
+
+# --- Running ----------------------------------------------------------------
+
+def variant_job_ids(job_id: str, count: int) -> List[str]:
+    """
+    Job ids of count variants: job_id for variant 0, new ones for the others.
+    """
+    return [job_id] + [jobs.new_job_id() for _ in range(count - 1)]
+
+
+def explore_board(netlist: Dict[str, Any], job_id: str, count: int, budget: Optional[float] = None,
+                  cancel_event: Optional[threading.Event] = None, workers: int = 1,
+                  job_ids: Optional[Sequence[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Builds count variants of the board, workers at a time, and returns them
+    ranked (see rank()) with a summary. Variant i is built in the directory
+    of job_ids[i] (default: variant_job_ids(job_id, count)). Raises
+    PipelineCancelled if cancel_event is set, and the first variant's error
+    if none finished.
+    """
+    budget = budget if budget and budget > 0 else EXPLORE_BUDGET_SECONDS
+    started = time.monotonic()
+    deadline = started + budget
+    stop = threading.Event()
+    job_ids = list(job_ids or variant_job_ids(job_id, count))
+    variants = []
+    for i, params in enumerate(make_variants(count)):
+        variants.append({"name": params.pop("name"), "params": params, "env": variant_env(params),
+                         "job_id": job_ids[i], "status": "pending"})
+    errors: Dict[str, BaseException] = {}
+
+    def build(variant):
+        if stop.is_set() or time.monotonic() >= deadline:
+            variant["status"] = "skipped"
+            return
+        variant_started = time.monotonic()
+        try:
+            job_dir = jobs.job_dir(variant["job_id"], create=True)
+            variant["pcb_file"] = pipeline.board_stage(netlist, job_dir, stop, None, variant["env"])
+            variant["metrics"] = score_board(variant["pcb_file"])
+            with open(variant["pcb_file"], "rb") as f:
+                variant["digest"] = hashlib.sha256(f.read()).hexdigest()
+            variant["status"] = "done"
+        except pipeline.PipelineCancelled:
+            variant["status"] = "stopped"
+        except Exception as e:
+            variant["status"] = "failed"
+            variant["error"] = str(e)
+            errors[variant["name"]] = e
+        finally:
+            variant["seconds"] = round(time.monotonic() - variant_started, 3)
+            VARIANT_COUNT.inc(outcome=variant["status"])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, count))) as pool:
+        pending = set(pool.submit(build, v) for v in variants)
+        while pending:
+            _, pending = wait(pending, timeout=POLL_SECONDS)
+            if cancel_event is not None and cancel_event.is_set():
+                stop.set()
+            elif time.monotonic() >= deadline and any(v["status"] == "done" for v in variants):
+                # Out of time: keep what has finished
+                stop.set()
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise pipeline.PipelineCancelled("Exploration cancelled")
+    ranked = rank(variants)
+    if ranked[0]["status"] != "done":
+        first = next((errors[v["name"]] for v in variants if v["name"] in errors), None)
+        raise first or pipeline.PipelineError("No design variant finished")
+
+    outcomes: Dict[str, int] = {}
+    for v in variants:
+        outcomes[v["status"]] = outcomes.get(v["status"], 0) + 1
+    summary = {"requested": count, "budget_seconds": budget, "seconds": round(time.monotonic() - started, 3),
+               "workers": max(1, min(workers, count)), "outcomes": outcomes, "weights": dict(SCORE_WEIGHTS)}
+    print(f"Exploration: {outcomes} in {summary['seconds']}s, best {ranked[0]['name']} "
+          f"(score {ranked[0]['score']})")
+    return ranked, summary
+
+
+def describe(variant: Dict[str, Any]) -> Dict[str, Any]:
+    # Response entry of a variant (no server paths or environment)
+    entry = {key: variant[key] for key in ("name", "params", "status", "seconds") if key in variant}
+    if variant["status"] == "done":
+        entry.update(job_id=variant["job_id"], score=variant["score"], metrics=variant["metrics"],
+                     download_url=jobs.job_url(variant["job_id"], pipeline.PCB_FILENAME),
+                     preview_url=jobs.job_url(variant["job_id"], pipeline.PREVIEW_FILENAME))
+    if "error" in variant:
+        entry["error"] = variant["error"]
+    return entry
+
+
+def exploration_result(ranked: List[Dict[str, Any]], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fields added to the /generate response: the chosen variant, the other
+    variants (best first), and the run summary. A variant whose board came
+    out byte-identical to a better one says so in "same_as".
+    """
+    entries, seen = [], {}
+    for variant in ranked:
+        entry = describe(variant)
+        digest = variant.get("digest")
+        if digest in seen:
+            entry["same_as"] = seen[digest]
+        elif digest:
+            seen[digest] = variant["name"]
+        entries.append(entry)
+    return {"variant": entries[0], "alternatives": entries[1:], "exploration": summary}
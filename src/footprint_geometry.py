@@ -0,0 +1,269 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src import sexpr
+
+# Structured footprint geometry.
+#
+# Footprints are parsed once (from FOOTPRINT_TEMPLATES or .kicad_mod files) into
+# Pad / Graphic / Footprint objects, so layout code can ask for pad positions
+# and bounding boxes directly. Serialization goes through a format string
+# compiled once per footprint (and rotation), so emitting a placed footprint is
+# a single str.format call.
+#
+# Coordinates are KiCad's: millimetres, Y pointing down, positive rotation is
+# counter-clockwise on screen.
+
+
+def _num(value: float) -> str:
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def rotation_matrix(rotation: float) -> np.ndarray:
+    """
+    Right-multiplies row vectors: points @ rotation_matrix(a) rotates them
+    the way KiCad's RotatePoint does (x' = x cos + y sin, y' = -x sin + y cos).
+    """
+    theta = math.radians(rotation)
+    c, s = math.cos(theta), math.sin(theta)
+    return np.array([[c, -s], [s, c]])
+
+
+def transform(points: np.ndarray, x: float, y: float, rotation: float = 0.0) -> np.ndarray:
+    """
+    Footprint-local (N, 2) coordinates -> board coordinates.
+    """
+    if rotation % 360:
+        points = points @ rotation_matrix(rotation)
+    return points + np.array([x, y])
+
+
+class Pad:
+    __slots__ = ("number", "kind", "shape", "x", "y", "width", "height", "drill", "layers", "rotation")
+
+    def __init__(self, number: str, kind: str, shape: str, x: float, y: float,
+                 width: float, height: float, drill: float = 0.0,
+                 layers: Sequence[str] = ("*.Cu", "*.Mask"), rotation: float = 0.0):
+        self.number = number
+        self.kind = kind
+        self.shape = shape
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.drill = drill
+        self.layers = tuple(layers)
+        self.rotation = rotation
+
+    @classmethod
+    def from_sexpr(cls, node) -> "Pad":
+        at = sexpr.floats(sexpr.find(node, "at")) + [0.0, 0.0, 0.0]
+        size = sexpr.floats(sexpr.find(node, "size")) or [0.0, 0.0]
+        drill = sexpr.floats(sexpr.find(node, "drill"))
+        layers = sexpr.find(node, "layers") or ["layers"]
+        return cls(
+            number=node[1] if len(node) > 1 else "",
+            kind=node[2] if len(node) > 2 else "thru_hole",
+            shape=node[3] if len(node) > 3 else "circle",
+            x=at[0], y=at[1],
+            width=size[0], height=size[1] if len(size) > 1 else size[0],
+            drill=drill[0] if drill else 0.0,
+            layers=[str(l) for l in layers[1:]],
+            rotation=at[2]
+        )
+
+    def to_sexpr(self, rotation: float = 0.0) -> str:
+        angle = (self.rotation + rotation) % 360
+        at = f"(at {_num(self.x)} {_num(self.y)}{' ' + _num(angle) if angle else ''})"
+        drill = f" (drill {_num(self.drill)})" if self.drill else ""
+        layers = " ".join(sexpr.quote(l) for l in self.layers)
+        return (f"(pad {sexpr.quote(self.number)} {self.kind} {self.shape} {at} "
+                f"(size {_num(self.width)} {_num(self.height)}){drill} (layers {layers}))")
+
+
+class Graphic:
+    """
+    A drawing item (fp_line, fp_rect, fp_circle, fp_arc, fp_poly). The parsed
+    node is kept for serialization; points are its extents for bounds checks.
+    """
+    __slots__ = ("kind", "layer", "width", "points", "node")
+
+    def __init__(self, kind: str, layer: str, width: float, points: List[Tuple[float, float]], node):
+        self.kind = kind
+        self.layer = layer
+        self.width = width
+        self.points = points
+        self.node = node
+
+    @classmethod
+    def from_sexpr(cls, node) -> "Graphic":
+        points = []
+        if node[0] == "fp_circle":
+            c = sexpr.floats(sexpr.find(node, "center"))
+            e = sexpr.floats(sexpr.find(node, "end"))
+            if len(c) >= 2 and len(e) >= 2:
+                r = math.hypot(e[0] - c[0], e[1] - c[1])
+                points = [(c[0] - r, c[1] - r), (c[0] + r, c[1] + r)]
+        else:
+            for key in ("start", "mid", "end"):
+                p = sexpr.floats(sexpr.find(node, key))
+                if len(p) >= 2:
+                    points.append((p[0], p[1]))
+            pts = sexpr.find(node, "pts")
+            if pts:
+                points.extend(tuple(sexpr.floats(xy)[:2]) for xy in sexpr.children(pts, "xy"))
+        stroke = sexpr.find(node, "stroke") # KiCad 7+: (stroke (width 0.12) ...)
+        width = sexpr.floats(sexpr.find(stroke, "width") if stroke else sexpr.find(node, "width"))
+        return cls(node[0], str(sexpr.value(node, "layer", "")), width[0] if width else 0.0, points, node)
+
+    @property
+    def is_courtyard(self) -> bool:
+        return self.layer.endswith("CrtYd")
+
+
+class Footprint:
+    __slots__ = ("name", "attr", "texts", "graphics", "pads", "_pad_xy", "_bbox", "_compiled")
+
+    def __init__(self, name: str, pads: List[Pad], graphics: List[Graphic] = (),
+                 texts: List = (), attr: Optional[str] = None):
+        self.name = name
+        self.attr = attr
+        self.texts = list(texts)
+        self.graphics = list(graphics)
+        self.pads = list(pads)
+        self._pad_xy = None
+        self._bbox = None
+        self._compiled: Dict[float, str] = {}
+
+    @classmethod
+    def from_sexpr(cls, tree) -> "Footprint":
+        pads, graphics, texts = [], [], []
+        for child in tree[2:]:
+            if not isinstance(child, list) or not child:
+                continue
+            if child[0] == "pad":
+                pads.append(Pad.from_sexpr(child))
+            elif child[0] in ("fp_line", "fp_rect", "fp_circle", "fp_arc", "fp_poly"):
+                graphics.append(Graphic.from_sexpr(child))
+            elif child[0] == "fp_text":
+                texts.append(child)
+        return cls(str(tree[1]), pads, graphics, texts, sexpr.value(tree, "attr"))
+
+    @classmethod
+    def from_text(cls, text: str) -> "Footprint":
+        return cls.from_sexpr(sexpr.parse(text))
+
+    # --- Geometry -----------------------------------------------------------
+
+    @property
+    def pad_numbers(self) -> List[str]:
+        return [p.number for p in self.pads]
+
+    def pad_offsets(self) -> np.ndarray:
+        """
+        (N, 2) pad centres relative to the footprint origin (read-only, cached).
+        """
+        if self._pad_xy is None:
+            xy = np.array([(p.x, p.y) for p in self.pads], dtype=float).reshape(-1, 2)
+            xy.setflags(write=False)
+            self._pad_xy = xy
+        return self._pad_xy
+
+    def pad_positions(self, x: float, y: float, rotation: float = 0.0) -> np.ndarray:
+        return transform(self.pad_offsets(), x, y, rotation)
+
+    def local_bbox(self) -> Tuple[float, float, float, float]:
+        """
+        (min_x, min_y, max_x, max_y) around the courtyard if there is one,
+        else around every drawing and pad.
+        """
+        if self._bbox is None:
+            points = [pt for g in self.graphics if g.is_courtyard for pt in g.points]
+            if not points:
+                points = [pt for g in self.graphics for pt in g.points]
+                for p in self.pads:
+                    points += [(p.x - p.width / 2, p.y - p.height / 2), (p.x + p.width / 2, p.y + p.height / 2)]
+            if points:
+                arr = np.array(points, dtype=float)
+                self._bbox = (*arr.min(axis=0).tolist(), *arr.max(axis=0).tolist())
+            else:
+                self._bbox = (0.0, 0.0, 0.0, 0.0)
+        return self._bbox
+
+    def bbox(self, x: float, y: float, rotation: float = 0.0) -> Tuple[float, float, float, float]:
+        x0, y0, x1, y1 = self.local_bbox()
+        corners = transform(np.array([(x0, y0), (x1, y0), (x1, y1), (x0, y1)]), x, y, rotation)
+        lo, hi = corners.min(axis=0), corners.max(axis=0)
+        return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+
+    # --- Serialization ------------------------------------------------------
+
+    def _compile(self, rotation: float) -> str:
+        def static(text):
+            return text.replace("{", "{{").replace("}", "}}")
+
+        rot = f" {_num(rotation)}" if rotation else ""
+        lines = [f'\n  (footprint {static(sexpr.quote(self.name))} (layer "F.Cu")', f"    (at {{x}} {{y}}{rot})"]
+        if self.attr:
+            lines.append(f"    (attr {static(str(self.attr))})")
+        for text in self.texts:
+            kind = text[1] if len(text) > 1 else ""
+            line = static(sexpr.dumps(text))
+            # The reference / value strings are filled in per instance
+            if kind in ("reference", "value") and len(text) > 2:
+                field = "{ref}" if kind == "reference" else "{val}"
+                line = line.replace(static(sexpr.quote(text[2])), f'"{field}"', 1)
+            lines.append("    " + line)
+        lines += ["    " + static(sexpr.dumps(g.node)) for g in self.graphics]
+        lines += ["    " + static(p.to_sexpr(rotation)) for p in self.pads]
+        lines.append("  )")
+        return "\n".join(lines)
+
+    def to_sexpr(self, x: float, y: float, ref: str = "", value: str = "", rotation: float = 0.0) -> str:
+        rotation = rotation % 360
+        compiled = self._compiled.get(rotation)
+        if compiled is None:
+            compiled = self._compiled[rotation] = self._compile(rotation)
+        return compiled.format(x=x, y=y, ref=_escape(ref), val=_escape(value))
+
+
+def _escape(text: str) -> str:
+    return str(text).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def pad_table(placed: Iterable[Tuple[str, Footprint, float, float, float]]) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+    """
+    Board-level pad table for a placement: [(ref, pad_number)] and an (N, 2)
+    array of pad centres in the same order. placed yields (ref, footprint, x, y, rotation).
+    """
+    names: List[Tuple[str, str]] = []
+    blocks = []
+    for ref, fp, x, y, rotation in placed:
+        names += [(ref, number) for number in fp.pad_numbers]
+        blocks.append(fp.pad_positions(x, y, rotation))
+    coords = np.vstack(blocks) if blocks else np.zeros((0, 2))
+    return names, coords
+
+
+_library: Optional[Dict[str, Footprint]] = None
+
+
+def load_templates(templates: Dict[str, str]) -> Dict[str, Footprint]:
+    """
+    Parses FOOTPRINT_TEMPLATES-style strings ({x}/{y}/{ref}/{val} placeholders).
+    """
+    return {fp_id: Footprint.from_text(text) for fp_id, text in templates.items()}
+
+
+def get_footprint(fp_id: str) -> Footprint:
+    """
+    Built-in footprint for fp_id, falling back to Unknown_Footprint.
+    """
+    global _library
+    if _library is None:
+        from src.pcb_layout_generator import FOOTPRINT_TEMPLATES
+        _library = load_templates(FOOTPRINT_TEMPLATES)
+    return _library.get(fp_id) or _library["Unknown_Footprint"]
@@ -0,0 +1,341 @@
+import argparse
+import difflib
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src import sexpr
+
+# Offline index of the KiCad footprint libraries.
+#
+# FOOTPRINT_MAP in schematic_generator only knows ~50 parts; this index covers
+# every *.pretty library under KICAD_SHARE/footprints. Building it parses
+# thousands of .kicad_mod files, so it runs ahead of time:
+#
+#   python -m src.footprint_index            # build / refresh
+#   python -m src.footprint_index --search "buzzer"
+#
+# The SQLite file is the persistent store; lookups run against an in-memory
+# token index loaded from it once, so exact/keyword hits are dict lookups.
+# Re-running only re-parses libraries whose files changed.
+
+INDEX_PATH = os.getenv("FOOTPRINT_INDEX", "footprint_index.sqlite3")
+
+# Relevance of a query term found in the footprint name, its library name,
+# or its description/tags
+NAME_WEIGHT = 3.0
+LIB_WEIGHT = 2.0
+KEYWORD_WEIGHT = 1.0
+FUZZY_FACTOR = 0.7 # a misspelt name term still clears MIN_SCORE, a misspelt keyword does not
+MIN_SCORE = LIB_WEIGHT # keyword-only matches are too loose to trust
+SEARCH_CACHE_SIZE = 1024 # Distinct (terms, pad count, limit) searches kept, least recently used dropped
+
+_SPLIT = re.compile(r"[^a-z0-9.]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS libraries (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    file_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS footprints (
+    lib TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pad_count INTEGER NOT NULL,
+    pads TEXT NOT NULL,
+    min_x REAL, min_y REAL, max_x REAL, max_y REAL,
+    descr TEXT,
+    tags TEXT,
+    PRIMARY KEY (lib, name)
+);
+"""
+
+
+def kicad_share_dir() -> str:
+    # Same default as kicad_script.py
+    default_share = r"C:\Program Files\KiCad\9.0\share\kicad"
+    if os.name != 'nt':
+        default_share = "/usr/share/kicad"
+    return os.getenv("KICAD_SHARE", default_share)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase alphanumeric terms, plus adjacent pairs joined so "DIP-8" and
+    "dip8" meet: "PinHeader_1x04" -> pinheader, 1x04, pinheader1x04.
+    """
+    words = [w.strip(".") for w in _SPLIT.split(text.lower())]
+    words = [w for w in words if w]
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+def parse_footprint(path: str) -> Dict[str, Any]:
+    """
+    Extracts name, pad numbers and bounding box (courtyard if present,
+    else pads) from a .kicad_mod file.
+    """
+    tree = sexpr.parse_file(path)
+    pads: List[str] = []
+    pad_box: List[float] = []
+    for pad in sexpr.children(tree, "pad"):
+        number = pad[1] if len(pad) > 1 and isinstance(pad[1], str) else ""
+        if number and number not in pads: # unnumbered pads are mechanical
+            pads.append(number)
+        at = sexpr.floats(sexpr.find(pad, "at"))
+        size = sexpr.floats(sexpr.find(pad, "size"))
+        if len(at) >= 2 and len(size) >= 2:
+            _grow(pad_box, at[0] - size[0] / 2, at[1] - size[1] / 2)
+            _grow(pad_box, at[0] + size[0] / 2, at[1] + size[1] / 2)
+
+    court_box: List[float] = []
+    for item in tree:
+        if not (isinstance(item, list) and item and item[0] in ("fp_line", "fp_rect", "fp_circle", "fp_arc", "fp_poly")):
+            continue
+        if not str(sexpr.value(item, "layer", "")).endswith("CrtYd"):
+            continue
+        if item[0] == "fp_circle":
+            c = sexpr.floats(sexpr.find(item, "center"))
+            e = sexpr.floats(sexpr.find(item, "end"))
+            if len(c) >= 2 and len(e) >= 2:
+                r = math.hypot(e[0] - c[0], e[1] - c[1])
+                _grow(court_box, c[0] - r, c[1] - r)
+                _grow(court_box, c[0] + r, c[1] + r)
+            continue
+        for key in ("start", "mid", "end"):
+            p = sexpr.floats(sexpr.find(item, key))
+            if len(p) >= 2:
+                _grow(court_box, p[0], p[1])
+        pts = sexpr.find(item, "pts")
+        if pts:
+            for xy in sexpr.children(pts, "xy"):
+                p = sexpr.floats(xy)
+                if len(p) >= 2:
+                    _grow(court_box, p[0], p[1])
+
+    box = court_box or pad_box or [0.0, 0.0, 0.0, 0.0]
+    return {
+        "name": tree[1] if len(tree) > 1 else os.path.splitext(os.path.basename(path))[0],
+        "pads": pads,
+        "bbox": tuple(box),
+        "descr": sexpr.value(tree, "descr", "") or "",
+        "tags": sexpr.value(tree, "tags", "") or "",
+    }
+
+
+def _grow(box: List[float], x: float, y: float) -> None:
+    if not box:
+        box.extend([x, y, x, y])
+        return
+    box[0] = min(box[0], x)
+    box[1] = min(box[1], y)
+    box[2] = max(box[2], x)
+    box[3] = max(box[3], y)
+
+
+def _library_signature(lib_path: str) -> Tuple[int, int]:
+    # Directory mtime catches added/removed files, file mtimes catch edits
+    latest = os.stat(lib_path).st_mtime_ns
+    count = 0
+    with os.scandir(lib_path) as it:
+        for entry in it:
+            if entry.name.endswith(".kicad_mod"):
+                count += 1
+                latest = max(latest, entry.stat().st_mtime_ns)
+    return latest, count
+
+
+class FootprintIndex:
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock() # Guards _memory and _cache
+        self._local = threading.local()
+        self._memory = None
+        self._cache: "OrderedDict[Tuple[Tuple[str, ...], Optional[int], int], List[Dict[str, Any]]]" = OrderedDict()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path)
+        return conn
+
+    def update(self, footprints_root: Optional[str] = None) -> Dict[str, int]:
+        """
+        Brings the index in line with the *.pretty directories under
+        footprints_root, re-parsing only libraries that changed.
+        """
+        root = footprints_root or os.path.join(kicad_share_dir(), "footprints")
+        on_disk = {}
+        if os.path.isdir(root):
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name.endswith(".pretty"):
+                        on_disk[entry.name[:-len(".pretty")]] = entry.path
+
+        stats = {"libraries": len(on_disk), "reindexed": 0, "removed": 0, "errors": 0}
+        conn = self._conn()
+        known = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT name, mtime_ns, file_count FROM libraries")}
+        for lib in set(known) - set(on_disk):
+            with conn:
+                conn.execute("DELETE FROM footprints WHERE lib = ?", (lib,))
+                conn.execute("DELETE FROM libraries WHERE name = ?", (lib,))
+            stats["removed"] += 1
+
+        for lib, lib_path in sorted(on_disk.items()):
+            signature = _library_signature(lib_path)
+            if known.get(lib) == signature:
+                continue
+            rows = []
+            for entry in os.scandir(lib_path):
+                if not entry.name.endswith(".kicad_mod"):
+                    continue
+                try:
+                    fp = parse_footprint(entry.path)
+                except (OSError, UnicodeDecodeError, sexpr.SExprError) as e:
+                    print(f"Skipping {entry.path}: {e}")
+                    stats["errors"] += 1
+                    continue
+                rows.append((lib, fp["name"], len(fp["pads"]), ",".join(fp["pads"])) + fp["bbox"] + (fp["descr"], fp["tags"]))
+            with conn:
+                conn.execute("DELETE FROM footprints WHERE lib = ?", (lib,))
+                conn.executemany("INSERT OR REPLACE INTO footprints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("INSERT OR REPLACE INTO libraries VALUES (?, ?, ?)", (lib, signature[0], signature[1]))
+            stats["reindexed"] += 1
+        stats["footprints"] = conn.execute("SELECT COUNT(*) FROM footprints").fetchone()[0]
+
+        with self._lock:
+            self._memory = None
+            self._cache.clear()
+        return stats
+
+    def _load(self):
+        with self._lock:
+            if self._memory is not None:
+                return self._memory
+            rows = self._conn().execute(
+                "SELECT lib, name, pad_count, pads, min_x, min_y, max_x, max_y, descr, tags"
+                " FROM footprints ORDER BY lib, name"
+            ).fetchall()
+
+            entries = []
+            postings: Dict[str, Dict[int, float]] = {}
+            for i, (lib, name, pad_count, pads, x0, y0, x1, y1, descr, tags) in enumerate(rows):
+                entries.append((lib, name, pad_count, pads, (x0, y0, x1, y1)))
+                # A term keeps its strongest role for each footprint
+                for terms, weight in ((tokenize(f"{descr} {tags}"), KEYWORD_WEIGHT),
+                                      (tokenize(lib), LIB_WEIGHT),
+                                      (tokenize(name), NAME_WEIGHT)):
+                    for term in terms:
+                        slot = postings.setdefault(term, {})
+                        if slot.get(i, 0) < weight:
+                            slot[i] = weight
+            self._memory = (entries, postings, sorted(postings))
+            return self._memory
+
+    def get(self, fp_id: str) -> Optional[Dict[str, Any]]:
+        lib, _, name = fp_id.partition(":")
+        row = self._conn().execute(
+            "SELECT lib, name, pad_count, pads, min_x, min_y, max_x, max_y FROM footprints WHERE lib = ? AND name = ?",
+            (lib, name)
+        ).fetchone()
+        if row is None:
+            return None
+        return _entry_dict((row[0], row[1], row[2], row[3], tuple(row[4:8])))
+
+    def search(self, query: str, limit: int = 5, pad_count: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ranks footprints for a free-text query ("buzzer", "DIP-8", "pin header 1x04").
+        Terms with no exact hit fall back to close spellings in the vocabulary.
+        """
+        terms = tuple(sorted(set(tokenize(query))))
+        # Keyed by the terms, so spellings of one query ("DIP-8", "dip 8") share an entry
+        key = (terms, pad_count, limit)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        entries, postings, vocab = self._load()
+        scores: Dict[int, float] = {}
+        for term in terms:
+            hits = [(postings[term], 1.0)] if term in postings else []
+            if not hits and len(term) >= 4:
+                hits = [(postings[t], FUZZY_FACTOR) for t in difflib.get_close_matches(term, vocab, n=2, cutoff=0.85)]
+            for posting, factor in hits:
+                for i, weight in posting.items():
+                    scores[i] = scores.get(i, 0.0) + weight * factor
+
+        ranked = sorted(
+            (i for i, score in scores.items() if score >= MIN_SCORE),
+            key=lambda i: (-scores[i], len(entries[i][1]), entries[i][0], entries[i][1])
+        )
+        results = []
+        for i in ranked:
+            if pad_count is not None and entries[i][2] != pad_count:
+                continue
+            results.append(dict(_entry_dict(entries[i]), score=scores[i]))
+            if len(results) >= limit:
+                break
+        with self._lock:
+            self._cache[key] = results
+            while len(self._cache) > SEARCH_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return results
+
+
+def _entry_dict(entry) -> Dict[str, Any]:
+    lib, name, pad_count, pads, bbox = entry
+    return {
+        "footprint": f"{lib}:{name}",
+        "pad_count": pad_count,
+        "pads": pads.split(",") if pads else [],
+        "bbox": bbox,
+    }
+
+
+_default_index: Optional[FootprintIndex] = None
+
+
+def default_index() -> Optional[FootprintIndex]:
+    """
+    The index at INDEX_PATH, or None if it hasn't been built.
+    """
+    global _default_index
+    if _default_index is None and os.path.exists(INDEX_PATH):
+        _default_index = FootprintIndex(INDEX_PATH)
+    return _default_index
+
+
+def lookup_footprint(component_name: str, pad_count: Optional[int] = None) -> Optional[str]:
+    index = default_index()
+    if index is None:
+        return None
+    results = index.search(component_name, limit=1, pad_count=pad_count)
+    return results[0]["footprint"] if results else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the KiCad footprint index")
+    parser.add_argument("--share", default=kicad_share_dir(), help="KiCad share directory (default: KICAD_SHARE)")
+    parser.add_argument("--index", default=INDEX_PATH, help="Index file (default: FOOTPRINT_INDEX)")
+    parser.add_argument("--search", help="Query the index instead of updating it")
+    args = parser.parse_args()
+
+    index = FootprintIndex(args.index)
+    if args.search:
+        for hit in index.search(args.search, limit=10):
+            print(f"{hit['score']:5.1f}  {hit['footprint']}  ({hit['pad_count']} pads)")
+        return
+    stats = index.update(os.path.join(args.share, "footprints"))
+    print(f"Indexed {stats['footprints']} footprints in {stats['libraries']} libraries "
+          f"({stats['reindexed']} re-parsed, {stats['removed']} removed, {stats['errors']} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from src import jobs
+
+# Job queue backends.
+#
+# With JOB_QUEUE_BACKEND=local (default) the web process runs every stage
+# itself, as before. With JOB_QUEUE_BACKEND=sqlite the web process only
+# enqueues; `python -m src.worker` processes - on this node or any node that
+# mounts the same JOBS_DIR volume - lease jobs, run the pipeline and write the
+# artifacts into the shared job directory. The two tiers scale independently.
+
+FINAL_STATES = ("done", "failed", "cancelled")
+
+# Seconds a finished job's stage events are kept, so streams still polling
+# when it finished can read the last ones. Older ones are purged.
+JOB_EVENTS_RETENTION = float(os.getenv("JOB_EVENTS_RETENTION", "3600"))
+EVENTS_PURGE_INTERVAL = 60.0 # Seconds between purges, per process
+
+
+class Lease:
+    __slots__ = ("job_id", "token", "payload", "attempt")
+
+    def __init__(self, job_id: str, token: str, payload: Dict[str, Any], attempt: int):
+        self.job_id = job_id
+        self.token = token
+        self.payload = payload
+        self.attempt = attempt
+
+
+class JobQueue:
+    """
+    Interface every backend implements. A job is leased to one worker at a
+    time; the lease token must accompany every later call so a worker whose
+    lease expired (and whose job was handed to someone else) can't overwrite
+    the new owner's result.
+    """
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Lease]:
+        """
+        Returns the oldest runnable job, or None if there is nothing to do.
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, token: str, lease_seconds: float) -> str:
+        """
+        Extends the lease. Returns "ok", "cancelled" (stop, the client asked
+        for it) or "lost" (stop, the job belongs to someone else now).
+        """
+        raise NotImplementedError
+
+    def complete(self, job_id: str, token: str, result: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, token: str, error: str, retry: bool = True,
+             kind: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        kind ("timeout", "preflight") and data classify a final failure so the
+        web tier can answer it like an in-process one (see main._queued_result).
+        """
+        raise NotImplementedError
+
+    def mark_cancelled(self, job_id: str, token: str) -> bool:
+        raise NotImplementedError
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Requests cancellation. Returns False if the job is unknown or finished.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def pending(self) -> int:
+        raise NotImplementedError
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """
+        Stage events recorded by the worker with id > after, oldest first.
+        """
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    error_kind TEXT,
+    error_data TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, updated_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Queue stored in a single SQLite file. Lease/expiry decisions are made in
+    BEGIN IMMEDIATE transactions, so any number of worker processes (and
+    nodes sharing the file) can poll it concurrently.
+
+    The default rollback journal works on shared volumes; JOB_QUEUE_JOURNAL=WAL
+    is faster but only safe when every process is on the same host.
+
+    Stage events of jobs that finished more than events_retention seconds
+    ago are deleted by the workers' lease polls (see purge_events).
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, events_retention: Optional[float] = None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.events_retention = JOB_EVENTS_RETENTION if events_retention is None else events_retention
+        self._next_purge = 0.0
+        self.journal_mode = os.getenv("JOB_QUEUE_JOURNAL", "DELETE").upper()
+        self._local = threading.local()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Queue files from before failures were classified lack these columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("error_kind", "error_data"):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+                except sqlite3.OperationalError:
+                    pass # Another process added it first
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, sql: str, params) -> bool:
+        return self._conn().execute(sql, params).rowcount == 1
+
+    def enqueue(self, job_id, payload):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, payload, status, max_attempts, available_at, created_at, updated_at)"
+            " VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), self.max_attempts, now, now, now)
+        )
+
+    def lease(self, worker_id, lease_seconds):
+        conn = self._conn()
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + EVENTS_PURGE_INTERVAL
+            self.purge_events(now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs"
+                " WHERE status = 'queued' AND available_at <= ?"
+                " ORDER BY available_at, created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?,"
+                " lease_token = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                (worker_id, token, now + lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return Lease(row["id"], token, json.loads(row["payload"]), row["attempts"] + 1)
+
+    def _expire_leases(self, conn, now):
+        # A lease that ran out means its worker died (or hung); hand the job
+        # back to the queue unless it already used up its attempts
+        expired = conn.execute(
+            "SELECT id, attempts, max_attempts, cancel_requested FROM jobs"
+            " WHERE status = 'leased' AND lease_expires < ?",
+            (now,)
+        ).fetchall()
+        for row in expired:
+            if row["cancel_requested"]:
+                status, error = "cancelled", None
+            elif row["attempts"] >= row["max_attempts"]:
+                status, error = "failed", "Worker lost (lease expired)"
+            else:
+                status, error = "queued", None
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_token = NULL, lease_owner = NULL,"
+                " available_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, now, now, row["id"])
+            )
+
+    def heartbeat(self, job_id, token, lease_seconds):
+        now = time.time()
+        conn = self._conn()
+        if conn.execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ?"
+            " WHERE id = ? AND lease_token = ? AND status = 'leased'",
+            (now + lease_seconds, now, job_id, token)
+        ).rowcount != 1:
+            return "lost"
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return "cancelled" if row["cancel_requested"] else "ok"
+
+    def complete(self, job_id, token, result):
+        return self._update(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_token = NULL, updated_at = ?"
+            " WHERE id = ? AND lease_token = ? AND status = 'leased'",
+            (json.dumps(result), time.time(), job_id, token)
+        )
+
+    def fail(self, job_id, token, error, retry=True, kind=None, data=None):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT attempts, max_attempts, cancel_requested FROM jobs WHERE id = ? AND lease_token = ?",
+            (job_id, token)
+        ).fetchone()
+        if row is None:
+            return False
+        if retry and not row["cancel_requested"] and row["attempts"] < row["max_attempts"]:
+            # Back off a little so a poison job doesn't spin through every worker
+            delay = min(60, 2 ** row["attempts"])
+            return self._update(
+                "UPDATE jobs SET status = 'queued', error = ?, lease_token = NULL, lease_owner = NULL,"
+                " available_at = ?, updated_at = ? WHERE id = ? AND lease_token = ?",
+                (error, now + delay, now, job_id, token)
+            )
+        return self._update(
+            "UPDATE jobs SET status = 'failed', error = ?, error_kind = ?, error_data = ?, lease_token = NULL,"
+            " updated_at = ? WHERE id = ? AND lease_token = ?",
+            (error, kind, json.dumps(data) if data is not None else None, now, job_id, token)
+        )
+
+    def mark_cancelled(self, job_id, token):
+        return self._update(
+            "UPDATE jobs SET status = 'cancelled', lease_token = NULL, updated_at = ?"
+            " WHERE id = ? AND lease_token = ? AND status = 'leased'",
+            (time.time(), job_id, token)
+        )
+
+    def cancel(self, job_id):
+        now = time.time()
+        conn = self._conn()
+        # Queued jobs are cancelled outright; running ones see it on their next heartbeat
+        if conn.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated_at = ?"
+            " WHERE id = ? AND status = 'queued'",
+            (now, job_id)
+        ).rowcount == 1:
+            return True
+        return conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'leased'",
+            (now, job_id)
+        ).rowcount == 1
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, status, attempts, error, error_kind, error_data, result, created_at, updated_at"
+            " FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["error_data"] = json.loads(job["error_data"]) if job["error_data"] else None
+        return job
+
+    def pending(self):
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def add_event(self, job_id, event, data):
+        self._conn().execute(
+            "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+            (job_id, event, json.dumps(data))
+        )
+
+    def events(self, job_id, after=0):
+        rows = self._conn().execute(
+            "SELECT id, event, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+            (job_id, after)
+        ).fetchall()
+        return [{"id": r["id"], "event": r["event"], "data": json.loads(r["data"])} for r in rows]
+
+    def purge_events(self, now: Optional[float] = None) -> int:
+        """
+        Deletes the events of jobs that reached a final state more than
+        events_retention seconds ago. Returns how many were deleted.
+        """
+        cutoff = (time.time() if now is None else now) - self.events_retention
+        return self._conn().execute(
+            "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs"
+            f" WHERE status IN ({', '.join('?' * len(FINAL_STATES))}) AND updated_at <= ?)",
+            (*FINAL_STATES, cutoff)
+        ).rowcount
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """
+    Backend selected by JOB_QUEUE_BACKEND; None means run jobs in-process.
+    """
+    backend = os.getenv("JOB_QUEUE_BACKEND", "local").strip().lower()
+    if backend in ("", "local"):
+        return None
+    if backend == "sqlite":
+        path = os.getenv("JOB_QUEUE_PATH", os.path.join(jobs.JOBS_ROOT, "queue.sqlite3"))
+        return SQLiteJobQueue(path, max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")))
+    raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
@@ -0,0 +1,82 @@
+import os
+import re
+import threading
+import uuid
+from typing import Dict, Optional
+
+# Every generation gets its own directory so concurrent requests never
+# overwrite each other's artifacts and files can be served per job.
+JOBS_ROOT = os.getenv("JOBS_DIR", "jobs")
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Cancellation flags for jobs that are currently running in this process
+_active: Dict[str, threading.Event] = {}
+_active_lock = threading.Lock()
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def is_valid_job_id(job_id: str) -> bool:
+    return bool(_JOB_ID_RE.match(job_id or ""))
+
+
+def job_dir(job_id: str, create: bool = False) -> str:
+    """
+    Returns the directory for a job. Raises ValueError for malformed ids so
+    callers never build paths from arbitrary user input.
+    """
+    if not is_valid_job_id(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    path = os.path.join(JOBS_ROOT, job_id)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def job_file(job_id: str, filename: str) -> Optional[str]:
+    """
+    Resolves an artifact inside a job directory, or None if the name tries to
+    escape it or the file does not exist (yet).
+    """
+    if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+        return None
+    try:
+        path = os.path.join(job_dir(job_id), filename)
+    except ValueError:
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def job_url(job_id: str, filename: str) -> str:
+    return f"/jobs/{job_id}/{filename}"
+
+
+def register_job(job_id: str, event: Optional[threading.Event] = None) -> threading.Event:
+    """
+    Marks a job as running and returns its cancellation event (a new one, or
+    event to have several jobs cancel together).
+    """
+    event = event or threading.Event()
+    with _active_lock:
+        _active[job_id] = event
+    return event
+
+
+def unregister_job(job_id: str) -> None:
+    with _active_lock:
+        _active.pop(job_id, None)
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    Requests cancellation of a running job. Returns False if it is not running here.
+    """
+    with _active_lock:
+        event = _active.get(job_id)
+    if event is None:
+        return False
+    event.set()
+    return True
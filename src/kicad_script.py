@@ -1,76 +1,543 @@
 import sys
-import json
 import os
+import json
+import math
+import argparse
 import pcbnew
 from pcbnew import *
 
-def create_board(netlist_file, output_file):
-    print(f"Loading netlist from {netlist_file}...")
-    with open(netlist_file, 'r') as f:
-        data = json.load(f)
-    
-    components_data = data.get('components', [])
-    nets_data = data.get('nets', [])
+# Shared stdlib-only helpers live next to this script (run as a plain script
+# by KiCad's Python, so the src package is not importable here).
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from netlist_model import load_netlist
 
-    # Create a new board
-    board = pcbnew.BOARD()
-    
-    # Define Library Path
-    # Define Library Path based on OS/ENV
-    default_share = r"C:\Program Files\KiCad\9.0\share\kicad"
-    if os.name != 'nt':
-        default_share = "/usr/share/kicad"
-        
-    KICAD_SHARE = os.getenv("KICAD_SHARE", default_share)
-    FP_LIB_PATH = os.path.join(KICAD_SHARE, "footprints")
-
-    def load_footprint(fp_id):
-        try:
-            if ":" in fp_id:
-                lib, name = fp_id.split(":", 1)
-                lib_path = os.path.join(FP_LIB_PATH, f"{lib}.pretty")
-                return pcbnew.FootprintLoad(lib_path, name)
-            return None
-        except Exception as e:
-            print(f"Error loading {fp_id}: {e}")
-            return None
-
-    # 1. Add Components & Grid Placement
-    comp_map = {} 
-    grid_x = 50.0
-    grid_y = 50.0
-    row_count = 0
-    
+# Define Library Path based on OS/ENV
+default_share = r"C:\Program Files\KiCad\9.0\share\kicad"
+if os.name != 'nt':
+    default_share = "/usr/share/kicad"
+
+KICAD_SHARE = os.getenv("KICAD_SHARE", default_share)
+FP_LIB_PATH = os.path.join(KICAD_SHARE, "footprints")
+
+# Grid placement (mm)
+GRID_ORIGIN = 50.0
+GRID_PITCH = 25.0
+GRID_COLUMNS = 4
+
+# Board outline margin around the footprints, mounting hole inset (mm)
+OUTLINE_MARGIN_MM = 5
+HOLE_OFFSET_MM = 3
+HOLE_KEEPOUT_MM = 2.0
+MOUNTING_HOLE_FP = "MountingHole:MountingHole_3.2mm_M3"
+HOLE_COURTYARD_MM = 3.5 # Half size of the mounting hole footprint, if it cannot be loaded
+# Part positions written next to the board for the BOM / pick-and-place export (pipeline.PLACEMENT_FILENAME)
+PLACEMENT_FILENAME = "placement.json"
+
+# "pathfinder": negotiated-congestion grid router (router.py), "direct": straight pad-to-pad tracks
+ROUTER = os.getenv("ROUTER", "pathfinder")
+# Post-route cleanup (track_optimizer.py); TRACK_SMOOTHING=1 also chamfers 90 degree corners
+OPTIMIZE_TRACKS = os.getenv("OPTIMIZE_TRACKS", "1") == "1"
+TRACK_SMOOTHING = os.getenv("TRACK_SMOOTHING", "0") == "1"
+# Repeated sub-circuits (blocks.py) are placed and routed once and copied; USE_BLOCKS=0 disables
+USE_BLOCKS = os.getenv("USE_BLOCKS", "1") == "1"
+# Repeated parts (array_placement.py) are placed as a row / grid / ring; USE_ARRAYS=0 disables
+USE_ARRAYS = os.getenv("USE_ARRAYS", "1") == "1"
+# Saved boards are rewritten byte-stable (deterministic.py); DETERMINISTIC_OUTPUT=0 disables
+DETERMINISTIC_OUTPUT = os.getenv("DETERMINISTIC_OUTPUT", "1") == "1"
+# The grid placement is re-packed into the smallest board (compaction.py); COMPACT_PLACEMENT=0 keeps the grid
+COMPACT_PLACEMENT = os.getenv("COMPACT_PLACEMENT", "1") == "1"
+COMPACT_SPACING_MM = float(os.getenv("COMPACT_SPACING_MM", "2.0"))
+# Variant knobs (explore.py builds several variants of a board with different values):
+# packing order seed (0: canonical), target width / height of a compacted board (0: any),
+# GND plane layer ("B.Cu", "F.Cu" or "none") and track widths per net class ("signal=0.3,power=1.0")
+PLACEMENT_SEED = int(os.getenv("PLACEMENT_SEED", "0"))
+BOARD_ASPECT = float(os.getenv("BOARD_ASPECT", "0"))
+GND_PLANE_LAYER = os.getenv("GND_PLANE_LAYER", "B.Cu")
+TRACK_WIDTHS = dict((cls.strip(), float(mm)) for cls, _, mm in
+                    (item.partition("=") for item in os.getenv("TRACK_WIDTHS", "").split(",") if "=" in item))
+
+# Library footprints by id, read from disk once per run (None if missing)
+_footprint_templates = {}
+# Packed area (mm) of a compacted placement; the outline is drawn around it
+_placement_extent = None
+
+def read_footprint(fp_id):
+    try:
+        if ":" in fp_id:
+            lib, name = fp_id.split(":", 1)
+            lib_path = os.path.join(FP_LIB_PATH, f"{lib}.pretty")
+            return pcbnew.FootprintLoad(lib_path, name)
+        return None
+    except Exception as e:
+        print(f"Error loading {fp_id}: {e}")
+        return None
+
+def copy_footprint(template):
+    # Duplicate() gives the copy its own KIIDs; a plain copy would share the template's
+    copy = template.Duplicate()
+    return copy.Cast() if hasattr(copy, "Cast") else copy
+
+def load_footprint(fp_id):
+    if fp_id not in _footprint_templates:
+        _footprint_templates[fp_id] = read_footprint(fp_id)
+    template = _footprint_templates[fp_id]
+    return copy_footprint(template) if template else None
+
+def grid_position(slot):
+    row, col = divmod(slot, GRID_COLUMNS)
+    return GRID_ORIGIN + col * GRID_PITCH, GRID_ORIGIN + row * GRID_PITCH
+
+def net_width_mm(net_cls):
+    # Determine Width based on Class
+    if net_cls in TRACK_WIDTHS:
+        return TRACK_WIDTHS[net_cls]
+    width_mm = 0.25
+    if net_cls == 'power': width_mm = 0.8 # GND/VCC
+    if net_cls == 'motor': width_mm = 1.2 # High Current
+    return width_mm
+
+def get_or_create_net(board, name):
+    # Check if already exists in board
+    existing = board.FindNet(name)
+    if existing:
+        return existing
+    net = pcbnew.NETINFO_ITEM(board, name)
+    board.Add(net)
+    return net
+
+def add_track(board, net, start, end, width_mm, layer=pcbnew.F_Cu):
+    track = pcbnew.PCB_TRACK(board)
+    track.SetStart(start)
+    track.SetEnd(end)
+    track.SetWidth(int(pcbnew.FromMM(width_mm)))
+    track.SetLayer(layer)
+    track.SetNet(net)
+    board.Add(track)
+
+def add_via(board, net, pos):
+    via = pcbnew.PCB_VIA(board)
+    via.SetPosition(pos)
+    via.SetWidth(int(pcbnew.FromMM(0.8)))
+    via.SetDrill(int(pcbnew.FromMM(0.4)))
+    via.SetNet(net)
+    board.Add(via)
+
+def mm_point(x, y):
+    return pcbnew.VECTOR2I(int(pcbnew.FromMM(x)), int(pcbnew.FromMM(y)))
+
+def route_pads(board, net, pads, width_mm, joined=1):
+    # Direct Routing: chain the pads in order. The first `joined` pads are
+    # already connected; each of the others goes to the nearest pad before it.
+    if joined <= 1:
+        for i in range(len(pads) - 1):
+            add_track(board, net, pads[i].GetPosition(), pads[i+1].GetPosition(), width_mm)
+        return
+    for i in range(joined, len(pads)):
+        pos = pads[i].GetPosition()
+        nearest = min(pads[:i], key=lambda p: (p.GetPosition().x - pos.x) ** 2 + (p.GetPosition().y - pos.y) ** 2)
+        add_track(board, net, nearest.GetPosition(), pos, width_mm)
+
+def route_nets(board, net_jobs, joined=None):
+    """
+    net_jobs: [(net, pads, width_mm)]. Routes them together with the
+    negotiated-congestion router, around every pad and any copper already on
+    the board. joined maps a net name to how many of its leading pads are
+    already connected (kept copper); only the other pads are routed onto
+    them. Nets it cannot complete fall back to straight tracks.
+    """
+    joined = joined or {}
+    net_jobs = [job for job in net_jobs if len(job[1]) > joined.get(job[0].GetNetname(), 1)]
+    if not net_jobs:
+        return
+    if ROUTER != "pathfinder":
+        for net, pads, width_mm in net_jobs:
+            route_pads(board, net, pads, width_mm, joined.get(net.GetNetname(), 1))
+        return
+
+    from router import Router
+
+    rect = board_rect(board)
+    edge = OUTLINE_MARGIN_MM - 1.0 # Keep copper 1 mm inside the outline
+    router = Router((pcbnew.ToMM(rect.GetLeft()) + edge, pcbnew.ToMM(rect.GetTop()) + edge,
+                     pcbnew.ToMM(rect.GetRight()) - edge, pcbnew.ToMM(rect.GetBottom()) - edge))
+
+    for fp in board.GetFootprints():
+        for pad in fp.Pads():
+            box = pad.GetBoundingBox()
+            layers = [i for i, layer in enumerate((pcbnew.F_Cu, pcbnew.B_Cu)) if pad.IsOnLayer(layer)]
+            router.add_obstacle(pcbnew.ToMM(box.GetLeft()), pcbnew.ToMM(box.GetTop()),
+                                pcbnew.ToMM(box.GetRight()), pcbnew.ToMM(box.GetBottom()),
+                                pad.GetNetname() or None, layers)
+    for track in board.GetTracks():
+        layer = 1 if track.GetLayer() == pcbnew.B_Cu else 0
+        router.add_segment_obstacle(pcbnew.ToMM(track.GetStart().x), pcbnew.ToMM(track.GetStart().y),
+                                    pcbnew.ToMM(track.GetEnd().x), pcbnew.ToMM(track.GetEnd().y),
+                                    pcbnew.ToMM(track.GetWidth()), track.GetNetname() or None, layer)
+    # Mounting holes are added after routing
+    for x, y in hole_positions(rect):
+        k = HOLE_KEEPOUT_MM
+        router.add_obstacle(pcbnew.ToMM(x) - k, pcbnew.ToMM(y) - k, pcbnew.ToMM(x) + k, pcbnew.ToMM(y) + k)
+
+    jobs = {}
+    for net, pads, width_mm in net_jobs:
+        name = net.GetNetname()
+        jobs[name] = (net, pads, width_mm)
+        terminals = [(pcbnew.ToMM(p.GetPosition().x), pcbnew.ToMM(p.GetPosition().y)) for p in pads]
+        layers = [[i for i, layer in enumerate((pcbnew.F_Cu, pcbnew.B_Cu)) if p.IsOnLayer(layer)] for p in pads]
+        router.add_net(name, terminals, width_mm, layers, joined.get(name, 1))
+
+    stats = router.route()
+    print(f"Router: {stats['routed']}/{stats['nets']} nets in {stats['iterations']} iterations, "
+          f"{stats['overused_cells']} overused cells, {stats['workers']} workers, {stats['seconds']}s")
+
+    for name, (net, pads, width_mm) in jobs.items():
+        if name in stats['unrouted']:
+            print(f"WARNING: Could not route {name}, using direct tracks")
+            route_pads(board, net, pads, width_mm, joined.get(name, 1))
+            continue
+        segments, vias = router.tracks(name)
+        for layer, x0, y0, x1, y1 in segments:
+            add_track(board, net, mm_point(x0, y0), mm_point(x1, y1), width_mm,
+                      pcbnew.B_Cu if layer else pcbnew.F_Cu)
+        for x, y in vias:
+            add_via(board, net, mm_point(x, y))
+
+def optimize_tracks(board, zone_nets=()):
+    """
+    Merges collinear segments and removes stubs / unneeded vias, then
+    replaces the board's tracks with the result.
+    """
+    if not OPTIMIZE_TRACKS:
+        return
+    from track_optimizer import Pad, Segment, Via, optimize
+
+    segments, vias = [], []
+    tracks = list(board.GetTracks())
+    for track in tracks:
+        if isinstance(track, pcbnew.PCB_VIA):
+            pos = track.GetPosition()
+            vias.append(Via(track.GetNetname(), pos.x, pos.y, track.GetWidth()))
+        else:
+            start, end = track.GetStart(), track.GetEnd()
+            segments.append(Segment(track.GetNetname(), track.GetLayer(), start.x, start.y, end.x, end.y, track.GetWidth()))
+    pads = []
+    for fp in board.GetFootprints():
+        for pad in fp.Pads():
+            box = pad.GetBoundingBox()
+            layers = [layer for layer in (pcbnew.F_Cu, pcbnew.B_Cu) if pad.IsOnLayer(layer)]
+            pads.append(Pad(pad.GetNetname(), layers, box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom()))
+
+    new_segments, new_vias, stats = optimize(segments, vias, pads, smooth=TRACK_SMOOTHING, zone_nets=zone_nets)
+    print(f"Track optimizer: {stats['segments_before']} -> {stats['segments_after']} segments "
+          f"({stats['merged']} merged, {stats['stubs_removed']} stubs removed), "
+          f"{stats['vias_removed']} vias removed, {stats['corners_smoothed']} corners smoothed")
+    if (stats['segments_before'] == stats['segments_after'] and not stats['vias_removed']
+            and not stats['corners_smoothed']):
+        return
+
+    for track in tracks:
+        board.Remove(track)
+    for seg in new_segments:
+        track = pcbnew.PCB_TRACK(board)
+        track.SetStart(pcbnew.VECTOR2I(seg.x0, seg.y0))
+        track.SetEnd(pcbnew.VECTOR2I(seg.x1, seg.y1))
+        track.SetWidth(seg.width)
+        track.SetLayer(seg.layer)
+        track.SetNet(board.FindNet(seg.net))
+        board.Add(track)
+    for v in new_vias:
+        via = pcbnew.PCB_VIA(board)
+        via.SetPosition(pcbnew.VECTOR2I(v.x, v.y))
+        via.SetWidth(v.size)
+        via.SetDrill(int(pcbnew.FromMM(0.4)))
+        via.SetNet(board.FindNet(v.net))
+        board.Add(via)
+
+def assign_pads(net, nodes, comp_map):
+    pads = []
+    for ref, pin in nodes:
+        if ref in comp_map:
+            pad = comp_map[ref].FindPadByNumber(pin)
+            if pad:
+                pad.SetNet(net)
+                pads.append(pad)
+    return pads
+
+def place_components(board, components_data, comp_map, occupied_slots=None):
+    """
+    Loads and places footprints on free grid slots. Components already in
+    comp_map (kept from a previous revision) are left where they are.
+    """
+    occupied_slots = occupied_slots or set()
+    slot = 0
     for comp in components_data:
         ref = comp['ref']
+        if ref in comp_map:
+            continue
         val = comp['value']
         fp_id = comp['footprint']
-        
+
         footprint = load_footprint(fp_id)
         if not footprint:
             print(f"WARNING: Skipping {ref} ({fp_id})")
             continue
-            
+
         footprint.SetReference(ref)
         footprint.SetValue(val)
-        
+
         # Position
+        while slot in occupied_slots:
+            slot += 1
+        grid_x, grid_y = grid_position(slot)
+        occupied_slots.add(slot)
         pos = pcbnew.VECTOR2I(int(pcbnew.FromMM(grid_x)), int(pcbnew.FromMM(grid_y)))
         footprint.SetPosition(pos)
-        
+
         board.Add(footprint)
         comp_map[ref] = footprint
-        
-        grid_x += 25.0
-        row_count += 1
-        if row_count > 3:
-            grid_x = 50.0
-            grid_y += 25.0
-            row_count = 0
 
-    # 2. PROPER NET CREATION
-    net_map = {} 
-    
+def local_geometry(footprint):
+    # Pads and extents (mm) of a freshly loaded footprint: at the origin, unrotated
+    box = footprint.GetBoundingBox()
+    pads = []
+    for pad in footprint.Pads():
+        pos, pbox = pad.GetPosition(), pad.GetBoundingBox()
+        layers = [i for i, layer in enumerate((pcbnew.F_Cu, pcbnew.B_Cu)) if pad.IsOnLayer(layer)]
+        pads.append([str(pad.GetNumber()), round(pcbnew.ToMM(pos.x), 4), round(pcbnew.ToMM(pos.y), 4),
+                     round(pcbnew.ToMM(pbox.GetLeft()), 4), round(pcbnew.ToMM(pbox.GetTop()), 4),
+                     round(pcbnew.ToMM(pbox.GetRight()), 4), round(pcbnew.ToMM(pbox.GetBottom()), 4), layers])
+    return {"bbox": [round(pcbnew.ToMM(box.GetLeft()), 4), round(pcbnew.ToMM(box.GetTop()), 4),
+                     round(pcbnew.ToMM(box.GetRight()), 4), round(pcbnew.ToMM(box.GetBottom()), 4)],
+            "pads": pads}
+
+def reserve_slots(occupied_slots, cols, rows):
+    # First free cols x rows rectangle of grid slots; returns its top-left slot
+    cols = min(cols, GRID_COLUMNS)
+    slot = 0
+    while True:
+        row, col = divmod(slot, GRID_COLUMNS)
+        if col + cols <= GRID_COLUMNS:
+            cells = set((row + r) * GRID_COLUMNS + col + c for r in range(rows) for c in range(cols))
+            if not cells & occupied_slots:
+                occupied_slots.update(cells)
+                return slot
+        slot += 1
+
+def reserve_area(occupied_slots, extent):
+    # Reserves grid slots for a group of parts with extents (x0, y0, x1, y1)
+    # around its origin; returns the origin that centres it in those slots
+    x0, y0, x1, y1 = extent
+    cols = max(1, int(math.ceil((x1 - x0) / GRID_PITCH)))
+    rows = max(1, int(math.ceil((y1 - y0) / GRID_PITCH)))
+    slot = reserve_slots(occupied_slots, cols, rows)
+    grid_x, grid_y = grid_position(slot)
+    origin_x = grid_x - GRID_PITCH / 2 + (min(cols, GRID_COLUMNS) * GRID_PITCH - (x1 - x0)) / 2 - x0
+    origin_y = grid_y - GRID_PITCH / 2 + (rows * GRID_PITCH - (y1 - y0)) / 2 - y0
+    return origin_x, origin_y
+
+def place_blocks(board, data, comp_map, occupied_slots, library, groups=None):
+    """
+    Places the netlist's tagged sub-circuits (blocks.py) as pre-routed blocks:
+    each distinct block is laid out and routed once (or taken from the block
+    cache), every copy is a translated / rotated instance of it. Returns
+    {net name: ([(layer, x0, y0, x1, y1)], [(via_x, via_y)])} of the block copper.
+    Each placed instance is appended to groups as (refs, copper net names).
+    """
+    from blocks import block_instances
+
+    instances = block_instances(data)
+    if not instances:
+        return {}
+    components = {c['ref']: c for c in data.get('components', [])}
+    classes = {}
+    for net_info in data.get('nets', []):
+        classes[net_info['name']] = net_info.get('class', 'signal')
+
+    block_nets = {}
+    templates = set()
+    for instance in instances:
+        footprints = {}
+        for role, ref, fp_id in instance.members:
+            footprint = load_footprint(fp_id)
+            if not footprint:
+                break
+            footprints[role] = footprint
+        if len(footprints) < len(instance.members):
+            # Missing library footprint: the parts are placed one by one instead
+            continue
+
+        geometry = dict((role, local_geometry(fp)) for role, fp in footprints.items())
+        widths = [net_width_mm(classes.get(name, 'signal')) for name, _, _ in instance.nets]
+        layout = library.layout(instance, geometry, widths)
+        templates.add(id(layout))
+
+        # Wider than the grid: stand the block on end
+        x0, y0, x1, y1 = layout.extent()
+        rotation = 90 if x1 - x0 > GRID_COLUMNS * GRID_PITCH and y1 - y0 < x1 - x0 else 0
+        origin_x, origin_y = reserve_area(occupied_slots, layout.extent(rotation))
+
+        positions, copper = layout.place(instance, origin_x, origin_y, rotation)
+        for role, ref, _ in instance.members:
+            footprint = footprints[role]
+            footprint.SetReference(ref)
+            footprint.SetValue(components[ref]['value'])
+            footprint.SetPosition(mm_point(*positions[ref]))
+            if rotation:
+                footprint.SetOrientationDegrees(rotation)
+            board.Add(footprint)
+            comp_map[ref] = footprint
+        block_nets.update(copper)
+        if groups is not None:
+            groups.append(([ref for _, ref, _ in instance.members], sorted(copper)))
+
+    print(f"Blocks: {len(instances)} instances of {len(templates)} blocks, "
+          f"{library.misses} routed, {library.hits} from cache")
+    return block_nets
+
+def place_arrays(board, data, comp_map, occupied_slots, groups=None):
+    """
+    Places the netlist's tagged arrays of repeated parts (array_placement.py):
+    one footprint load and one slot rectangle per array, every member's
+    position and rotation from the pattern. Members already placed (in a
+    block) are left out; arrays of mixed footprints are placed part by part.
+    Each placed array is appended to groups as (refs, []).
+    """
+    from array_placement import array_layout
+
+    components = {c['ref']: c for c in data.get('components', [])}
+    arrays = placed = 0
+    for spec in data.get('arrays', []):
+        refs = [ref for ref in spec.get('refs', []) if ref in components and ref not in comp_map]
+        fp_ids = set(components[ref]['footprint'] for ref in refs)
+        if len(refs) < 2 or len(fp_ids) != 1:
+            continue
+        template = load_footprint(fp_ids.pop())
+        if not template:
+            continue
+
+        positions, extent = array_layout(spec.get('pattern', 'grid'), len(refs), local_geometry(template)["bbox"],
+                                         int(spec.get('rows') or 0), int(spec.get('cols') or 0))
+        origin_x, origin_y = reserve_area(occupied_slots, extent)
+        for index, (ref, (x, y, rotation)) in enumerate(zip(refs, positions)):
+            footprint = template if index == 0 else copy_footprint(template)
+            footprint.SetReference(ref)
+            footprint.SetValue(components[ref]['value'])
+            footprint.SetPosition(mm_point(origin_x + x, origin_y + y))
+            if rotation:
+                footprint.SetOrientationDegrees(rotation)
+            board.Add(footprint)
+            comp_map[ref] = footprint
+        if groups is not None:
+            groups.append((refs, []))
+        arrays += 1
+        placed += len(refs)
+    if arrays:
+        print(f"Arrays: {placed} parts in {arrays} arrays")
+
+def footprints_box(footprints):
+    # Union of the footprints' extents (mm): x0, y0, x1, y1
+    boxes = [fp.GetBoundingBox() for fp in footprints]
+    return (pcbnew.ToMM(min(b.GetLeft() for b in boxes)), pcbnew.ToMM(min(b.GetTop() for b in boxes)),
+            pcbnew.ToMM(max(b.GetRight() for b in boxes)), pcbnew.ToMM(max(b.GetBottom() for b in boxes)))
+
+def compact_placement(board, data, comp_map, groups, block_nets):
+    """
+    Re-packs the grid placement into the smallest board (compaction.py).
+    Every part, block and array is one rectangle; blocks and arrays move as a
+    whole (block copper with them), single parts may turn 90 degrees. The
+    corners stay free for the mounting holes. Runs before routing.
+    """
+    global _placement_extent
+    import time
+    from compaction import Unit, area_report, compact, pack_order
+
+    rect = board_rect(board)
+    if rect is None:
+        return
+    started = time.perf_counter()
+
+    # Placement units: (footprints, block copper nets), blocks and arrays first
+    units = {}
+    unit_of = {}
+    for index, (refs, nets) in enumerate(groups):
+        refs = [ref for ref in refs if ref in comp_map and ref not in unit_of]
+        if refs:
+            units[f"#{index}"] = ([comp_map[ref] for ref in refs], nets)
+            unit_of.update((ref, f"#{index}") for ref in refs)
+    for ref, fp in comp_map.items():
+        if ref not in unit_of:
+            units[ref] = ([fp], [])
+            unit_of[ref] = ref
+
+    packing_units = []
+    for key, (footprints, nets) in units.items():
+        x0, y0, x1, y1 = footprints_box(footprints)
+        packing_units.append(Unit(key, x1 - x0, y1 - y0, rotatable=len(footprints) == 1 and not nets))
+    connections = [[unit_of[node['ref']] for node in net_info['nodes'] if node['ref'] in unit_of]
+                   for net_info in data.get('nets', [])]
+
+    # Corner keep-outs: the mounting holes' extents, half a routing channel clear
+    spacing = COMPACT_SPACING_MM
+    hole = load_footprint(MOUNTING_HOLE_FP)
+    reach = max(abs(v) for v in local_geometry(hole)["bbox"]) if hole else HOLE_COURTYARD_MM
+    corner = max(0.0, HOLE_OFFSET_MM + reach - OUTLINE_MARGIN_MM + spacing / 2)
+    packing = compact(pack_order(packing_units, connections, PLACEMENT_SEED), corner, spacing, BOARD_ASPECT)
+
+    # The grid placement stays if it is no larger and clear of the mounting holes
+    before = (pcbnew.ToMM(rect.GetWidth()), pcbnew.ToMM(rect.GetHeight()))
+    after = (packing.width - spacing + 2 * OUTLINE_MARGIN_MM, packing.height - spacing + 2 * OUTLINE_MARGIN_MM)
+    holes = [(pcbnew.ToMM(x), pcbnew.ToMM(y)) for x, y in hole_positions(rect)]
+    holes_clear = not any(hx - reach < x1 and x0 < hx + reach and hy - reach < y1 and y0 < hy + reach
+                          for x0, y0, x1, y1 in (footprints_box([fp]) for fp in comp_map.values())
+                          for hx, hy in holes)
+    if holes_clear and after[0] * after[1] >= before[0] * before[1]:
+        print("Compaction: grid placement kept (no smaller packing)")
+        return
+
+    # The packed area starts where the grid placement did
+    left = pcbnew.ToMM(rect.GetLeft()) + OUTLINE_MARGIN_MM - spacing / 2
+    top = pcbnew.ToMM(rect.GetTop()) + OUTLINE_MARGIN_MM - spacing / 2
+    for key, (footprints, nets) in units.items():
+        x, y, rotated = packing.positions[key]
+        if rotated:
+            footprints[0].SetOrientationDegrees(footprints[0].GetOrientationDegrees() + 90)
+        x0, y0, _, _ = footprints_box(footprints)
+        dx, dy = left + x + spacing / 2 - x0, top + y + spacing / 2 - y0
+        offset = mm_point(dx, dy)
+        for fp in footprints:
+            pos = fp.GetPosition()
+            fp.SetPosition(pcbnew.VECTOR2I(pos.x + offset.x, pos.y + offset.y))
+        for name in nets:
+            segments, vias = block_nets[name]
+            block_nets[name] = ([(layer, ax + dx, ay + dy, bx + dx, by + dy) for layer, ax, ay, bx, by in segments],
+                                [(vx + dx, vy + dy) for vx, vy in vias])
+
+    _placement_extent = (left + spacing / 2, top + spacing / 2,
+                         left + packing.width - spacing / 2, top + packing.height - spacing / 2)
+    print(f"Compaction: {len(comp_map)} parts in {len(units)} units, {area_report(before, after)} "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def add_block_copper(board, net, copper, width_mm):
+    segments, vias = copper
+    for layer, x0, y0, x1, y1 in segments:
+        add_track(board, net, mm_point(x0, y0), mm_point(x1, y1), width_mm,
+                  pcbnew.B_Cu if layer else pcbnew.F_Cu)
+    for x, y in vias:
+        add_via(board, net, mm_point(x, y))
+
+def slots_of(footprint):
+    # Grid slots the extents of an existing footprint overlap (a compacted
+    # board is off the grid, and one part can cover several slots)
+    box = footprint.GetBoundingBox()
+
+    def cell(mm):
+        return int(math.floor((mm - GRID_ORIGIN + GRID_PITCH / 2) / GRID_PITCH))
+
+    col0, col1 = max(cell(pcbnew.ToMM(box.GetLeft())), 0), min(cell(pcbnew.ToMM(box.GetRight())), GRID_COLUMNS - 1)
+    row0, row1 = max(cell(pcbnew.ToMM(box.GetTop())), 0), cell(pcbnew.ToMM(box.GetBottom()))
+    return [row * GRID_COLUMNS + col for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+def apply_design_rules(board):
     # Setup Design Rules (Professional Tweak)
     # Wrap in try-except to be safe across API versions
     try:
@@ -83,92 +550,66 @@ def create_board(netlist_file, output_file):
             dsettings.m_ViasMinDrill = int(pcbnew.FromMM(0.3))
     except Exception as e:
         print(f"Warning: Could not set Design Rules: {e}")
-    
-    def get_or_create_net(name):
-        # Check if already exists in board
-        existing = board.FindNet(name)
-        if existing:
-            return existing
-        net = pcbnew.NETINFO_ITEM(board, name)
-        board.Add(net)
-        return net
-
-    # 3. Process Connections
-    print("Routing Connections...")
-    for net_info in nets_data:
-        net_name = net_info['name']
-        net_nodes = net_info['nodes']
-        
-        net = get_or_create_net(net_name)
-        # Net Class assignment skipped to avoid API incompatibility
-        net_map[net_name] = net
-        
-        pads_to_connect = [] 
 
-        # Assign Pads to Net
-        for node in net_nodes:
-            ref = node['ref']
-            pin = node['pin']
-            if ref in comp_map:
-                pad = comp_map[ref].FindPadByNumber(pin)
-                if pad:
-                    pad.SetNet(net)
-                    pads_to_connect.append(pad)
-
-        # 4. Create Tracks (Direct Routing with Variable Width)
-        if len(pads_to_connect) > 1:
-            for i in range(len(pads_to_connect) - 1):
-                p1 = pads_to_connect[i]
-                p2 = pads_to_connect[i+1]
-                
-                # Determine Width based on Class
-                net_cls = net_info.get('class', 'signal')
-                width_mm = 0.25
-                if net_cls == 'power': width_mm = 0.8 # GND/VCC
-                if net_cls == 'motor': width_mm = 1.2 # High Current
-                
-                # Create Track
-                track = pcbnew.PCB_TRACK(board)
-                track.SetStart(p1.GetPosition())
-                track.SetEnd(p2.GetPosition())
-                track.SetWidth(int(pcbnew.FromMM(width_mm)))
-                track.SetLayer(pcbnew.F_Cu)
-                track.SetNet(net)
-                board.Add(track)
+def plane_layer():
+    # Copper layer of the GND plane, None without one
+    return {"B.Cu": pcbnew.B_Cu, "F.Cu": pcbnew.F_Cu}.get(GND_PLANE_LAYER)
 
-    # 5. Add GND Zone
-    # Try to find a GND net
-    gnd_net = None
+def find_gnd_net(net_map):
+    # Try to find a GND net (none when the board has no GND plane)
+    if plane_layer() is None:
+        return None
     for name in net_map:
         if "GND" in name.upper() or "GROUND" in name.upper():
-            gnd_net = net_map[name]
-            break
-            
-    if gnd_net:
+            return net_map[name]
+    return None
+
+def board_rect(board):
+    # Footprint extents plus the outline margin
+    listing = [m.GetBoundingBox() for m in board.GetFootprints()]
+    if not listing:
+        return None
+    rect = listing[0]
+    for r in listing[1:]:
+        rect.Merge(r)
+    if _placement_extent:
+        # Compacted: the packed area, which keeps the mounting hole corners free
+        x0, y0, x1, y1 = _placement_extent
+        rect.Merge(mm_point(x0, y0))
+        rect.Merge(mm_point(x1, y1))
+    rect.Inflate(int(pcbnew.FromMM(OUTLINE_MARGIN_MM)))
+    return rect
+
+def hole_positions(rect):
+    hole_offset = int(pcbnew.FromMM(HOLE_OFFSET_MM))
+    return [
+        (rect.GetLeft() + hole_offset, rect.GetTop() + hole_offset),
+        (rect.GetRight() - hole_offset, rect.GetTop() + hole_offset),
+        (rect.GetRight() - hole_offset, rect.GetBottom() - hole_offset),
+        (rect.GetLeft() + hole_offset, rect.GetBottom() - hole_offset)
+    ]
+
+def add_outline_and_zones(board, gnd_net, add_preliminary_zone=True):
+    # 5. Add GND Zone
+    if gnd_net and add_preliminary_zone:
         print(f"Adding GND Zone for {gnd_net.GetNetname()}...")
         # Get Board Bounding Box
         b_bbox = board.GetBoardEdgesBoundingBox()
-        
+
         # Inflate slightly for zone coverage
         inflate = int(pcbnew.FromMM(2.0))
         b_bbox.Inflate(inflate) # Keep logic simple
-        
+
         # Create Zone
         zone = pcbnew.ZONE(board)
-        zone.SetLayer(pcbnew.B_Cu) # Bottom copper for ground plane logic
+        zone.SetLayer(plane_layer()) # Bottom copper by default (GND_PLANE_LAYER)
         zone.SetNet(gnd_net)
-        
+
         # Add basic rectangle outline
         # Using NewOutline mechanism
         poly = zone.Outline()
         outline = poly.NewOutline()
-        
-        # Define rectangle points
-        p1 = pcbnew.VECTOR2I(b_bbox.GetLeft(), b_bbox.GetTop())
-        p2 = pcbnew.VECTOR2I(b_bbox.GetRight(), b_bbox.GetTop())
-        p3 = pcbnew.VECTOR2I(b_bbox.GetRight(), b_bbox.GetBottom())
-        p4 = pcbnew.VECTOR2I(b_bbox.GetLeft(), b_bbox.GetBottom())
-        
+
         # Append logic (KiCad API varies, attempting standard poly set)
         # Note: In KiCad 7+, Append may take x, y integers
         try:
@@ -179,92 +620,272 @@ def create_board(netlist_file, output_file):
         except:
              # Fallback if API differs
              print("Warning: Could not create zone geometry (API mismatch)")
-        
+
         board.Add(zone)
         # zone.Fill() # Usually requires valid connectivity context, might fail in script
 
     # 6. Edge Cuts & Mounting Holes
-    listing = [m.GetBoundingBox() for m in board.GetFootprints()]
-    if listing:
-        rect = listing[0]
-        for r in listing[1:]:
-            rect.Merge(r)
-        
-        # Margin for routing and holes
-        margin_mm = 5
-        margin = int(pcbnew.FromMM(margin_mm))
-        rect.Inflate(margin)
-        
-        pts = [
-            (rect.GetLeft(), rect.GetTop()),
-            (rect.GetRight(), rect.GetTop()),
-            (rect.GetRight(), rect.GetBottom()),
-            (rect.GetLeft(), rect.GetBottom())
-        ]
-        
-        # Add Edge Cuts
-        for i in range(4):
-            seg = pcbnew.PCB_SHAPE(board)
-            seg.SetShape(pcbnew.SHAPE_T_SEGMENT)
-            start = pcbnew.VECTOR2I(pts[i][0], pts[i][1])
-            end = pcbnew.VECTOR2I(pts[(i+1)%4][0], pts[(i+1)%4][1])
-            seg.SetStart(start)
-            seg.SetEnd(end)
-            seg.SetLayer(pcbnew.Edge_Cuts)
-            seg.SetWidth(int(pcbnew.FromMM(0.1)))
-            board.Add(seg)
-
-        # Add Mounting Holes (M3)
-        hole_offset = int(pcbnew.FromMM(3)) # 3mm from edge
-        hole_size = int(pcbnew.FromMM(3.2)) # M3 clearance
-        
-        hole_positions = [
-            (rect.GetLeft() + hole_offset, rect.GetTop() + hole_offset),
-            (rect.GetRight() - hole_offset, rect.GetTop() + hole_offset),
-            (rect.GetRight() - hole_offset, rect.GetBottom() - hole_offset),
-            (rect.GetLeft() + hole_offset, rect.GetBottom() - hole_offset)
-        ]
-        
-        for h_pos in hole_positions:
-            try:
-                # Load generic Mounting Hole footprint
-                # "MountingHole:MountingHole_3.2mm_M3"
-                mh = pcbnew.FootprintLoad(os.path.join(KICAD_SHARE, "footprints", "MountingHole.pretty"), "MountingHole_3.2mm_M3")
-                mh.SetPosition(pcbnew.VECTOR2I(h_pos[0], h_pos[1]))
-                board.Add(mh)
-            except:
-                print("Warning: Could not add mounting hole (footprint not found)")
+    # Margin for routing and holes
+    rect = board_rect(board)
+    if rect is None:
+        return
+
+    pts = [
+        (rect.GetLeft(), rect.GetTop()),
+        (rect.GetRight(), rect.GetTop()),
+        (rect.GetRight(), rect.GetBottom()),
+        (rect.GetLeft(), rect.GetBottom())
+    ]
+
+    # Add Edge Cuts
+    for i in range(4):
+        seg = pcbnew.PCB_SHAPE(board)
+        seg.SetShape(pcbnew.SHAPE_T_SEGMENT)
+        start = pcbnew.VECTOR2I(pts[i][0], pts[i][1])
+        end = pcbnew.VECTOR2I(pts[(i+1)%4][0], pts[(i+1)%4][1])
+        seg.SetStart(start)
+        seg.SetEnd(end)
+        seg.SetLayer(pcbnew.Edge_Cuts)
+        seg.SetWidth(int(pcbnew.FromMM(0.1)))
+        board.Add(seg)
+
+    # Add Mounting Holes (M3), 3mm from edge
+    for h_pos in hole_positions(rect):
+        try:
+            # Load generic Mounting Hole footprint
+            # "MountingHole:MountingHole_3.2mm_M3"
+            mh = pcbnew.FootprintLoad(os.path.join(FP_LIB_PATH, "MountingHole.pretty"), "MountingHole_3.2mm_M3")
+            mh.SetPosition(pcbnew.VECTOR2I(h_pos[0], h_pos[1]))
+            board.Add(mh)
+        except:
+            print("Warning: Could not add mounting hole (footprint not found)")
 
     # 7. Add Zone (Moved to after Edge Cuts for better filling logic)
     if gnd_net:
         print(f"Adding GND Zone for {gnd_net.GetNetname()}...")
-        
+
         zone = pcbnew.ZONE(board)
-        zone.SetLayer(pcbnew.B_Cu) 
+        zone.SetLayer(plane_layer())
         zone.SetNet(gnd_net)
         zone.SetMinThickness(int(pcbnew.FromMM(0.25)))
-        
+
         poly = zone.Outline()
         outline = poly.NewOutline()
-        
+
         # Use simple inflated rect
         zone_rect = rect
         # zone_rect.Inflate(int(pcbnew.FromMM(-0.5))) # Pull back slightly from edge
-        
+
         poly.Append(zone_rect.GetLeft(), zone_rect.GetTop())
         poly.Append(zone_rect.GetRight(), zone_rect.GetTop())
         poly.Append(zone_rect.GetRight(), zone_rect.GetBottom())
         poly.Append(zone_rect.GetLeft(), zone_rect.GetBottom())
-        
+
         board.Add(zone)
         # Try to fill if possible (requires zones to be closed)
         # zone.Fill(board.GetConnectivity()) # KiCad 7+ logic is complex here
         # board.BuildConnectivity()
 
+def create_board(netlist_file, output_file, block_cache=None):
+    # netlist_file may be a JSON file, a binary netlist file or "-" (binary on stdin)
+    print(f"Loading netlist from {'stdin' if netlist_file == '-' else netlist_file}...")
+    data = load_netlist(netlist_file)
+
+    components_data = data.get('components', [])
+    nets_data = data.get('nets', [])
+
+    # Create a new board
+    board = pcbnew.BOARD()
+
+    # 1. Add Components & Grid Placement: pre-routed blocks first, then arrays, then the rest
+    comp_map = {}
+    occupied_slots = set()
+    block_nets = {}
+    groups = []
+    if USE_BLOCKS:
+        from blocks import BlockLibrary
+        block_nets = place_blocks(board, data, comp_map, occupied_slots, BlockLibrary(block_cache), groups)
+    if USE_ARRAYS:
+        place_arrays(board, data, comp_map, occupied_slots, groups)
+    place_components(board, components_data, comp_map, occupied_slots)
+    if COMPACT_PLACEMENT:
+        compact_placement(board, data, comp_map, groups, block_nets)
+
+    # 2. PROPER NET CREATION
+    net_map = {}
+    apply_design_rules(board)
+
+    # 3. Process Connections
+    print("Routing Connections...")
+    net_jobs = []
+    for net_info in nets_data:
+        net_name = net_info['name']
+        net = get_or_create_net(board, net_name)
+        # Net Class assignment skipped to avoid API incompatibility
+        net_map[net_name] = net
+
+        # Assign Pads to Net
+        nodes = [(node['ref'], node['pin']) for node in net_info['nodes']]
+        pads_to_connect = assign_pads(net, nodes, comp_map)
+        width_mm = net_width_mm(net_info.get('class', 'signal'))
+        if net_name in block_nets:
+            # Routed inside its block; only the stitching between blocks is left to the router
+            add_block_copper(board, net, block_nets[net_name], width_mm)
+            continue
+        net_jobs.append((net, pads_to_connect, width_mm))
+
+    # 4. Create Tracks (all nets routed together, with variable width)
+    route_nets(board, net_jobs)
+    gnd_net = find_gnd_net(net_map)
+    optimize_tracks(board, [gnd_net.GetNetname()] if gnd_net else [])
+
+    add_outline_and_zones(board, gnd_net)
+
+    save_board(board, output_file)
+
+def save_board(board, output_file):
     pcbnew.SaveBoard(output_file, board)
+    if DETERMINISTIC_OUTPUT:
+        # Stable UUIDs and item order: the same netlist gives the same bytes
+        from deterministic import canonicalize_board_file
+        canonicalize_board_file(output_file)
+    write_placement(board, os.path.join(os.path.dirname(os.path.abspath(output_file)), PLACEMENT_FILENAME))
+
+def write_placement(board, path):
+    """
+    Final position, rotation and side of every referenced footprint plus the
+    board outline (mm, board coordinates), so the assembly export
+    (src/assembly_export.py) never has to load the board again.
+    """
+    edges = board.GetBoardEdgesBoundingBox()
+    parts = []
+    for fp in board.GetFootprints():
+        ref = fp.GetReference()
+        if not ref:
+            continue # Mounting holes
+        pos = fp.GetPosition()
+        parts.append({
+            "ref": ref,
+            "footprint": fp.GetFPIDAsString(),
+            "x": round(pcbnew.ToMM(pos.x), 4),
+            "y": round(pcbnew.ToMM(pos.y), 4),
+            "rotation": round(fp.GetOrientationDegrees() % 360, 3),
+            "side": "bottom" if fp.IsFlipped() else "top",
+        })
+    parts.sort(key=lambda p: p["ref"])
+    outline = [round(pcbnew.ToMM(v), 4) for v in (edges.GetLeft(), edges.GetTop(), edges.GetRight(), edges.GetBottom())]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"units": "mm", "outline": outline, "parts": parts}, f, indent=1, sort_keys=True)
+
+def revise_board(netlist_file, output_file, base_board_file, base_netlist_file):
+    """
+    Incremental regeneration: starts from a previous revision's board, keeps
+    the placement and copper of everything the netlist diff says is unchanged,
+    and only places / routes added or changed parts and nets.
+    """
+    from netlist_diff import diff_netlists
+
+    print(f"Loading netlist from {'stdin' if netlist_file == '-' else netlist_file}...")
+    data = load_netlist(netlist_file)
+    old_data = load_netlist(base_netlist_file)
+    diff = diff_netlists(old_data, data)
+    print(f"Revision diff: kept {len(diff['ref_map'])}, added {diff['added']}, removed {diff['removed']}")
+
+    components_data = data.get('components', [])
+    nets_data = data.get('nets', [])
+
+    board = pcbnew.LoadBoard(base_board_file)
+    old_refs = set(c['ref'] for c in old_data.get('components', []))
+
+    # 1. Keep unchanged footprints (renamed to their new refs); drop removed
+    # parts and the generated mounting holes, which are re-added for the new outline
+    comp_map = {}
+    occupied_slots = set()
+    for fp in list(board.GetFootprints()):
+        ref = fp.GetReference()
+        if ref in diff['ref_map']:
+            new_ref = diff['ref_map'][ref]
+            fp.SetReference(new_ref)
+            comp_map[new_ref] = fp
+            occupied_slots.update(slots_of(fp))
+        elif ref in old_refs or not ref or "MountingHole" in fp.GetFPIDAsString():
+            board.Remove(fp)
+
+    # 2. Keep copper of identical / extended nets, rip up everything else.
+    # Outline and zones are cheap to rebuild, so they always are.
+    keep_net_names = {}
+    for old_name, new_name in diff['net_map'].items():
+        keep_net_names[old_name] = new_name
+    for new_name, info in diff['extended_nets'].items():
+        keep_net_names[info['base']] = new_name
+
+    net_map = {}
+    for net_info in nets_data:
+        net_map[net_info['name']] = get_or_create_net(board, net_info['name'])
+
+    for track in list(board.GetTracks()):
+        new_name = keep_net_names.get(track.GetNetname())
+        if new_name is None:
+            board.Remove(track)
+        else:
+            track.SetNet(net_map[new_name])
+    for zone in list(board.Zones()):
+        board.Remove(zone)
+    for drawing in list(board.GetDrawings()):
+        if drawing.GetLayer() == pcbnew.Edge_Cuts:
+            board.Remove(drawing)
+
+    # Pads of kept parts get their nets re-assigned from the new netlist below
+    for fp in comp_map.values():
+        for pad in fp.Pads():
+            pad.SetNetCode(0)
+
+    # 3. Place only new components on free grid slots
+    place_components(board, components_data, comp_map, occupied_slots)
+    apply_design_rules(board)
+
+    # 4. Route only what changed
+    print("Routing Connections...")
+    rerouted = set(diff['reroute_nets'])
+    net_jobs = []
+    joined = {}
+    for net_info in nets_data:
+        net_name = net_info['name']
+        net = net_map[net_name]
+        nodes = [(node['ref'], node['pin']) for node in net_info['nodes']]
+        pads = assign_pads(net, nodes, comp_map)
+        width_mm = net_width_mm(net_info.get('class', 'signal'))
+
+        if net_name in rerouted:
+            net_jobs.append((net, pads, width_mm))
+        elif net_name in diff['extended_nets']:
+            # Existing copper stays and connects the old pads; only the new pads are routed onto it
+            added = set(tuple(n) for n in diff['extended_nets'][net_name]['added_nodes'])
+            existing = [pad for pad in pads if (pad.GetParentFootprint().GetReference(), pad.GetNumber()) not in added]
+            new_pads = [pad for pad in pads if (pad.GetParentFootprint().GetReference(), pad.GetNumber()) in added]
+            if existing and new_pads:
+                net_jobs.append((net, existing + new_pads, width_mm))
+                joined[net_name] = len(existing)
+
+    # Kept copper is routed around
+    route_nets(board, net_jobs, joined)
+    gnd_net = find_gnd_net(net_map)
+    optimize_tracks(board, [gnd_net.GetNetname()] if gnd_net else [])
+
+    add_outline_and_zones(board, gnd_net, add_preliminary_zone=False)
+
+    save_board(board, output_file)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python kicad_script.py <netlist> <output>")
+    parser = argparse.ArgumentParser(usage="python kicad_script.py <netlist|-> <output> [--base BOARD NETLIST] [--block-cache DIR]")
+    parser.add_argument("netlist")
+    parser.add_argument("output")
+    parser.add_argument("--base", nargs=2, metavar=("BOARD", "NETLIST"),
+                        help="Previous revision to update incrementally")
+    parser.add_argument("--block-cache", help="Directory of routed block layouts shared between boards")
+    args = parser.parse_args()
+
+    if args.base:
+        revise_board(args.netlist, args.output, args.base[0], args.base[1])
     else:
-        create_board(sys.argv[1], sys.argv[2])
+        create_board(args.netlist, args.output, args.block_cache)
@@ -1,119 +1,577 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
 import os
-import subprocess
+
+from src import jobs
+from src import metrics
+from src import pipeline
+from src.admission import AdmissionController, AdmissionRejected
+from src.job_queue import FINAL_STATES, get_job_queue
+from src.singleflight import SingleFlight, netlist_key, normalize_prompt
 
 app = FastAPI()
 
 class DesignRequest(BaseModel):
     prompt: str
+    # Job id of a previous revision; only the parts that changed are re-placed / re-routed
+    base_job: Optional[str] = None
+    # Build this many board variants and return the best, the others as alternatives
+    # (see src/explore.py); explore_budget caps the time spent on them (s)
+    explore: Optional[int] = None
+    explore_budget: Optional[float] = None
+
+class PartMove(BaseModel):
+    ref: str
+    x: float # mm
+    y: float
+    rotation: Optional[float] = None # degrees; None keeps the current rotation
+
+class RatsnestMoveRequest(BaseModel):
+    moves: List[PartMove]
+
+class PanelRequest(BaseModel):
+    cols: int = 2
+    rows: int = 2
+    separation: str = "mousebites" # or "vscore"
+    gap: float = 2.0 # mm between boards (mouse bites only)
+    rail: float = 5.0 # mm, 0 for no frame
+    fiducials: bool = True
+    tab_width: float = 3.0 # mm, mouse-bite tabs
+    tabs_per_edge: Optional[int] = None
+
+# Identical concurrent work is coalesced (see src/singleflight.py): /generate
+# calls with the same prompt share one run, and any two requests that end up
+# with the same netlist share one KiCad board build and Gerber export.
+prompt_flight = SingleFlight("prompt")
+build_flight = SingleFlight("build")
+gerber_flight = SingleFlight("gerbers")
+_build_jobs: Dict[Any, str] = {} # build key -> job id of the in-flight build
+
+# Bounds concurrent KiCad processes (see src/admission.py)
+admission = AdmissionController()
+
+metrics.Gauge("admission_running", "Builds holding a KiCad worker slot", callback=lambda: admission.running)
+metrics.Gauge("admission_queued", "Builds waiting for a KiCad worker slot", callback=lambda: admission.queued())
+metrics.Gauge("singleflight_build_in_flight", "Distinct board builds in flight", callback=build_flight.in_flight)
+
+# Proxies in front of the service that append the caller's address to
+# X-Forwarded-For (Cloud Run: 1). With 0 the header is ignored and clients are
+# told apart by socket address, which behind a proxy is the proxy's.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+def _client_id(http_request: Request) -> str:
+    if TRUSTED_PROXY_HOPS > 0:
+        # The address the outermost trusted proxy saw; entries left of it are
+        # whatever the client sent and can't be trusted
+        forwarded = [a.strip() for a in http_request.headers.get("x-forwarded-for", "").split(",") if a.strip()]
+        if forwarded:
+            return forwarded[max(0, len(forwarded) - TRUSTED_PROXY_HOPS)]
+    return http_request.client.host if http_request.client else "unknown"
+
+def _busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# With JOB_QUEUE_BACKEND=sqlite jobs run on src/worker.py processes instead of here
+job_queue = get_job_queue()
+QUEUE_POLL_SECONDS = float(os.getenv("JOB_QUEUE_POLL", "0.5"))
+
+def _admit(client_id: str) -> None:
+    if job_queue is not None and job_queue.pending() >= admission.max_queued:
+        raise AdmissionRejected("queue_full", admission.retry_after())
+    admission.check()
+    admission.enter_client(client_id)
+
+async def _enqueue(prompt, base_job, explore=None) -> str:
+    job_id = jobs.new_job_id()
+    payload = {"prompt": prompt, "base_job": base_job}
+    if explore:
+        payload["explore"] = explore
+    await run_in_threadpool(job_queue.enqueue, job_id, payload)
+    return job_id
+
+async def _wait_queued(job_id):
+    while True:
+        job = await run_in_threadpool(job_queue.get, job_id)
+        if job["status"] in FINAL_STATES:
+            return job
+        await asyncio.sleep(QUEUE_POLL_SECONDS)
+
+def _queued_result(job):
+    if job["status"] == "done":
+        return job["result"]
+    if job["status"] == "cancelled":
+        raise pipeline.PipelineCancelled("Job cancelled")
+    # Failures the worker classified are raised as they would be in-process
+    data = job.get("error_data") or {}
+    if job.get("error_kind") == "timeout":
+        raise pipeline.PipelineTimeout(data["stage"], data["seconds"])
+    if job.get("error_kind") == "preflight":
+        raise pipeline.PreflightFailed(data["problems"])
+    raise pipeline.PipelineError(job["error"] or "Job failed")
+
+def _build_key(netlist, base_job):
+    return (netlist_key(netlist), base_job or "")
+
+async def _gerbers(pcb_path, job_dir, job_id, cancel_event, ticket, timings):
+    try:
+        return await run_in_threadpool(pipeline.timed, timings, "gerbers", pipeline.gerber_stage,
+                                       pcb_path, job_dir, cancel_event)
+    finally:
+        admission.release(ticket)
+        jobs.unregister_job(job_id)
+
+async def start_build(netlist, base_job, on_job=None):
+    """
+    Runs (or attaches to) the board stage for a netlist. Returns (build, shared).
+    The leader starts the Gerber export as soon as the board exists; callers
+    wait for it with wait_gerbers(). on_job(job_id) is called before the
+    build starts.
+    """
+    key = _build_key(netlist, base_job)
+    # Callers of the same in-flight build all see the leader's job id. The id
+    # is reserved right before the flight starts (no await in between), and
+    # the leader drops it when the board stage ends, however it ends.
+    job_id = _build_jobs.setdefault(key, jobs.new_job_id())
+    if on_job is not None:
+        on_job(job_id)
+
+    async def lead():
+        cancel_event = jobs.register_job(job_id)
+        ticket = None
+        timings = {}
+        try:
+            # The KiCad slot is held through the Gerber export
+            ticket = await admission.acquire()
+            job_dir = jobs.job_dir(job_id, create=True)
+            base_dir = pipeline.base_revision(base_job)
+            pcb_path = await run_in_threadpool(pipeline.timed, timings, "board", pipeline.board_stage,
+                                               netlist, job_dir, cancel_event, base_dir)
+            revision = None
+            if base_dir:
+                revision = dict(base_job=base_job, **pipeline.revision_summary(netlist, base_dir))
+            ratsnest = await run_in_threadpool(pipeline.timed, timings, "ratsnest", pipeline.ratsnest_stage, pcb_path)
+        except BaseException:
+            if ticket is not None:
+                admission.release(ticket)
+            jobs.unregister_job(job_id)
+            raise
+        finally:
+            _build_jobs.pop(key, None)
+
+        gerbers = asyncio.ensure_future(_gerbers(pcb_path, job_dir, job_id, cancel_event, ticket, timings))
+        # Nobody may be left to await it; don't warn about unretrieved exceptions
+        gerbers.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return {"job_id": job_id, "pcb_path": pcb_path, "revision": revision, "ratsnest": ratsnest,
+                "gerbers": gerbers, "timings": timings}
+
+    return await build_flight.do(key, lead, on_abandon=lambda: jobs.cancel_job(job_id))
+
+async def wait_gerbers(build):
+    async def wait():
+        return await build["gerbers"]
+    job_id = build["job_id"]
+    gerber_zip, _ = await gerber_flight.do(job_id, wait, on_abandon=lambda: jobs.cancel_job(job_id))
+    return gerber_zip
+
+async def _explore(prompt, parsed_data, netlist, problems, timings, options):
+    """
+    Exploration mode: the variants run on one KiCad slot plus whichever
+    slots are idle, then the best variant goes through the Gerber export.
+    """
+    from src import explore
+
+    # Every variant's job id cancels the whole run: any of them may come back
+    # as the response's job_id
+    job_ids = explore.variant_job_ids(jobs.new_job_id(), options["variants"])
+    cancel_event = jobs.register_job(job_ids[0])
+    for variant_id in job_ids[1:]:
+        jobs.register_job(variant_id, cancel_event)
+    tickets = []
+    try:
+        tickets.append(await admission.acquire())
+        while len(tickets) < options["variants"]:
+            ticket = admission.try_acquire()
+            if ticket is None:
+                break
+            tickets.append(ticket)
+        ranked, summary = await run_in_threadpool(pipeline.timed, timings, "explore", explore.explore_board,
+                                                  netlist, job_ids[0], options["variants"], options["budget"],
+                                                  cancel_event, len(tickets), job_ids)
+        # Only one slot is needed from here on
+        for ticket in tickets[1:]:
+            admission.release(ticket)
+        del tickets[1:]
+
+        best = ranked[0]
+        ratsnest = await run_in_threadpool(pipeline.timed, timings, "ratsnest", pipeline.ratsnest_stage,
+                                           best["pcb_file"])
+        gerber_zip = await run_in_threadpool(pipeline.timed, timings, "gerbers", pipeline.gerber_stage,
+                                             best["pcb_file"], jobs.job_dir(best["job_id"]), cancel_event)
+    finally:
+        for ticket in tickets:
+            admission.release(ticket)
+        for variant_id in job_ids:
+            jobs.unregister_job(variant_id)
+
+    build = {"job_id": best["job_id"], "pcb_path": best["pcb_file"], "revision": None,
+             "ratsnest": ratsnest, "timings": {}}
+    result = await _finish(prompt, parsed_data, netlist, build, gerber_zip, timings, problems)
+    result.update(explore.exploration_result(ranked, summary))
+    return result
+
+async def _generate(prompt, base_job, explore=None):
+    if job_queue is not None:
+        return _queued_result(await _wait_queued(await _enqueue(prompt, base_job, explore)))
+
+    timings = {}
+    parsed_data = await run_in_threadpool(pipeline.timed, timings, "parse", pipeline.parse_stage, prompt)
+    if not parsed_data.get("components"):
+        return pipeline.empty_result(parsed_data)
+
+    netlist = await run_in_threadpool(pipeline.timed, timings, "netlist", pipeline.netlist_stage, parsed_data)
+    netlist, problems = pipeline.timed(timings, "preflight", pipeline.preflight_stage, netlist)
+    if explore:
+        return await _explore(prompt, parsed_data, netlist, problems, timings, explore)
+    build, _ = await start_build(netlist, base_job)
+    gerber_zip = await wait_gerbers(build)
+    return await _finish(prompt, parsed_data, netlist, build, gerber_zip, timings, problems)
+
+async def _finish(prompt, parsed_data, netlist, build, gerber_zip, timings, problems=None):
+    # Final response body; the design goes into the history first
+    timings.update(build["timings"])
+    await run_in_threadpool(pipeline.record_design, build["job_id"], prompt, parsed_data, netlist,
+                            build["pcb_path"], gerber_zip, timings)
+    result = pipeline.success_result(build["job_id"], parsed_data, netlist, build["pcb_path"], gerber_zip)
+    result["ratsnest"] = build["ratsnest"]
+    result["timings"] = timings
+    if build["revision"]:
+        result["revision"] = build["revision"]
+    if problems:
+        result["preflight"] = problems
+    return result
 
 @app.post("/generate")
-async def generate_design(request: DesignRequest):
+async def generate_design(request: DesignRequest, http_request: Request):
+    from src.explore import explore_options
+
+    explore = explore_options(request.explore, request.explore_budget)
+    if explore and request.base_job:
+        raise HTTPException(status_code=400, detail="explore cannot be combined with base_job")
+    client_id = _client_id(http_request)
+    try:
+        _admit(client_id)
+    except AdmissionRejected as e:
+        raise _busy(e)
+
+    key = (normalize_prompt(request.prompt), request.base_job or "",
+           json.dumps(explore, sort_keys=True) if explore else "")
+    try:
+        result, shared = await prompt_flight.do(key, lambda: _generate(request.prompt, request.base_job, explore))
+    except AdmissionRejected as e:
+        raise _busy(e)
+    except pipeline.PipelineTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except pipeline.PreflightFailed as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "problems": e.problems})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.leave_client(client_id)
+    if shared:
+        result = dict(result, coalesced=True)
+    return result
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate/stream")
+async def generate_design_stream(request: DesignRequest, http_request: Request):
+    """
+    Same pipeline as /generate, but emits a Server-Sent Event as each stage
+    completes (parsed, netlist, job, board, gerbers, done) so clients can show
+    partial results and download artifacts as soon as they exist. A netlist
+    that fails preflight ends the stream with a preflight event instead.
+    Closing the connection or DELETE /jobs/{job_id} cancels the job (a build
+    shared with other requests keeps running until its last client leaves).
+    """
+    from fastapi.responses import StreamingResponse
+    from src.explore import explore_options
+
+    # Variants have no stage events to stream
+    if explore_options(request.explore, request.explore_budget):
+        raise HTTPException(status_code=400, detail="explore is only supported on /generate")
+    # Reject before the stream starts so clients get a real 429
+    client_id = _client_id(http_request)
     try:
-        # Call NLP Parser
-        from src.nlp_parser import parse_requirements
-        parsed_data = parse_requirements(request.prompt)
-        parsed_data = parse_requirements(request.prompt)
-        print(f"Parsed Data: {parsed_data}")
-        
-        # Debug Log
+        _admit(client_id)
+    except AdmissionRejected as e:
+        raise _busy(e)
+
+    async def queued_events():
+        # Relay the stage events the worker records, then the final outcome
         try:
-            with open("server_debug.log", "a", encoding="utf-8") as logutils:
-                logutils.write(f"--- Request ---\n")
-                logutils.write(f"Prompt: {request.prompt}\n")
-                logutils.write(f"Parsed: {parsed_data}\n")
+            job_id = await _enqueue(request.prompt, request.base_job)
+            yield _sse("job", {"job_id": job_id})
+            after = 0
+            try:
+                while True:
+                    job = await run_in_threadpool(job_queue.get, job_id)
+                    for event in await run_in_threadpool(job_queue.events, job_id, after):
+                        after = event["id"]
+                        yield _sse(event["event"], event["data"])
+                    if job["status"] in FINAL_STATES:
+                        break
+                    await asyncio.sleep(QUEUE_POLL_SECONDS)
+            except asyncio.CancelledError:
+                await run_in_threadpool(job_queue.cancel, job_id)
+                raise
+            yield _sse("done", _queued_result(job))
+        except pipeline.PipelineCancelled:
+            yield _sse("cancelled", {})
+        except pipeline.PipelineTimeout as e:
+            yield _sse("timeout", {"detail": str(e), "stage": e.stage, "seconds": e.seconds})
+        except pipeline.PreflightFailed as e:
+            yield _sse("preflight", {"detail": str(e), "problems": e.problems})
         except Exception as e:
-            print(f"Logging failed: {e}")
-        
-        if not parsed_data.get("components"):
-            return {
-                "status": "warning",
-                "message": "No components detected in your prompt. Please be more specific (e.g., 'Add a resistor and LED').",
-                "parsed_data": parsed_data,
-                "netlist": {"components": [], "nets": []},
-                "pcb_file": None,
-                "logs": [
-                    "Parsing requirement...",
-                    "WARNING: No components found in the text.",
-                    "Try referencing specific parts like 'LM7805', 'Resistor', 'Capacitor'."
-                ],
-                "download_url": None
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            admission.leave_client(client_id)
+
+    async def events():
+        try:
+            timings = {}
+            parsed_data = await run_in_threadpool(pipeline.timed, timings, "parse", pipeline.parse_stage, request.prompt)
+            yield _sse("parsed", {"parsed_data": parsed_data})
+            if not parsed_data.get("components"):
+                yield _sse("done", pipeline.empty_result(parsed_data))
+                return
+
+            netlist = await run_in_threadpool(pipeline.timed, timings, "netlist", pipeline.netlist_stage, parsed_data)
+            netlist, problems = pipeline.timed(timings, "preflight", pipeline.preflight_stage, netlist)
+            yield _sse("netlist", {"netlist": netlist, "preflight": problems})
+
+            # The build reports its job id before the board stage; a client
+            # leaving at any point detaches from it like any other waiter
+            announced = asyncio.get_running_loop().create_future()
+            build_task = asyncio.ensure_future(start_build(netlist, request.base_job, announced.set_result))
+            try:
+                await asyncio.wait((announced, build_task), return_when=asyncio.FIRST_COMPLETED)
+                if announced.done():
+                    yield _sse("job", {"job_id": announced.result()})
+                build, shared = await build_task
+            finally:
+                build_task.cancel()
+            job_id = build["job_id"]
+            board_event = {
+                "job_id": job_id,
+                "pcb_file": build["pcb_path"],
+                "download_url": jobs.job_url(job_id, pipeline.PCB_FILENAME),
+                "preview_url": jobs.job_url(job_id, pipeline.PREVIEW_FILENAME),
+                "ratsnest": build["ratsnest"],
+                "coalesced": shared
             }
+            if build["revision"]:
+                board_event["revision"] = build["revision"]
+            yield _sse("board", board_event)
 
-        # Generate Schematic (Netlist)
-        from src.schematic_generator import generate_schematic
-        netlist = generate_schematic(
-            parsed_data.get("components", []), 
-            parsed_data.get("connections", [])
-        )
-        
-        # Save Netlist to JSON for KiCad Script
-        import json
-        netlist_file = "netlist.json"
-        with open(netlist_file, "w") as f:
-            json.dump(netlist, f, indent=2)
-
-        # Generate PCB Layout using KiCad Script
-        output_file = "design.kicad_pcb"
-        # Determine KiCad Python Executable based on OS/ENV
-        default_kicad_py = r"C:\Program Files\KiCad\9.0\bin\python.exe"
-        if os.name != 'nt':
-            default_kicad_py = "/usr/bin/python3" # Typical linux path
-            
-        kicad_python = os.getenv("KICAD_PYTHON_EXE", default_kicad_py)
-        script_path = "src/kicad_script.py"
-        
-        print(f"Running KiCad script: {kicad_python} {script_path}")
-        cmd = [kicad_python, script_path, netlist_file, output_file]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        print("STDOUT:", result.stdout)
-        print("STDERR:", result.stderr)
-        
-        if result.returncode != 0:
-             raise Exception(f"KiCad script failed: {result.stderr}")
-            
-        # Verify output exists
-        if not os.path.exists(output_file):
-             raise Exception("KiCad script finished but no PCB file created.")
-
-        # Logs update
-        logs = [
-            "Parsing requirements...",
-            f"Identified components: {len(parsed_data.get('components', []))}",
-            "Generating netlist...",
-            "Executing KiCad Automation Script...",
-            "Placing footprints...",
-            "Routing tracks...",
-            f"Generated {output_file}"
-        ]
-            
-        # Generate Gerbers
-        from src.pcb_layout_generator import generate_gerbers
-        import shutil
-        
-        gerber_dir = "gerbers"
-        gerber_zip = "design_gerbers" # shutil adds .zip automatically
-        gerber_generated = generate_gerbers(output_file, gerber_dir)
-        
-        gerber_url = None
-        if gerber_generated:
-            shutil.make_archive(gerber_zip, 'zip', gerber_dir)
-            gerber_url = f"/download/{gerber_zip}.zip"
-            
-        return {
-            "status": "success", 
-            "message": "Design generated successfully", 
-            "parsed_data": parsed_data,
-            "netlist": netlist,
-            "pcb_file": output_file,
-            "logs": logs + [f"Gerber generation: {'Success' if gerber_generated else 'Failed'}"],
-            "download_url": f"/download/{output_file}",
-            "gerber_url": gerber_url
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            gerber_zip = await wait_gerbers(build)
+            yield _sse("gerbers", {
+                "gerber_url": jobs.job_url(job_id, os.path.basename(gerber_zip)) if gerber_zip else None
+            })
+
+            yield _sse("done", await _finish(request.prompt, parsed_data, netlist, build, gerber_zip, timings,
+                                             problems))
+        except pipeline.PipelineCancelled:
+            yield _sse("cancelled", {})
+        except pipeline.PipelineTimeout as e:
+            yield _sse("timeout", {"detail": str(e), "stage": e.stage, "seconds": e.seconds})
+        except pipeline.PreflightFailed as e:
+            yield _sse("preflight", {"detail": str(e), "problems": e.problems})
+        except AdmissionRejected as e:
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            admission.leave_client(client_id)
+
+    return StreamingResponse(
+        events() if job_queue is None else queued_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: DesignRequest, http_request: Request):
+    """
+    Queues a job and returns immediately; poll GET /jobs/{job_id} for the result.
+    Only available with a job queue backend.
+    """
+    from src.explore import explore_options
+
+    if job_queue is None:
+        raise HTTPException(status_code=501, detail="Job queue not configured (JOB_QUEUE_BACKEND=local)")
+    explore = explore_options(request.explore, request.explore_budget)
+    if explore and request.base_job:
+        raise HTTPException(status_code=400, detail="explore cannot be combined with base_job")
+    try:
+        _admit(_client_id(http_request))
+    except AdmissionRejected as e:
+        raise _busy(e)
+    # Only the enqueue is bounded per client; the work itself runs elsewhere
+    admission.leave_client(_client_id(http_request))
+    job_id = await _enqueue(request.prompt, request.base_job, explore)
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+@app.post("/jobs/{job_id}/panel")
+async def panelize_job(job_id: str, request: PanelRequest):
+    """
+    Step-and-repeat panel Gerbers for a finished job (see src/panelize.py).
+    """
+    from src.panelize import PanelError, panelize_job as build_panel
+    try:
+        job_dir = jobs.job_dir(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        info = await run_in_threadpool(build_panel, job_dir, pipeline.GERBER_DIRNAME, **request.model_dump())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Job has no Gerbers")
+    except PanelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return dict(info, panel_url=jobs.job_url(job_id, info["zip"]))
+
+# Loaded ratsnests, so part moves only recompute the nets they touch
+RATSNEST_CACHE_SIZE = 32
+_ratsnests: "OrderedDict[str, Any]" = OrderedDict()
+
+async def _job_ratsnest(job_id: str):
+    from src.ratsnest import Ratsnest
+    pcb_path = jobs.job_file(job_id, pipeline.PCB_FILENAME)
+    if not pcb_path:
+        raise HTTPException(status_code=404, detail="Job has no board")
+    rats = _ratsnests.get(job_id)
+    if rats is None:
+        rats = await run_in_threadpool(Ratsnest.from_board, pcb_path)
+        _ratsnests[job_id] = rats
+        while len(_ratsnests) > RATSNEST_CACHE_SIZE:
+            _ratsnests.popitem(last=False)
+    _ratsnests.move_to_end(job_id)
+    return rats
+
+@app.get("/jobs/{job_id}/ratsnest")
+async def get_ratsnest(job_id: str):
+    """
+    Pads and airwires of a job's board as flat arrays (see src/ratsnest.py).
+    """
+    rats = await _job_ratsnest(job_id)
+    return rats.payload()
+
+@app.post("/jobs/{job_id}/ratsnest/move")
+async def move_parts(job_id: str, request: RatsnestMoveRequest):
+    """
+    Moves parts on the (in-memory) ratsnest and returns the updated payload;
+    only the nets on the moved parts' pads are recomputed.
+    """
+    rats = await _job_ratsnest(job_id)
+    updated = set()
+    for move in request.moves:
+        try:
+            updated.update(rats.move(move.ref, move.x, move.y, move.rotation))
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Unknown part {move.ref}")
+    return dict(rats.payload(), updated_nets=sorted(updated))
+
+@app.get("/jobs/{job_id}/preview.{fmt}")
+async def get_preview(job_id: str, fmt: str, request: Request, layer: str = "all"):
+    """
+    SVG / PNG render of a job's board, cached by board content hash
+    (see src/board_preview.py). layer is "all", a layer name or a comma list.
+    """
+    from src import board_preview as preview
+    from src.downloads import file_response
+    pcb_path = jobs.job_file(job_id, pipeline.PCB_FILENAME)
+    if not pcb_path:
+        raise HTTPException(status_code=404, detail="Job has no board")
+    if fmt not in ("svg", "png"):
+        raise HTTPException(status_code=404, detail="File not found")
+    if fmt == "png" and preview.cairosvg is None:
+        raise HTTPException(status_code=501, detail="PNG previews need the cairosvg package")
+    try:
+        path = await run_in_threadpool(preview.board_preview, pcb_path, layer, fmt)
+    except preview.PreviewError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = "image/svg+xml" if fmt == "svg" else "image/png"
+    return await run_in_threadpool(file_response, request, path, f"preview.{fmt}", False, media_type, "inline")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = None
+    if job_queue is not None and jobs.is_valid_job_id(job_id):
+        job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    cancelled = jobs.cancel_job(job_id)
+    if not cancelled and job_queue is not None and jobs.is_valid_job_id(job_id):
+        cancelled = await run_in_threadpool(job_queue.cancel, job_id)
+    if not cancelled:
+        raise HTTPException(status_code=404, detail="Job not running")
+    return {"status": "cancelling", "job_id": job_id}
+
+def _design_store():
+    from src.design_store import get_design_store
+    store = get_design_store()
+    if store is None:
+        raise HTTPException(status_code=501, detail="Design store disabled (DESIGN_STORE_PATH is empty)")
+    return store
+
+@app.get("/designs")
+async def list_designs(limit: int = 50, cursor: Optional[int] = None, component: List[str] = Query([]),
+                       prompt: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None):
+    """
+    Design history, newest first (see src/design_store.py). Pass next_cursor
+    back as cursor for the next page. component (repeatable) keeps designs
+    containing every named part; prompt finds earlier runs of a prompt;
+    since / until are Unix times.
+    """
+    store = _design_store()
+    designs, next_cursor = await run_in_threadpool(store.page, limit, cursor, component, prompt, since, until)
+    return {"designs": designs, "next_cursor": next_cursor}
+
+@app.get("/designs/{job_id}")
+async def get_design(job_id: str):
+    store = _design_store()
+    design = await run_in_threadpool(store.get, job_id)
+    if design is None:
+        raise HTTPException(status_code=404, detail="Design not found")
+    for name in design["artifacts"]:
+        design["artifacts"][name]["url"] = f"/designs/{job_id}/artifacts/{name}"
+    return design
+
+@app.get("/designs/{job_id}/artifacts/{name}")
+async def get_design_artifact(job_id: str, name: str, request: Request):
+    from src.downloads import file_response
+    store = _design_store()
+    design = await run_in_threadpool(store.get, job_id)
+    artifact = design["artifacts"].get(name) if design else None
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    if not os.path.isfile(artifact["path"]):
+        raise HTTPException(status_code=410, detail="Artifact no longer on disk")
+    return await run_in_threadpool(file_response, request, artifact["path"], os.path.basename(artifact["path"]), True)
 
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -124,11 +582,67 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def root():
     return FileResponse('static/index.html')
 
+async def _assembly_file(job_id: str, kind: str, fmt: str):
+    """
+    Streams a job's BOM or pick-and-place file (see src/assembly_export.py)
+    from its netlist and the placement the board script saved.
+    """
+    from fastapi.responses import StreamingResponse
+    from src import assembly_export
+    from src.netlist_model import load_netlist
+
+    if fmt not in assembly_export.FORMATS:
+        raise HTTPException(status_code=404, detail="File not found")
+    netlist_path = jobs.job_file(job_id, pipeline.NETLIST_FILENAME)
+    if not netlist_path:
+        raise HTTPException(status_code=404, detail="Job has no netlist")
+    netlist = await run_in_threadpool(load_netlist, netlist_path)
+    if kind == "bom":
+        rows, columns = assembly_export.bom_rows(netlist), assembly_export.BOM_COLUMNS
+    else:
+        placement = await run_in_threadpool(assembly_export.load_placement,
+                                            os.path.join(jobs.job_dir(job_id), pipeline.PLACEMENT_FILENAME))
+        if placement is None:
+            raise HTTPException(status_code=404, detail="Job has no placement")
+        rows, columns = assembly_export.cpl_rows(netlist, placement), assembly_export.CPL_COLUMNS
+    return StreamingResponse(
+        assembly_export.stream_rows(rows, columns, fmt),
+        media_type=assembly_export.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'}
+    )
+
+@app.get("/jobs/{job_id}/bom.{fmt}")
+async def get_bom(job_id: str, fmt: str):
+    """
+    Bill of materials, grouped by value and footprint, as CSV or JSON.
+    """
+    return await _assembly_file(job_id, "bom", fmt)
+
+@app.get("/jobs/{job_id}/cpl.{fmt}")
+async def get_cpl(job_id: str, fmt: str):
+    """
+    Pick-and-place (ref, x, y, rotation, side) as CSV or JSON.
+    """
+    return await _assembly_file(job_id, "cpl", fmt)
+
+@app.get("/jobs/{job_id}/{filename}")
+async def download_job_file(job_id: str, filename: str, request: Request):
+    from src.downloads import file_response
+    file_path = jobs.job_file(job_id, filename)
+    if file_path:
+        # Job artifacts are written once, so they can be cached forever
+        return await run_in_threadpool(file_response, request, file_path, filename, True)
+    raise HTTPException(status_code=404, detail="File not found")
+
 @app.get("/download/{filename}")
-async def download_file(filename: str):
-    file_path = filename # Simple implementation for now, ideally restrict directory
-    if os.path.exists(file_path):
-        return FileResponse(file_path, filename=filename, media_type='application/octet-stream')
+async def download_file(filename: str, request: Request):
+    from src.downloads import file_response, sidecar_dir
+    file_path = os.path.basename(filename) # Only serve from the working directory
+    if os.path.isfile(file_path):
+        # Legacy cwd artifacts get overwritten, so clients must revalidate (ETag);
+        # their compressed copies go to the download cache, not the working directory
+        return await run_in_threadpool(file_response, request, file_path, file_path, False,
+                                       "application/octet-stream", "attachment", sidecar_dir())
     raise HTTPException(status_code=404, detail="File not found")
 
 if __name__ == "__main__":
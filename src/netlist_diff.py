@@ -0,0 +1,133 @@
+from typing import Any, Dict, List, Tuple
+
+# Netlist diffing for incremental regeneration.
+#
+# generate_schematic numbers refs by position in the prompt ("R2", "D5", ...),
+# so adding one part can renumber every part after it. Components are therefore
+# matched by identity (value + footprint, in order of appearance), not by ref,
+# and nets are matched by their node set once old refs are translated to new ones.
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+
+def _component_key(comp: Dict[str, Any]) -> Tuple[str, str]:
+    return (str(comp.get("value", "")).strip().lower(), str(comp.get("footprint", "")))
+
+
+def _node_set(net: Dict[str, Any], ref_map: Dict[str, str] = None) -> frozenset:
+    nodes = set()
+    for node in net.get("nodes", []):
+        ref = node.get("ref")
+        if ref_map is not None:
+            ref = ref_map.get(ref)
+            if ref is None:
+                continue
+        nodes.add((ref, str(node.get("pin"))))
+    return frozenset(nodes)
+
+
+def match_components(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Returns {old_ref: new_ref} for components that exist in both netlists.
+    """
+    pool: Dict[Tuple[str, str], List[str]] = {}
+    for comp in new.get("components", []):
+        pool.setdefault(_component_key(comp), []).append(comp["ref"])
+
+    ref_map = {}
+    for comp in old.get("components", []):
+        candidates = pool.get(_component_key(comp))
+        if candidates:
+            ref_map[comp["ref"]] = candidates.pop(0)
+    return ref_map
+
+
+def diff_netlists(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compares two netlists. Returned keys:
+      ref_map          old ref -> new ref for unchanged components
+      added / removed  new refs without an old match / old refs without a new match
+      net_map          old net name -> new net name for nets whose nodes are identical
+      extended_nets    new net name -> {"base": old name, "added_nodes": [(ref, pin)]}
+                       for nets that only gained nodes (existing copper can stay)
+      reroute_nets     new net names that must be routed from scratch
+      removed_nets     old net names with no surviving counterpart
+    """
+    ref_map = match_components(old, new)
+    matched_new = set(ref_map.values())
+
+    added = [c["ref"] for c in new.get("components", []) if c["ref"] not in matched_new]
+    removed = [c["ref"] for c in old.get("components", []) if c["ref"] not in ref_map]
+
+    old_nets = {}
+    # A net that lost a node (component removed) can't be kept as-is
+    old_complete = {}
+    for net in old.get("nets", []):
+        old_nets[net["name"]] = _node_set(net, ref_map)
+        old_complete[net["name"]] = all(n.get("ref") in ref_map for n in net.get("nodes", []))
+
+    net_map: Dict[str, str] = {}
+    extended_nets: Dict[str, Dict[str, Any]] = {}
+    reroute_nets: List[str] = []
+    used_old = set()
+
+    # Exact matches are hash lookups; only unmatched nets fall back to a subset scan
+    by_nodes: Dict[frozenset, List[str]] = {}
+    for old_name, old_nodes in old_nets.items():
+        if old_complete[old_name]:
+            by_nodes.setdefault(old_nodes, []).append(old_name)
+
+    for net in new.get("nets", []):
+        new_nodes = _node_set(net)
+        match = None
+        for old_name in by_nodes.get(new_nodes, []):
+            if old_name not in used_old:
+                match = ("same", old_name)
+                break
+        if match is None:
+            for old_name, old_nodes in old_nets.items():
+                if old_name in used_old or not old_complete[old_name]:
+                    continue
+                if old_nodes and old_nodes < new_nodes:
+                    match = ("extended", old_name)
+                    break
+
+        if match and match[0] == "same":
+            net_map[match[1]] = net["name"]
+            used_old.add(match[1])
+        elif match:
+            old_name = match[1]
+            used_old.add(old_name)
+            extended_nets[net["name"]] = {
+                "base": old_name,
+                "added_nodes": sorted(new_nodes - old_nets[old_name])
+            }
+        else:
+            reroute_nets.append(net["name"])
+
+    removed_nets = [name for name in old_nets if name not in used_old]
+
+    return {
+        "ref_map": ref_map,
+        "added": added,
+        "removed": removed,
+        "net_map": net_map,
+        "extended_nets": extended_nets,
+        "reroute_nets": reroute_nets,
+        "removed_nets": removed_nets,
+    }
+
+
+def summarize_diff(diff: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Small JSON-friendly summary for API responses.
+    """
+    return {
+        "kept_components": len(diff["ref_map"]),
+        "added_components": diff["added"],
+        "removed_components": diff["removed"],
+        "kept_nets": len(diff["net_map"]),
+        "extended_nets": sorted(diff["extended_nets"]),
+        "rerouted_nets": diff["reroute_nets"],
+        "removed_nets": diff["removed_nets"],
+    }
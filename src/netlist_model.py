@@ -0,0 +1,319 @@
+import io
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Compact netlist model + versioned binary interchange format.
+#
+# The API process builds the netlist as plain dicts (generate_schematic), but
+# shipping it to the KiCad process as pretty-printed JSON means three full
+# copies of the same data. Here every string (refs, pins, values, footprints,
+# net names) is interned once into a string table and components / nets only
+# carry integer ids. Net nodes are a flat array of (ref_id, pin_id) pairs.
+#
+# Binary layout (little-endian), version 1:
+#   magic "TPNL" | u8 version | u8 flags
+#   u32 n_strings, then n_strings x (u32 byte_len, utf-8 bytes)
+#   u32 n_meta,    then n_meta x (u32 key_id, u32 json_value_id)
+#   u32 n_comps,   then n_comps x (u32 ref, u32 value, u32 footprint, u32 quantity,
+#                                  u32 n_extra, n_extra x (u32 key, u32 json_value))
+#   u32 n_nets,    then n_nets x (u32 name, u32 class, u32 n_nodes,
+#                                 u32 n_extra, n_extra x (u32 key, u32 json_value),
+#                                 n_nodes x (u32 ref, u32 pin))
+#
+# Unknown keys on components, nets and the top level ride along as JSON encoded
+# "extras" so the format does not need a version bump for every new field.
+
+MAGIC = b"TPNL"
+FORMAT_VERSION = 1
+
+_U32 = struct.Struct("<I")
+_HEADER = struct.Struct("<4sBB")
+
+_COMPONENT_KEYS = ("ref", "value", "footprint", "quantity")
+_NET_KEYS = ("name", "class", "nodes")
+
+
+class StringTable:
+    """
+    Interns strings to small integer ids. Id 0 is always the empty string.
+    """
+    __slots__ = ("strings", "_ids")
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for s in strings or [""]:
+            self.intern(s)
+
+    def intern(self, s: Any) -> int:
+        s = sys.intern(str(s))
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self.strings)
+            self._ids[s] = sid
+            self.strings.append(s)
+        return sid
+
+    def __getitem__(self, sid: int) -> str:
+        return self.strings[sid]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class Component:
+    __slots__ = ("ref", "value", "footprint", "quantity", "extra")
+
+    def __init__(self, ref: int, value: int, footprint: int, quantity: int = 1,
+                 extra: Optional[Tuple[Tuple[int, int], ...]] = None):
+        self.ref = ref
+        self.value = value
+        self.footprint = footprint
+        self.quantity = quantity
+        self.extra = extra or ()
+
+
+class Net:
+    __slots__ = ("name", "net_class", "nodes", "extra")
+
+    def __init__(self, name: int, net_class: int, nodes: Optional[array] = None,
+                 extra: Optional[Tuple[Tuple[int, int], ...]] = None):
+        self.name = name
+        self.net_class = net_class
+        # Flat (ref_id, pin_id, ref_id, pin_id, ...) pairs
+        self.nodes = nodes if nodes is not None else array("I")
+        self.extra = extra or ()
+
+    def node_pairs(self) -> Iterable[Tuple[int, int]]:
+        nodes = self.nodes
+        return zip(nodes[0::2], nodes[1::2])
+
+
+class Netlist:
+    """
+    Interned, slotted netlist. Convert with from_dict / to_dict and
+    to_bytes / from_bytes.
+    """
+    __slots__ = ("strings", "components", "nets", "meta")
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.components: List[Component] = []
+        self.nets: List[Net] = []
+        self.meta: List[Tuple[int, int]] = []
+
+    # --- Accessors (strings resolved) ---
+
+    def s(self, sid: int) -> str:
+        return self.strings[sid]
+
+    def refs(self) -> List[str]:
+        return [self.strings[c.ref] for c in self.components]
+
+    def nodes_of(self, net: Net) -> List[Tuple[str, str]]:
+        st = self.strings
+        return [(st[r], st[p]) for r, p in net.node_pairs()]
+
+    # --- dict conversion ---
+
+    def _extras(self, d: Dict[str, Any], known: Tuple[str, ...]) -> Tuple[Tuple[int, int], ...]:
+        intern = self.strings.intern
+        return tuple(
+            (intern(k), intern(json.dumps(v, separators=(",", ":"), sort_keys=True)))
+            for k, v in d.items() if k not in known
+        )
+
+    def _extras_dict(self, extra: Tuple[Tuple[int, int], ...]) -> Dict[str, Any]:
+        st = self.strings
+        return {st[k]: json.loads(st[v]) for k, v in extra}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Netlist":
+        nl = cls()
+        intern = nl.strings.intern
+
+        nl.meta = list(nl._extras(data, ("components", "nets")))
+
+        for comp in data.get("components", []):
+            nl.components.append(Component(
+                intern(comp.get("ref", "")),
+                intern(comp.get("value", "")),
+                intern(comp.get("footprint", "")),
+                int(comp.get("quantity", 1) or 1),
+                nl._extras(comp, _COMPONENT_KEYS),
+            ))
+
+        for net in data.get("nets", []):
+            nodes = array("I")
+            for node in net.get("nodes", []):
+                nodes.append(intern(node.get("ref", "")))
+                nodes.append(intern(node.get("pin", "")))
+            nl.nets.append(Net(
+                intern(net.get("name", "")),
+                intern(net.get("class", "signal")),
+                nodes,
+                nl._extras(net, _NET_KEYS),
+            ))
+        return nl
+
+    def to_dict(self) -> Dict[str, Any]:
+        st = self.strings
+        out: Dict[str, Any] = self._extras_dict(tuple(self.meta))
+
+        components = []
+        for c in self.components:
+            comp = {
+                "ref": st[c.ref],
+                "value": st[c.value],
+                "footprint": st[c.footprint],
+                "quantity": c.quantity,
+            }
+            comp.update(self._extras_dict(c.extra))
+            components.append(comp)
+
+        nets = []
+        for n in self.nets:
+            net = {
+                "name": st[n.name],
+                "nodes": [{"ref": st[r], "pin": st[p]} for r, p in n.node_pairs()],
+            }
+            net.update(self._extras_dict(n.extra))
+            net["class"] = st[n.net_class]
+            nets.append(net)
+
+        out["components"] = components
+        out["nets"] = nets
+        return out
+
+    # --- binary encoding ---
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        w = buf.write
+        u32 = _U32.pack
+
+        w(_HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+
+        encoded = [s.encode("utf-8") for s in self.strings.strings]
+        w(u32(len(encoded)))
+        for b in encoded:
+            w(u32(len(b)))
+            w(b)
+
+        def write_pairs(pairs):
+            w(u32(len(pairs)))
+            if pairs:
+                w(_u32_array([x for pair in pairs for x in pair]))
+
+        write_pairs(self.meta)
+
+        w(u32(len(self.components)))
+        for c in self.components:
+            w(_u32_array((c.ref, c.value, c.footprint, c.quantity)))
+            write_pairs(c.extra)
+
+        w(u32(len(self.nets)))
+        for n in self.nets:
+            w(_u32_array((n.name, n.net_class, len(n.nodes) // 2)))
+            write_pairs(n.extra)
+            w(_u32_array(n.nodes))
+
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Netlist":
+        view = memoryview(data)
+        magic, version, _flags = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a binary netlist (bad magic)")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported netlist format version {version}")
+        pos = _HEADER.size
+
+        def read_u32s(n):
+            nonlocal pos
+            arr = array("I")
+            arr.frombytes(view[pos:pos + 4 * n])
+            if sys.byteorder == "big":
+                arr.byteswap()
+            pos += 4 * n
+            return arr
+
+        def read_pairs():
+            (n,) = read_u32s(1)
+            flat = read_u32s(2 * n)
+            return tuple(zip(flat[0::2], flat[1::2]))
+
+        nl = cls()
+        (n_strings,) = read_u32s(1)
+        strings = []
+        for _ in range(n_strings):
+            (length,) = read_u32s(1)
+            strings.append(sys.intern(bytes(view[pos:pos + length]).decode("utf-8")))
+            pos += length
+        nl.strings = StringTable(strings)
+
+        nl.meta = list(read_pairs())
+
+        (n_comps,) = read_u32s(1)
+        for _ in range(n_comps):
+            ref, value, footprint, quantity = read_u32s(4)
+            nl.components.append(Component(ref, value, footprint, quantity, read_pairs()))
+
+        (n_nets,) = read_u32s(1)
+        for _ in range(n_nets):
+            name, net_class, n_nodes = read_u32s(3)
+            extra = read_pairs()
+            nl.nets.append(Net(name, net_class, read_u32s(2 * n_nodes), extra))
+
+        return nl
+
+
+def _u32_array(values) -> bytes:
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def encode_netlist(netlist: Dict[str, Any]) -> bytes:
+    """
+    Encodes a netlist dict (as returned by generate_schematic) to the binary format.
+    """
+    return Netlist.from_dict(netlist).to_bytes()
+
+
+def decode_netlist(data: bytes) -> Dict[str, Any]:
+    """
+    Decodes the binary format back into a netlist dict.
+    """
+    return Netlist.from_bytes(data).to_dict()
+
+
+def load_netlist(source) -> Dict[str, Any]:
+    """
+    Loads a netlist from a path, "-" (stdin) or raw bytes. Binary and JSON
+    inputs are both accepted; the format is sniffed from the magic header.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        raw = bytes(source)
+    elif source == "-":
+        raw = sys.stdin.buffer.read()
+    else:
+        with open(source, "rb") as f:
+            raw = f.read()
+
+    if raw[:4] == MAGIC:
+        return decode_netlist(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def export_json(netlist: Dict[str, Any], path: str) -> None:
+    """
+    Optional human-readable export (compact, no pretty-printing).
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(netlist, f, separators=(",", ":"))
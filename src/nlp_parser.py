@@ -1,123 +1,394 @@
-import spacy
-from typing import List, Dict, Any
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
 
-# Load the spaCy model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    # Fallback if model is not found, though it should be installed via command
-    print("Warning: en_core_web_sm not found. Run 'python -m spacy download en_core_web_sm'")
-    nlp = None
+from src import metrics
 
-def parse_requirements(text: str) -> Dict[str, Any]:
+# Tiered prompt parsing.
+#
+# Tier 1 ("structured") handles list-style input line by line with plain string
+# and regex checks: markdown bullets, numbered lists, BOM lines ("2x LED",
+# "Resistor x 4", "8 LEDs and 8 resistors") and markdown table rows.
+# Headings are skipped. Only the
+# narrative lines left over go to tier 2 ("spacy"): they are grouped into
+# paragraphs and run through spaCy with nlp.pipe. A bullet-list prompt never
+# touches spaCy, and the model is only loaded the first time narrative text
+# shows up.
+#
+# Quantities come from numerals ("8 LEDs", "2x LED", "Resistor x 4"), number
+# words ("twenty-four LEDs", "a dozen capacitors") and matrix sizes ("8x8 LED
+# matrix" = 64). A layout word next to the part ("ring", "matrix", "row") is
+# passed on as a placement pattern hint for generate_schematic.
+
+PARSE_TIER = metrics.Counter(
+    "nlp_parse_tier_total", "Prompts that needed each parser tier", ("tier",))
+PARSE_LINES = metrics.Counter(
+    "nlp_parse_lines_total", "Prompt lines handled by each parser tier", ("tier",))
+PARSE_SECONDS = metrics.Histogram(
+    "nlp_parse_seconds", "Prompt parse time by deepest tier used", ("tier",),
+    buckets=(0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+SPACY_MODEL = "en_core_web_sm"
+SPACY_BATCH_SIZE = 32 # Paragraphs per nlp.pipe batch
+BOM_MAX_WORDS = 4 # "2x 10k ohm resistor"; longer lines are treated as sentences
+QUANTITY_LOOKBACK_WORDS = 5 # How far before a part name a narrative count may start
+
+# Expanded component keywords based on user prompts
+potential_components = [
+    "lm7805", "capacitor", "resistor", "led", "diode", "battery", "switch",
+    "button", "potentiometer", "sensor", "display", "screen", "oled", "lcd",
+    "buzzer", "motor", "relay", "transistor", "breadboard", "wire", "jumper",
+    "regulator", "module", "bluetooth", "wifi", "gsm", "rf", "esp8266", "arduino",
+    "dht11", "dht22", "lm35", "hc-sr04", "pir", "ldr", "photodiode", "mq", "mpu6050",
+    "segment", "header", "connector"
+]
+
+connection_verbs = ["connect", "attach", "wire", "link", "add"]
+
+_BULLET = ('-', '*', '+', '•')
+_NUMBERED = re.compile(r'^\d{1,3}[.)]\s+(.*)$')
+_BOM_COUNT_FIRST = re.compile(r'^(\d{1,4})\s*(?:[x×]|pcs?\.?)?\s+(.+)$', re.I)
+_BOM_GRID = re.compile(r'^(\d{1,3})\s*[x×]\s*(\d{1,3})\s+(.+)$', re.I)
+_BOM_COUNT_LAST = re.compile(r'^(.+?)\s*(?:[x×]\s*|:\s*|,\s*)(\d{1,4})\s*(?:pcs?\.?)?$', re.I)
+_TABLE_RULE = re.compile(r'^\|?[\s:|-]+\|?$')
+# Bullets that describe wiring rather than name a part go to the spaCy tier
+_WIRING = re.compile(r'\b(?:connect\w*|attach\w*|link\w*|wired)\b', re.I)
+# "8 LEDs and 8 resistors", "2 LEDs, 1 buzzer": one BOM line, several parts
+_BOM_JOIN = re.compile(r'\s*(?:,|\+|&|\band\b|\bwith\b)\s*', re.I)
+_BOM_ARTICLE = re.compile(r'^(?:a|an|the)\s+', re.I)
+
+_UNITS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_MULTIPLIERS = {"dozen": 12, "hundred": 100}
+_FILLERS = ("a", "an", "and")
+_WORD = re.compile(r'\d+\s*[x×]\s*\d+|[a-z0-9]+')
+_GRID_WORD = re.compile(r'^(\d+)\s*[x×]\s*(\d+)$')
+_NUMERAL = re.compile(r'^(\d{1,4})x?$')
+_BOM_WORDS_FIRST = re.compile(
+    r'^((?:(?:%s)[\s-]+)+)(.+)$' % "|".join(list(_UNITS) + list(_MULTIPLIERS) + list(_FILLERS)), re.I)
+# Words that end a narrative count: "with 4 LEDs and resistors" does not make 4 resistors
+_COUNT_BREAKS = {"and", "or", "with", "to", "of", "for", "in", "on", "from", "the", "each", "per"}
+_PATTERN_HINTS = (
+    ("circular", re.compile(r'\b(?:ring|circle|circular|round)\b', re.I)),
+    ("grid", re.compile(r'\b(?:matrix|grid|array)\b', re.I)),
+    ("row", re.compile(r'\b(?:row|strip|bar)\b', re.I)),
+)
+
+# spaCy model, loaded on first use (None if unavailable)
+nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    global nlp, _nlp_loaded
+    if _nlp_loaded:
+        return nlp
+    with _nlp_lock:
+        if not _nlp_loaded:
+            try:
+                import spacy
+                # Named entities are never used; skipping them roughly halves the pipeline
+                nlp = spacy.load(SPACY_MODEL, disable=["ner"])
+            except (ImportError, OSError):
+                # Fallback if model is not found, though it should be installed via command
+                print(f"Warning: {SPACY_MODEL} not found. Run 'python -m spacy download {SPACY_MODEL}'")
+                nlp = None
+            _nlp_loaded = True
+    return nlp
+
+
+def _keyword(text: str) -> Optional[str]:
+    lowered = text.lower()
+    for keyword in potential_components:
+        if keyword in lowered:
+            return keyword
+    return None
+
+
+def parse_quantity(words: List[str]) -> Optional[Tuple[int, Optional[Tuple[int, int]]]]:
     """
-    Parses natural language requirements to extract components and connections.
+    Reads a count from lower-case words: ["8"], ["2x"], ["twenty", "four"],
+    ["a", "dozen"], ["8x8"]. Returns (quantity, (rows, cols) or None), or None
+    if the words are not a count.
     """
-    if not nlp:
-        return {"error": "NLP model not loaded"}
+    if len(words) == 1:
+        grid = _GRID_WORD.match(words[0])
+        if grid:
+            rows, cols = int(grid.group(1)), int(grid.group(2))
+            return (rows * cols, (rows, cols)) if rows and cols else None
+        numeral = _NUMERAL.match(words[0])
+        if numeral:
+            return (int(numeral.group(1)), None) if int(numeral.group(1)) else None
+
+    total = 0
+    counted = False
+    for word in words:
+        if word in _UNITS:
+            total += _UNITS[word]
+        elif word in _MULTIPLIERS:
+            total = max(total, 1) * _MULTIPLIERS[word]
+        elif word in _FILLERS:
+            continue
+        else:
+            return None
+        counted = True
+    return (total, None) if counted and total else None
+
+
+def _quantity_before(text: str) -> Optional[Tuple[int, Optional[Tuple[int, int]]]]:
+    # The count written right before a part name, allowing one adjective in
+    # between ("8 red LEDs")
+    words = _WORD.findall(text.lower())[-QUANTITY_LOOKBACK_WORDS:]
+    for end in (len(words), len(words) - 1):
+        if end < 1 or (end < len(words) and words[end] in _COUNT_BREAKS):
+            return None
+        if _NUMERAL.match(words[end - 1]) or _GRID_WORD.match(words[end - 1]):
+            return parse_quantity(words[end - 1:end])
+        start = end
+        while start > 0 and (words[start - 1] in _UNITS or words[start - 1] in _MULTIPLIERS
+                             or words[start - 1] in _FILLERS):
+            start -= 1
+        found = parse_quantity(words[start:end])
+        if found:
+            return found
+    return None
+
+
+def _pattern_hint(text: str, quantity: int, grid: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    # Placement pattern for a repeated part: "grid" with the rows / cols of an
+    # "AxB" count, else whatever layout word the line uses
+    if quantity < 2:
+        return {}
+    if grid:
+        return {"pattern": "grid", "rows": grid[0], "cols": grid[1]}
+    for pattern, regex in _PATTERN_HINTS:
+        if regex.search(text):
+            return {"pattern": pattern}
+    return {}
+
+
+def _list_item(content: str, quantity: int = 1) -> Optional[Dict[str, Any]]:
+    # Check for component match in the line content
+    found_keyword = _keyword(content)
+    if not found_keyword:
+        return None
+    # Try to extract full name from the line (e.g., "**Push Buttons**" -> "Push Buttons")
+    # Remove markdown bold/italic; take the part before a dash if a description follows
+    clean_name = content.replace('*', '').replace('_', '').split('-')[0].strip()
+    # Validation: ensure clean_name isn't just empty or super long description
+    if len(clean_name) > 50 or len(clean_name) < 2:
+        clean_name = found_keyword.title()
+    return {"name": clean_name, "quantity": quantity, "type": "MarkdownList"}
+
+
+def _table_row(line: str) -> Optional[Dict[str, Any]]:
+    cells = [c.strip() for c in line.strip().strip('|').split('|')]
+    name_cell = next((c for c in cells if _keyword(c)), None)
+    if name_cell is None:
+        return None
+    quantity = next((int(c) for c in cells if c.isdigit()), 1)
+    item = _list_item(name_cell, max(1, quantity))
+    if item:
+        item["type"] = "Table"
+    return item
+
+
+def _bom_candidates(line: str):
+    # (name, quantity, grid shape) readings of "8x8 LED", "8 LEDs", "two LEDs" or "LED x 8"
+    m = _BOM_GRID.match(line)
+    if m and int(m.group(1)) and int(m.group(2)):
+        rows, cols = int(m.group(1)), int(m.group(2))
+        yield m.group(3), rows * cols, (rows, cols)
+    m = _BOM_COUNT_FIRST.match(line)
+    if m:
+        yield m.group(2), max(1, int(m.group(1))), None
+    m = _BOM_WORDS_FIRST.match(line)
+    if m:
+        found = parse_quantity(_WORD.findall(m.group(1).lower()))
+        if found:
+            yield m.group(2), found[0], None
+    m = _BOM_COUNT_LAST.match(line)
+    if m:
+        yield m.group(1), max(1, int(m.group(2))), None
+
+
+def _part_name(name: str) -> bool:
+    # A part name, not a sentence that happens to start with a number, and not
+    # several parts ("LEDs and 8 resistors", "LEDs, 1 buzzer", "LEDs or relays")
+    words = name.lower().split()
+    return (len(words) <= BOM_MAX_WORDS and not name.rstrip().endswith('.')
+            and not _BOM_JOIN.search(name) and "or" not in words
+            and not any(parse_quantity([w]) for w in words))
+
+
+def _bom_part(line: str) -> Optional[Dict[str, Any]]:
+    for name, quantity, grid in _bom_candidates(line):
+        if _part_name(name):
+            item = _list_item(name, quantity)
+            if item:
+                item["type"] = "BOM"
+                item.update(_pattern_hint(line, quantity, grid))
+                return item
+    return None
+
+
+def _bom_items(line: str) -> List[Dict[str, Any]]:
+    """
+    The parts of a BOM line: one ("8 LEDs", "Resistor x 4"), or one per
+    segment of a list joined by commas / and / with ("8 LEDs and 8
+    resistors", "4 LEDs with resistors"). The first segment needs a count;
+    a later one without is one part, as in a sentence. Empty if the line is
+    not a BOM line.
+    """
+    if _WIRING.search(line):
+        return []
+    item = _bom_part(line)
+    if item:
+        return [item]
+    segments = [_BOM_ARTICLE.sub('', segment) for segment in _BOM_JOIN.split(line) if segment.strip()]
+    if len(segments) < 2:
+        return []
+    items = []
+    for i, segment in enumerate(segments):
+        item = _bom_part(segment)
+        if item is None and i and _part_name(segment):
+            item = _list_item(segment)
+            if item:
+                item["type"] = "BOM"
+        if item is None:
+            return [] # A sentence ("LEDs and resistors", "Add a box and 2 LEDs")
+        items.append(item)
+    return items
+
 
-    doc = nlp(text)
+def _is_heading(line: str) -> bool:
+    if line.startswith('#'):
+        return True
+    bare = line.replace('*', '').replace('_', '').strip()
+    return bare.endswith(':') and len(bare.split()) <= 4
+
+
+def split_tiers(text: str) -> Tuple[List[Dict[str, Any]], List[str], int, int]:
+    """
+    Tier 1: returns (components from list-style lines, narrative paragraphs
+    left for spaCy, number of structured lines, number of narrative lines).
+    """
     components = []
-    
-    # Expanded component keywords based on user prompts
-    potential_components = [
-        "lm7805", "capacitor", "resistor", "led", "diode", "battery", "switch",
-        "button", "potentiometer", "sensor", "display", "screen", "oled", "lcd",
-        "buzzer", "motor", "relay", "transistor", "breadboard", "wire", "jumper",
-        "regulator", "module", "bluetooth", "wifi", "gsm", "rf", "esp8266", "arduino",
-        "dht11", "dht22", "lm35", "hc-sr04", "pir", "ldr", "photodiode", "mq", "mpu6050",
-        "segment", "header", "connector"
-    ]
-
-    # 1. Parsing Line-by-Line for Markdown Lists
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        # Check for bullet points
-        if line.startswith(('-', '*', '+')):
-            # Remove bullet and process the content
-            content = line.lstrip('-*+ ').strip()
-            # simple quantity extraction (heuristic)
-            quantity = 1
-            
-            # Check for component match in the line content
-            # strict check: any known keyword present?
-            found_keyword = None
-            for keyword in potential_components:
-                if keyword in content.lower():
-                    found_keyword = keyword
-                    break
-            
-            if found_keyword:
-                # Try to extract full name from the line (e.g., "**Push Buttons**" -> "Push Buttons")
-                # Remove markdown bold/italic
-                clean_name = content.replace('*', '').replace('_', '').split('-')[0].strip() # Take part before dash if description exists
-                
-                # Validation: ensure clean_name isn't just empty or super long description
-                if len(clean_name) > 50 or len(clean_name) < 2:
-                    clean_name = found_keyword.title()
-
-                components.append({
-                    "name": clean_name,
-                    "quantity": quantity,
-                    "type": "MarkdownList" 
-                })
+    paragraphs: List[str] = []
+    current: List[str] = []
+    structured = narrative = 0
+
+    def flush():
+        if current:
+            paragraphs.append(" ".join(current))
+            current.clear()
+
+    for raw in text.split('\n'):
+        line = raw.strip()
+        if not line:
+            flush()
+            continue
+
+        item = None
+        handled = False
+        numbered = _NUMBERED.match(line)
+        if line.startswith(_BULLET) or numbered:
+            content = numbered.group(1) if numbered else line.lstrip('-*+• ').strip()
+            if not _WIRING.search(content):
+                item, handled = _bom_items(content) or _list_item(content), True
+            else:
+                # A wiring instruction in a list is its own sentence
+                flush()
+                narrative += 1
+                paragraphs.append(content)
+                continue
+        elif line.startswith('|'):
+            item, handled = (None if _TABLE_RULE.match(line) else _table_row(line)), True
+        elif _is_heading(line):
+            handled = True
+        else:
+            item = _bom_items(line)
+            handled = bool(item)
 
-    # 2. SpaCy Fallback for Narrative Text (if no list items found, or to supplement)
-    # Only run if line-parsing didn't yield much, or run anyway to catch things in sentences.
-    # To avoid duplicates, we'll check names.
-    
-    existing_names = [c["name"].lower() for c in components]
-    
+        if handled:
+            flush()
+            structured += 1
+            if isinstance(item, list):
+                components.extend(item)
+            elif item:
+                components.append(item)
+        else:
+            narrative += 1
+            current.append(line)
+    flush()
+    return components, paragraphs, structured, narrative
+
+
+def _is_component(t) -> bool:
+    return any(comp in t.text.lower() for comp in potential_components)
+
+
+def _sentence(text: str, index: int) -> str:
+    # The sentence around a character offset, for pattern hints
+    start = max(text.rfind(stop, 0, index) for stop in '.;!?') + 1
+    ends = [e for e in (text.find(stop, index) for stop in '.;!?') if e >= 0]
+    return text[start:min(ends) if ends else len(text)]
+
+
+def _doc_components(doc, existing_names: List[str]) -> List[Dict[str, Any]]:
+    components = []
     for token in doc:
         # Check if text matches known components (case-insensitive partial match)
         if any(comp in token.text.lower() for comp in potential_components) and token.text.lower() not in existing_names:
-             # Basic check to avoid grabbing verbs or common words unless they are strictly in our list
-             # (Our list is now quite broad, so we rely on POS tags for context if possible, but keep it simple for now)
-             
-             if token.pos_ in ["NOUN", "PROPN"] or token.text.lower() in potential_components:
-                components.append({
+            # Basic check to avoid grabbing verbs or common words unless they are strictly in our list
+            if token.pos_ in ["NOUN", "PROPN"] or token.text.lower() in potential_components:
+                quantity, grid = _quantity_before(doc.text[:token.idx]) or (1, None)
+                component = {
                     "name": token.text,
-                    "quantity": 1,
+                    "quantity": quantity,
                     "type": token.pos_
-                })
+                }
+                component.update(_pattern_hint(_sentence(doc.text, token.idx), quantity, grid))
+                components.append(component)
                 existing_names.append(token.text.lower())
+    return components
 
-    # Connection extraction logic (unchanged for now, focusing on components)
-    connections = []
-    
+
+def _doc_connections(doc) -> List[Dict[str, str]]:
     # Simple dependency parsing for connections
-    connection_verbs = ["connect", "attach", "wire", "link", "add"]
-    
+    connections = []
     for token in doc:
         if token.lemma_.lower() in connection_verbs:
             subj = None
             obj = None
             ind_obj = None
-            
-            # Helper to check if token is a potential component
-            def is_component(t):
-                return any(comp in t.text.lower() for comp in potential_components)
 
             # Check children
             for child in token.children:
-                if is_component(child):
+                if _is_component(child):
                     if child.dep_ in ["nsubj", "nsubjpass"]:
                         subj = child.text
                     elif child.dep_ in ["dobj"]:
                         obj = child.text
                     elif child.dep_ in ["xcomp", "dative"]:
                         ind_obj = child.text
-                
+
                 if child.dep_ == "prep" and child.text in ["to", "with"]:
                     for grandchild in child.children:
-                        if is_component(grandchild):
+                        if _is_component(grandchild):
                             ind_obj = grandchild.text
-            
+
             # Form connection
             source = None
             target = None
-            
+
             if subj and ind_obj:
                 source = subj
                 target = ind_obj
@@ -125,8 +396,8 @@ def parse_requirements(text: str) -> Dict[str, Any]:
                 source = obj
                 target = ind_obj
             elif subj and obj:
-                 source = subj
-                 target = obj
+                source = subj
+                target = obj
 
             if source and target:
                 connections.append({
@@ -134,7 +405,41 @@ def parse_requirements(text: str) -> Dict[str, Any]:
                     "to": target,
                     "type": "electrical"
                 })
+    return connections
+
+
+def parse_requirements(text: str) -> Dict[str, Any]:
+    """
+    Parses natural language requirements to extract components and connections.
+    """
+    started = time.perf_counter()
+
+    # 1. Structured tier: lists, BOM lines and tables
+    components, paragraphs, structured, narrative = split_tiers(text)
+    if structured:
+        PARSE_TIER.inc(tier="structured")
+        PARSE_LINES.inc(structured, tier="structured")
+
+    # 2. spaCy tier, only for the narrative paragraphs that remain
+    connections = []
+    tier = "structured"
+    if paragraphs:
+        model = get_nlp()
+        if model is None:
+            if not components:
+                return {"error": "NLP model not loaded"}
+            print(f"Warning: NLP model not loaded, skipped {len(paragraphs)} narrative paragraph(s)")
+        else:
+            tier = "spacy"
+            PARSE_TIER.inc(tier="spacy")
+            PARSE_LINES.inc(narrative, tier="spacy")
+            # To avoid duplicates, we'll check names.
+            existing_names = [c["name"].lower() for c in components]
+            for doc in model.pipe(paragraphs, batch_size=SPACY_BATCH_SIZE):
+                components.extend(_doc_components(doc, existing_names))
+                connections.extend(_doc_connections(doc))
 
+    PARSE_SECONDS.observe(time.perf_counter() - started, tier=tier)
     return {
         "original_text": text,
         "components": components,
@@ -0,0 +1,475 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src.deterministic import make_archive
+
+# Panelization (step-and-repeat) on the Gerbers generate_gerbers() exports.
+#
+# Every layer keeps a single copy of the board's graphics wrapped in a Gerber
+# step-and-repeat block (%SRX..Y..I..J..*% ... %SR*%), so the board geometry is
+# referenced once no matter how many copies the panel has; only the panel frame
+# (rails, fiducials, tabs) is added around it. Excellon has no portable repeat
+# construct, so drill hits are replicated per copy (hits are a few bytes each).
+#
+# Coordinates are handled in the Gerber coordinate system as exported (KiCad
+# flips Y), and user parameters are millimetres.
+
+GERBER_EXTENSIONS = (".gbr", ".gtl", ".gbl", ".gto", ".gbo", ".gts", ".gbs", ".gtp", ".gbp", ".gm1")
+DRILL_EXTENSIONS = (".drl", ".xln")
+
+SEPARATIONS = ("mousebites", "vscore")
+
+FIDUCIAL_COPPER_MM = 1.0
+FIDUCIAL_MASK_MM = 2.0
+FRAME_LINE_MM = 0.1
+BITE_DRILL_MM = 0.5
+BITE_PITCH_MM = 0.8
+
+Box = Tuple[float, float, float, float]
+Segment = Tuple[float, float, float, float]
+
+
+class PanelError(Exception):
+    pass
+
+
+# --- Reading the exported files ---------------------------------------------
+
+_FS = re.compile(r"%FSLA?X(\d)(\d)Y(\d)(\d)\*%")
+_COORD = re.compile(r"([XY])(-?\d+)")
+_AD = re.compile(r"%ADD(\d+)")
+
+
+class GerberFile:
+    """
+    A Gerber file split into the header (format, apertures, macros) and the
+    graphics body, which is what gets stepped and repeated.
+    """
+    __slots__ = ("name", "header", "body", "decimals", "unit_mm", "function")
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+
+        text = "\n".join(lines[:60])
+        fs = _FS.search(text)
+        if not fs:
+            raise PanelError(f"{self.name}: no %FS coordinate format")
+        self.decimals = int(fs.group(2))
+        self.unit_mm = "%MOIN*%" not in text
+        function = re.search(r"%TF\.FileFunction,([^*]*)\*%", text)
+        self.function = function.group(1) if function else ""
+
+        # Header ends at KiCad's aperture list marker, else at the last aperture/macro
+        end = None
+        for i, line in enumerate(lines):
+            if line.startswith("G04 APERTURE END LIST"):
+                end = i + 1
+                break
+        if end is None:
+            end = 0
+            in_macro = False
+            for i, line in enumerate(lines):
+                if line.startswith("%AM"):
+                    in_macro = not line.endswith("%")
+                    end = i + 1
+                elif in_macro:
+                    in_macro = not line.endswith("%")
+                    end = i + 1
+                elif line.startswith(("%AD", "%FS", "%MO", "%TF", "%TA", "%TD")):
+                    end = i + 1
+        self.header = lines[:end]
+        self.body = [l for l in lines[end:] if l.strip() and l.strip() != "M02*"]
+
+    def coord(self, mm: float) -> str:
+        value = mm if self.unit_mm else mm / 25.4
+        return str(int(round(value * 10 ** self.decimals)))
+
+    def units(self, mm: float) -> float:
+        return mm if self.unit_mm else mm / 25.4
+
+    def next_aperture(self) -> int:
+        codes = [int(m.group(1)) for line in self.header + self.body for m in _AD.finditer(line)]
+        return max(codes + [9]) + 1
+
+    def kind(self) -> str:
+        function = self.function.lower()
+        name = self.name.lower()
+        if function.startswith("profile") or "edge_cuts" in name:
+            return "profile"
+        if function.startswith("copper") and function.endswith("top") or "f_cu" in name:
+            return "top_copper"
+        if function.startswith("soldermask,top") or "f_mask" in name:
+            return "top_mask"
+        return "other"
+
+
+def outline_box(profile: GerberFile) -> Tuple[Box, bool]:
+    """
+    Bounding box of the board outline (mm) and whether the outline is a plain
+    axis-aligned rectangle.
+    """
+    scale = 10 ** profile.decimals * (1 if profile.unit_mm else 1 / 25.4)
+    x = y = 0
+    points = []
+    segments = []
+    for line in profile.body:
+        if not line.startswith(("X", "Y")):
+            continue
+        prev = (x, y)
+        for axis, val in _COORD.findall(line.split("D0")[0]):
+            if axis == "X":
+                x = int(val)
+            else:
+                y = int(val)
+        points.append((x / scale, y / scale))
+        if "D01" in line:
+            segments.append((prev[0] / scale, prev[1] / scale, x / scale, y / scale))
+    if not points:
+        raise PanelError("Board outline (Edge.Cuts) is empty")
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    box = (min(xs), min(ys), max(xs), max(ys))
+    eps = 1e-3
+    has_arcs = any("G02" in l or "G03" in l for l in profile.body)
+    # Every segment lies on one of the four sides of the bounding box
+    rectangular = not has_arcs and all(
+        (abs(x0 - x1) < eps and any(abs(x0 - e) < eps for e in (box[0], box[2]))) or
+        (abs(y0 - y1) < eps and any(abs(y0 - e) < eps for e in (box[1], box[3])))
+        for x0, y0, x1, y1 in segments
+    )
+    return box, rectangular
+
+
+# --- Panel geometry ------------------------------------------------------------
+
+def _tab_centers(length: float, count: Optional[int]) -> List[float]:
+    if not count:
+        count = 1 if length <= 30 else 2 if length <= 80 else 3
+    return [length * (k + 0.5) / count for k in range(count)]
+
+
+def _broken_line(start: float, end: float, fixed: float, horizontal: bool,
+                 breaks: List[Tuple[float, float]]) -> List[Segment]:
+    """
+    Line from start to end along one axis, skipping the break intervals.
+    """
+    segments = []
+    pos = start
+    for lo, hi in sorted(breaks):
+        if lo > pos:
+            segments.append((pos, lo))
+        pos = max(pos, hi)
+    if pos < end:
+        segments.append((pos, end))
+    if horizontal:
+        return [(a, fixed, b, fixed) for a, b in segments]
+    return [(fixed, a, fixed, b) for a, b in segments]
+
+
+def panel_layout(board: Box, cols: int, rows: int, separation: str = "mousebites",
+                 gap: float = 2.0, rail: float = 5.0, fiducials: bool = True,
+                 tab_width: float = 3.0, tabs_per_edge: Optional[int] = None) -> Dict:
+    """
+    Computes the panel frame around a cols x rows array of the board.
+    Per-board items (tabbed outline, mouse-bite holes) are for the first copy;
+    the others are at multiples of the pitch.
+    """
+    if separation not in SEPARATIONS:
+        raise PanelError(f"separation must be one of {SEPARATIONS}")
+    if not (1 <= cols <= 50 and 1 <= rows <= 50):
+        raise PanelError("cols and rows must be between 1 and 50")
+    if separation == "vscore":
+        gap = 0.0 # V-scored boards butt against each other
+    elif gap <= 0 or rail <= 0:
+        raise PanelError("mouse bites need a gap and rails to hold the tabs")
+    if fiducials and rail < 3:
+        raise PanelError("fiducials need rails at least 3 mm wide")
+
+    x0, y0, x1, y1 = board
+    width, height = x1 - x0, y1 - y0
+    pitch = (width + gap, height + gap)
+    array = (x0, y0, x0 + cols * width + (cols - 1) * gap, y0 + rows * height + (rows - 1) * gap)
+    inner = (array[0] - gap, array[1] - gap, array[2] + gap, array[3] + gap)
+    outer = (inner[0] - rail, inner[1] - rail, inner[2] + rail, inner[3] + rail)
+
+    layout = {
+        "pitch": pitch,
+        "outer": outer,
+        "size": (round(outer[2] - outer[0], 4), round(outer[3] - outer[1], 4)),
+        "board_outline": [], # stepped with the board
+        "frame": [],
+        "vscore": [],
+        "fiducials": [],
+        "bites": [],
+    }
+    frame = layout["frame"]
+    ox0, oy0, ox1, oy1 = outer
+    frame += [(ox0, oy0, ox1, oy0), (ox1, oy0, ox1, oy1), (ox1, oy1, ox0, oy1), (ox0, oy1, ox0, oy0)]
+
+    if separation == "vscore":
+        for j in range(rows + 1):
+            y = y0 + j * height
+            if rail or 0 < j < rows:
+                layout["vscore"].append((ox0, y, ox1, y))
+        for i in range(cols + 1):
+            x = x0 + i * width
+            if rail or 0 < i < cols:
+                layout["vscore"].append((x, oy0, x, oy1))
+    else:
+        half = gap / 2
+        h_tabs = [x0 + c for c in _tab_centers(width, tabs_per_edge)]
+        v_tabs = [y0 + c for c in _tab_centers(height, tabs_per_edge)]
+        tw = tab_width / 2
+        outline = layout["board_outline"]
+        # Board edges broken at the tabs, tab sides running out to mid-gap
+        for y, out in ((y0, -half), (y1, half)):
+            outline += _broken_line(x0, x1, y, True, [(c - tw, c + tw) for c in h_tabs])
+            for c in h_tabs:
+                outline += [(c - tw, y, c - tw, y + out), (c + tw, y, c + tw, y + out)]
+        for x, out in ((x0, -half), (x1, half)):
+            outline += _broken_line(y0, y1, x, False, [(c - tw, c + tw) for c in v_tabs])
+            for c in v_tabs:
+                outline += [(x, c - tw, x + out, c - tw), (x, c + tw, x + out, c + tw)]
+
+        # Inner edge of the frame, broken where the outer boards' tabs meet it
+        ix0, iy0, ix1, iy1 = inner
+        col_tabs = [c + i * pitch[0] for i in range(cols) for c in h_tabs]
+        row_tabs = [c + j * pitch[1] for j in range(rows) for c in v_tabs]
+        for y, into in ((iy0, half), (iy1, -half)):
+            frame += _broken_line(ix0, ix1, y, True, [(c - tw, c + tw) for c in col_tabs])
+            for c in col_tabs:
+                frame += [(c - tw, y, c - tw, y + into), (c + tw, y, c + tw, y + into)]
+        for x, into in ((ix0, half), (ix1, -half)):
+            frame += _broken_line(iy0, iy1, x, False, [(c - tw, c + tw) for c in row_tabs])
+            for c in row_tabs:
+                frame += [(x, c - tw, x + into, c - tw), (x, c + tw, x + into, c + tw)]
+
+        # Perforation along the board edge across each tab
+        count = max(2, int(tab_width / BITE_PITCH_MM))
+        span = (count - 1) * BITE_PITCH_MM
+        for c in h_tabs:
+            for k in range(count):
+                px = c - span / 2 + k * BITE_PITCH_MM
+                layout["bites"] += [(px, y0), (px, y1)]
+        for c in v_tabs:
+            for k in range(count):
+                py = c - span / 2 + k * BITE_PITCH_MM
+                layout["bites"] += [(x0, py), (x1, py)]
+
+    if fiducials:
+        # Three fiducials in an L so the orientation is unambiguous
+        layout["fiducials"] = [(ox0 + rail, oy0 + rail / 2), (ox1 - rail, oy0 + rail / 2), (ox0 + rail, oy1 - rail / 2)]
+    return layout
+
+
+# --- Writing the panel -------------------------------------------------------------
+
+def _write_gerber(gerber: GerberFile, out_path: str, cols: int, rows: int, layout: Dict,
+                  separation: str) -> None:
+    kind = gerber.kind()
+    c = gerber.coord
+    aperture = gerber.next_aperture()
+    extra_apertures = []
+    frame_ops: List[str] = []
+
+    def lines_with(d_code: int, segments: List[Segment]) -> List[str]:
+        ops = [f"D{d_code}*"]
+        for sx, sy, ex, ey in segments:
+            ops += [f"X{c(sx)}Y{c(sy)}D02*", f"X{c(ex)}Y{c(ey)}D01*"]
+        return ops
+
+    stepped = gerber.body
+    if kind == "profile":
+        extra_apertures.append(f"%ADD{aperture}C,{gerber.units(FRAME_LINE_MM):.6f}*%")
+        # The board's own outline is replaced by the tabbed one (or dropped for V-scoring)
+        stepped = lines_with(aperture, layout["board_outline"]) if layout["board_outline"] else []
+        frame_ops = lines_with(aperture, layout["frame"])
+    elif kind in ("top_copper", "top_mask") and layout["fiducials"]:
+        size = FIDUCIAL_COPPER_MM if kind == "top_copper" else FIDUCIAL_MASK_MM
+        extra_apertures.append(f"%ADD{aperture}C,{gerber.units(size):.6f}*%")
+        frame_ops = [f"D{aperture}*"] + [f"X{c(x)}Y{c(y)}D03*" for x, y in layout["fiducials"]]
+
+    pitch_x, pitch_y = layout["pitch"]
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(gerber.header + extra_apertures) + "\n")
+        if stepped:
+            f.write(f"%SRX{cols}Y{rows}I{gerber.units(pitch_x):.6f}J{gerber.units(pitch_y):.6f}*%\n")
+            f.write("\n".join(stepped) + "\n")
+            f.write("%SR*%\n")
+        if frame_ops:
+            # Reset state the stepped body may have changed
+            f.write("%LPD*%\nG01*\n" + "\n".join(frame_ops) + "\n")
+        f.write("M02*\n")
+
+
+def _write_vscore(template: GerberFile, out_path: str, segments: List[Segment]) -> None:
+    c = template.coord
+    lines = [
+        "%TF.GenerationSoftware,Text-to-PCB,Panelizer*%",
+        "%TF.FileFunction,Other,V-Score*%",
+        "%TF.FilePolarity,Positive*%",
+        next(l for l in template.header if l.startswith("%FS")), # same number format
+        "%MOMM*%" if template.unit_mm else "%MOIN*%",
+        "%LPD*%",
+        "G01*",
+        f"%ADD10C,{template.units(FRAME_LINE_MM):.6f}*%",
+        "D10*",
+    ]
+    for sx, sy, ex, ey in segments:
+        lines += [f"X{c(sx)}Y{c(sy)}D02*", f"X{c(ex)}Y{c(ey)}D01*"]
+    lines.append("M02*")
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+_XY = re.compile(r"([XY])(-?\d*\.?\d+)")
+
+
+def _write_drill(in_path: str, out_path: str, cols: int, rows: int, layout: Dict,
+                 add_bites: bool) -> int:
+    """
+    Replicates every drill hit (and routed slot) once per copy, grouped by
+    tool so the machine still changes tools once. Returns the hit count.
+    """
+    with open(in_path, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    try:
+        split = lines.index("%")
+    except ValueError:
+        raise PanelError(f"{os.path.basename(in_path)}: no Excellon header")
+    header, body = lines[:split], lines[split + 1:]
+    metric = any(l.startswith("METRIC") for l in header)
+    scale = 1.0 if metric else 1 / 25.4
+    if any(_XY.match(l) and "." not in l for l in body):
+        raise PanelError("Only decimal-point Excellon coordinates are supported")
+
+    tools = [int(m.group(1)) for l in header for m in [re.match(r"T(\d+)C", l)] if m]
+    bite_tool = max(tools + [0]) + 1
+    if add_bites:
+        header += ["; Mouse-bite perforation (panel)", f"T{bite_tool}C{BITE_DRILL_MM * scale:.3f}"]
+
+    offsets = [(i * layout["pitch"][0] * scale, j * layout["pitch"][1] * scale)
+               for j in range(rows) for i in range(cols)]
+
+    def shifted(line, dx, dy):
+        def move(m):
+            delta = dx if m.group(1) == "X" else dy
+            return f"{m.group(1)}{float(m.group(2)) + delta:.4f}".rstrip("0").rstrip(".")
+        return _XY.sub(move, line)
+
+    # Preamble (G90, G05, ...) and then one section per tool
+    out = header + ["%"]
+    sections: List[List[str]] = []
+    trailer = []
+    for line in body:
+        if re.match(r"T\d+$", line):
+            sections.append([line])
+        elif line in ("M30", "M00"):
+            trailer.append(line)
+        elif sections:
+            sections[-1].append(line)
+        else:
+            out.append(line)
+
+    hits = 0
+    for section in sections:
+        out.append(section[0])
+        for dx, dy in offsets:
+            for line in section[1:]:
+                if _XY.search(line):
+                    hits += 1
+                    out.append(shifted(line, dx, dy))
+                else:
+                    out.append(line)
+    if add_bites:
+        out.append(f"T{bite_tool}")
+        for dx, dy in offsets:
+            for x, y in layout["bites"]:
+                hits += 1
+                out.append(f"X{x * scale + dx:.4f}Y{y * scale + dy:.4f}")
+    out += trailer or ["M30"]
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(out) + "\n")
+    return hits
+
+
+def panelize(gerber_dir: str, output_dir: str, cols: int, rows: int,
+             separation: str = "mousebites", gap: float = 2.0, rail: float = 5.0,
+             fiducials: bool = True, tab_width: float = 3.0,
+             tabs_per_edge: Optional[int] = None) -> Dict:
+    """
+    Writes panel Gerbers/drill files for the board in gerber_dir into output_dir.
+    """
+    names = sorted(os.listdir(gerber_dir))
+    gerbers = [GerberFile(os.path.join(gerber_dir, n)) for n in names if n.lower().endswith(GERBER_EXTENSIONS)]
+    profile = next((g for g in gerbers if g.kind() == "profile"), None)
+    if profile is None:
+        raise PanelError("No board outline (Edge.Cuts) Gerber found")
+    board, rectangular = outline_box(profile)
+    if separation == "mousebites" and not rectangular:
+        raise PanelError("Mouse-bite tabs need a rectangular board outline; use separation='vscore'")
+
+    layout = panel_layout(board, cols, rows, separation, gap, rail, fiducials, tab_width, tabs_per_edge)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for gerber in gerbers:
+        _write_gerber(gerber, os.path.join(output_dir, gerber.name), cols, rows, layout, separation)
+    if layout["vscore"]:
+        base = profile.name.rsplit("-", 1)[0] if "-" in profile.name else "panel"
+        _write_vscore(profile, os.path.join(output_dir, f"{base}-VScore.gbr"), layout["vscore"])
+
+    drills = [n for n in names if n.lower().endswith(DRILL_EXTENSIONS)]
+    # Mouse bites are non-plated: prefer KiCad's separate NPTH file if there is one
+    bite_file = next((n for n in drills if "npth" in n.lower()), drills[0] if drills else None)
+    hits = 0
+    for name in drills:
+        hits += _write_drill(os.path.join(gerber_dir, name), os.path.join(output_dir, name),
+                             cols, rows, layout, bool(layout["bites"]) and name == bite_file)
+
+    for name in names:
+        if name.endswith(".gbrjob"):
+            with open(os.path.join(gerber_dir, name), "r", encoding="utf-8") as f:
+                job = json.load(f)
+            job.setdefault("GeneralSpecs", {})["Size"] = {"X": layout["size"][0], "Y": layout["size"][1]}
+            with open(os.path.join(output_dir, name), "w", encoding="utf-8") as f:
+                json.dump(job, f, indent=2)
+
+    return {
+        "cols": cols,
+        "rows": rows,
+        "separation": separation,
+        "board_size_mm": [round(board[2] - board[0], 4), round(board[3] - board[1], 4)],
+        "panel_size_mm": list(layout["size"]),
+        "fiducials": len(layout["fiducials"]),
+        "drill_hits": hits,
+    }
+
+
+def panelize_job(job_dir: str, gerber_dirname: str = "gerbers", **options) -> Dict:
+    """
+    Panelizes a job's Gerbers into job_dir/panel-<key>.zip. Identical options
+    reuse the existing archive.
+    """
+    gerber_dir = os.path.join(job_dir, gerber_dirname)
+    if not os.path.isdir(gerber_dir):
+        raise FileNotFoundError("Job has no Gerbers")
+
+    key = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    base = os.path.join(job_dir, f"panel-{key}")
+    info_path = base + ".json"
+    if os.path.isfile(base + ".zip") and os.path.isfile(info_path):
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    info = panelize(gerber_dir, base, **options)
+    info["zip"] = os.path.basename(make_archive(base, base))
+    tmp = info_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp, info_path)
+    return info
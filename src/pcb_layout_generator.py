@@ -3,11 +3,27 @@ import subprocess
 import os
 import shutil
 
-def generate_gerbers(pcb_path: str, output_dir: str) -> bool:
+def generate_gerbers(pcb_path: str, output_dir: str, cancel_event=None, timeout=None, limits=None) -> bool:
     """
     Generates Gerber and Drill files from a .kicad_pcb file using kicad-cli.
-    Returns True if successful, False otherwise.
+    Returns True if successful, False otherwise. Setting cancel_event kills
+    the running kicad-cli and raises ProcessCancelled; timeout (seconds) is
+    shared by both exports and raises ProcessTimeout when it runs out.
+    limits (ResourceLimits) caps each kicad-cli process.
     """
+    import time
+    from src.process_runner import ProcessTimeout, run_process
+
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def remaining():
+        if deadline is None:
+            return None
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise ProcessTimeout(f"Timed out after {timeout:g}s: {kicad_cli}", timeout)
+        return left
+
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
     
@@ -35,7 +51,9 @@ def generate_gerbers(pcb_path: str, output_dir: str) -> bool:
             pcb_path
         ]
         
-        subprocess.run(cmd_gerber, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        result = run_process(cmd_gerber, cancel_event=cancel_event, timeout=remaining(), limits=limits)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, cmd_gerber, result.stdout, result.stderr)
         
         # 2. Export Drill files
         cmd_drill = [
@@ -44,7 +62,9 @@ def generate_gerbers(pcb_path: str, output_dir: str) -> bool:
             pcb_path
         ]
         
-        subprocess.run(cmd_drill, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        result = run_process(cmd_drill, cancel_event=cancel_event, timeout=remaining(), limits=limits)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, cmd_drill, result.stdout, result.stderr)
         
         return True
         
@@ -291,7 +311,11 @@ def generate_kicad_pcb(netlist: dict) -> str:
     
     # Component placement logic with coordinate tracking
     comp_coords = {} # Map ref -> (x, y)
+    comp_bounds = [] # Placed footprint bounding boxes (board coordinates)
     
+    # Footprints are parsed once into geometry objects (see footprint_geometry.py)
+    from src.footprint_geometry import get_footprint
+
     components = netlist.get("components", [])
     for idx, comp in enumerate(components):
         row = idx // components_per_row
@@ -303,15 +327,10 @@ def generate_kicad_pcb(netlist: dict) -> str:
         comp_coords[ref] = (x, y)
         
         fp_name = comp.get("footprint", "Unknown_Footprint")
-        template = FOOTPRINT_TEMPLATES.get(fp_name, FOOTPRINT_TEMPLATES["Unknown_Footprint"])
+        footprint = get_footprint(fp_name)
+        comp_bounds.append(footprint.bbox(x, y))
         
-        fp_str = template.format(
-            x=x, 
-            y=y, 
-            ref=ref, 
-            val=comp.get("value", "Val")
-        )
-        footprints_str += fp_str
+        footprints_str += footprint.to_sexpr(x, y, ref, comp.get("value", "Val"))
 
     # Routing logic (Simple graphical lines)
     routing_str = ""
@@ -346,18 +365,18 @@ def generate_kicad_pcb(netlist: dict) -> str:
 
     footer = "\n)"
     
-    # Calculate board bounds
+    # Calculate board bounds from the real footprint extents
     min_x, min_y = 50.0, 50.0
     max_x, max_y = 50.0, 50.0
     
-    if comp_coords:
-        xs = [c[0] for c in comp_coords.values()]
-        ys = [c[1] for c in comp_coords.values()]
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
+    if comp_bounds:
+        min_x = min(b[0] for b in comp_bounds)
+        min_y = min(b[1] for b in comp_bounds)
+        max_x = max(b[2] for b in comp_bounds)
+        max_y = max(b[3] for b in comp_bounds)
     
     # Add margin
-    margin = 10.0
+    margin = 5.0
     min_x -= margin
     min_y -= margin
     max_x += margin
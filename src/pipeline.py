@@ -0,0 +1,399 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src import deterministic
+from src import jobs
+from src import metrics
+
+# Artifact names inside a job directory
+PCB_FILENAME = "design.kicad_pcb"
+NETLIST_FILENAME = "netlist.tpnl" # Binary netlist, kept for incremental revisions
+GERBER_DIRNAME = "gerbers"
+BLOCK_CACHE_DIRNAME = "_blocks" # Routed sub-circuit blocks shared by all jobs (see src/blocks.py)
+PREVIEW_FILENAME = "preview.svg" # Rendered on request by main.py (see src/board_preview.py)
+PLACEMENT_FILENAME = "placement.json" # Written by the board script for the assembly export
+BOM_FILENAME = "bom.csv" # Assembly files, generated on request (see src/assembly_export.py)
+CPL_FILENAME = "cpl.csv"
+GERBER_ZIP_BASENAME = "design_gerbers" # make_archive adds .zip
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kicad_script.py")
+
+# Wall-clock budget (s) of each KiCad stage; 0 = none. The child is killed
+# with its whole process group when it runs out (see src/process_runner.py).
+STAGE_TIMEOUTS = {
+    "board": float(os.getenv("BOARD_TIMEOUT_SECONDS", "600")),
+    "gerbers": float(os.getenv("GERBER_TIMEOUT_SECONDS", "180")),
+}
+
+STAGE_TIMEOUT_COUNT = metrics.Counter(
+    "pipeline_stage_timeouts_total", "KiCad stages killed at their wall-clock timeout", ("stage",))
+STAGE_FAILURE_COUNT = metrics.Counter(
+    "pipeline_stage_failures_total", "KiCad stages that exited with an error", ("stage",))
+
+
+class PipelineError(Exception):
+    pass
+
+
+class PipelineCancelled(PipelineError):
+    pass
+
+
+class PipelineTimeout(PipelineError):
+    """
+    A stage ran past its timeout and was killed. Not worth retrying: the same
+    input would run away again.
+    """
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} stage timed out after {seconds:g}s")
+        self.stage = stage
+        self.seconds = seconds
+
+
+class PreflightFailed(PipelineError):
+    """
+    The netlist cannot give a board (see src/preflight.py); KiCad was not
+    started. Not worth retrying either.
+    """
+
+    def __init__(self, problems: List[Dict[str, Any]]):
+        from src.preflight import summary
+        super().__init__(f"Netlist preflight failed ({summary(problems)})")
+        self.problems = problems
+
+
+def stage_timeout(stage: str) -> Optional[float]:
+    return STAGE_TIMEOUTS.get(stage) or None
+
+
+def kicad_python_exe() -> str:
+    # Determine KiCad Python Executable based on OS/ENV
+    default_kicad_py = r"C:\Program Files\KiCad\9.0\bin\python.exe"
+    if os.name != 'nt':
+        default_kicad_py = "/usr/bin/python3" # Typical linux path
+    return os.getenv("KICAD_PYTHON_EXE", default_kicad_py)
+
+
+def _check_cancel(cancel_event: Optional[threading.Event]) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise PipelineCancelled("Job cancelled")
+
+
+def parse_stage(prompt: str) -> Dict[str, Any]:
+    """
+    Stage 1: natural language -> parsed components / connections.
+    """
+    from src.nlp_parser import parse_requirements
+    parsed_data = parse_requirements(prompt)
+    print(f"Parsed Data: {parsed_data}")
+
+    # Debug Log
+    try:
+        with open("server_debug.log", "a", encoding="utf-8") as logutils:
+            logutils.write(f"--- Request ---\n")
+            logutils.write(f"Prompt: {prompt}\n")
+            logutils.write(f"Parsed: {parsed_data}\n")
+    except Exception as e:
+        print(f"Logging failed: {e}")
+
+    return parsed_data
+
+
+def netlist_stage(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stage 2: parsed data -> netlist dict.
+    """
+    from src.schematic_generator import generate_schematic
+    return generate_schematic(
+        parsed_data.get("components", []),
+        parsed_data.get("connections", [])
+    )
+
+
+def preflight_stage(netlist: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Stage 2b: checks the netlist against the footprints' pads before any
+    KiCad process starts. Returns the netlist (with fixes applied) and the
+    problems found; raises PreflightFailed if there are errors.
+    """
+    from src.preflight import check_netlist, summary
+    netlist, problems = check_netlist(netlist)
+    if problems:
+        print(f"Preflight: {summary(problems)}")
+    if any(p["severity"] == "error" for p in problems):
+        raise PreflightFailed(problems)
+    return netlist, problems
+
+
+def base_revision(base_job: Optional[str]) -> Optional[str]:
+    """
+    Returns the job directory of a previous revision if it has everything an
+    incremental rebuild needs, else None (caller falls back to a full build).
+    """
+    if not base_job:
+        return None
+    try:
+        base_dir = jobs.job_dir(base_job)
+    except ValueError:
+        return None
+    for name in (PCB_FILENAME, NETLIST_FILENAME):
+        if not os.path.isfile(os.path.join(base_dir, name)):
+            return None
+    return base_dir
+
+
+def revision_summary(netlist: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    from src.netlist_diff import diff_netlists, summarize_diff
+    from src.netlist_model import load_netlist
+    old_netlist = load_netlist(os.path.join(base_dir, NETLIST_FILENAME))
+    return summarize_diff(diff_netlists(old_netlist, netlist))
+
+
+def board_stage(netlist: Dict[str, Any], job_dir: str,
+                cancel_event: Optional[threading.Event] = None,
+                base_dir: Optional[str] = None,
+                env: Optional[Dict[str, str]] = None) -> str:
+    """
+    Stage 3: runs the KiCad script in KiCad's Python and returns the board path.
+    With base_dir (a previous revision's job directory) only the parts of the
+    board affected by the netlist change are placed and routed. env sets the
+    script's knobs (see src/explore.py for the variant ones).
+    """
+    from src.netlist_model import encode_netlist, export_json
+    from src.process_runner import run_process, kicad_limits, ProcessCancelled, ProcessTimeout
+
+    _check_cancel(cancel_event)
+
+    # Encode Netlist (compact binary) and pipe it straight to the KiCad Script.
+    # JSON is only written when explicitly requested (debugging / interchange).
+    netlist_blob = encode_netlist(netlist)
+    with open(os.path.join(job_dir, NETLIST_FILENAME), "wb") as f:
+        f.write(netlist_blob)
+    if os.getenv("EXPORT_NETLIST_JSON", "0") == "1":
+        export_json(netlist, os.path.join(job_dir, "netlist.json"))
+
+    output_file = os.path.join(job_dir, PCB_FILENAME)
+    kicad_python = kicad_python_exe()
+
+    print(f"Running KiCad script: {kicad_python} {SCRIPT_PATH}")
+    cmd = [kicad_python, SCRIPT_PATH, "-", output_file]
+    if base_dir:
+        cmd += ["--base", os.path.join(base_dir, PCB_FILENAME), os.path.join(base_dir, NETLIST_FILENAME)]
+    else:
+        cmd += ["--block-cache", os.path.join(jobs.JOBS_ROOT, BLOCK_CACHE_DIRNAME)]
+
+    timeout = stage_timeout("board")
+    try:
+        result = run_process(cmd, input=netlist_blob, cancel_event=cancel_event,
+                             timeout=timeout, limits=kicad_limits(timeout), env=env)
+    except ProcessCancelled as e:
+        raise PipelineCancelled(str(e))
+    except ProcessTimeout as e:
+        STAGE_TIMEOUT_COUNT.inc(stage="board")
+        print("STDOUT:", e.stdout)
+        raise PipelineTimeout("board", e.seconds)
+    print("STDOUT:", result.stdout)
+    print("STDERR:", result.stderr)
+
+    if result.returncode != 0:
+        STAGE_FAILURE_COUNT.inc(stage="board")
+        limit = result.limit_hit()
+        if limit:
+            raise PipelineError(f"KiCad script stopped by resource limit: {limit}")
+        raise PipelineError(f"KiCad script failed: {result.stderr}")
+
+    # Verify output exists
+    if not os.path.exists(output_file):
+        raise PipelineError("KiCad script finished but no PCB file created.")
+
+    # Precompress now so the first download is already served compressed
+    from src.downloads import precompressed_path
+    precompressed_path(output_file, "gzip")
+
+    return output_file
+
+
+def ratsnest_stage(pcb_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Airwires for the placed board (see src/ratsnest.py), or None if the board
+    could not be read. Geometry only; never fails the job.
+    """
+    from src.ratsnest import board_ratsnest
+    try:
+        return board_ratsnest(pcb_path)
+    except Exception as e:
+        print(f"Ratsnest failed: {e}")
+        return None
+
+
+def gerber_stage(pcb_path: str, job_dir: str,
+                 cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+    """
+    Stage 4: exports Gerbers + drill files and zips them. Returns the zip path,
+    or None if export failed.
+    """
+    from src.pcb_layout_generator import generate_gerbers
+    from src.process_runner import kicad_limits, ProcessCancelled, ProcessTimeout
+
+    _check_cancel(cancel_event)
+
+    gerber_dir = os.path.join(job_dir, GERBER_DIRNAME)
+    timeout = stage_timeout("gerbers")
+    try:
+        gerber_generated = generate_gerbers(pcb_path, gerber_dir, cancel_event=cancel_event,
+                                            timeout=timeout, limits=kicad_limits(timeout))
+    except ProcessCancelled as e:
+        raise PipelineCancelled(str(e))
+    except ProcessTimeout as e:
+        STAGE_TIMEOUT_COUNT.inc(stage="gerbers")
+        raise PipelineTimeout("gerbers", e.seconds)
+
+    if not gerber_generated:
+        STAGE_FAILURE_COUNT.inc(stage="gerbers")
+        return None
+    if deterministic.ENABLED:
+        # kicad-cli stamps every file with the export time
+        deterministic.pin_timestamps(gerber_dir)
+    return deterministic.make_archive(os.path.join(job_dir, GERBER_ZIP_BASENAME), gerber_dir)
+
+
+def timed(timings: Dict[str, float], stage: str, fn: Callable[..., Any], *args) -> Any:
+    """
+    Runs fn(*args) and records its wall time (s) in timings[stage].
+    """
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 4)
+
+
+def record_design(job_id: str, prompt: str, parsed_data: Dict[str, Any], netlist: Dict[str, Any],
+                  pcb_path: str, gerber_zip: Optional[str], timings: Dict[str, float]) -> None:
+    """
+    Adds a finished job to the design history (see src/design_store.py).
+    Bookkeeping only; never fails the job.
+    """
+    from src.design_store import describe_artifacts, get_design_store
+    try:
+        store = get_design_store()
+        if store is None:
+            return
+        artifacts = describe_artifacts({
+            "pcb": pcb_path,
+            "netlist": os.path.join(os.path.dirname(pcb_path), NETLIST_FILENAME),
+            "gerbers": gerber_zip,
+        })
+        store.record(job_id, prompt, parsed_data, netlist, artifacts, timings)
+    except Exception as e:
+        print(f"Design store failed for {job_id}: {e}")
+
+
+def empty_result(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "warning",
+        "message": "No components detected in your prompt. Please be more specific (e.g., 'Add a resistor and LED').",
+        "parsed_data": parsed_data,
+        "netlist": {"components": [], "nets": []},
+        "pcb_file": None,
+        "logs": [
+            "Parsing requirement...",
+            "WARNING: No components found in the text.",
+            "Try referencing specific parts like 'LM7805', 'Resistor', 'Capacitor'."
+        ],
+        "download_url": None
+    }
+
+
+def success_result(job_id: str, parsed_data: Dict[str, Any], netlist: Dict[str, Any],
+                   pcb_path: str, gerber_zip: Optional[str]) -> Dict[str, Any]:
+    # Logs update
+    logs = [
+        "Parsing requirements...",
+        f"Identified components: {len(parsed_data.get('components', []))}",
+        "Generating netlist...",
+        "Executing KiCad Automation Script...",
+        "Placing footprints...",
+        "Routing tracks...",
+        f"Generated {PCB_FILENAME}"
+    ]
+    return {
+        "status": "success",
+        "message": "Design generated successfully",
+        "job_id": job_id,
+        "parsed_data": parsed_data,
+        "netlist": netlist,
+        "pcb_file": pcb_path,
+        "logs": logs + [f"Gerber generation: {'Success' if gerber_zip else 'Failed'}"],
+        "download_url": jobs.job_url(job_id, PCB_FILENAME),
+        "preview_url": jobs.job_url(job_id, PREVIEW_FILENAME),
+        "gerber_url": jobs.job_url(job_id, os.path.basename(gerber_zip)) if gerber_zip else None,
+        "bom_url": jobs.job_url(job_id, BOM_FILENAME),
+        "cpl_url": jobs.job_url(job_id, CPL_FILENAME)
+    }
+
+
+def run_pipeline(prompt: str, job_id: str,
+                 cancel_event: Optional[threading.Event] = None,
+                 base_job: Optional[str] = None,
+                 on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 explore: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Runs every stage for a prompt and returns the /generate response body.
+    base_job turns this into a revision of an earlier job. on_stage(event, data)
+    is called after each stage with the same payloads /generate/stream emits.
+    explore (see src/explore.py) builds several board variants and carries
+    on with the best one.
+    """
+    def stage(event, data):
+        if on_stage is not None:
+            on_stage(event, data)
+
+    timings: Dict[str, float] = {}
+    parsed_data = timed(timings, "parse", parse_stage, prompt)
+    stage("parsed", {"parsed_data": parsed_data})
+    if not parsed_data.get("components"):
+        return empty_result(parsed_data)
+
+    netlist = timed(timings, "netlist", netlist_stage, parsed_data)
+    # A failed preflight is reported by the caller (the job row keeps the problems)
+    netlist, problems = timed(timings, "preflight", preflight_stage, netlist)
+    stage("netlist", {"netlist": netlist, "preflight": problems})
+
+    job_dir = jobs.job_dir(job_id, create=True)
+    revision = None
+    if explore:
+        from src.explore import EXPLORE_WORKERS, explore_board, exploration_result
+        ranked, summary = timed(timings, "explore", explore_board, netlist, job_id, explore["variants"],
+                                explore.get("budget"), cancel_event, EXPLORE_WORKERS)
+        # The best variant is the job from here on
+        job_id, pcb_path = ranked[0]["job_id"], ranked[0]["pcb_file"]
+        job_dir = jobs.job_dir(job_id)
+    else:
+        base_dir = base_revision(base_job)
+        pcb_path = timed(timings, "board", board_stage, netlist, job_dir, cancel_event, base_dir)
+        if base_dir:
+            revision = dict(base_job=base_job, **revision_summary(netlist, base_dir))
+    ratsnest = timed(timings, "ratsnest", ratsnest_stage, pcb_path)
+    board_event = {"job_id": job_id, "pcb_file": pcb_path, "download_url": jobs.job_url(job_id, PCB_FILENAME),
+                   "preview_url": jobs.job_url(job_id, PREVIEW_FILENAME), "ratsnest": ratsnest}
+    if revision:
+        board_event["revision"] = revision
+    stage("board", board_event)
+
+    gerber_zip = timed(timings, "gerbers", gerber_stage, pcb_path, job_dir, cancel_event)
+    stage("gerbers", {"gerber_url": jobs.job_url(job_id, os.path.basename(gerber_zip)) if gerber_zip else None})
+
+    record_design(job_id, prompt, parsed_data, netlist, pcb_path, gerber_zip, timings)
+    result = success_result(job_id, parsed_data, netlist, pcb_path, gerber_zip)
+    result["ratsnest"] = ratsnest
+    result["timings"] = timings
+    if revision:
+        result["revision"] = revision
+    if problems:
+        result["preflight"] = problems
+    if explore:
+        result.update(exploration_result(ranked, summary))
+    return result
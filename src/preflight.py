@@ -0,0 +1,255 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from src import metrics
+
+# Netlist preflight: the problems the board stage would only find inside KiCad.
+#
+# The board script skips a part whose footprint it cannot load and a net node
+# whose pin the footprint does not have, a pad put in two nets ends up in the
+# last one, and a net with a single node has nothing to route. The job still
+# pays for the KiCad start-up, library loads and routing, and the board comes
+# out quietly incomplete. check_netlist() runs before that, in the process
+# that built the netlist, against each footprint's pad numbers, and fixes the
+# netlist or says why it cannot be built:
+#
+# - unknown_footprint: no footprint (Unknown_Footprint, or not in the
+#   footprint index when one is built) -> a pin header with as many pins as
+#   the part uses, like the other proxies in FOOTPRINT_MAP
+# - unknown_ref: a net node on a part that does not exist -> node dropped
+# - missing_pin: a pin the footprint does not have (a 5th pin on a 4-pin
+#   header) -> the first pad no net uses, else the node is dropped
+# - pad_conflict: one pad in two nets -> the earlier net moves to a free
+#   pad, else the pad stays in the last net only (as on the board)
+# - single_node_net: a net with fewer than two nodes -> dropped
+# - no_components, duplicate_ref: cannot be fixed
+#
+# Pad numbers come from the footprint index if it has been built (see
+# src/footprint_index.py), else from PAD_TABLE or the pin count in the
+# footprint name (DIP-16, PinHeader_1x04, ...). Pins of footprints none of
+# these know are not checked. Lookups are cached, so a check is a few dict
+# operations per node.
+
+# 0: report every problem as an error instead of fixing it (no board is built)
+PREFLIGHT_FIX = os.getenv("PREFLIGHT_FIX", "1") == "1"
+
+PROXY_FOOTPRINT = "Connector_PinHeader_2.54mm:PinHeader_1x{pins:02d}_P2.54mm_Vertical"
+PROXY_MAX_PINS = 40 # Longest single-row header in the KiCad library
+
+# Pad count (pads "1".."n") of the FOOTPRINT_MAP footprints whose name doesn't give it
+PAD_TABLE = {
+    "LED_THT:LED_D5.0mm": 2,
+    "Capacitor_THT:C_Disc_D5.0mm_W2.5mm_P5.00mm": 2,
+    "Resistor_THT:R_Axial_DIN0207_L6.3mm_D2.5mm_P7.62mm_Horizontal": 2,
+    "Diode_THT:D_DO-41_SOD81_P10.16mm_Horizontal": 2,
+    "OptoDevice:Resistor_LDR_5.0x4.1mm_P3mm_Vertical": 2,
+    "Button_Switch_THT:SW_PUSH_6mm": 2,
+    "Potentiometer_THT:Potentiometer_Bourns_3386P_Vertical": 3,
+    "Connector_BarrelJack:BarrelJack_Horizontal": 3,
+    "Sensor:Aosong_DHT11_5.5x12.0_P2.54mm": 4,
+    "Module:Arduino_UNO_R3": 32,
+}
+
+# Pin count in a footprint name: rows x columns of a connector, or the N of a package
+_NAME_PINS = (
+    re.compile(r"_(\d+)x(\d+)(?:_|$)"),
+    re.compile(r"^(?:DIP|SOIC|SOP|SSOP|TSSOP|TO-220|TO-247|TO-263)-(\d+)(?:_|$)"),
+)
+
+PROBLEM_COUNT = metrics.Counter(
+    "netlist_preflight_problems_total", "Netlist problems found before the board stage", ("code", "severity"))
+
+# fp_id -> (exists, pad numbers or None)
+_footprints: Dict[str, Tuple[bool, Optional[Tuple[str, ...]]]] = {}
+
+
+def _numbered(count: int) -> Tuple[str, ...]:
+    return tuple(str(n) for n in range(1, count + 1))
+
+
+def _lookup(fp_id: str) -> Tuple[bool, Optional[Tuple[str, ...]]]:
+    if not fp_id or ":" not in fp_id:
+        return False, None
+    from src.footprint_index import default_index
+    index = default_index()
+    if index is not None:
+        entry = index.get(fp_id)
+        return (True, tuple(entry["pads"])) if entry else (False, None)
+    if fp_id in PAD_TABLE:
+        return True, _numbered(PAD_TABLE[fp_id])
+    name = fp_id.partition(":")[2]
+    for pattern in _NAME_PINS:
+        match = pattern.search(name)
+        if match:
+            count = 1
+            for group in match.groups():
+                count *= int(group)
+            return True, _numbered(count)
+    return True, None
+
+
+def footprint_pads(fp_id: str) -> Tuple[bool, Optional[Tuple[str, ...]]]:
+    """
+    (exists, pad numbers) of a footprint id. Pad numbers are None when no
+    source knows the footprint, and its pins are not checked.
+    """
+    found = _footprints.get(fp_id)
+    if found is None:
+        found = _footprints[fp_id] = _lookup(fp_id)
+    return found
+
+
+def proxy_footprint(pins: List[str]) -> str:
+    # Smallest header that keeps the numeric pins a part uses
+    count = max([len(set(pins))] + [int(p) for p in pins if p.isdigit()] + [1])
+    return PROXY_FOOTPRINT.format(pins=min(count, PROXY_MAX_PINS))
+
+
+def _describe(pads: Tuple[str, ...]) -> str:
+    if pads == _numbered(len(pads)):
+        return f"pads 1-{len(pads)}" if len(pads) > 1 else "pad 1" if pads else "no pads"
+    return "pads " + ", ".join(pads)
+
+
+def check_netlist(netlist: Dict[str, Any], fix: Optional[bool] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Checks a netlist (see schematic_generator.generate_schematic) against its
+    footprints' pads. Returns the netlist with the fixes applied (the input
+    is not modified) and the problems found, each {"code", "severity",
+    "message", "fix"} plus "ref" / "net" / "pin" where they apply. severity
+    is "error" (no board can be built as asked), "fixed", or "warning" (fixed
+    by dropping a connection). With fix=False (default: PREFLIGHT_FIX) every
+    problem is an error.
+    """
+    fix = PREFLIGHT_FIX if fix is None else fix
+    problems: List[Dict[str, Any]] = []
+
+    def report(code, severity, message, fix_text=None, **where):
+        severity = severity if fix else "error"
+        problem = dict(code=code, severity=severity, message=message, **where)
+        if fix_text:
+            problem["fix"] = fix_text
+        problems.append(problem)
+        PROBLEM_COUNT.inc(code=code, severity=severity)
+
+    components = netlist.get("components") or []
+    if not components:
+        report("no_components", "error", "The netlist has no components")
+        return netlist, problems
+
+    parts: Dict[str, Dict[str, Any]] = {}
+    for comp in components:
+        if comp["ref"] in parts:
+            report("duplicate_ref", "error", f"Reference {comp['ref']} is used by more than one component",
+                   ref=comp["ref"])
+        parts[comp["ref"]] = comp
+
+    # Nodes by net, without unknown parts or repeats
+    nets = []
+    for net in netlist.get("nets") or []:
+        nodes = []
+        for node in net.get("nodes") or []:
+            ref, pin = node["ref"], str(node["pin"])
+            if ref not in parts:
+                report("unknown_ref", "fixed", f"Net {net['name']} connects to {ref}, which is not a component",
+                       "node dropped", ref=ref, net=net["name"], pin=pin)
+            elif (ref, pin) not in nodes:
+                nodes.append((ref, pin))
+        nets.append((net, nodes))
+
+    # Footprints, proxied where missing
+    pads: Dict[str, Optional[Tuple[str, ...]]] = {}
+    changed_parts = {}
+    for ref, comp in parts.items():
+        exists, pads[ref] = footprint_pads(comp.get("footprint") or "")
+        if not exists:
+            proxy = proxy_footprint([pin for _, nodes in nets for r, pin in nodes if r == ref])
+            report("unknown_footprint", "fixed",
+                   f"{ref} ({comp.get('value', '')}) has no footprint ({comp.get('footprint') or 'none'})",
+                   f"using {proxy}", ref=ref)
+            changed_parts[ref] = dict(comp, footprint=proxy)
+            pads[ref] = footprint_pads(proxy)[1]
+
+    # Pins: missing ones and pads shared by two nets move to free pads
+    taken = set((ref, pin) for _, nodes in nets for ref, pin in nodes if pads[ref] is None or pin in pads[ref])
+
+    def free_pad(ref):
+        for pad in pads[ref] or ():
+            if (ref, pad) not in taken:
+                taken.add((ref, pad))
+                return pad
+        return None
+
+    remapped: Dict[Tuple[str, str], Optional[str]] = {}
+    pinned = []
+    for net, nodes in nets:
+        kept = []
+        for ref, pin in nodes:
+            if pads[ref] is not None and pin not in pads[ref]:
+                if (ref, pin) not in remapped:
+                    remapped[(ref, pin)] = new_pin = free_pad(ref)
+                    footprint = changed_parts.get(ref, parts[ref]).get("footprint")
+                    report("missing_pin", "fixed" if new_pin else "warning",
+                           f"{ref} has no pin {pin}: {footprint} has {_describe(pads[ref])}",
+                           f"moved to pad {new_pin}" if new_pin else f"dropped from net {net['name']}",
+                           ref=ref, net=net["name"], pin=pin)
+                elif remapped[(ref, pin)] is None:
+                    report("missing_pin", "warning", f"{ref} has no pin {pin}", f"dropped from net {net['name']}",
+                           ref=ref, net=net["name"], pin=pin)
+                pin = remapped[(ref, pin)]
+                if pin is None:
+                    continue
+            if (ref, pin) not in kept:
+                kept.append((ref, pin))
+        pinned.append((net, kept))
+
+    # A pad in two nets stays in the last one, as on the board
+    owner = {}
+    for i, (_, nodes) in enumerate(pinned):
+        for node in nodes:
+            owner[node] = i
+
+    fixed_nets = []
+    for i, (net, nodes) in enumerate(pinned):
+        name = net["name"]
+        kept = []
+        for ref, pin in nodes:
+            if owner[(ref, pin)] != i:
+                other = pinned[owner[(ref, pin)]][0]["name"]
+                new_pin = free_pad(ref)
+                report("pad_conflict", "fixed" if new_pin else "warning",
+                       f"{ref} pin {pin} is in nets {name} and {other}",
+                       f"moved to pad {new_pin} in net {name}" if new_pin else f"dropped from net {name}",
+                       ref=ref, net=name, pin=pin)
+                if new_pin is None:
+                    continue
+                pin = new_pin
+            kept.append((ref, pin))
+
+        if len(kept) < 2:
+            where = f" ({kept[0][0]} pin {kept[0][1]})" if kept else ""
+            report("single_node_net", "fixed", f"Net {name} has {len(kept)} node{'' if len(kept) == 1 else 's'}{where}",
+                   "net dropped", net=name)
+            continue
+        fixed_nets.append(dict(net, nodes=[{"ref": ref, "pin": pin} for ref, pin in kept]))
+
+    if not problems:
+        return netlist, problems
+    fixed = dict(netlist, nets=fixed_nets)
+    if changed_parts:
+        fixed["components"] = [changed_parts.get(c["ref"], c) for c in components]
+    return fixed, problems
+
+
+def summary(problems: List[Dict[str, Any]]) -> str:
+    """
+    One line for logs and error details: "2 fixed, 1 error: <first error>".
+    """
+    counts: Dict[str, int] = {}
+    for problem in problems:
+        counts[problem["severity"]] = counts.get(problem["severity"], 0) + 1
+    text = ", ".join(f"{n} {severity}{'s' if n > 1 and severity != 'fixed' else ''}"
+                     for severity, n in sorted(counts.items()))
+    errors = [p["message"] for p in problems if p["severity"] == "error"]
+    return f"{text}: {errors[0]}" if errors else text
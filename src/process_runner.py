@@ -0,0 +1,197 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Polling interval while waiting on a child process for cancellation / timeout
+POLL_INTERVAL = 0.1
+# After SIGTERM, how long the process group gets before SIGKILL
+KILL_GRACE_SECONDS = 2.0
+
+
+class ProcessCancelled(Exception):
+    pass
+
+
+class ProcessTimeout(Exception):
+    """
+    The child ran past its wall-clock timeout and was killed (with its whole
+    process group).
+    """
+
+    def __init__(self, message: str, seconds: float, stdout: str = "", stderr: str = ""):
+        super().__init__(message)
+        self.seconds = seconds
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class ProcessResult:
+    __slots__ = ("returncode", "stdout", "stderr")
+
+    def __init__(self, returncode: int, stdout: str, stderr: str):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def limit_hit(self) -> Optional[str]:
+        """
+        Which resource cap killed the child, if that is what happened.
+        """
+        if os.name == "nt" or self.returncode >= 0:
+            return None
+        if self.returncode == -getattr(signal, "SIGXCPU", 0):
+            return "CPU time limit"
+        if self.returncode == -signal.SIGKILL:
+            # The kernel's OOM killer, or RLIMIT_CPU's hard limit
+            return "killed (memory or CPU limit)"
+        return None
+
+
+class ResourceLimits:
+    """
+    RLIMIT caps for a child process (POSIX only; ignored on Windows).
+    memory_mb caps the address space, cpu_seconds the CPU time. 0 = no cap.
+    """
+    __slots__ = ("memory_mb", "cpu_seconds")
+
+    def __init__(self, memory_mb: int = 0, cpu_seconds: int = 0):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+
+    def rlimits(self):
+        import resource
+        limits = []
+        if self.memory_mb > 0:
+            size = self.memory_mb * 1024 * 1024
+            limits.append((resource.RLIMIT_AS, (size, size)))
+        if self.cpu_seconds > 0:
+            # SIGXCPU at the soft limit, SIGKILL a little later if that is ignored
+            limits.append((resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 5)))
+        return limits
+
+
+def kicad_limits(timeout: Optional[float] = None) -> ResourceLimits:
+    """
+    Caps for KiCad children: KICAD_MEMORY_MB (default 4096) and
+    KICAD_CPU_SECONDS (default: the stage timeout, so a process can never
+    burn more CPU than its wall-clock budget).
+    """
+    cpu_default = int(timeout) if timeout else 0
+    return ResourceLimits(int(os.getenv("KICAD_MEMORY_MB", "4096")),
+                          int(os.getenv("KICAD_CPU_SECONDS", str(cpu_default))))
+
+
+def _apply_limits(proc: subprocess.Popen, limits: Optional[ResourceLimits]):
+    # prlimit sets the caps on the running child without a preexec_fn
+    # (which is unsafe in a threaded server); children it starts inherit them
+    if limits is None or os.name == "nt":
+        return
+    import resource
+    if not hasattr(resource, "prlimit"):
+        return
+    for which, value in limits.rlimits():
+        try:
+            resource.prlimit(proc.pid, which, value)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not set resource limit on pid {proc.pid}: {e}")
+
+
+def _preexec(limits: Optional[ResourceLimits]):
+    # Platforms without prlimit (macOS) set the caps in the child before exec
+    if limits is None or os.name == "nt":
+        return None
+    import resource
+    if hasattr(resource, "prlimit"):
+        return None
+
+    def set_limits():
+        for which, value in limits.rlimits():
+            resource.setrlimit(which, value)
+    return set_limits
+
+
+def kill_group(proc: subprocess.Popen) -> None:
+    """
+    Stops the child and everything it started: SIGTERM to its process group,
+    SIGKILL after KILL_GRACE_SECONDS. On Windows the process tree is killed.
+    """
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if proc.poll() is None:
+            proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(timeout=KILL_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        # Grandchildren may outlive the leader; the group goes either way
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_process(cmd: List[str], input: Optional[bytes] = None,
+                cancel_event: Optional[threading.Event] = None,
+                timeout: Optional[float] = None,
+                limits: Optional[ResourceLimits] = None,
+                env: Optional[Dict[str, str]] = None) -> ProcessResult:
+    """
+    Runs a child process to completion, capturing output. The child gets its
+    own process group. If cancel_event is set while it runs, the group is
+    killed and ProcessCancelled is raised; past timeout seconds (wall clock)
+    it is killed and ProcessTimeout is raised. limits caps its memory / CPU.
+    env is added to this process's environment.
+    """
+    kwargs = {}
+    if env:
+        kwargs["env"] = dict(os.environ, **env)
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+        preexec = _preexec(limits)
+        if preexec is not None:
+            kwargs["preexec_fn"] = preexec
+
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **kwargs
+    )
+    _apply_limits(proc, limits)
+    pending_input = input
+    while True:
+        try:
+            out, err = proc.communicate(pending_input, timeout=POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            # communicate() keeps track of input already written
+            pending_input = None
+            if cancel_event is not None and cancel_event.is_set():
+                kill_group(proc)
+                proc.communicate()
+                raise ProcessCancelled(f"Cancelled: {cmd[0]}")
+            if timeout is not None and time.monotonic() - started > timeout:
+                kill_group(proc)
+                out, err = proc.communicate()
+                raise ProcessTimeout(f"Timed out after {timeout:g}s: {cmd[0]}", timeout,
+                                     out.decode("utf-8", errors="replace"),
+                                     err.decode("utf-8", errors="replace"))
+
+    return ProcessResult(
+        proc.returncode,
+        out.decode("utf-8", errors="replace"),
+        err.decode("utf-8", errors="replace"),
+    )
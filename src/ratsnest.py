@@ -0,0 +1,410 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src import sexpr
+from src.footprint_geometry import Pad, transform
+from src.track_optimizer import SpatialHash
+
+# Ratsnest (airwires) for a placed board.
+#
+# Per net, the minimum set of pad-to-pad connections is the Euclidean minimum
+# spanning tree of its pads. The EMST is a subgraph of the Delaunay
+# triangulation, so candidates come from an incremental Bowyer-Watson
+# triangulation (O(n log n) expected) instead of all n^2 pairs, and Kruskal
+# picks the tree. Pads already joined by copper are pre-merged, which turns
+# the same computation into "what is still unrouted".
+#
+# Coordinates are converted to integer micrometres so the geometric
+# predicates are exact. Copper islands are found through a spatial hash of
+# pads, track ends and vias, so a net with thousands of segments still loads
+# and moves in milliseconds.
+
+SCALE = 1000 # board units per mm in the predicates (um)
+HASH_CELL = 2.0 # mm, spatial hash cell for copper connectivity
+
+
+def _orient(a, b, c) -> int:
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def _in_circle(a, b, c, d) -> int:
+    """
+    > 0 if d is strictly inside the circumcircle of the counter-clockwise triangle abc.
+    """
+    adx, ady = a[0] - d[0], a[1] - d[1]
+    bdx, bdy = b[0] - d[0], b[1] - d[1]
+    cdx, cdy = c[0] - d[0], c[1] - d[1]
+    ad, bd, cd = adx * adx + ady * ady, bdx * bdx + bdy * bdy, cdx * cdx + cdy * cdy
+    return (adx * (bdy * cd - bd * cdy) - ady * (bdx * cd - bd * cdx) + ad * (bdx * cdy - bdy * cdx))
+
+
+def _snake_order(points: Sequence[Tuple[int, int]]) -> List[int]:
+    """
+    Insertion order with spatial locality (columns, alternating direction),
+    so point location walks stay short.
+    """
+    n = len(points)
+    xs = [p[0] for p in points]
+    x0, x1 = min(xs), max(xs)
+    columns = max(1, int(math.sqrt(n)))
+    width = (x1 - x0) / columns or 1
+
+    def key(i):
+        col = min(columns - 1, int((points[i][0] - x0) / width))
+        y = points[i][1]
+        return (col, y if col % 2 == 0 else -y, points[i][0])
+
+    return sorted(range(n), key=key)
+
+
+def delaunay_edges(points: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Edges (i, j), i < j, of a Delaunay triangulation of distinct integer points.
+    """
+    n = len(points)
+    if n < 2:
+        return []
+    if n == 2:
+        return [(0, 1)]
+
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    cx, cy = (min(xs) + max(xs)) // 2, (min(ys) + max(ys)) // 2
+    m = max(max(xs) - min(xs), max(ys) - min(ys), 1) * 64
+    pts = list(points) + [(cx - 3 * m, cy - 3 * m), (cx + 3 * m, cy - 3 * m), (cx, cy + 3 * m)]
+    super_tri = (n, n + 1, n + 2)
+    if _orient(*(pts[i] for i in super_tri)) < 0:
+        super_tri = (n, n + 2, n + 1)
+
+    tris: Dict[int, Tuple[int, int, int]] = {0: super_tri}
+    edge: Dict[Tuple[int, int], int] = {}
+    a, b, c = super_tri
+    edge[(a, b)] = edge[(b, c)] = edge[(c, a)] = 0
+    next_id = 1
+    last = 0
+
+    for i in _snake_order(points):
+        p = pts[i]
+
+        # Locate: walk towards p from the last triangle created
+        t = last
+        for _ in range(4 * len(tris) + 8):
+            a, b, c = tris[t]
+            for u, v in ((a, b), (b, c), (c, a)):
+                if _orient(pts[u], pts[v], p) < 0:
+                    t = edge[(v, u)]
+                    break
+            else:
+                break
+
+        # Cavity: every triangle whose circumcircle contains p (connected)
+        bad = {t}
+        stack = [t]
+        while stack:
+            a, b, c = tris[stack.pop()]
+            for u, v in ((a, b), (b, c), (c, a)):
+                other = edge.get((v, u))
+                if other is not None and other not in bad and _in_circle(*(pts[k] for k in tris[other]), p) > 0:
+                    bad.add(other)
+                    stack.append(other)
+
+        boundary = []
+        for t in bad:
+            a, b, c = tris[t]
+            for u, v in ((a, b), (b, c), (c, a)):
+                if edge.get((v, u)) not in bad:
+                    boundary.append((u, v))
+        for t in bad:
+            a, b, c = tris.pop(t)
+            for u, v in ((a, b), (b, c), (c, a)):
+                del edge[(u, v)]
+        for u, v in boundary:
+            tris[next_id] = (u, v, i)
+            edge[(u, v)] = edge[(v, i)] = edge[(i, u)] = next_id
+            last = next_id
+            next_id += 1
+
+    edges = set()
+    for a, b, c in tris.values():
+        for u, v in ((a, b), (b, c), (c, a)):
+            if u < n and v < n:
+                edges.add((min(u, v), max(u, v)))
+    return sorted(edges)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        self.parent[rb] = ra
+        return True
+
+
+def minimum_airwires(points: Sequence[Tuple[float, float]],
+                     clusters: Optional[Sequence[int]] = None) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    points in mm. Returns (airwires, unrouted): the spanning tree of all
+    points, and the shortest set of connections that still joins points whose
+    clusters (e.g. copper islands, one label per point) differ.
+    """
+    n = len(points)
+    if n < 2:
+        return [], []
+    ints = [(int(round(x * SCALE)), int(round(y * SCALE))) for x, y in points]
+
+    # Coincident pads triangulate as one point and join at zero length
+    first: Dict[Tuple[int, int], int] = {}
+    unique, candidates = [], []
+    for i, p in enumerate(ints):
+        if p in first:
+            candidates.append((0, first[p], i))
+        else:
+            first[p] = i
+            unique.append(i)
+    for u, v in delaunay_edges([ints[i] for i in unique]):
+        a, b = unique[u], unique[v]
+        candidates.append(((ints[a][0] - ints[b][0]) ** 2 + (ints[a][1] - ints[b][1]) ** 2, a, b))
+    # Consecutive points in sorted order: keeps collinear inputs connected
+    chain = sorted(unique, key=lambda i: ints[i])
+    for a, b in zip(chain, chain[1:]):
+        candidates.append(((ints[a][0] - ints[b][0]) ** 2 + (ints[a][1] - ints[b][1]) ** 2, a, b))
+    candidates.sort()
+
+    tree = _UnionFind(n)
+    airwires = [(min(a, b), max(a, b)) for _, a, b in candidates if tree.union(a, b)]
+
+    unrouted = []
+    if clusters is not None:
+        islands = _UnionFind(n)
+        owner: Dict[int, int] = {}
+        for i, label in enumerate(clusters):
+            if label in owner:
+                islands.union(owner[label], i)
+            else:
+                owner[label] = i
+        unrouted = [(min(a, b), max(a, b)) for _, a, b in candidates if islands.union(a, b)]
+    else:
+        unrouted = list(airwires)
+    return airwires, unrouted
+
+
+class Ratsnest:
+    """
+    Pads (grouped by component) and copper of a board, with per-net airwires
+    kept up to date as components move.
+    """
+
+    def __init__(self):
+        self.refs: List[str] = []
+        self.placement: Dict[str, Tuple[float, float, float]] = {}
+        self.comp_pads: Dict[str, List[int]] = {}
+        self.local: Dict[str, np.ndarray] = {}
+        self.pad_ref: List[int] = []
+        self.pad_number: List[str] = []
+        self.pad_net: List[str] = []
+        self.pad_size: List[float] = []
+        self.pad_xy = np.zeros((0, 2))
+        self.net_pads: Dict[str, List[int]] = {}
+        self.segments: Dict[str, List[Tuple[float, float, float, float, float]]] = {}
+        self.vias: Dict[str, List[Tuple[float, float]]] = {}
+        self.results: Dict[str, Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]] = {}
+
+    # --- Loading ------------------------------------------------------------
+
+    @classmethod
+    def from_board_text(cls, text: str) -> "Ratsnest":
+        tree = sexpr.parse(text)
+        net_names = {}
+        for node in sexpr.children(tree, "net"):
+            if len(node) > 2:
+                net_names[str(node[1])] = str(node[2])
+
+        def net_of(node) -> str:
+            net = sexpr.find(node, "net")
+            if not net or len(net) < 2:
+                return ""
+            # (net 2 "GND") in pads / older files, (net 2) on tracks, (net "GND") in newer ones
+            if len(net) > 2:
+                return str(net[2])
+            return str(net[1]) if isinstance(net[1], sexpr.QStr) else net_names.get(str(net[1]), "")
+
+        rats = cls()
+        xy = []
+        for fp in sexpr.children(tree, "footprint"):
+            ref = None
+            for prop in sexpr.children(fp, "property"):
+                if len(prop) > 2 and prop[1] == "Reference":
+                    ref = str(prop[2])
+            for text_node in sexpr.children(fp, "fp_text"):
+                if ref is None and len(text_node) > 2 and text_node[1] == "reference":
+                    ref = str(text_node[2])
+            ref = ref or f"#{len(rats.refs)}"
+            at = sexpr.floats(sexpr.find(fp, "at")) + [0.0, 0.0, 0.0]
+            pads = [(Pad.from_sexpr(p), net_of(p)) for p in sexpr.children(fp, "pad")]
+
+            ref_index = len(rats.refs)
+            rats.refs.append(ref)
+            rats.placement[ref] = (at[0], at[1], at[2])
+            rats.local[ref] = np.array([(p.x, p.y) for p, _ in pads], dtype=float).reshape(-1, 2)
+            rats.comp_pads[ref] = []
+            for (pad, net), pos in zip(pads, transform(rats.local[ref], at[0], at[1], at[2])):
+                index = len(rats.pad_ref)
+                rats.comp_pads[ref].append(index)
+                rats.pad_ref.append(ref_index)
+                rats.pad_number.append(str(pad.number))
+                rats.pad_net.append(net)
+                rats.pad_size.append(min(pad.width, pad.height))
+                xy.append(pos)
+                if net:
+                    rats.net_pads.setdefault(net, []).append(index)
+        rats.pad_xy = np.array(xy, dtype=float).reshape(-1, 2)
+
+        for seg in sexpr.children(tree, "segment"):
+            start = sexpr.floats(sexpr.find(seg, "start"))
+            end = sexpr.floats(sexpr.find(seg, "end"))
+            width = sexpr.floats(sexpr.find(seg, "width")) or [0.0]
+            layer = str(sexpr.value(seg, "layer", ""))
+            net = net_of(seg)
+            if net and len(start) >= 2 and len(end) >= 2:
+                rats.segments.setdefault(net, []).append((layer, start[0], start[1], end[0], end[1], width[0]))
+        for via in sexpr.children(tree, "via"):
+            at = sexpr.floats(sexpr.find(via, "at"))
+            net = net_of(via)
+            if net and len(at) >= 2:
+                rats.vias.setdefault(net, []).append((at[0], at[1]))
+
+        for net in rats.net_pads:
+            rats._update(net)
+        return rats
+
+    @classmethod
+    def from_board(cls, path: str) -> "Ratsnest":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_board_text(f.read())
+
+    # --- Connectivity -------------------------------------------------------
+
+    def _islands(self, net: str) -> List[int]:
+        """
+        Copper island label for each pad of the net. Track ends join when they
+        meet, land inside a pad, land on another track, or share a via.
+        Candidates come from a spatial hash, so this is near-linear in the
+        number of segments.
+        """
+        pads = self.net_pads[net]
+        segments = self.segments.get(net, [])
+        count = len(pads) + len(segments)
+        uf = _UnionFind(count)
+        eps = 1e-6
+
+        def on_segment(s, x, y):
+            _, x0, y0, x1, y1, width = s
+            dx, dy = x1 - x0, y1 - y0
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length2))
+            return math.hypot(x0 + t * dx - x, y0 + t * dy - y) <= width / 2
+
+        # Each item is stored under every cell its reach (pad radius, track
+        # half-width) touches, so the cell of a track end lists every candidate
+        pad_hash, seg_hash, via_hash = SpatialHash(HASH_CELL), SpatialHash(HASH_CELL), SpatialHash(HASH_CELL)
+        for j, pad in enumerate(pads):
+            px, py = self.pad_xy[pad]
+            r = self.pad_size[pad] / 2 + eps
+            pad_hash.insert(j, px - r, py - r, px + r, py + r)
+        for k, (_, x0, y0, x1, y1, width) in enumerate(segments):
+            r = width / 2 + eps
+            seg_hash.insert(k, min(x0, x1) - r, min(y0, y1) - r, max(x0, x1) + r, max(y0, y1) + r)
+        for vx, vy in self.vias.get(net, []):
+            via_hash.insert((vx, vy), vx - eps, vy - eps, vx + eps, vy + eps)
+
+        for k, s in enumerate(segments):
+            node = len(pads) + k
+            for x, y in ((s[1], s[2]), (s[3], s[4])):
+                for j in pad_hash.near(x, y):
+                    px, py = self.pad_xy[pads[j]]
+                    if math.hypot(px - x, py - y) <= self.pad_size[pads[j]] / 2 + eps:
+                        uf.union(j, node)
+                for m in seg_hash.near(x, y):
+                    if m != k and segments[m][0] == s[0] and on_segment(segments[m], x, y):
+                        uf.union(len(pads) + m, node)
+                for vx, vy in via_hash.near(x, y):
+                    if math.hypot(vx - x, vy - y) <= eps:
+                        # Via joins every track ending on it, whatever the layer
+                        for m in seg_hash.near(vx, vy):
+                            if on_segment(segments[m], vx, vy):
+                                uf.union(len(pads) + m, node)
+        return [uf.find(j) for j in range(len(pads))]
+
+    def _update(self, net: str) -> None:
+        pads = self.net_pads[net]
+        points = [tuple(self.pad_xy[i]) for i in pads]
+        airwires, unrouted = minimum_airwires(points, self._islands(net))
+        self.results[net] = ([(pads[a], pads[b]) for a, b in airwires],
+                             [(pads[a], pads[b]) for a, b in unrouted])
+
+    # --- Updates ------------------------------------------------------------
+
+    def move(self, ref: str, x: float, y: float, rotation: Optional[float] = None) -> List[str]:
+        """
+        Moves a component; only the nets on its pads are recomputed.
+        Returns the affected net names.
+        """
+        if ref not in self.placement:
+            raise KeyError(ref)
+        if rotation is None:
+            rotation = self.placement[ref][2]
+        self.placement[ref] = (x, y, rotation)
+        indices = self.comp_pads[ref]
+        if indices:
+            self.pad_xy[indices] = transform(self.local[ref], x, y, rotation)
+        nets = sorted(set(self.pad_net[i] for i in indices if self.pad_net[i]))
+        for net in nets:
+            self._update(net)
+        return nets
+
+    def payload(self) -> Dict:
+        """
+        Flat arrays a client can draw directly: pad i is at pad_xy[2i], pad_xy[2i+1];
+        airwires / unrouted are (net index, pad a, pad b) triples.
+        """
+        nets = sorted(self.net_pads)
+        net_index = {name: i for i, name in enumerate(nets)}
+        airwires, unrouted = [], []
+        for name in nets:
+            wires, open_wires = self.results[name]
+            for a, b in wires:
+                airwires += [net_index[name], a, b]
+            for a, b in open_wires:
+                unrouted += [net_index[name], a, b]
+        xy = self.pad_xy
+        bounds = [0.0, 0.0, 0.0, 0.0]
+        if len(xy):
+            bounds = [round(float(v), 3) for v in (*xy.min(axis=0), *xy.max(axis=0))]
+        return {
+            "units": "mm",
+            "refs": list(self.refs),
+            "nets": nets,
+            "pad_ref": list(self.pad_ref),
+            "pad_number": list(self.pad_number),
+            "pad_net": [net_index.get(n, -1) for n in self.pad_net],
+            "pad_xy": [round(float(v), 3) for v in xy.reshape(-1)],
+            "airwires": airwires,
+            "unrouted": unrouted,
+            "bounds": bounds,
+        }
+
+
+def board_ratsnest(path: str) -> Dict:
+    return Ratsnest.from_board(path).payload()
@@ -0,0 +1,528 @@
+import heapq
+import math
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Negotiated-congestion (PathFinder-style) grid router.
+#
+# The board is rasterized into a grid of cells per copper layer. Every net is
+# routed as a tree with A* (terminal by terminal, nearest first), and nets are allowed to
+# share cells at first: each shared cell costs more the more nets use it
+# (present cost) and the longer it has been contested (history cost). Nets that
+# touch an overused cell are ripped up and rerouted until no cell is used by
+# more than one net, so the result does not depend on net order.
+#
+# Nets are routed in batches of nets whose regions (terminals plus previous
+# route) do not overlap. A batch is spread over a process pool and routed
+# against one occupancy / history snapshot, then its paths are committed
+# before the next batch starts; nets that could compete for the same cells
+# always see each other's latest route.
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+GRID_PITCH_MM = 0.5
+CLEARANCE_MM = 0.2
+BASE_WIDTH_MM = 0.25 # Track width the grid pitch is sized for
+VIA_COST = 8.0 # In cell steps
+MAX_ITERATIONS = 40
+PRES_FAC_FIRST = 0.5
+PRES_FAC_MULT = 1.6
+HIST_FAC = 1.0
+NETS_PER_WORKER = 4 # Batch size is workers x NETS_PER_WORKER
+PARALLEL_MIN_NETS = 8 # Below this, a process pool costs more than it saves
+REGION_MARGIN = 4 # Cells; nets whose regions overlap are never in the same batch
+
+HARD = -2 # Keep-out / cell claimed by pads of more than one net
+FREE = -1
+
+# Grid shape and obstacle masks for the current routing run. Set in the
+# parent for in-process routing and once per pool worker by the initializer.
+_state = None
+
+
+def default_workers() -> int:
+    env = os.getenv("ROUTER_WORKERS")
+    if env:
+        return max(1, int(env))
+    return os.cpu_count() or 1
+
+
+def _merge(a: int, b: int) -> int:
+    if a == FREE or a == b:
+        return b
+    if b == FREE:
+        return a
+    return HARD
+
+
+def _dilate(owner: Sequence[int], width: int, height: int, layers: int, radius: int) -> array:
+    """
+    Each cell becomes the merged owner of the cells within radius (square),
+    so a net of that radius may use a cell only if nothing else is that close.
+    Done as a row pass then a column pass.
+    """
+    out = array("i", owner)
+    if radius <= 0:
+        return out
+    plane = width * height
+    rows = array("i", owner)
+    for layer in range(layers):
+        for y in range(height):
+            base = layer * plane + y * width
+            for x in range(width):
+                acc = FREE
+                for xx in range(max(0, x - radius), min(width, x + radius + 1)):
+                    acc = _merge(acc, owner[base + xx])
+                rows[base + x] = acc
+        for y in range(height):
+            for x in range(width):
+                acc = FREE
+                for yy in range(max(0, y - radius), min(height, y + radius + 1)):
+                    acc = _merge(acc, rows[layer * plane + yy * width + x])
+                out[layer * plane + y * width + x] = acc
+    return out
+
+
+def _init_worker(state) -> None:
+    global _state
+    _state = state
+
+
+def _route_net(net_id: int, radius: int, terminals: List[List[int]], occ, hist, pres_fac: float, joined: int = 1):
+    """
+    A* tree routing of one net. Returns (paths, complete), each path being a
+    list of cell indices from a reached terminal back to the tree. The first
+    `joined` terminals are already connected and start the tree together.
+
+    Terminals join in Prim order: the one nearest (Manhattan, between
+    terminal cells) to a connected terminal is routed next, searching from
+    that terminal to the tree, so each search only covers the gap it
+    closes and a net with hundreds of pads costs about as much per pad as
+    a two-pad net.
+    """
+    width, height, layers, masks = _state
+    plane = width * height
+    mask = masks[radius]
+    inf = float("inf")
+
+    def xy(c):
+        rest = c % plane
+        return rest % width, rest // width
+
+    points = [xy(t[0]) for t in terminals]
+    tree = set(c for t in terminals[:joined] for c in t)
+    connected = [i < joined for i in range(len(terminals))]
+    # Distance of every terminal to its nearest connected one, and which one that is
+    nearest = [min((abs(x - points[j][0]) + abs(y - points[j][1]), j) for j in range(joined)) for x, y in points]
+    paths = []
+
+    def join(index):
+        connected[index] = True
+        tree.update(terminals[index])
+        jx, jy = points[index]
+        for i, (x, y) in enumerate(points):
+            if not connected[i]:
+                d = abs(x - jx) + abs(y - jy)
+                if d < nearest[i][0]:
+                    nearest[i] = (d, index)
+
+    while not all(connected):
+        source = min((i for i in range(len(terminals)) if not connected[i]), key=lambda i: nearest[i])
+        tx, ty = points[nearest[source][1]]
+        starts = set(terminals[source])
+
+        g: Dict[int, float] = {}
+        came: Dict[int, int] = {}
+        heap = []
+        for c in starts:
+            g[c] = 0.0
+            x, y = xy(c)
+            heap.append((abs(x - tx) + abs(y - ty), 0.0, c))
+        heapq.heapify(heap)
+
+        found = None
+        while heap:
+            _, gc, c = heapq.heappop(heap)
+            if gc > g.get(c, inf):
+                continue
+            if c in tree:
+                found = c
+                break
+            layer, rest = divmod(c, plane)
+            y, x = divmod(rest, width)
+            neighbours = []
+            if x > 0:
+                neighbours.append((c - 1, 1.0))
+            if x < width - 1:
+                neighbours.append((c + 1, 1.0))
+            if y > 0:
+                neighbours.append((c - width, 1.0))
+            if y < height - 1:
+                neighbours.append((c + width, 1.0))
+            for other in range(layers):
+                if other != layer:
+                    neighbours.append((rest + other * plane, VIA_COST))
+            for n, step in neighbours:
+                m = mask[n]
+                if m != FREE and m != net_id and n not in tree:
+                    continue
+                ng = gc + step * (1.0 + hist[n]) * (1.0 + pres_fac * occ[n])
+                if ng < g.get(n, inf):
+                    g[n] = ng
+                    came[n] = c
+                    nx, ny = n % plane % width, n % plane // width
+                    heapq.heappush(heap, (ng + abs(nx - tx) + abs(ny - ty), ng, n))
+
+        if found is None:
+            return paths, False
+        path = [found]
+        while path[-1] in came:
+            path.append(came[path[-1]])
+        path.reverse()
+        paths.append(path)
+        tree.update(path)
+        join(source)
+        # Terminals the new path runs through are connected too
+        on_path = set(path)
+        for i, cells in enumerate(terminals):
+            if not connected[i] and on_path.intersection(cells):
+                join(i)
+    return paths, True
+
+
+def _footprint(paths: List[List[int]], radius: int, width: int, height: int) -> List[int]:
+    """
+    Cells a routed net occupies: its paths, grown by its radius.
+    """
+    cells = set()
+    for path in paths:
+        cells.update(path)
+    if radius:
+        plane = width * height
+        grown = set()
+        for c in cells:
+            layer, rest = divmod(c, plane)
+            gy, gx = divmod(rest, width)
+            for yy in range(max(0, gy - radius), min(height, gy + radius + 1)):
+                base = layer * plane + yy * width
+                for xx in range(max(0, gx - radius), min(width, gx + radius + 1)):
+                    grown.add(base + xx)
+        cells = grown
+    return sorted(cells)
+
+
+def _route_chunk(specs, occ, hist, pres_fac: float):
+    """
+    Pool task: routes a few nets, one after the other, on a private copy of
+    the occupancy snapshot. occ / hist arrive as bytes in a worker process.
+    Returns [(net_id, paths, complete, cells)].
+    """
+    width, height = _state[0], _state[1]
+    occ = array("H", occ)
+    if isinstance(hist, bytes):
+        hist = array("f", hist)
+    results = []
+    for net_id, radius, terminals, joined in specs:
+        paths, complete = _route_net(net_id, radius, terminals, occ, hist, pres_fac, joined)
+        cells = _footprint(paths, radius, width, height)
+        for c in cells:
+            occ[c] += 1
+        results.append((net_id, paths, complete, cells))
+    return results
+
+
+class RouteNet:
+    __slots__ = ("name", "width", "terminals", "layers", "joined", "radius", "cells", "paths", "complete")
+
+    def __init__(self, name: str, terminals: List[Tuple[float, float]], width: float, layers: Sequence[Sequence[int]],
+                 joined: int = 1):
+        self.name = name
+        self.width = width
+        self.terminals = terminals # Pad centres (mm)
+        self.layers = layers # Copper layers each terminal is on
+        self.joined = joined # Leading terminals already connected to each other
+        self.radius = 0
+        self.cells: List[List[int]] = [] # Candidate grid cells per terminal
+        self.paths: List[List[int]] = []
+        self.complete = False
+
+
+class Router:
+    """
+    Router(bounds) -> add_obstacle / add_segment_obstacle / add_net -> route().
+    Coordinates are millimetres; layer 0 is F.Cu and layer 1 is B.Cu.
+    """
+
+    def __init__(self, bounds: Tuple[float, float, float, float], pitch: float = GRID_PITCH_MM,
+                 clearance: float = CLEARANCE_MM, layers: int = 2):
+        x0, y0, x1, y1 = bounds
+        self.pitch = pitch
+        self.clearance = clearance
+        self.layers = layers
+        self.origin = (x0, y0)
+        self.width = int(math.floor((x1 - x0) / pitch)) + 1
+        self.height = int(math.floor((y1 - y0) / pitch)) + 1
+        self.owner = array("i", [FREE]) * (self.width * self.height * layers)
+        self.nets: List[RouteNet] = []
+        self.net_ids: Dict[str, int] = {}
+        self.stats: Dict = {}
+
+    # --- Problem setup --------------------------------------------------------
+
+    def _net_id(self, name: Optional[str]) -> int:
+        if name is None:
+            return HARD
+        if name not in self.net_ids:
+            self.net_ids[name] = len(self.net_ids)
+        return self.net_ids[name]
+
+    def cell(self, x: float, y: float, layer: int = 0) -> int:
+        gx = min(self.width - 1, max(0, int(round((x - self.origin[0]) / self.pitch))))
+        gy = min(self.height - 1, max(0, int(round((y - self.origin[1]) / self.pitch))))
+        return (layer * self.height + gy) * self.width + gx
+
+    def position(self, cell: int) -> Tuple[int, float, float]:
+        layer, rest = divmod(cell, self.width * self.height)
+        gy, gx = divmod(rest, self.width)
+        return layer, self.origin[0] + gx * self.pitch, self.origin[1] + gy * self.pitch
+
+    def _claim(self, cell: int, net_id: int) -> None:
+        self.owner[cell] = _merge(self.owner[cell], net_id)
+
+    def add_obstacle(self, x0: float, y0: float, x1: float, y1: float, net: Optional[str] = None,
+                     layers: Optional[Sequence[int]] = None) -> None:
+        """
+        Copper (e.g. a pad) owned by net, or a keep-out for every net if net is None.
+        The rectangle is grown by clearance plus half a base-width track.
+        """
+        net_id = self._net_id(net)
+        grow = self.clearance + BASE_WIDTH_MM / 2
+        gx0 = max(0, int(math.ceil((x0 - grow - self.origin[0]) / self.pitch)))
+        gx1 = min(self.width - 1, int(math.floor((x1 + grow - self.origin[0]) / self.pitch)))
+        gy0 = max(0, int(math.ceil((y0 - grow - self.origin[1]) / self.pitch)))
+        gy1 = min(self.height - 1, int(math.floor((y1 + grow - self.origin[1]) / self.pitch)))
+        for layer in (range(self.layers) if layers is None else layers):
+            for gy in range(gy0, gy1 + 1):
+                base = (layer * self.height + gy) * self.width
+                for gx in range(gx0, gx1 + 1):
+                    self._claim(base + gx, net_id)
+
+    def add_segment_obstacle(self, x0: float, y0: float, x1: float, y1: float, width: float,
+                             net: Optional[str] = None, layer: int = 0) -> None:
+        """
+        Existing track: stamped as small squares along its length.
+        """
+        half = width / 2
+        steps = max(1, int(math.ceil(math.hypot(x1 - x0, y1 - y0) / (self.pitch / 2))))
+        for i in range(steps + 1):
+            x = x0 + (x1 - x0) * i / steps
+            y = y0 + (y1 - y0) * i / steps
+            self.add_obstacle(x - half, y - half, x + half, y + half, net, [layer])
+
+    def add_net(self, name: str, terminals: List[Tuple[float, float]], width: float = BASE_WIDTH_MM,
+                layers: Optional[Sequence[Sequence[int]]] = None, joined: int = 1) -> None:
+        """
+        terminals are pad centres; layers[i] lists the copper layers of
+        terminal i (default: all, i.e. through-hole). The first `joined`
+        terminals are already connected (e.g. by copper kept from a previous
+        revision): only the others are routed, each onto that tree.
+        """
+        if layers is None:
+            layers = [tuple(range(self.layers))] * len(terminals)
+        self._net_id(name)
+        self.nets.append(RouteNet(name, list(terminals), width, [tuple(l) for l in layers], max(1, joined)))
+
+    # --- Routing --------------------------------------------------------------
+
+    def _radius(self, width: float) -> int:
+        # Extra cells each side so a wide track keeps clearance to base-width neighbours
+        return max(0, int(math.ceil((width / 2 + self.clearance + BASE_WIDTH_MM / 2) / self.pitch)) - 1)
+
+    def _region(self, net: RouteNet, cells: Sequence[int]) -> Tuple[int, int, int, int]:
+        plane = self.width * self.height
+        points = [c % plane for c in cells] + [c[0] % plane for c in net.cells]
+        xs = [p % self.width for p in points]
+        ys = [p // self.width for p in points]
+        margin = REGION_MARGIN + net.radius
+        return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+
+    def _batches(self, nets: List[RouteNet], used: Dict[str, List[int]], batch_size: int) -> List[List[RouteNet]]:
+        """
+        Greedy first-fit of nets (in order) into batches of pairwise
+        disjoint regions.
+        """
+        batches = []
+        for net in nets:
+            box = self._region(net, used.get(net.name, ()))
+            for members, boxes in batches:
+                if len(members) < batch_size and not any(
+                        box[0] <= b[2] and b[0] <= box[2] and box[1] <= b[3] and b[1] <= box[3] for b in boxes):
+                    members.append(net)
+                    boxes.append(box)
+                    break
+            else:
+                batches.append(([net], [box]))
+        return [members for members, _ in batches]
+
+    def route(self, workers: Optional[int] = None, max_iterations: int = MAX_ITERATIONS) -> Dict:
+        started = time.time()
+        workers = workers or default_workers()
+        size = self.width * self.height * self.layers
+
+        # Terminal cells always belong to their net, even inside a neighbour's clearance
+        for net in self.nets:
+            net_id = self.net_ids[net.name]
+            net.radius = self._radius(net.width)
+            net.cells = [[self.cell(x, y, layer) for layer in layers] for (x, y), layers in zip(net.terminals, net.layers)]
+            for cells in net.cells:
+                for c in cells:
+                    self.owner[c] = net_id
+        masks = {r: _dilate(self.owner, self.width, self.height, self.layers, r)
+                 for r in sorted(set(net.radius for net in self.nets))}
+        state = (self.width, self.height, self.layers, masks)
+        _init_worker(state)
+
+        # Short nets first: they have the fewest alternatives
+        def span(net):
+            xs = [x for x, _ in net.terminals]
+            ys = [y for _, y in net.terminals]
+            return (max(xs) - min(xs) + max(ys) - min(ys), net.name)
+
+        pending = sorted((n for n in self.nets if len(n.terminals) > n.joined), key=span)
+        if len(pending) < PARALLEL_MIN_NETS:
+            workers = 1
+
+        occ = array("H", bytes(2 * size))
+        hist = array("f", bytes(4 * size))
+        used: Dict[str, List[int]] = {}
+        failed = set()
+        pres_fac = PRES_FAC_FIRST
+        batches = 0
+        iteration = 0
+        overused: List[int] = []
+
+        pool = None
+        if workers > 1:
+            try:
+                from concurrent.futures import ProcessPoolExecutor
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,))
+            except Exception as e:
+                print(f"Router: process pool unavailable ({e}), routing in-process")
+                workers = 1
+
+        try:
+            for iteration in range(1, max_iterations + 1):
+                for batch in self._batches(pending, used, workers * NETS_PER_WORKER):
+                    batches += 1
+                    # Rip up the whole batch, then reroute it against one snapshot
+                    for net in batch:
+                        for c in used.pop(net.name, ()):
+                            occ[c] -= 1
+                    specs = [(self.net_ids[n.name], n.radius, n.cells, n.joined) for n in batch]
+                    results = []
+                    if pool is not None and len(batch) > 1:
+                        chunks = [specs[i::workers] for i in range(workers) if specs[i::workers]]
+                        snapshot, history = occ.tobytes(), hist.tobytes()
+                        for part in pool.map(_route_chunk, chunks, [snapshot] * len(chunks),
+                                             [history] * len(chunks), [pres_fac] * len(chunks)):
+                            results.extend(part)
+                    else:
+                        results = _route_chunk(specs, occ, hist, pres_fac)
+
+                    by_id = {self.net_ids[n.name]: n for n in batch}
+                    for net_id, paths, complete, cells in results:
+                        net = by_id[net_id]
+                        net.paths, net.complete = paths, complete
+                        if not complete:
+                            failed.add(net.name)
+                        used[net.name] = cells
+                        for c in cells:
+                            occ[c] += 1
+
+                overused = [c for c in range(size) if occ[c] > 1]
+                if not overused:
+                    break
+                for c in overused:
+                    hist[c] += HIST_FAC * (occ[c] - 1)
+                pres_fac *= PRES_FAC_MULT
+                # Only nets on contested cells are rerouted; unroutable ones are not retried
+                contested = set(overused)
+                pending = [n for n in self.nets if n.name in used and n.name not in failed
+                           and any(c in contested for c in used[n.name])]
+                if not pending:
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if overused:
+            # Negotiation gave up with nets still sharing cells. Emitting them
+            # would short them together, so each contested group keeps its
+            # shortest net; the others are reported unrouted (and their copper
+            # dropped) for the caller's fallback.
+            contested = set(overused)
+            kept_cells = set()
+            for net in sorted((n for n in self.nets if n.complete and contested.intersection(used.get(n.name, ()))),
+                              key=span):
+                cells = used[net.name]
+                if kept_cells.isdisjoint(cells):
+                    kept_cells.update(cells)
+                else:
+                    net.complete = False
+                    net.paths = []
+                    failed.add(net.name)
+
+        self.stats = {
+            "nets": len([n for n in self.nets if len(n.terminals) > n.joined]),
+            "routed": len([n for n in self.nets if n.complete]),
+            "unrouted": sorted(failed),
+            "overused_cells": len(overused),
+            "iterations": iteration,
+            "batches": batches,
+            "workers": workers,
+            "grid": [self.width, self.height, self.layers],
+            "seconds": round(time.time() - started, 3),
+        }
+        return self.stats
+
+    # --- Results --------------------------------------------------------------
+
+    def tracks(self, name: str) -> Tuple[List[Tuple[int, float, float, float, float]], List[Tuple[float, float]]]:
+        """
+        Copper for a routed net: ([(layer, x0, y0, x1, y1)], [(via_x, via_y)]),
+        straight runs merged and stubs added from the pad centres onto the grid.
+        """
+        net = self.nets[[n.name for n in self.nets].index(name)]
+        segments, vias = [], []
+        touched = set()
+        for path in net.paths:
+            touched.update(path)
+            run_start = path[0]
+            direction = None
+            for prev, cur in zip(path, path[1:]):
+                l0, x0, y0 = self.position(prev)
+                l1, x1, y1 = self.position(cur)
+                if l0 != l1:
+                    if prev != run_start:
+                        segments.append((l0,) + self.position(run_start)[1:] + (x0, y0))
+                    vias.append((x0, y0))
+                    run_start, direction = cur, None
+                    continue
+                step = (round(x1 - x0, 6), round(y1 - y0, 6))
+                if direction is not None and step != direction:
+                    segments.append((l0,) + self.position(run_start)[1:] + (x0, y0))
+                    run_start = prev
+                direction = step
+            if run_start != path[-1]:
+                layer, x, y = self.position(path[-1])
+                segments.append((layer,) + self.position(run_start)[1:] + (x, y))
+
+        for (px, py), cells in zip(net.terminals, net.cells):
+            for c in cells:
+                if c in touched:
+                    layer, x, y = self.position(c)
+                    if (round(x - px, 6), round(y - py, 6)) != (0, 0):
+                        segments.append((layer, px, py, x, y))
+        return segments, sorted(set(vias))
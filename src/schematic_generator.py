@@ -1,5 +1,10 @@
 from typing import List, Dict, Any
 
+from src.array_placement import PATTERNS, array_shape
+
+MAX_QUANTITY = 1024 # Parts per entry; larger counts are capped with a warning
+ARRAY_ROW_MAX = 8 # Repeated parts without a pattern hint: a row up to this many, else a grid
+
 # Simplified footprint mapping
 FOOTPRINT_MAP = {
     # Specifics first
@@ -67,42 +72,71 @@ def map_component_to_footprint(component_name: str) -> str:
     for key, footprint in FOOTPRINT_MAP.items():
         if key in name_lower:
             return footprint
-            
+
+    # Fall back to the offline index of the installed KiCad libraries, if built
+    # (python -m src.footprint_index)
+    from src.footprint_index import lookup_footprint
+    footprint = lookup_footprint(component_name)
+    if footprint:
+        return footprint
+
     return "Unknown_Footprint"
 
+def reference_prefix(component_name: str) -> str:
+    """
+    Reference designator prefix (R, C, D, ...) for a component name.
+    """
+    name = component_name.lower()
+    if "resistor" in name or "potentiometer" in name:
+        return "R"
+    elif "capacitor" in name:
+        return "C"
+    elif "led" in name or "diode" in name:
+        return "D"
+    elif "switch" in name or "button" in name:
+        return "SW"
+    elif "connector" in name or "header" in name or "jumper" in name:
+        return "J"
+    elif "motor" in name:
+        return "M"
+    elif "battery" in name:
+        return "BT"
+    elif "crystal" in name:
+        return "Y"
+    return "U"
+
 def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Generates a schematic representation (netlist) from components and connections.
+
+    An entry with quantity N becomes N parts with consecutive references;
+    the parts of one entry are tagged in netlist["arrays"] so the board
+    places them as a row, grid or ring.
     """
     schematic_components = []
-    
-    for idx, comp in enumerate(components):
-        ref_designator = f"U{idx+1}" # Simple auto-incrementing reference
-        if "resistor" in comp["name"].lower() or "potentiometer" in comp["name"].lower():
-            ref_designator = f"R{idx+1}"
-        elif "capacitor" in comp["name"].lower():
-            ref_designator = f"C{idx+1}"
-        elif "led" in comp["name"].lower() or "diode" in comp["name"].lower():
-            ref_designator = f"D{idx+1}"
-        elif "switch" in comp["name"].lower() or "button" in comp["name"].lower():
-            ref_designator = f"SW{idx+1}"
-        elif "connector" in comp["name"].lower() or "header" in comp["name"].lower() or "jumper" in comp["name"].lower():
-            ref_designator = f"J{idx+1}" 
-        elif "motor" in comp["name"].lower():
-            ref_designator = f"M{idx+1}"
-        elif "battery" in comp["name"].lower():
-            ref_designator = f"BT{idx+1}"
-        elif "crystal" in comp["name"].lower():
-            ref_designator = f"Y{idx+1}"
-            
+    arrays = []
+
+    # Name -> prefix / footprint is resolved once per entry, then all N refs
+    # are generated together; references number parts in order across entries
+    next_index = 1
+    for comp in components:
+        quantity = int(comp.get("quantity", 1) or 1)
+        if quantity > MAX_QUANTITY:
+            print(f"Warning: Capping {comp['name']} at {MAX_QUANTITY} parts (asked for {quantity})")
+            quantity = MAX_QUANTITY
+        prefix = reference_prefix(comp["name"])
         footprint = map_component_to_footprint(comp["name"])
-        
-        schematic_components.append({
-            "ref": ref_designator,
-            "value": comp["name"],
-            "footprint": footprint,
-            "quantity": comp["quantity"]
-        })
+        refs = [f"{prefix}{n}" for n in range(next_index, next_index + max(1, quantity))]
+        next_index += len(refs)
+
+        schematic_components.extend(
+            {"ref": ref, "value": comp["name"], "footprint": footprint, "quantity": 1} for ref in refs)
+        if len(refs) > 1:
+            pattern = comp.get("pattern") or ("grid" if len(refs) > ARRAY_ROW_MAX else "row")
+            if pattern not in PATTERNS:
+                pattern = "grid"
+            rows, cols = array_shape(len(refs), pattern, int(comp.get("rows", 0) or 0), int(comp.get("cols", 0) or 0))
+            arrays.append({"refs": refs, "pattern": pattern, "rows": rows, "cols": cols})
 
     # Component Pin Configurations (Standard KiCad Footprints)
     PIN_CONFIG = {
@@ -204,6 +238,10 @@ def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[
     unconnected_resistors = [c for c in schematic_components if "resistor" in c['value'].lower()]
     power_sources = [c for c in schematic_components if "battery" in c['value'].lower() or "regulator" in c['value'].lower() or "arduino" in c['value'].lower()]
     
+    # Sub-circuits built by the heuristics below, tagged so the board can place
+    # and route identical copies once (see src/blocks.py): {"type", "members": [[role, ref]]}
+    blocks = []
+
     # Heuristic A: Connect typical LED-Resistor pairs if valid
     # Logic: Pair 1 LED with 1 Resistor until we run out
     min_pairs = min(len(unconnected_leds), len(unconnected_resistors))
@@ -230,6 +268,7 @@ def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[
             # Connect Resistor -> Signal/Power (Placeholder)
             
             processed_pairs.add((led['ref'], res['ref']))
+            blocks.append({"type": "led_resistor", "members": [["led", led['ref']], ["resistor", res['ref']]]})
 
     # Heuristic B: Power Rails (GND, VCC)
     gnd_net_nodes = []
@@ -254,19 +293,27 @@ def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[
     motor_drivers = [c for c in schematic_components if "l293" in c['value'].lower() or "l298" in c['value'].lower() or "driver" in c['value'].lower()]
     motors = [c for c in schematic_components if "motor" in c['value'].lower() and "driver" not in c['value'].lower()]
     
+    # Each driver takes two motors; further motors go to the next driver
+    driver_blocks = {}
     if motor_drivers and motors:
-        driver = motor_drivers[0]
-        pass_count = 0
-        for m in motors:
-            if (m['ref'], driver['ref']) in processed_pairs: continue
-            net_name_1 = f"Net-(Motor_Out_{pass_count}A)"
-            net_name_2 = f"Net-(Motor_Out_{pass_count}B)"
-            d_pin_1 = "3" if pass_count == 0 else "11"
-            d_pin_2 = "6" if pass_count == 0 else "14"
-            net_list.append({"name": net_name_1, "nodes": [{"ref": driver['ref'], "pin": d_pin_1}, {"ref": m['ref'], "pin": "1"}]})
-            net_list.append({"name": net_name_2, "nodes": [{"ref": driver['ref'], "pin": d_pin_2}, {"ref": m['ref'], "pin": "2"}]})
-            pass_count += 1
-            if pass_count >= 2: break
+        pending_motors = list(motors)
+        for d_idx, driver in enumerate(motor_drivers):
+            pass_count = 0
+            while pending_motors and pass_count < 2:
+                m = pending_motors.pop(0)
+                if (m['ref'], driver['ref']) in processed_pairs: continue
+                channel = d_idx * 2 + pass_count
+                net_name_1 = f"Net-(Motor_Out_{channel}A)"
+                net_name_2 = f"Net-(Motor_Out_{channel}B)"
+                d_pin_1 = "3" if pass_count == 0 else "11"
+                d_pin_2 = "6" if pass_count == 0 else "14"
+                net_list.append({"name": net_name_1, "nodes": [{"ref": driver['ref'], "pin": d_pin_1}, {"ref": m['ref'], "pin": "1"}]})
+                net_list.append({"name": net_name_2, "nodes": [{"ref": driver['ref'], "pin": d_pin_2}, {"ref": m['ref'], "pin": "2"}]})
+                block = driver_blocks.setdefault(driver['ref'], {"type": "motor_driver", "members": [["driver", driver['ref']]]})
+                block["members"].append([f"motor_{pass_count}", m['ref']])
+                pass_count += 1
+            if not pending_motors:
+                break
 
     # Heuristic D: Battery -> Power Input
     batteries = [c for c in schematic_components if "battery" in c['value'].lower()]
@@ -275,6 +322,10 @@ def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[
         drv = motor_drivers[0]
         net_name = "Net-(Batt_Pos-Driver_Power)"
         net_list.append({"name": net_name, "nodes": [{"ref": bat['ref'], "pin": "2"}, {"ref": drv['ref'], "pin": "8"}]})
+        # The feed is part of the driver's block
+        driver_blocks.setdefault(drv['ref'], {"type": "motor_driver", "members": [["driver", drv['ref']]]})
+        driver_blocks[drv['ref']]["members"].append(["battery", bat['ref']])
+    blocks.extend(driver_blocks.values())
 
     # Helper: Net Classification
     def classify_net(name):
@@ -295,16 +346,19 @@ def generate_schematic(components: List[Dict[str, Any]], connections: List[Dict[
         net['class'] = n_cls
         final_nets.append(net)
 
-    # Basic netlist structure
+    # Basic netlist structure (no date: equal inputs must give equal bytes, see src/deterministic.py)
     netlist = {
         "design": {
             "source": "Text-to-PCB Generator",
-            "date": "2026-02-13",
             "tool": "Custom AI Generator"
         },
         "components": schematic_components,
         "nets": final_nets
     }
+    if blocks:
+        netlist["blocks"] = blocks
+    if arrays:
+        netlist["arrays"] = arrays
     
     return netlist
 
@@ -0,0 +1,121 @@
+import re
+from typing import Any, Iterator, List, Optional, Union
+
+# Minimal reader for KiCad's S-expression files (.kicad_mod, .kicad_pcb).
+# Lists become Python lists and atoms become str, so
+# (pad "1" smd rect (at 0 1.5)) -> ["pad", "1", "smd", "rect", ["at", "0", "1.5"]].
+# Quoted atoms are QStr (a str subclass) so dumps() can write them back quoted.
+#
+# Stdlib only: usable from KiCad's Python as well as the web service.
+
+Node = Union[str, List["Node"]]
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))', re.S)
+_ESCAPE = re.compile(r'\\(.)', re.S)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class SExprError(ValueError):
+    pass
+
+
+class QStr(str):
+    """
+    An atom that was quoted in the source ("F.Cu" as opposed to thru_hole).
+    """
+    __slots__ = ()
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def parse(text: str) -> List[Node]:
+    """
+    Parses the first top-level list in text.
+    """
+    stack: List[List[Node]] = []
+    pos = 0
+    end = len(text)
+    while pos < end:
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            if text[pos:].strip():
+                raise SExprError(f"Unexpected character at offset {pos}")
+            break
+        pos = m.end()
+        opening, closing, quoted, atom = m.groups()
+        if opening:
+            stack.append([])
+        elif closing:
+            if not stack:
+                raise SExprError(f"Unbalanced ')' at offset {m.start()}")
+            node = stack.pop()
+            if not stack:
+                return node
+            stack[-1].append(node)
+        elif not stack:
+            raise SExprError(f"Atom outside a list at offset {m.start()}")
+        elif quoted is not None:
+            stack[-1].append(QStr(_unescape(quoted)))
+        else:
+            stack[-1].append(atom)
+    raise SExprError("Unexpected end of input")
+
+
+def parse_file(path: str) -> List[Node]:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse(f.read())
+
+
+def children(node: List[Node], name: str) -> Iterator[List[Node]]:
+    for child in node:
+        if isinstance(child, list) and child and child[0] == name:
+            yield child
+
+
+def find(node: List[Node], name: str) -> Optional[List[Node]]:
+    return next(children(node, name), None)
+
+
+def value(node: List[Node], name: str, default: Any = None) -> Any:
+    """
+    Second element of the first child called name, e.g. value(fp, "descr").
+    """
+    child = find(node, name)
+    if child is None or len(child) < 2:
+        return default
+    return child[1]
+
+
+def floats(node: Optional[List[Node]]) -> List[float]:
+    """
+    Numeric arguments of a node such as (at 1 2 90) -> [1.0, 2.0, 90.0].
+    """
+    out = []
+    if node is None:
+        return out
+    for item in node[1:]:
+        if isinstance(item, str):
+            try:
+                out.append(float(item))
+            except ValueError:
+                pass
+    return out
+
+
+def quote(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def dumps(node: Node) -> str:
+    """
+    Writes a node on one line; QStr atoms are quoted, others written as-is.
+    """
+    if isinstance(node, list):
+        return "(" + " ".join(dumps(child) for child in node) + ")"
+    if isinstance(node, QStr) or node == "" or any(c in node for c in ' ()"\n'):
+        return quote(node)
+    return node
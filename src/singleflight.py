@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "on_abandon")
+
+    def __init__(self, task: asyncio.Future, on_abandon: Optional[Callable[[], None]]):
+        self.task = task
+        self.waiters = 0
+        self.on_abandon = on_abandon
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller (leader) starts the work as an independent task; callers
+    arriving while it runs attach to that task and receive the same result or
+    exception. A caller being cancelled (e.g. client disconnect) only detaches
+    it; on_abandon runs when the last waiter leaves before the work finished.
+    Completed calls are forgotten immediately - this is not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Any, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable[Any]],
+                 on_abandon: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared) where shared is True if this caller attached
+        to work started by another caller.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            self.leaders += 1
+            call = _Call(asyncio.ensure_future(fn()), on_abandon)
+            self._calls[key] = call
+
+            def _forget(_task, key=key, call=call):
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.task.add_done_callback(_forget)
+        else:
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done() and call.on_abandon:
+                call.on_abandon()
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Runs of spaces/tabs and trailing whitespace don't change what gets parsed.
+    # Line breaks (markdown lists are parsed per line) and case (part names are
+    # echoed back as typed) do, so both are kept.
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in (prompt or "").splitlines())
+    return "\n".join(lines).strip()
+
+
+def netlist_key(netlist: Dict[str, Any]) -> str:
+    canonical = json.dumps(netlist, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
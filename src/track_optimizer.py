@@ -0,0 +1,337 @@
+import math
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Post-route track cleanup.
+#
+# Works on plain records in board units (KiCad nanometres, ints) so it can run
+# on any board: kicad_script.py converts pcbnew tracks to Segment / Via / Pad,
+# optimizes, and writes the result back.
+#
+#   1. Vias that touch copper on fewer than two layers are removed.
+#   2. Dangling stubs (a segment end touching no pad, via or same-net copper)
+#      are removed, repeatedly, since removing one can expose the next.
+#   3. Collinear and overlapping segments of one net / layer / width are merged.
+#   4. Optionally, 90 degree corners are replaced by 45 degree chamfers.
+#
+# Lookups go through a uniform spatial hash, so every pass is near-linear in
+# the number of items.
+#
+# Stdlib only: this module is also imported by kicad_script.py inside KiCad's Python.
+
+HASH_CELL = 2000000 # 2 mm
+CHAMFER = 500000 # 0.5 mm
+
+
+class Segment:
+    __slots__ = ("net", "layer", "x0", "y0", "x1", "y1", "width")
+
+    def __init__(self, net: str, layer: int, x0: int, y0: int, x1: int, y1: int, width: int):
+        self.net = net
+        self.layer = layer
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.width = width
+
+    @property
+    def length(self) -> float:
+        return math.hypot(self.x1 - self.x0, self.y1 - self.y0)
+
+    def ends(self) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        return (self.x0, self.y0), (self.x1, self.y1)
+
+    def distance(self, x: int, y: int) -> float:
+        dx, dy = self.x1 - self.x0, self.y1 - self.y0
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - self.x0) * dx + (y - self.y0) * dy) / length2))
+        return math.hypot(self.x0 + t * dx - x, self.y0 + t * dy - y)
+
+    def __repr__(self):
+        return f"Segment({self.net!r}, {self.layer}, {self.x0}, {self.y0}, {self.x1}, {self.y1}, {self.width})"
+
+
+class Via:
+    __slots__ = ("net", "x", "y", "size")
+
+    def __init__(self, net: str, x: int, y: int, size: int):
+        self.net = net
+        self.x, self.y = x, y
+        self.size = size
+
+
+class Pad:
+    __slots__ = ("net", "layers", "x0", "y0", "x1", "y1")
+
+    def __init__(self, net: str, layers: Iterable[int], x0: int, y0: int, x1: int, y1: int):
+        self.net = net
+        self.layers = frozenset(layers)
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    def contains(self, x: int, y: int, grow: float = 0) -> bool:
+        return self.x0 - grow <= x <= self.x1 + grow and self.y0 - grow <= y <= self.y1 + grow
+
+
+class SpatialHash:
+    """
+    Uniform grid of buckets; an item is stored in every cell its box touches.
+    """
+
+    def __init__(self, cell: int = HASH_CELL):
+        self.cell = cell
+        self.buckets: Dict[Tuple[int, int], List] = defaultdict(list)
+
+    def _cells(self, x0, y0, x1, y1):
+        c = self.cell
+        for gx in range(int(min(x0, x1) // c), int(max(x0, x1) // c) + 1):
+            for gy in range(int(min(y0, y1) // c), int(max(y0, y1) // c) + 1):
+                yield gx, gy
+
+    def insert(self, item, x0, y0, x1, y1) -> None:
+        for key in self._cells(x0, y0, x1, y1):
+            self.buckets[key].append(item)
+
+    def remove(self, item, x0, y0, x1, y1) -> None:
+        for key in self._cells(x0, y0, x1, y1):
+            bucket = self.buckets.get(key)
+            if bucket and item in bucket:
+                bucket.remove(item)
+
+    def near(self, x, y) -> List:
+        return self.buckets.get((int(x // self.cell), int(y // self.cell)), [])
+
+
+class _Board:
+    """
+    Spatial indexes over the current items, kept in sync as items are removed.
+    """
+
+    def __init__(self, segments: List[Segment], vias: List[Via], pads: List[Pad]):
+        self.segments = set(segments)
+        self.vias = set(vias)
+        self.seg_hash = SpatialHash()
+        self.via_hash = SpatialHash()
+        self.pad_hash = SpatialHash()
+        for s in segments:
+            self._seg_box(s, self.seg_hash.insert)
+        for v in vias:
+            self.via_hash.insert(v, v.x - v.size // 2, v.y - v.size // 2, v.x + v.size // 2, v.y + v.size // 2)
+        for p in pads:
+            self.pad_hash.insert(p, p.x0, p.y0, p.x1, p.y1)
+
+    @staticmethod
+    def _seg_box(s: Segment, fn) -> None:
+        half = s.width // 2
+        fn(s, min(s.x0, s.x1) - half, min(s.y0, s.y1) - half, max(s.x0, s.x1) + half, max(s.y0, s.y1) + half)
+
+    def remove_segment(self, s: Segment) -> None:
+        self.segments.discard(s)
+        self._seg_box(s, self.seg_hash.remove)
+
+    def remove_via(self, v: Via) -> None:
+        self.vias.discard(v)
+        self.via_hash.remove(v, v.x - v.size // 2, v.y - v.size // 2, v.x + v.size // 2, v.y + v.size // 2)
+
+    def segments_at(self, net: str, layer: int, x: int, y: int, grow: float = 0, exclude=None) -> List[Segment]:
+        return [s for s in self.seg_hash.near(x, y)
+                if s is not exclude and s.net == net and s.layer == layer and s.distance(x, y) <= s.width / 2 + grow]
+
+    def via_at(self, net: str, x: int, y: int, grow: float = 0) -> bool:
+        return any(v.net == net and math.hypot(v.x - x, v.y - y) <= v.size / 2 + grow for v in self.via_hash.near(x, y))
+
+    def pad_at(self, net: str, layer: int, x: int, y: int, grow: float = 0) -> bool:
+        return any(p.net == net and layer in p.layers and p.contains(x, y, grow) for p in self.pad_hash.near(x, y))
+
+    def anchored(self, net: str, layer: int, x: int, y: int) -> bool:
+        """
+        Pad or via of the net at this point: a place tracks must keep reaching.
+        """
+        return self.pad_at(net, layer, x, y) or self.via_at(net, x, y)
+
+
+def _remove_vias(board: _Board, zone_nets: Sequence[str]) -> int:
+    removed = 0
+    for v in sorted(board.vias, key=lambda v: (v.net, v.x, v.y)):
+        if not v.net:
+            continue
+        layers = set(s.layer for s in board.seg_hash.near(v.x, v.y)
+                     if s.net == v.net and s.distance(v.x, v.y) <= (s.width + v.size) / 2)
+        layers.update(l for p in board.pad_hash.near(v.x, v.y)
+                      if p.net == v.net and p.contains(v.x, v.y, v.size / 2) for l in p.layers)
+        # A zone net's via may be stitching to the plane, so keep it while anything uses it
+        if len(layers) > 1 or (layers and v.net in zone_nets):
+            continue
+        board.remove_via(v)
+        removed += 1
+    return removed
+
+
+def _remove_stubs(board: _Board) -> int:
+    def end_connected(s: Segment, x: int, y: int) -> bool:
+        return board.anchored(s.net, s.layer, x, y) or bool(board.segments_at(s.net, s.layer, x, y, exclude=s))
+
+    removed = 0
+    queue = sorted(board.segments, key=lambda s: (s.net, s.layer, s.x0, s.y0, s.x1, s.y1))
+    while queue:
+        s = queue.pop()
+        if s not in board.segments or not s.net:
+            continue
+        if end_connected(s, s.x0, s.y0) and end_connected(s, s.x1, s.y1):
+            continue
+        board.remove_segment(s)
+        removed += 1
+        # Its neighbours may now dangle
+        for x, y in s.ends():
+            queue.extend(board.segments_at(s.net, s.layer, x, y, grow=s.width / 2))
+    return removed
+
+
+def _direction(s: Segment) -> Tuple[int, int]:
+    dx, dy = s.x1 - s.x0, s.y1 - s.y0
+    g = math.gcd(abs(dx), abs(dy)) or 1
+    ux, uy = dx // g, dy // g
+    if ux < 0 or (ux == 0 and uy < 0):
+        ux, uy = -ux, -uy
+    return ux, uy
+
+
+def _merge_collinear(board: _Board) -> int:
+    """
+    Segments on one line (same net, layer and width) are sorted along it and
+    overlapping runs joined. Runs that only touch end to end are joined
+    unless something else connects at the shared point.
+    """
+    groups = defaultdict(list)
+    for s in board.segments:
+        if (s.x0, s.y0) == (s.x1, s.y1):
+            continue
+        ux, uy = _direction(s)
+        groups[(s.net, s.layer, s.width, ux, uy, ux * s.y0 - uy * s.x0)].append(s)
+
+    merged = 0
+    for (net, layer, width, ux, uy, _), members in groups.items():
+        if len(members) < 2:
+            continue
+        spans = []
+        for s in members:
+            a, b = s.ends()
+            ta, tb = ux * a[0] + uy * a[1], ux * b[0] + uy * b[1]
+            spans.append((ta, a, tb, b, s) if ta <= tb else (tb, b, ta, a, s))
+        spans.sort(key=lambda span: (span[0], span[2]))
+
+        runs = []
+        for t0, p0, t1, p1, s in spans:
+            if runs:
+                run = runs[-1]
+                touching = t0 == run[2] and not _junction(board, net, layer, p0, run[4] + [s])
+                if t0 < run[2] or touching:
+                    if t1 > run[2]:
+                        run[2], run[3] = t1, p1
+                    run[4].append(s)
+                    continue
+            runs.append([t0, p0, t1, p1, [s]])
+
+        for t0, p0, t1, p1, parts in runs:
+            if len(parts) < 2:
+                continue
+            for s in parts:
+                board.remove_segment(s)
+            joined = Segment(net, layer, p0[0], p0[1], p1[0], p1[1], width)
+            board.segments.add(joined)
+            board._seg_box(joined, board.seg_hash.insert)
+            merged += len(parts) - 1
+    return merged
+
+
+def _junction(board: _Board, net: str, layer: int, point: Tuple[int, int], members: List[Segment]) -> bool:
+    x, y = point
+    if board.anchored(net, layer, x, y):
+        return True
+    others = [s for s in board.segments_at(net, layer, x, y) if s not in members]
+    return bool(others)
+
+
+def _smooth_corners(board: _Board, chamfer: int) -> int:
+    """
+    Replaces the corner of two perpendicular axis-aligned segments that meet
+    end to end (and nothing else) with a 45 degree segment.
+    """
+    ends = defaultdict(list)
+    for s in board.segments:
+        for i, (x, y) in enumerate(s.ends()):
+            ends[(s.net, s.layer, x, y)].append((s, i))
+
+    smoothed = 0
+    for (net, layer, x, y), touching in sorted(ends.items(), key=lambda item: item[0]):
+        if len(touching) != 2:
+            continue
+        (a, ia), (b, ib) = touching
+        if a is b or a not in board.segments or b not in board.segments or a.width != b.width:
+            continue
+        va = _away(a, ia)
+        vb = _away(b, ib)
+        if va is None or vb is None or va[0] * vb[0] + va[1] * vb[1] != 0:
+            continue
+        if (va[0] and va[1]) or (vb[0] and vb[1]):
+            continue # Only axis-aligned corners
+        if board.anchored(net, layer, x, y) or _junction(board, net, layer, (x, y), [a, b]):
+            continue
+        d = int(min(chamfer, a.length / 2, b.length / 2))
+        if d <= 0:
+            continue
+        pa = (x + va[0] * d, y + va[1] * d)
+        pb = (x + vb[0] * d, y + vb[1] * d)
+        for s, i, p in ((a, ia, pa), (b, ib, pb)):
+            board.remove_segment(s)
+            if i == 0:
+                s.x0, s.y0 = p
+            else:
+                s.x1, s.y1 = p
+            board.segments.add(s)
+            board._seg_box(s, board.seg_hash.insert)
+        diagonal = Segment(net, layer, pa[0], pa[1], pb[0], pb[1], a.width)
+        board.segments.add(diagonal)
+        board._seg_box(diagonal, board.seg_hash.insert)
+        smoothed += 1
+    return smoothed
+
+
+def _away(s: Segment, end: int) -> Optional[Tuple[int, int]]:
+    # Unit step (-1/0/1 per axis) from the given end into the segment
+    if end == 0:
+        dx, dy = s.x1 - s.x0, s.y1 - s.y0
+    else:
+        dx, dy = s.x0 - s.x1, s.y0 - s.y1
+    if dx == 0 and dy == 0:
+        return None
+    return (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+
+
+def optimize(segments: List[Segment], vias: List[Via], pads: List[Pad], smooth: bool = False,
+             chamfer: int = CHAMFER, zone_nets: Sequence[str] = ()) -> Tuple[List[Segment], List[Via], Dict]:
+    """
+    Returns the cleaned-up (segments, vias) and a stats dict. Items without a
+    net are left alone.
+    """
+    started = time.time()
+    board = _Board(segments, vias, pads)
+    stats = {"segments_before": len(segments), "vias_before": len(vias),
+             "vias_removed": 0, "stubs_removed": 0, "merged": 0, "corners_smoothed": 0}
+
+    # Removing a via can leave a stub and removing a stub can free a via
+    while True:
+        vias_removed = _remove_vias(board, zone_nets)
+        stubs_removed = _remove_stubs(board)
+        stats["vias_removed"] += vias_removed
+        stats["stubs_removed"] += stubs_removed
+        if not vias_removed and not stubs_removed:
+            break
+    stats["merged"] = _merge_collinear(board)
+    if smooth:
+        stats["corners_smoothed"] = _smooth_corners(board, chamfer)
+
+    out_segments = sorted(board.segments, key=lambda s: (s.net, s.layer, s.x0, s.y0, s.x1, s.y1))
+    out_vias = sorted(board.vias, key=lambda v: (v.net, v.x, v.y))
+    stats["segments_after"] = len(out_segments)
+    stats["vias_after"] = len(out_vias)
+    stats["seconds"] = round(time.time() - started, 3)
+    return out_segments, out_vias, stats
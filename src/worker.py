@@ -0,0 +1,124 @@
+import argparse
+import os
+import signal
+import socket
+import threading
+from typing import Optional
+
+from src import jobs
+from src import pipeline
+from src.job_queue import JobQueue, get_job_queue
+
+# Worker process for JOB_QUEUE_BACKEND=sqlite:
+#
+#   JOB_QUEUE_BACKEND=sqlite JOBS_DIR=/shared/jobs python -m src.worker
+#
+# Leases jobs from the queue, runs the pipeline (KiCad included) and writes the
+# artifacts into the shared job directory the web tier serves them from.
+
+
+def process_one(queue: JobQueue, worker_id: str, lease_seconds: float = 60) -> bool:
+    """
+    Runs at most one job. Returns False if there was nothing to do.
+    """
+    lease = queue.lease(worker_id, lease_seconds)
+    if lease is None:
+        return False
+
+    job_id = lease.job_id
+    print(f"[{worker_id}] Leased job {job_id} (attempt {lease.attempt})")
+    cancel_event = jobs.register_job(job_id)
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(lease_seconds / 3):
+            try:
+                state = queue.heartbeat(job_id, lease.token, lease_seconds)
+            except Exception as e:
+                print(f"[{worker_id}] Heartbeat failed for {job_id}: {e}")
+                continue
+            if state != "ok":
+                # Cancelled by the client, or our lease went to another worker
+                print(f"[{worker_id}] Stopping job {job_id}: {state}")
+                cancel_event.set()
+                return
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    try:
+        payload = lease.payload
+        # Only exploration jobs carry "explore"
+        options = {"explore": payload["explore"]} if payload.get("explore") else {}
+        result = pipeline.run_pipeline(
+            payload["prompt"], job_id, cancel_event, payload.get("base_job"),
+            on_stage=lambda event, data: queue.add_event(job_id, event, data), **options
+        )
+        queue.complete(job_id, lease.token, result)
+    except pipeline.PipelineCancelled:
+        queue.mark_cancelled(job_id, lease.token)
+    except pipeline.PipelineTimeout as e:
+        # The same input would run away again; don't hand it to another worker
+        print(f"[{worker_id}] Job {job_id} timed out: {e}")
+        queue.fail(job_id, lease.token, str(e), retry=False, kind="timeout",
+                   data={"stage": e.stage, "seconds": e.seconds})
+    except pipeline.PreflightFailed as e:
+        # The netlist won't get better on another worker either
+        print(f"[{worker_id}] Job {job_id} failed preflight: {e}")
+        queue.fail(job_id, lease.token, str(e), retry=False, kind="preflight", data={"problems": e.problems})
+    except Exception as e:
+        print(f"[{worker_id}] Job {job_id} failed: {e}")
+        queue.fail(job_id, lease.token, str(e))
+    finally:
+        stop_heartbeat.set()
+        jobs.unregister_job(job_id)
+    return True
+
+
+def run_worker(queue: JobQueue, worker_id: str, concurrency: int = 1, poll_interval: float = 1.0,
+               lease_seconds: float = 60, stop_event: Optional[threading.Event] = None) -> None:
+    stop_event = stop_event or threading.Event()
+
+    def loop(slot):
+        name = f"{worker_id}/{slot}"
+        while not stop_event.is_set():
+            try:
+                busy = process_one(queue, name, lease_seconds)
+            except Exception as e:
+                print(f"[{name}] Queue error: {e}")
+                busy = False
+            if not busy:
+                stop_event.wait(poll_interval)
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def main():
+    from src.admission import default_workers
+
+    parser = argparse.ArgumentParser(description="Run queued PCB generation jobs")
+    parser.add_argument("--concurrency", type=int, default=default_workers(),
+                        help="Jobs run in parallel (default: sized from cores / memory)")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--lease-seconds", type=float, default=60)
+    args = parser.parse_args()
+
+    queue = get_job_queue()
+    if queue is None:
+        raise SystemExit("JOB_QUEUE_BACKEND is 'local'; set it to 'sqlite' to run workers.")
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = threading.Event()
+    # Finish the jobs in hand, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    print(f"Worker {worker_id} started ({args.concurrency} slots), jobs in {os.path.abspath(jobs.JOBS_ROOT)}")
+    run_worker(queue, worker_id, args.concurrency, args.poll_interval, args.lease_seconds, stop_event)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import sys
+import os
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src import metrics
+from src.admission import AdmissionController, AdmissionRejected
+
+
+def test_running_builds_are_bounded():
+    admission = AdmissionController(max_running=2, max_queued=10, per_client=5)
+    peak = []
+
+    async def build():
+        ticket = await admission.acquire()
+        peak.append(admission.running)
+        await asyncio.sleep(0.01)
+        admission.release(ticket)
+
+    async def main_():
+        await asyncio.gather(*(build() for _ in range(6)))
+
+    asyncio.run(main_())
+    assert max(peak) == 2
+    assert admission.running == 0 and admission.queued() == 0
+
+
+def test_full_queue_rejects_fast():
+    admission = AdmissionController(max_running=1, max_queued=1, per_client=5)
+
+    async def main_():
+        ticket = await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            await admission.acquire()
+        assert exc.value.retry_after >= 1
+        with pytest.raises(AdmissionRejected):
+            admission.check()
+
+        admission.release(ticket)
+        admission.release(await waiting)
+
+    asyncio.run(main_())
+    assert admission.running == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    admission = AdmissionController(max_running=1, max_queued=5, per_client=5)
+
+    async def main_():
+        ticket = await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued() == 1
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert admission.queued() == 0
+        admission.release(ticket)
+
+    asyncio.run(main_())
+    assert admission.running == 0
+
+
+def test_per_client_cap():
+    admission = AdmissionController(max_running=4, max_queued=4, per_client=2)
+    admission.enter_client("a")
+    admission.enter_client("a")
+    admission.enter_client("b")
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.enter_client("a")
+    assert exc.value.reason == "client_limit"
+    admission.leave_client("a")
+    admission.enter_client("a")
+
+
+def test_generate_returns_429_when_saturated(monkeypatch):
+    admission = AdmissionController(max_running=1, max_queued=0, per_client=5)
+    admission.running = 1 # a build is already holding the only slot
+    monkeypatch.setattr(main, "admission", admission)
+
+    client = TestClient(main.app)
+    response = client.post("/generate", json={"prompt": "Add an LED"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    response = client.post("/generate/stream", json={"prompt": "Add an LED"})
+    assert response.status_code == 429
+
+
+def test_metrics_endpoint():
+    client = TestClient(main.app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "admission_queue_wait_seconds" in response.text
+    assert "# TYPE admission_rejected_total counter" in response.text
+
+
+def test_histogram_render():
+    hist = metrics.Histogram("test_latency_seconds", "test", buckets=(1, 5))
+    hist.observe(0.5)
+    hist.observe(3)
+    text = hist.render()
+    assert 'test_latency_seconds_bucket{le="1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "test_latency_seconds_count 2" in text
+
+
+def test_client_id_behind_trusted_proxies(monkeypatch):
+    from starlette.requests import Request
+
+    def request(forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 4321)})
+
+    # Header ignored unless a proxy is trusted: anyone could send it
+    assert main._client_id(request("203.0.113.7")) == "10.0.0.1"
+    monkeypatch.setattr(main, "TRUSTED_PROXY_HOPS", 1)
+    assert main._client_id(request("203.0.113.7")) == "203.0.113.7"
+    # A spoofed entry is left of the one the proxy appended
+    assert main._client_id(request("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+    assert main._client_id(request()) == "10.0.0.1"
+    monkeypatch.setattr(main, "TRUSTED_PROXY_HOPS", 2)
+    assert main._client_id(request("1.2.3.4, 203.0.113.7, 198.51.100.2")) == "203.0.113.7"
@@ -0,0 +1,50 @@
+import sys
+import os
+import math
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.array_placement import array_layout, array_shape
+from src.router import Router
+
+BBOX = [-2.0, -1.5, 2.0, 1.5] # 4 x 3 mm footprint
+
+
+def test_shapes():
+    assert array_shape(8, "row") == (1, 8)
+    assert array_shape(64, "grid", 8, 8) == (8, 8)
+    # Too small for the count: near-square instead
+    assert array_shape(20, "grid", 2, 2) == (4, 5)
+    assert array_shape(10, "grid") == (3, 4)
+
+
+def test_grid_positions_and_extent():
+    positions, extent = array_layout("grid", 10, BBOX, 0, 0, gap=1.0)
+    assert positions[:5] == [(0.0, 0.0, 0.0), (5.0, 0.0, 0.0), (10.0, 0.0, 0.0), (15.0, 0.0, 0.0), (0.0, 4.0, 0.0)]
+    # 4 columns, 3 rows (the last one partly filled)
+    assert extent == (-2.0, -1.5, 17.0, 9.5)
+    assert len(set(p[:2] for p in positions)) == 10
+
+
+def test_ring_keeps_neighbours_apart():
+    positions, (x0, y0, x1, y1) = array_layout("circular", 16, BBOX, gap=1.0)
+    assert positions[0] == (0.0, 0.0, 0.0)
+    assert [p[2] for p in positions[:3]] == [0.0, 337.5, 315.0]
+    for (ax, ay, _), (bx, by, _) in zip(positions, positions[1:] + positions[:1]):
+        assert math.hypot(ax - bx, ay - by) >= 5.0 - 1e-6
+    reach = math.hypot(2.0, 1.5)
+    for x, y, _ in positions:
+        assert x0 <= x - reach and x + reach <= x1 and y0 <= y - reach and y + reach <= y1
+
+
+def test_array_net_routes_every_pad():
+    # One net over a 16 x 16 array of pads, as for the cathodes of an LED matrix
+    positions, _ = array_layout("grid", 256, BBOX, 16, 16)
+    router = Router((-5, -5, 85, 70))
+    pads = [(x - 1.27, y) for x, y, _ in positions]
+    for x, y in pads:
+        router.add_obstacle(x - 0.8, y - 0.8, x + 0.8, y + 0.8, "GND", [0, 1])
+    router.add_net("GND", pads, 0.25, [[0, 1]] * len(pads))
+    stats = router.route(workers=1)
+    assert stats["routed"] == 1 and not stats["unrouted"]
+    segments, _ = router.tracks("GND")
+    assert len(segments) >= 255
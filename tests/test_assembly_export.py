@@ -0,0 +1,87 @@
+import sys
+import os
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import jobs
+from src import main
+from src import pipeline
+from src.assembly_export import bom_rows, cpl_rows, stream_csv, stream_json
+from src.schematic_generator import generate_schematic
+
+FAKE_KICAD = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'loadtest', 'fake_kicad'))
+
+NETLIST = {"components": [
+    {"ref": "R10", "value": "Resistor", "footprint": "R_Axial"},
+    {"ref": "D1", "value": "LED", "footprint": "LED_D5.0mm"},
+    {"ref": "R2", "value": "Resistor", "footprint": "R_Axial"},
+    {"ref": "R3", "value": "Resistor", "footprint": "R_0805"},
+], "nets": []}
+
+
+def test_bom_groups_by_value_and_footprint():
+    assert bom_rows(NETLIST) == [
+        {"value": "Resistor", "footprint": "R_Axial", "quantity": 2, "refs": "R2,R10"},
+        {"value": "LED", "footprint": "LED_D5.0mm", "quantity": 1, "refs": "D1"},
+        {"value": "Resistor", "footprint": "R_0805", "quantity": 1, "refs": "R3"},
+    ]
+
+
+def test_pick_and_place_is_relative_to_the_outline():
+    placement = {"outline": [20.0, 40.0, 100.0, 90.0], "parts": [
+        {"ref": "R2", "footprint": "R_Axial", "x": 30.0, "y": 50.0, "rotation": 90.0, "side": "top"},
+        {"ref": "D1", "footprint": "LED_D5.0mm", "x": 60.5, "y": 85.25, "rotation": 0.0, "side": "bottom"},
+        {"ref": "", "footprint": "MountingHole", "x": 23.0, "y": 43.0, "rotation": 0.0, "side": "top"},
+    ]}
+    rows = cpl_rows(NETLIST, placement)
+    # Parts the board lacks are left out, Y points up from the bottom-left corner
+    assert rows == [
+        {"ref": "D1", "value": "LED", "footprint": "LED_D5.0mm", "x": 40.5, "y": 4.75, "rotation": 0.0, "side": "bottom"},
+        {"ref": "R2", "value": "Resistor", "footprint": "R_Axial", "x": 10.0, "y": 40.0, "rotation": 90.0, "side": "top"},
+    ]
+
+
+def test_streams():
+    rows = [{"a": 1, "b": "x,y"}, {"a": 2, "b": "z"}]
+    assert "".join(stream_csv(rows, ("a", "b"))) == 'a,b\r\n1,"x,y"\r\n2,z\r\n'
+    assert "".join(stream_csv([], ("a", "b"))) == "a,b\r\n"
+    assert json.loads("".join(stream_json(rows))) == rows
+    assert "".join(stream_json([])) == "[]"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stand-in launchers are POSIX scripts")
+def test_job_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setenv("KICAD_PYTHON_EXE", os.path.join(FAKE_KICAD, "kicad-python"))
+    monkeypatch.setenv("FAKE_KICAD_PYTHON", sys.executable)
+    monkeypatch.setenv("PATH", FAKE_KICAD + os.pathsep + os.environ.get("PATH", ""))
+    for name in ("FAKE_KICAD_LATENCY", "FAKE_KICAD_FAILURE_RATE", "FAKE_KICAD_MEMORY_MB"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+
+    netlist = generate_schematic([{"name": "LED", "quantity": 3}, {"name": "Resistor", "quantity": 3},
+                                  {"name": "Battery", "quantity": 1}], [])
+    job_id = jobs.new_job_id()
+    pipeline.board_stage(netlist, jobs.job_dir(job_id, create=True))
+    client = TestClient(main.app)
+
+    bom = client.get(f"/jobs/{job_id}/bom.csv")
+    assert bom.status_code == 200 and bom.headers["content-type"].startswith("text/csv")
+    assert 'filename="bom.csv"' in bom.headers["content-disposition"]
+    lines = list(csv.DictReader(io.StringIO(bom.text)))
+    assert [(l["value"], l["quantity"], l["refs"]) for l in lines] == [
+        ("LED", "3", "D1,D2,D3"), ("Resistor", "3", "R4,R5,R6"), ("Battery", "1", "BT7")]
+
+    cpl = client.get(f"/jobs/{job_id}/cpl.json").json()
+    assert [row["ref"] for row in cpl] == ["BT7", "D1", "D2", "D3", "R4", "R5", "R6"]
+    assert all(row["x"] > 0 and row["y"] > 0 and row["side"] == "top" for row in cpl)
+    assert list(csv.reader(io.StringIO(client.get(f"/jobs/{job_id}/cpl.csv").text)))[0] == \
+        ["ref", "value", "footprint", "x", "y", "rotation", "side"]
+
+    assert client.get(f"/jobs/{job_id}/bom.xlsx").status_code == 404
+    assert client.get(f"/jobs/{jobs.new_job_id()}/cpl.csv").status_code == 404
+    os.remove(os.path.join(jobs.job_dir(job_id), pipeline.PLACEMENT_FILENAME))
+    assert client.get(f"/jobs/{job_id}/cpl.csv").json()["detail"] == "Job has no placement"
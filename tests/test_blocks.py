@@ -0,0 +1,110 @@
+import sys
+import os
+import math
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.blocks import BlockLibrary, BlockLayout, block_instances, block_key, layout_block, rotate
+from src.schematic_generator import generate_schematic
+
+
+def _two_pin(pitch):
+    # Through-hole two-pin part, pads 1 and 2 along x
+    half = pitch / 2
+    return {"bbox": [-half - 1.5, -1.5, half + 1.5, 1.5],
+            "pads": [["1", -half, 0.0, -half - 0.8, -0.8, -half + 0.8, 0.8, [0, 1]],
+                     ["2", half, 0.0, half - 0.8, -0.8, half + 0.8, 0.8, [0, 1]]]}
+
+
+GEOMETRY = {"led": _two_pin(2.54), "resistor": _two_pin(7.62)}
+
+
+def _led_netlist(pairs):
+    components = [{"name": "LED", "quantity": 1}] * pairs + [{"name": "Resistor", "quantity": 1}] * pairs
+    return generate_schematic(components, [])
+
+
+def test_heuristics_tag_blocks():
+    netlist = _led_netlist(3)
+    assert [b["type"] for b in netlist["blocks"]] == ["led_resistor"] * 3
+    assert netlist["blocks"][0]["members"] == [["led", "D1"], ["resistor", "R4"]]
+
+    robot = generate_schematic([{"name": "L293D", "quantity": 1}, {"name": "DC motor", "quantity": 1},
+                                {"name": "DC motor", "quantity": 1}, {"name": "Battery", "quantity": 1}], [])
+    members = robot["blocks"][0]["members"]
+    assert [role for role, _ in members] == ["driver", "motor_0", "motor_1", "battery"]
+
+    # No heuristic sub-circuit, no blocks key (netlists stay as they were)
+    assert "blocks" not in generate_schematic([{"name": "LM7805", "quantity": 1}], [])
+
+
+def test_identical_instances_share_a_signature():
+    instances = block_instances(_led_netlist(4))
+    assert len(instances) == 4
+    # GND leaves the block, so only the LED-resistor net is internal
+    assert [len(i.nets) for i in instances] == [1, 1, 1, 1]
+    assert instances[0].nets[0][0] == "Net-(D1-R5)" and instances[1].nets[0][0] == "Net-(D2-R6)"
+    assert len(set(block_key(i, GEOMETRY, [0.25]) for i in instances)) == 1
+
+    # Another footprint, another block
+    other = dict(GEOMETRY, resistor=_two_pin(10.16))
+    assert block_key(instances[0], other, [0.25]) != block_key(instances[0], GEOMETRY, [0.25])
+
+
+def test_parts_are_claimed_once():
+    netlist = _led_netlist(1)
+    netlist["blocks"].append({"type": "led_resistor", "members": [["led", "D1"], ["resistor", "R2"]]})
+    netlist["blocks"].append({"type": "led_resistor", "members": [["led", "D404"], ["resistor", "R2"]]})
+    assert len(block_instances(netlist)) == 1
+
+
+def _endpoints(segments):
+    points = set()
+    for _, x0, y0, x1, y1 in segments:
+        points.add((round(x0, 3), round(y0, 3)))
+        points.add((round(x1, 3), round(y1, 3)))
+    return points
+
+
+def test_layout_is_routed_and_placed_by_transform():
+    first, second = block_instances(_led_netlist(2))
+    layout = layout_block(first, GEOMETRY, [0.25])
+    assert layout.routed == [0]
+    assert layout.offsets["led"] == (0.0, 0.0)
+    # Members do not overlap
+    assert layout.offsets["resistor"][0] - 3.81 - 1.5 >= 2.54 / 2 + 1.5
+
+    for rotation in (0, 90):
+        positions, copper = layout.place(second, 100.0, 50.0, rotation)
+        assert set(positions) == {"D2", "R4"}
+        assert list(copper) == ["Net-(D2-R4)"]
+        # The copy's copper starts and ends on the copy's pads
+        dx, dy = rotate(2.54 / 2, 0.0, rotation)
+        led_anode = (round(positions["D2"][0] + dx, 3), round(positions["D2"][1] + dy, 3))
+        rx, ry = rotate(-3.81, 0.0, rotation)
+        res_pin1 = (round(positions["R4"][0] + rx, 3), round(positions["R4"][1] + ry, 3))
+        ends = _endpoints(copper["Net-(D2-R4)"][0])
+        assert led_anode in ends and res_pin1 in ends
+
+    x0, y0, x1, y1 = layout.extent(90)
+    assert math.isclose(x1 - x0, layout.bbox[3] - layout.bbox[1])
+
+
+def test_library_routes_each_block_once(tmp_path):
+    instances = block_instances(_led_netlist(5))
+    calls = []
+
+    def build(instance, geometry, widths):
+        calls.append(instance)
+        return layout_block(instance, geometry, widths)
+
+    library = BlockLibrary(str(tmp_path))
+    layouts = [library.layout(i, GEOMETRY, [0.25], build) for i in instances]
+    assert len(calls) == 1 and library.misses == 1 and library.hits == 4
+    assert all(l is layouts[0] for l in layouts)
+
+    # A new process reads the layout back from the directory
+    again = BlockLibrary(str(tmp_path))
+    cached = again.layout(instances[0], GEOMETRY, [0.25], build)
+    assert len(calls) == 1 and again.hits == 1
+    assert cached.to_dict() == layouts[0].to_dict()
+    assert isinstance(BlockLayout.from_dict(cached.to_dict()).bbox, tuple)
@@ -0,0 +1,182 @@
+import sys
+import os
+import time
+import xml.etree.ElementTree as ET
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import board_preview
+from src import jobs
+from src import main
+from src.board_preview import BoardScene, PreviewError, board_preview as preview_file, render_svg
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+BOARD = """(kicad_pcb (version 20241229) (generator "pcbnew")
+  (net 0 "")
+  (net 1 "GND")
+  (footprint "R" (layer "F.Cu") (at 10 10 90)
+    (property "Reference" "R1" (at 0 -2 90) (layer "F.SilkS") (effects (font (size 1 1))))
+    (fp_line (start -3 -1) (end 3 -1) (stroke (width 0.12) (type solid)) (layer "F.SilkS"))
+    (fp_line (start -3 1) (end 3 1) (stroke (width 0.12) (type solid)) (layer "F.SilkS"))
+    (fp_arc (start -1 0) (mid 0 1) (end 1 0) (stroke (width 0.12) (type solid)) (layer "F.SilkS"))
+    (fp_poly (pts (xy 0 0) (xy 1 0) (xy 1 1)) (stroke (width 0) (type solid)) (fill yes) (layer "F.SilkS"))
+    (pad "1" thru_hole circle (at -2 0 90) (size 1.6 1.6) (drill 0.8) (layers "*.Cu" "*.Mask") (net 1 "GND"))
+    (pad "2" thru_hole oval (at 2 0 90) (size 1.6 2.4) (drill 0.8) (layers "*.Cu" "*.Mask") (net 0 "")))
+  (footprint "C" (layer "F.Cu") (at 30 10)
+    (property "Reference" "C1" (at 0 -2 0) (layer "F.SilkS") (hide yes) (effects (font (size 1 1))))
+    (pad "1" smd rect (at -1 0) (size 1 1.2) (layers "F.Cu" "F.Paste" "F.Mask") (net 1 "GND"))
+    (pad "2" smd roundrect (at 1 0) (size 1 1.2) (layers "F.Cu" "F.Paste" "F.Mask") (net 0 "")))
+  (segment (start 10 8) (end 29 10) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 10 8) (end 10 20) (width 0.5) (layer "B.Cu") (net 1))
+  (segment (start 10 20) (end 20 20) (width 0.5) (layer "B.Cu") (net 1))
+  (via (at 10 20) (size 0.8) (drill 0.4) (layers "F.Cu" "B.Cu") (net 1))
+  (zone (net 1) (net_name "GND") (layers "F.Cu" "B.Cu")
+    (polygon (pts (xy 0 0) (xy 40 0) (xy 40 30) (xy 0 30))))
+  (zone (net 0) (net_name "") (layers "F.Cu" "B.Cu") (keepout (tracks not_allowed))
+    (polygon (pts (xy 1 1) (xy 2 1) (xy 2 2) (xy 1 2))))
+  (gr_line (start 0 0) (end 40 0) (stroke (width 0.1) (type default)) (layer "Edge.Cuts"))
+  (gr_line (start 40 0) (end 40 30) (stroke (width 0.1) (type default)) (layer "Edge.Cuts"))
+  (gr_line (start 40 30) (end 0 30) (stroke (width 0.1) (type default)) (layer "Edge.Cuts"))
+  (gr_line (start 0 30) (end 0 0) (stroke (width 0.1) (type default)) (layer "Edge.Cuts"))
+)
+"""
+
+
+def _groups(svg):
+    root = ET.fromstring(svg)
+    return root, {g.get("id"): g for g in root.iter(f"{SVG_NS}g")}
+
+
+def test_svg_layers_and_view_box():
+    root, groups = _groups(render_svg(BOARD))
+    assert list(groups) == ["B.Cu", "F.Cu", "F.SilkS", "Edge.Cuts"]
+    # Edge cuts (with their stroke) plus the margin decide the view box
+    assert root.get("viewBox") == "-2.05 -2.05 44.1 34.1"
+    # The hidden reference is not drawn, the visible one is
+    texts = [t.text for t in root.iter(f"{SVG_NS}text")]
+    assert texts == ["R1"]
+
+    _, only = _groups(render_svg(BOARD, ["F.Cu"]))
+    assert list(only) == ["F.Cu"]
+
+
+def test_primitives_are_batched_per_layer_and_width():
+    _, groups = _groups(render_svg(BOARD))
+    # B.Cu: zone, via fills, pad fills, 0.5mm tracks, 1.6mm oval pad strokes
+    b_cu = list(groups["B.Cu"])
+    widths = [p.get("stroke-width") for p in b_cu if p.get("stroke-width")]
+    assert widths == ["0.5", "1.6"]
+    assert len(b_cu) == 4
+    # Both 0.12mm silkscreen lines and the arc share one path
+    silk = [p for p in groups["F.SilkS"] if p.get("stroke-width") == "0.12"]
+    assert len(silk) == 1
+    assert silk[0].get("d").count("M") == 3 and "A" in silk[0].get("d")
+
+
+def test_footprint_rotation_and_keepouts():
+    scene = BoardScene.from_text(BOARD)
+    # R1 is rotated 90 degrees: its silkscreen lines run vertically through x = 9 and 11
+    silk = scene.strokes["F.SilkS"][0.12]
+    assert silk[0] == "M9 13L9 7"
+    assert silk[1] == "M11 13L11 7"
+    # Only the real zone is drawn, once per layer
+    assert len(scene.zones["F.Cu"]) == 1 and len(scene.zones["B.Cu"]) == 1
+    # Two pad drills and one via drill
+    assert len(scene.holes) == 3
+
+
+def test_render_is_fast_for_large_boards():
+    footprints = "".join(
+        f'(footprint "R" (layer "F.Cu") (at {i % 40 * 5} {i // 40 * 5} {i % 4 * 90})'
+        f'(fp_line (start -2 -1) (end 2 -1) (stroke (width 0.12)) (layer "F.SilkS"))'
+        f'(pad "1" smd rect (at -1 0) (size 1 1.2) (layers "F.Cu") (net 1 "A"))'
+        f'(pad "2" thru_hole circle (at 1 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "A")))'
+        for i in range(400))
+    tracks = "".join(f'(segment (start {i % 200} 0) (end {i % 200} 100) (width 0.25) (layer "B.Cu") (net 1))'
+                     for i in range(1000))
+    text = f'(kicad_pcb (net 1 "A") {footprints} {tracks})'
+    started = time.perf_counter()
+    svg = render_svg(text)
+    assert time.perf_counter() - started < 2.0
+    # 1400+ primitives, but only a handful of elements
+    assert svg.count("<path") < 10
+
+
+def test_preview_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("PREVIEW_CACHE_DIR", str(tmp_path / "cache"))
+    pcb = tmp_path / "design.kicad_pcb"
+    pcb.write_text(BOARD)
+
+    first = preview_file(str(pcb))
+    assert first.endswith("-all.svg")
+    calls = []
+    monkeypatch.setattr(BoardScene, "svg", lambda self, layers=None: calls.append(layers) or "")
+    assert preview_file(str(pcb)) == first
+    assert calls == []
+
+    layer = preview_file(str(pcb), "F.Cu,Edge.Cuts")
+    assert layer.endswith("-F_Cu+Edge_Cuts.svg") and layer != first
+    # Order and repeats don't make new entries
+    assert preview_file(str(pcb), "Edge.Cuts, F.Cu,F.Cu,Edge.Cuts") == layer
+    assert calls == [["F.Cu", "Edge.Cuts"]]
+
+    # Changed board content -> new cache entry
+    pcb.write_text(BOARD.replace("(at 30 10)", "(at 31 10)"))
+    assert preview_file(str(pcb)) != first
+
+    try:
+        preview_file(str(pcb), "In1.Cu")
+        assert False, "unknown layer accepted"
+    except PreviewError:
+        pass
+
+
+def test_png_needs_cairosvg(monkeypatch, tmp_path):
+    monkeypatch.setattr(board_preview, "cairosvg", None)
+    monkeypatch.setenv("PREVIEW_CACHE_DIR", str(tmp_path / "cache"))
+    pcb = tmp_path / "design.kicad_pcb"
+    pcb.write_text(BOARD)
+    try:
+        preview_file(str(pcb), fmt="png")
+        assert False, "PNG rendered without cairosvg"
+    except PreviewError:
+        pass
+
+
+def test_preview_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    monkeypatch.delenv("PREVIEW_CACHE_DIR", raising=False)
+    monkeypatch.setattr(board_preview, "cairosvg", None)
+    job_id = jobs.new_job_id()
+    with open(os.path.join(jobs.job_dir(job_id, create=True), "design.kicad_pcb"), "w") as f:
+        f.write(BOARD)
+
+    client = TestClient(main.app)
+    response = client.get(f"/jobs/{job_id}/preview.svg")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    assert response.text.startswith("<svg")
+    assert os.path.isdir(os.path.join(str(tmp_path), "_previews"))
+
+    cached = client.get(f"/jobs/{job_id}/preview.svg", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+    assert client.get(f"/jobs/{job_id}/preview.svg?layer=F.Cu").status_code == 200
+    assert client.get(f"/jobs/{job_id}/preview.svg?layer=nope").status_code == 400
+    assert client.get(f"/jobs/{job_id}/preview.png").status_code == 501
+    assert client.get(f"/jobs/{jobs.new_job_id()}/preview.svg").status_code == 404
+    # Other job files are still served by the generic route
+    assert client.get(f"/jobs/{job_id}/design.kicad_pcb").status_code == 200
+
+
+def test_preview_cache_is_pruned(monkeypatch, tmp_path):
+    monkeypatch.setenv("PREVIEW_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(board_preview, "PREVIEW_CACHE_MAX_FILES", 2)
+    pcb = tmp_path / "design.kicad_pcb"
+    pcb.write_text(BOARD)
+    paths = []
+    for layer in ("F.Cu", "B.Cu", "Edge.Cuts"):
+        paths.append(preview_file(str(pcb), layer))
+        os.utime(paths[-1], ns=(len(paths) * 10**9, len(paths) * 10**9))
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted(os.path.basename(p) for p in paths[1:])
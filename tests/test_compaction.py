@@ -0,0 +1,69 @@
+import sys
+import os
+import random
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.compaction import Unit, area_report, clusters, compact, pack_order
+
+
+def _boxes(units, packing, spacing):
+    boxes = {}
+    for unit in units:
+        x, y, rotated = packing.positions[unit.key]
+        w, h = (unit.height, unit.width) if rotated else (unit.width, unit.height)
+        boxes[unit.key] = (x, y, x + w + spacing, y + h + spacing)
+    return boxes
+
+
+def _overlap(a, b):
+    return a[0] < b[2] - 1e-9 and b[0] < a[2] - 1e-9 and a[1] < b[3] - 1e-9 and b[1] < a[3] - 1e-9
+
+
+def test_packing_is_dense_and_keeps_corners_free():
+    rng = random.Random(7)
+    units = [Unit(i, rng.choice([3.0, 5.0, 7.6, 10.0]), rng.choice([2.0, 2.5, 5.0]), rotatable=i % 5 != 0)
+             for i in range(300)]
+    nets = [[rng.randrange(300) for _ in range(3)] for _ in range(150)]
+    started = time.perf_counter()
+    packing = compact(pack_order(units, nets), corner=2.0, spacing=1.0)
+    assert time.perf_counter() - started < 2.0
+
+    boxes = _boxes(units, packing, 1.0)
+    ordered = sorted(boxes.values())
+    for i, a in enumerate(ordered):
+        assert a[0] >= 0 and a[1] >= 0 and a[2] <= packing.width + 1e-9 and a[3] <= packing.height + 1e-9
+        for b in ordered[i + 1:]:
+            if b[0] >= a[2]:
+                break
+            assert not _overlap(a, b)
+    corners = [(x, y, x + 2.0, y + 2.0) for x in (0.0, packing.width - 2.0) for y in (0.0, packing.height - 2.0)]
+    assert not any(_overlap(box, corner) for box in ordered for corner in corners)
+    # Fixed units keep their orientation
+    assert not any(packing.positions[u.key][2] for u in units if not u.rotatable)
+    assert sum((u.width + 1.0) * (u.height + 1.0) for u in units) / packing.area > 0.85
+
+
+def test_long_parts_are_turned():
+    units = [Unit(i, 20.0, 2.0) for i in range(6)] + [Unit("tall", 2.0, 20.0, rotatable=False)]
+    packing = compact(units, spacing=0.0)
+    assert round(packing.area, 6) == 280.0
+    assert packing.positions["tall"][2] is False
+
+
+def test_connected_parts_pack_together():
+    assert clusters(["a", "b", "c", "d"], [["a", "c"], ["b", "b"]]) == [["a", "c"], ["b"], ["d"]]
+    # Ground touches everything and does not merge clusters
+    assert clusters(list("abcd"), [list("abcd")], max_fanout=3) == [["a"], ["b"], ["c"], ["d"]]
+
+    units = [Unit(f"R{i}", 4.0, 2.0) for i in range(10)]
+    gnd = [u.key for u in units]
+    order = [u.key for u in pack_order(units, [["R0", "R7"], ["R7", "R3"], ["R2", "R5"], gnd])]
+    # Largest cluster first, then the pair, then the rest
+    assert order[:5] == ["R0", "R3", "R7", "R2", "R5"]
+
+
+def test_report():
+    assert area_report((100.0, 50.0), (40.0, 25.0)) == "100.0 x 50.0 mm -> 40.0 x 25.0 mm, saved 4000.0 mm2 (80%)"
+    assert area_report((10.0, 10.0), (10.0, 11.0)).endswith("added 10.0 mm2 (10%)")
+    assert compact([]).area == 0.0
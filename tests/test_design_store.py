@@ -0,0 +1,103 @@
+import sys
+import os
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import main
+from src import pipeline
+from src.design_store import DesignStore, component_term
+from src.schematic_generator import generate_schematic
+
+
+def _netlist(*names):
+    return generate_schematic([{"name": n, "quantity": 1} for n in names], [])
+
+
+def _record(store, index, *names, prompt=None):
+    return store.record(f"{index:032x}", prompt or f"Design {index}", {"components": []}, _netlist(*names),
+                        {}, {"parse": 0.1, "board": 1.0}, created_at=1000.0 + index)
+
+
+def test_record_and_get(tmp_path):
+    store = DesignStore(str(tmp_path / "designs.sqlite3"))
+    assert _record(store, 1, "LED", "Resistor")
+    # A shared build reports the same job again: the first record stays
+    assert not _record(store, 1, "Buzzer")
+
+    design = store.get(f"{1:032x}")
+    assert design["components"] == ["led", "resistor"]
+    assert design["component_count"] == 2 and design["total_seconds"] == 1.1
+    assert design["netlist"]["components"][0]["ref"] == "D1"
+    assert design["timings"] == {"parse": 0.1, "board": 1.0}
+    assert store.get("f" * 32) is None
+    assert component_term("  Push   Buttons ") == "push button" and component_term("Glass") == "glass"
+
+
+def test_keyset_pages_and_search(tmp_path):
+    store = DesignStore(str(tmp_path / "designs.sqlite3"))
+    for i in range(1, 121):
+        names = ["LED"] + (["Resistor"] if i % 2 else []) + (["Buzzer"] if i % 3 == 0 else [])
+        _record(store, i, *names, prompt="Blink an LED" if i % 10 == 0 else None)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.page(limit=50, cursor=cursor)
+        seen += [d["id"] for d in page]
+        if cursor is None:
+            break
+    assert seen == list(range(120, 0, -1))
+
+    both, cursor = store.page(limit=5, components=["leds", "Buzzer", "resistor"])
+    assert [d["id"] for d in both] == [117, 111, 105, 99, 93] and cursor == 93
+    assert [d["id"] for d in store.page(limit=100, components=["buzzer"], cursor=10)[0]] == [9, 6, 3]
+    assert [d["id"] for d in store.page(prompt="Blink  an LED")[0]] == list(range(120, 0, -10))
+    assert [d["id"] for d in store.page(components=["resistor"], since=1050, until=1056)[0]] == [55, 53, 51]
+    assert store.page(since=5000)[0] == []
+
+
+def test_searches_use_indexes(tmp_path):
+    store = DesignStore(str(tmp_path / "designs.sqlite3"))
+    conn = store._conn()
+    plans = []
+    original = conn.execute
+
+    class Recorder:
+        def execute(self, sql, params=()):
+            if sql.startswith("SELECT") and "ORDER BY" in sql and "LIMIT ?" in sql:
+                plans.append(" ".join(r[3] for r in original("EXPLAIN QUERY PLAN " + sql, params).fetchall()))
+            return original(sql, params)
+
+    store._local.conn = Recorder()
+    store.page(cursor=10)
+    store.page(components=["led", "resistor"], cursor=10)
+    store.page(prompt="x")
+    for plan in plans:
+        # Index searches only; no full table scan or temporary sort
+        assert "SCAN" not in plan.replace("SCAN d USING INTEGER PRIMARY KEY", "") and "TEMP B-TREE" not in plan
+
+
+def test_designs_api(monkeypatch, tmp_path):
+    monkeypatch.setenv("DESIGN_STORE_PATH", str(tmp_path / "designs.sqlite3"))
+    monkeypatch.setattr(main, "job_queue", None)
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    pcb = job_dir / pipeline.PCB_FILENAME
+    pcb.write_text("(kicad_pcb)")
+    job_id = "c" * 32
+    pipeline.record_design(job_id, "Add an LED", {"components": []}, _netlist("LED"), str(pcb), None,
+                           {"parse": 0.01})
+
+    client = TestClient(main.app)
+    listing = client.get("/designs", params={"component": "LEDs"}).json()
+    assert [d["job_id"] for d in listing["designs"]] == [job_id] and listing["next_cursor"] is None
+    assert client.get("/designs", params={"component": "motor"}).json()["designs"] == []
+
+    design = client.get(f"/designs/{job_id}").json()
+    assert list(design["artifacts"]) == ["pcb"] and design["artifacts"]["pcb"]["size"] == 11
+    response = client.get(design["artifacts"]["pcb"]["url"])
+    assert response.status_code == 200 and response.text == "(kicad_pcb)"
+    assert client.get(f"/designs/{job_id}/artifacts/gerbers").status_code == 404
+
+    pcb.unlink()
+    assert client.get(design["artifacts"]["pcb"]["url"]).status_code == 410
+    assert client.get(f"/designs/{'d' * 32}").status_code == 404
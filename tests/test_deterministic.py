@@ -0,0 +1,78 @@
+import sys
+import os
+import uuid
+import zipfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import deterministic, sexpr
+from src.schematic_generator import generate_schematic
+
+
+def _board(order, ids=None):
+    # pcbnew-like output: random UUIDs, items in whatever order they were saved
+    ids = ids or {}
+
+    def uid(name):
+        return ids.setdefault(name, str(uuid.uuid4()))
+
+    items = {
+        "R2": f'(footprint "R" (layer "F.Cu") (uuid "{uid("R2")}") (at 10 0) (property "Reference" "R2")'
+              f' (pad "1" smd rect (at -0 0) (uuid "{uid("R2p1")}")) (pad "2" smd rect (at 1 0) (uuid "{uid("R2p2")}")))',
+        "R10": f'(footprint "R" (layer "F.Cu") (uuid "{uid("R10")}") (at 20 0) (property "Reference" "R10")'
+               f' (pad "1" smd rect (at 0 0) (uuid "{uid("R10p1")}")))',
+        "seg": f'(segment (start 0 0) (end 1 0) (width 0.25) (layer "F.Cu") (net 1) (uuid "{uid("seg")}"))',
+        "via": f'(via (at 1 0) (size 0.8) (drill 0.4) (layers "F.Cu" "B.Cu") (net 1) (uuid "{uid("via")}"))',
+        "group": f'(group "" (uuid "{uid("group")}") (members "{uid("seg")}" "{uid("via")}"))',
+    }
+    return '(kicad_pcb (version 20240108) (net 0 "") (net 1 "GND")\n' + "\n".join(items[k] for k in order) + ")\n"
+
+
+def test_same_board_gives_same_bytes():
+    first = deterministic.canonical_board(_board(["R2", "R10", "seg", "via", "group"]))
+    second = deterministic.canonical_board(_board(["group", "via", "R10", "seg", "R2"]))
+    assert first == second
+    # Idempotent, so a re-saved canonical board stays put
+    assert deterministic.canonical_board(first) == first
+
+    board = sexpr.parse(first)
+    refs = [deterministic._reference(c) for c in sexpr.children(board, "footprint")]
+    assert refs == ["R2", "R10"]
+    assert "(at 0 0)" in first and "(at -0 " not in first
+    # Group members follow their items' new UUIDs
+    members = sexpr.find(sexpr.find(board, "group"), "members")[1:]
+    assert sorted(members) == sorted([sexpr.value(sexpr.find(board, "segment"), "uuid"),
+                                      sexpr.value(sexpr.find(board, "via"), "uuid")])
+
+
+def test_gerber_timestamps_are_pinned(tmp_path):
+    (tmp_path / "board-F_Cu.gbr").write_text(
+        "G04 Created by KiCad (PCBNEW 9.0.0) date 2026-10-19 12:34:56*\n"
+        "%TF.CreationDate,2026-10-19T12:34:56+02:00*%\nX0Y0D02*\n")
+    (tmp_path / "board.drl").write_text("M48\n; DRILL file {KiCad 9.0.0} date 2026-10-19T12:34:56+0200\nT1C0.8\n")
+    (tmp_path / "board.gbrjob").write_text('{\n  "Header": {\n    "CreationDate": "2026-10-19T12:34:56+02:00"\n  }\n}\n')
+
+    assert deterministic.pin_timestamps(str(tmp_path)) == 3
+    assert "date 1980-01-01 00:00:00*" in (tmp_path / "board-F_Cu.gbr").read_text()
+    assert "%TF.CreationDate,1980-01-01T00:00:00+00:00*%" in (tmp_path / "board-F_Cu.gbr").read_text()
+    assert "date 1980-01-01T00:00:00+0000" in (tmp_path / "board.drl").read_text()
+    assert '"CreationDate": "1980-01-01T00:00:00+00:00"' in (tmp_path / "board.gbrjob").read_text()
+    assert deterministic.pin_timestamps(str(tmp_path)) == 0
+
+
+def test_zip_bytes_ignore_mtimes_and_listing_order(tmp_path):
+    src = tmp_path / "gerbers"
+    src.mkdir()
+    for name in ("b.gbr", "a.gbr", "c.drl"):
+        (src / name).write_text(name)
+    first = open(deterministic.zip_directory(str(tmp_path / "one"), str(src)), "rb").read()
+    os.utime(src / "a.gbr", (1e9, 1e9))
+    second = open(deterministic.zip_directory(str(tmp_path / "two"), str(src)), "rb").read()
+    assert first == second
+    with zipfile.ZipFile(tmp_path / "one.zip") as archive:
+        assert archive.namelist() == ["a.gbr", "b.gbr", "c.drl"]
+        assert archive.read("c.drl") == b"c.drl"
+
+
+def test_netlist_has_no_date():
+    netlist = generate_schematic([{"name": "LED", "quantity": 1}], [])
+    assert "date" not in netlist["design"]
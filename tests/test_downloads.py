@@ -0,0 +1,107 @@
+from fastapi.testclient import TestClient
+import sys
+import os
+import gzip
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import app
+from src import jobs
+
+client = TestClient(app)
+
+BOARD = b"(kicad_pcb (version 20241229)\n" + b"  (segment (start 0 0) (end 1 1) (width 0.25))\n" * 500 + b")\n"
+
+def _make_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    job_id = jobs.new_job_id()
+    with open(os.path.join(jobs.job_dir(job_id, create=True), "design.kicad_pcb"), "wb") as f:
+        f.write(BOARD)
+    return job_id
+
+def test_etag_and_conditional_get(tmp_path, monkeypatch):
+    job_id = _make_job(tmp_path, monkeypatch)
+    url = f"/jobs/{job_id}/design.kicad_pcb"
+
+    first = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    assert first.content == BOARD
+    assert "immutable" in first.headers["cache-control"]
+    etag = first.headers["etag"]
+
+    second = client.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert second.status_code == 304
+    assert second.content == b""
+
+def test_gzip_precompressed_sidecar(tmp_path, monkeypatch):
+    job_id = _make_job(tmp_path, monkeypatch)
+    url = f"/jobs/{job_id}/design.kicad_pcb"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(BOARD) // 10
+    # httpx transparently decodes
+    assert response.content == BOARD
+    sidecar = os.path.join(jobs.job_dir(job_id), "design.kicad_pcb.gz")
+    assert os.path.exists(sidecar)
+    with open(sidecar, "rb") as f:
+        assert gzip.decompress(f.read()) == BOARD
+
+def test_range_requests(tmp_path, monkeypatch):
+    job_id = _make_job(tmp_path, monkeypatch)
+    url = f"/jobs/{job_id}/design.kicad_pcb"
+
+    partial = client.get(url, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == BOARD[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(BOARD)}"
+
+    tail = client.get(url, headers={"Range": "bytes=-5"})
+    assert tail.content == BOARD[-5:]
+
+    bad = client.get(url, headers={"Range": f"bytes={len(BOARD) + 10}-"})
+    assert bad.status_code == 416
+
+def test_missing_job_file(tmp_path, monkeypatch):
+    job_id = _make_job(tmp_path, monkeypatch)
+    assert client.get(f"/jobs/{job_id}/nope.kicad_pcb").status_code == 404
+
+def test_etag_cache_is_bounded(tmp_path, monkeypatch):
+    from src import downloads
+    monkeypatch.setattr(downloads, "_etag_cache", downloads.OrderedDict())
+    monkeypatch.setattr(downloads, "ETAG_CACHE_SIZE", 3)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text(str(i))
+        paths.append(str(path))
+        downloads.file_etag(str(path))
+    assert [key[0] for key in downloads._etag_cache] == [os.path.abspath(p) for p in paths[2:]]
+    # A hit moves the entry to the back
+    downloads.file_etag(paths[2])
+    downloads.file_etag(str(tmp_path / "f0.txt"))
+    assert [key[0] for key in downloads._etag_cache] == [os.path.abspath(p) for p in (paths[4], paths[2], paths[0])]
+
+def test_working_directory_sidecars_go_to_the_cache(tmp_path, monkeypatch):
+    from src import downloads
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path / "jobs"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "legacy.kicad_pcb").write_bytes(BOARD)
+
+    response = client.get("/download/legacy.kicad_pcb", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.content == BOARD
+    assert not (tmp_path / "legacy.kicad_pcb.gz").exists()
+    cache = downloads.sidecar_dir()
+    sidecar = [os.path.join(cache, n) for n in os.listdir(cache) if n.endswith(".gz")]
+    assert len(sidecar) == 1
+
+    # A changed original makes its copy stale, a deleted one orphans it
+    assert downloads.prune_sidecars(cache) == 0
+    os.utime(tmp_path / "legacy.kicad_pcb", ns=(0, os.stat(sidecar[0]).st_mtime_ns + 10 ** 9))
+    assert downloads.prune_sidecars(cache) == 1
+    assert client.get("/download/legacy.kicad_pcb", headers={"Accept-Encoding": "gzip"}).content == BOARD
+    os.remove(tmp_path / "legacy.kicad_pcb")
+    assert downloads.prune_sidecars(cache) == 1
+    assert os.listdir(cache) == []
@@ -0,0 +1,137 @@
+import sys
+import os
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import explore
+from src import jobs
+from src import main
+from src import pipeline
+from src.schematic_generator import generate_schematic
+
+FAKE_KICAD = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'loadtest', 'fake_kicad'))
+
+BOARD = """(kicad_pcb (version 20241229) (generator "pcbnew")
+  (net 0 "")
+  (net 1 "GND")
+  (net 2 "SIG")
+  (gr_rect (start 0 0) (end 40 20) (layer "Edge.Cuts"))
+  (footprint "R" (layer "F.Cu") (at 10 10)
+    (property "Reference" "R1")
+    (pad "1" thru_hole circle (at -2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "GND"))
+    (pad "2" thru_hole circle (at 2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 2 "SIG")))
+  (footprint "R" (layer "F.Cu") (at 30 10)
+    (property "Reference" "R2")
+    (pad "1" thru_hole circle (at -2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "GND"))
+    (pad "2" thru_hole circle (at 2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 2 "SIG")))
+  (segment (start 8 10) (end 8 15) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 8 15) (end 28 15) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 28 15) (end 28 10) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 12 10) (end 12 15.3) (width 0.25) (layer "B.Cu") (net 2))
+  (via (at 12 15.3) (size 0.8) (drill 0.4) (layers "F.Cu" "B.Cu") (net 2))
+)
+"""
+
+
+def test_segment_distance():
+    assert explore.segment_distance((0, 0, 10, 0), (5, -1, 5, 1)) == 0.0
+    assert explore.segment_distance((0, 0, 10, 0), (0, 2, 10, 2)) == 2.0
+    assert explore.segment_distance((0, 0, 1, 0), (4, 4, 4, 4)) == 5.0
+
+
+def test_board_score(tmp_path):
+    path = tmp_path / "design.kicad_pcb"
+    path.write_text(BOARD)
+    metrics = explore.score_board(str(path))
+    assert metrics["area_mm2"] == 800.0
+    assert metrics["wirelength_mm"] == 35.3 and metrics["vias"] == 1
+    # The SIG via sits on the GND track; SIG itself is not routed
+    assert metrics["clearance_violations"] == 1
+    assert metrics["unrouted"] == 1 and metrics["drc_violations"] == 2
+
+
+def test_ranking_and_variants():
+    def done(name, area, length, vias, drc):
+        return {"name": name, "status": "done", "metrics": {
+            "area_mm2": area, "wirelength_mm": length, "vias": vias, "drc_violations": drc}}
+
+    ranked = explore.rank([{"name": "a", "status": "failed"}, done("b", 100, 50, 4, 1),
+                           done("c", 120, 55, 6, 0), done("d", 90, 50, 2, 0)])
+    assert [v["name"] for v in ranked] == ["d", "c", "b", "a"]
+    assert ranked[0]["score"] == 2.25
+
+    variants = explore.make_variants(5)
+    assert variants[0] == {"name": "v0", "placement_seed": 0, "aspect": 0.0, "gnd_layer": "B.Cu",
+                           "track_widths": "standard"}
+    assert len({tuple(sorted(explore.variant_env(v).items())) for v in variants}) == 5
+    assert explore.explore_options(1) is None
+    assert explore.explore_options(50, 0) == {"variants": explore.EXPLORE_MAX_VARIANTS,
+                                              "budget": explore.EXPLORE_BUDGET_SECONDS}
+
+
+@pytest.fixture
+def fake_kicad(monkeypatch, tmp_path):
+    monkeypatch.setenv("KICAD_PYTHON_EXE", os.path.join(FAKE_KICAD, "kicad-python"))
+    monkeypatch.setenv("FAKE_KICAD_PYTHON", sys.executable)
+    monkeypatch.setenv("PATH", FAKE_KICAD + os.pathsep + os.environ.get("PATH", ""))
+    for name in ("FAKE_KICAD_LATENCY", "FAKE_KICAD_FAILURE_RATE", "FAKE_KICAD_MEMORY_MB"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    return monkeypatch
+
+
+def _netlist():
+    return generate_schematic([{"name": "LED", "quantity": 4}, {"name": "Resistor", "quantity": 4},
+                               {"name": "Capacitor", "quantity": 2}], [])
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stand-in launchers are POSIX scripts")
+def test_explore_builds_and_ranks_variants(fake_kicad):
+    job_id = jobs.new_job_id()
+    ranked, summary = explore.explore_board(_netlist(), job_id, 3, budget=60, workers=2)
+    assert summary["outcomes"] == {"done": 3} and summary["workers"] == 2
+    assert [v["score"] for v in ranked] == sorted(v["score"] for v in ranked)
+    assert len({v["job_id"] for v in ranked}) == 3 and job_id in {v["job_id"] for v in ranked}
+    assert all(os.path.isfile(v["pcb_file"]) for v in ranked)
+
+    result = explore.exploration_result(ranked, summary)
+    assert result["variant"]["name"] == ranked[0]["name"] and len(result["alternatives"]) == 2
+    assert result["variant"]["download_url"].endswith(pipeline.PCB_FILENAME)
+    assert "env" not in result["variant"] and "pcb_file" not in result["variant"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stand-in launchers are POSIX scripts")
+def test_explore_stops_at_the_budget(fake_kicad):
+    fake_kicad.setenv("FAKE_KICAD_LATENCY", "1")
+    ranked, summary = explore.explore_board(_netlist(), jobs.new_job_id(), 3, budget=0.5, workers=1)
+    assert summary["outcomes"] == {"done": 1, "skipped": 2}
+    assert ranked[0]["name"] == "v0" and ranked[0]["status"] == "done"
+
+    fake_kicad.setenv("FAKE_KICAD_FAILURE_RATE", "1")
+    with pytest.raises(pipeline.PipelineError):
+        explore.explore_board(_netlist(), jobs.new_job_id(), 2, budget=30, workers=2)
+
+
+def test_every_variant_id_cancels_the_exploration(monkeypatch):
+    seen = {}
+
+    def cancelled_explore_board(netlist, job_id, count, budget, cancel_event, workers, job_ids):
+        seen["job_ids"] = list(job_ids)
+        # The best variant's id is the one the client gets back
+        assert jobs.cancel_job(job_ids[-1]) and cancel_event.is_set()
+        raise pipeline.PipelineCancelled("Exploration cancelled")
+
+    monkeypatch.setattr(explore, "explore_board", cancelled_explore_board)
+    with pytest.raises(pipeline.PipelineCancelled):
+        asyncio.run(main._explore("p", {}, {}, [], {}, {"variants": 3, "budget": 10}))
+    assert len(set(seen["job_ids"])) == 3
+    assert not any(jobs.cancel_job(job_id) for job_id in seen["job_ids"])
+
+
+def test_stream_rejects_explore():
+    client = TestClient(main.app)
+    response = client.post("/generate/stream", json={"prompt": "Add an LED", "explore": 3})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "explore is only supported on /generate"
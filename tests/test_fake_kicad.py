@@ -0,0 +1,113 @@
+import sys
+import os
+import math
+import zipfile
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import pipeline
+from src.panelize import panelize
+from src.schematic_generator import generate_schematic
+
+FAKE_KICAD = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'loadtest', 'fake_kicad'))
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="the stand-in launchers are POSIX scripts")
+
+
+@pytest.fixture
+def fake_kicad(monkeypatch):
+    monkeypatch.setenv("KICAD_PYTHON_EXE", os.path.join(FAKE_KICAD, "kicad-python"))
+    monkeypatch.setenv("FAKE_KICAD_PYTHON", sys.executable)
+    monkeypatch.setenv("PATH", FAKE_KICAD + os.pathsep + os.environ.get("PATH", ""))
+    for name in ("FAKE_KICAD_LATENCY", "FAKE_KICAD_FAILURE_RATE", "FAKE_KICAD_MEMORY_MB"):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def _job(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    return str(path)
+
+
+def _netlist():
+    return generate_schematic([{"name": "LED", "quantity": 2}, {"name": "Resistor", "quantity": 2},
+                               {"name": "Battery", "quantity": 1}], [])
+
+
+def test_board_and_gerbers_without_kicad(fake_kicad, tmp_path):
+    netlist = _netlist()
+    first = pipeline.board_stage(netlist, _job(tmp_path, "one"))
+    second = pipeline.board_stage(netlist, _job(tmp_path, "two"))
+    assert open(first, "rb").read() == open(second, "rb").read()
+
+    gerber_zip = pipeline.gerber_stage(first, str(tmp_path / "one"))
+    with zipfile.ZipFile(gerber_zip) as archive:
+        names = archive.namelist()
+    assert "design-F_Cu.gtl" in names and "design-Edge_Cuts.gm1" in names and "design.drl" in names
+    again = pipeline.gerber_stage(second, str(tmp_path / "two"))
+    assert open(gerber_zip, "rb").read() == open(again, "rb").read()
+    # Realistic enough to panelize
+    info = panelize(str(tmp_path / "one" / pipeline.GERBER_DIRNAME), str(tmp_path / "panel"), cols=2, rows=2)
+    assert info["drill_hits"] > 0
+
+
+def test_failures_and_latency_are_configurable(fake_kicad, tmp_path):
+    fake_kicad.setenv("FAKE_KICAD_FAILURE_RATE", "1")
+    with pytest.raises(pipeline.PipelineError):
+        pipeline.board_stage(_netlist(), _job(tmp_path, "failed"))
+
+    fake_kicad.setenv("FAKE_KICAD_FAILURE_RATE", "0")
+    fake_kicad.setenv("FAKE_KICAD_LATENCY", "30")
+    fake_kicad.setitem(pipeline.STAGE_TIMEOUTS, "board", 2)
+    with pytest.raises(pipeline.PipelineTimeout):
+        pipeline.board_stage(_netlist(), _job(tmp_path, "slow"))
+
+
+def _outline(pcb_path):
+    from src import sexpr
+    points = [sexpr.floats(sexpr.find(line, key)) for line in sexpr.children(sexpr.parse_file(pcb_path), "gr_line")
+              if str(sexpr.value(line, "layer")) == "Edge.Cuts" for key in ("start", "end")]
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    return (max(xs) - min(xs)) * (max(ys) - min(ys))
+
+
+def test_compaction_shrinks_the_board(fake_kicad, tmp_path):
+    netlist = generate_schematic([{"name": "LED", "quantity": 6}, {"name": "Resistor", "quantity": 6},
+                                  {"name": "Capacitor", "quantity": 3}], [])
+    fake_kicad.setenv("USE_ARRAYS", "0")
+    fake_kicad.setenv("COMPACT_PLACEMENT", "0")
+    grid = _outline(pipeline.board_stage(netlist, _job(tmp_path, "grid")))
+    fake_kicad.setenv("COMPACT_PLACEMENT", "1")
+    compacted = _outline(pipeline.board_stage(netlist, _job(tmp_path, "compact")))
+    assert compacted < grid / 2
+
+
+def test_revision_routes_new_pads_around_other_copper(fake_kicad, tmp_path):
+    from src import sexpr
+    base = _job(tmp_path, "base")
+    pipeline.board_stage(_netlist(), base)
+    # D3 joins GND, whose copper is kept
+    netlist = generate_schematic([{"name": "LED", "quantity": 3}, {"name": "Resistor", "quantity": 3},
+                                  {"name": "Battery", "quantity": 1}], [])
+    root = sexpr.parse_file(pipeline.board_stage(netlist, _job(tmp_path, "revised"), base_dir=base))
+
+    pads = []
+    for fp in sexpr.children(root, "footprint"):
+        x, y, angle = (sexpr.floats(sexpr.find(fp, "at")) + [0.0])[:3]
+        c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        for pad in sexpr.children(fp, "pad"):
+            dx, dy = sexpr.floats(sexpr.find(pad, "at"))[:2]
+            net = sexpr.find(pad, "net")
+            pads.append((x + dx * c + dy * s, y - dx * s + dy * c, max(sexpr.floats(sexpr.find(pad, "size"))) / 2,
+                         net and int(net[1])))
+    for segment in sexpr.children(root, "segment"):
+        (x0, y0), (x1, y1) = sexpr.floats(sexpr.find(segment, "start")), sexpr.floats(sexpr.find(segment, "end"))
+        half = sexpr.floats(sexpr.find(segment, "width"))[0] / 2
+        net = int(sexpr.find(segment, "net")[1])
+        length = max((x1 - x0) ** 2 + (y1 - y0) ** 2, 1e-12)
+        for px, py, r, pad_net in pads:
+            # No track of one net over a pad of another
+            t = max(0.0, min(1.0, ((px - x0) * (x1 - x0) + (py - y0) * (y1 - y0)) / length))
+            if pad_net != net:
+                assert math.hypot(px - x0 - t * (x1 - x0), py - y0 - t * (y1 - y0)) >= r + half
@@ -0,0 +1,49 @@
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.footprint_geometry import Footprint, get_footprint, pad_table
+
+TO220 = "Package_TO_SOT_THT:TO-220-3_Vertical"
+
+
+def test_templates_parse_into_pads():
+    fp = get_footprint(TO220)
+    assert fp.pad_numbers == ["1", "2", "3"]
+    pad = fp.pads[0]
+    assert (pad.kind, pad.shape, pad.x, pad.width, pad.drill) == ("thru_hole", "rect", -2.54, 2.0, 1.0)
+    assert fp.local_bbox() == (-5.0, -2.0, 5.0, 2.0)
+    assert get_footprint("No:Such_Footprint").name == "Unknown_Footprint"
+
+
+def test_pad_positions_rotate_like_kicad():
+    fp = get_footprint(TO220)
+    assert np.allclose(fp.pad_positions(50, 50), [[47.46, 50], [50, 50], [52.54, 50]])
+    # 90 degrees counter-clockwise on screen (Y down): +x moves to -y
+    assert np.allclose(fp.pad_positions(50, 50, 90), [[50, 52.54], [50, 50], [50, 47.46]])
+    assert np.allclose(fp.bbox(0, 0, 90), (-2, -5, 2, 5))
+
+
+def test_to_sexpr_round_trips():
+    fp = get_footprint(TO220)
+    text = fp.to_sexpr(50.0, 50.0, "U1", 'Reg "5V"')
+    assert '(footprint "Package_TO_SOT_THT:TO-220-3_Vertical" (layer "F.Cu")' in text
+    assert "(at 50.0 50.0)" in text
+    assert '(fp_text value "Reg \\"5V\\""' in text
+
+    again = Footprint.from_text(text)
+    assert again.pad_numbers == fp.pad_numbers
+    assert np.allclose(again.pad_offsets(), fp.pad_offsets())
+
+    rotated = fp.to_sexpr(10, 20, "U2", "x", rotation=90)
+    assert "(at 10 20 90)" in rotated
+    assert '(pad "1" thru_hole rect (at -2.54 0 90)' in rotated
+
+
+def test_pad_table():
+    placed = [("U1", get_footprint(TO220), 0, 0, 0), ("C1", get_footprint("Capacitor_THT:C_Disc_D5.0mm_W2.5mm_P5.00mm"), 10, 0, 0)]
+    names, coords = pad_table(placed)
+    assert names == [("U1", "1"), ("U1", "2"), ("U1", "3"), ("C1", "1"), ("C1", "2")]
+    assert coords.shape == (5, 2)
+    assert np.allclose(coords[3], [7.5, 0])
@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.footprint_index import FootprintIndex, tokenize
+
+BUZZER = """(footprint "Buzzer_12x9.5RM7.6" (version 20240108)
+  (descr "Generic Buzzer, D12mm height 9.5mm with RM7.6mm")
+  (tags "buzzer")
+  (fp_circle (center 0 0) (end 6.25 0) (layer "F.CrtYd") (width 0.05))
+  (pad "1" thru_hole rect (at -3.8 0) (size 2 2) (drill 1) (layers "*.Cu"))
+  (pad "2" thru_hole circle (at 3.8 0) (size 2 2) (drill 1) (layers "*.Cu"))
+)
+"""
+
+DIP8 = """(footprint "DIP-8_W7.62mm" (version 20240108)
+  (descr "8-lead though-hole mounted DIP package")
+  (tags "THT DIP DIL PDIP 2.54mm 7.62mm 300mil")
+  (fp_rect (start -1.1 -1.55) (end 8.7 9.15) (layer "F.CrtYd") (width 0.05))
+""" + "".join(f'  (pad "{i + 1}" thru_hole oval (at 0 {i * 2.54}) (size 1.6 1.6) (drill 0.8) (layers "*.Cu"))\n' for i in range(8)) + ")\n"
+
+
+def _write(root, lib, name, text):
+    os.makedirs(os.path.join(root, f"{lib}.pretty"), exist_ok=True)
+    with open(os.path.join(root, f"{lib}.pretty", f"{name}.kicad_mod"), "w") as f:
+        f.write(text)
+
+
+def test_tokenize_joins_adjacent_terms():
+    assert "dip8" in tokenize("DIP-8_W7.62mm")
+    assert "w7.62mm" in tokenize("DIP-8_W7.62mm")
+
+
+def test_build_and_search(tmp_path):
+    root = str(tmp_path / "footprints")
+    _write(root, "Buzzer_Beeper", "Buzzer_12x9.5RM7.6", BUZZER)
+    _write(root, "Package_DIP", "DIP-8_W7.62mm", DIP8)
+
+    index = FootprintIndex(str(tmp_path / "index.sqlite3"))
+    stats = index.update(root)
+    assert stats == {"libraries": 2, "reindexed": 2, "removed": 0, "errors": 0, "footprints": 2}
+
+    hit = index.search("Buzzer")[0]
+    assert hit["footprint"] == "Buzzer_Beeper:Buzzer_12x9.5RM7.6"
+    assert hit["pads"] == ["1", "2"]
+    assert hit["bbox"] == (-6.25, -6.25, 6.25, 6.25)
+
+    assert index.search("dip8")[0]["footprint"] == "Package_DIP:DIP-8_W7.62mm"
+    assert index.search("DIP", pad_count=8)[0]["pad_count"] == 8
+    assert index.search("buzzr")[0]["footprint"].startswith("Buzzer_Beeper:") # fuzzy
+    assert index.search("UnknownThing") == []
+    assert index.get("Package_DIP:DIP-8_W7.62mm")["bbox"] == (-1.1, -1.55, 8.7, 9.15)
+
+
+def test_incremental_update(tmp_path):
+    root = str(tmp_path / "footprints")
+    _write(root, "Buzzer_Beeper", "Buzzer_12x9.5RM7.6", BUZZER)
+    _write(root, "Package_DIP", "DIP-8_W7.62mm", DIP8)
+    index = FootprintIndex(str(tmp_path / "index.sqlite3"))
+    index.update(root)
+
+    # Nothing changed -> nothing re-parsed
+    assert index.update(root)["reindexed"] == 0
+
+    time.sleep(0.01)
+    _write(root, "Package_DIP", "DIP-4_W7.62mm", DIP8.replace("DIP-8", "DIP-4"))
+    stats = index.update(root)
+    assert stats["reindexed"] == 1 and stats["footprints"] == 3
+    assert index.get("Package_DIP:DIP-4_W7.62mm") is not None
+
+    import shutil
+    shutil.rmtree(os.path.join(root, "Buzzer_Beeper.pretty"))
+    stats = index.update(root)
+    assert stats["removed"] == 1 and stats["footprints"] == 2
+    assert index.search("buzzer") == []
+
+
+def test_search_cache_is_bounded_and_shared_between_threads(tmp_path, monkeypatch):
+    import threading
+    from src import footprint_index
+
+    root = str(tmp_path / "footprints")
+    _write(root, "Package_DIP", "DIP-8_W7.62mm", DIP8)
+    index = FootprintIndex(str(tmp_path / "index.sqlite3"))
+    index.update(root)
+    monkeypatch.setattr(footprint_index, "SEARCH_CACHE_SIZE", 2)
+
+    # One entry per set of terms, however the query is spelt
+    assert index.search("DIP-8") is index.search("dip  8")
+    index.search("buzzer")
+    index.search("header")
+    assert len(index._cache) == 2
+
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(50):
+                index.search(f"dip {i % 7}")
+                assert index.get("Package_DIP:DIP-8_W7.62mm")["pad_count"] == 8
+        except Exception as e: # sqlite3 refuses connections from other threads
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and len(index._cache) <= 2
@@ -6,6 +6,7 @@ import subprocess
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from src.pipeline import kicad_python_exe
 from src.schematic_generator import generate_schematic
 
 def test_pipeline():
@@ -46,7 +47,8 @@ def test_pipeline():
     if os.path.exists(output_file):
         os.remove(output_file)
         
-    kicad_python = r"C:\Program Files\KiCad\9.0\bin\python.exe"
+    # KICAD_PYTHON_EXE; loadtest/fake_kicad/kicad-python runs it without KiCad
+    kicad_python = kicad_python_exe()
     script_path = "src/kicad_script.py"
     
     cmd = [kicad_python, script_path, netlist_file, output_file]
@@ -25,7 +25,8 @@ def test_generate_endpoint_integration():
     
     # Check Schematic part
     netlist = data["netlist"]
-    assert len(netlist["components"]) == len(parsed["components"])
+    # Each parsed entry becomes quantity parts
+    assert len(netlist["components"]) == sum(c["quantity"] for c in parsed["components"])
     assert len(netlist["nets"]) == len(parsed["connections"])
     
     # Verify footprint mapping in netlist
@@ -0,0 +1,180 @@
+import sys
+import os
+import threading
+import time
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import jobs
+from src import main
+from src import pipeline
+from src import worker
+from src.job_queue import SQLiteJobQueue
+
+
+def _queue(tmp_path, **kwargs):
+    return SQLiteJobQueue(str(tmp_path / "queue.sqlite3"), **kwargs)
+
+
+def test_lease_and_complete(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("a" * 32, {"prompt": "Add an LED"})
+    assert queue.pending() == 1
+
+    lease = queue.lease("w1", lease_seconds=30)
+    assert lease.payload == {"prompt": "Add an LED"} and lease.attempt == 1
+    assert queue.lease("w2", lease_seconds=30) is None # already leased
+
+    assert queue.heartbeat(lease.job_id, lease.token, 30) == "ok"
+    assert queue.complete(lease.job_id, lease.token, {"status": "success"})
+    job = queue.get(lease.job_id)
+    assert job["status"] == "done" and job["result"] == {"status": "success"}
+
+
+def test_expired_lease_is_retried_elsewhere(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.enqueue("b" * 32, {"prompt": "x"})
+
+    dead = queue.lease("w1", lease_seconds=0.01)
+    time.sleep(0.02)
+    retry = queue.lease("w2", lease_seconds=30)
+    assert retry.job_id == dead.job_id and retry.attempt == 2
+
+    # The first worker lost its lease and can't clobber the new owner
+    assert queue.heartbeat(dead.job_id, dead.token, 30) == "lost"
+    assert not queue.complete(dead.job_id, dead.token, {})
+    assert queue.complete(retry.job_id, retry.token, {"ok": True})
+
+
+def test_attempts_are_bounded(tmp_path):
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.enqueue("c" * 32, {"prompt": "x"})
+    lease = queue.lease("w1", lease_seconds=30)
+    assert queue.fail(lease.job_id, lease.token, "KiCad crashed")
+    job = queue.get(lease.job_id)
+    assert job["status"] == "failed" and job["error"] == "KiCad crashed"
+
+
+def test_cancel(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("d" * 32, {"prompt": "x"})
+    assert queue.cancel("d" * 32)
+    assert queue.get("d" * 32)["status"] == "cancelled"
+    assert queue.lease("w1", 30) is None
+
+    queue.enqueue("e" * 32, {"prompt": "x"})
+    lease = queue.lease("w1", 30)
+    assert queue.cancel(lease.job_id)
+    assert queue.heartbeat(lease.job_id, lease.token, 30) == "cancelled"
+
+
+def test_worker_runs_job_and_records_events(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path / "jobs"))
+    queue = _queue(tmp_path)
+
+    def fake_pipeline(prompt, job_id, cancel_event=None, base_job=None, on_stage=None):
+        on_stage("parsed", {"parsed_data": {"components": []}})
+        return {"status": "warning", "prompt": prompt}
+
+    monkeypatch.setattr(pipeline, "run_pipeline", fake_pipeline)
+    monkeypatch.setattr(main, "job_queue", queue)
+
+    client = TestClient(main.app)
+    submitted = client.post("/jobs", json={"prompt": "nothing useful"})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+
+    assert worker.process_one(queue, "test-worker")
+    assert not worker.process_one(queue, "test-worker")
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert job["result"] == {"status": "warning", "prompt": "nothing useful"}
+    assert [e["event"] for e in queue.events(job_id)] == ["parsed"]
+
+
+def test_worker_failure_is_retried(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path / "jobs"))
+    queue = _queue(tmp_path, max_attempts=3)
+
+    def broken_pipeline(*args, **kwargs):
+        raise pipeline.PipelineError("KiCad script failed")
+
+    monkeypatch.setattr(pipeline, "run_pipeline", broken_pipeline)
+    queue.enqueue("f" * 32, {"prompt": "x"})
+    worker.process_one(queue, "test-worker")
+
+    job = queue.get("f" * 32)
+    assert job["status"] == "queued" and job["attempts"] == 1
+    assert job["error"] == "KiCad script failed"
+
+
+def test_events_of_finished_jobs_are_purged(tmp_path):
+    queue = _queue(tmp_path, events_retention=60)
+    for job_id in ("f" * 32, "0" * 32):
+        queue.enqueue(job_id, {"prompt": "x"})
+    done = queue.lease("w1", 30)
+    running = queue.lease("w1", 30)
+    for lease in (done, running):
+        queue.add_event(lease.job_id, "parsed", {"n": 1})
+    queue.complete(done.job_id, done.token, {"status": "success"})
+
+    # Kept for streams still reading, then dropped; running jobs keep theirs
+    assert queue.purge_events() == 0
+    assert queue.purge_events(time.time() + 61) == 1
+    assert queue.events(done.job_id) == []
+    assert [e["event"] for e in queue.events(running.job_id)] == ["parsed"]
+
+
+def _generate_queued(monkeypatch, tmp_path, run_pipeline, path="/generate"):
+    # /generate on the web tier with one worker thread serving the queue
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path / "jobs"))
+    queue = _queue(tmp_path)
+    monkeypatch.setattr(pipeline, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(main, "job_queue", queue)
+    monkeypatch.setattr(main, "QUEUE_POLL_SECONDS", 0.01)
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.run_worker, args=(queue, "test-worker"),
+                              kwargs={"poll_interval": 0.01, "stop_event": stop})
+    thread.start()
+    try:
+        return TestClient(main.app).post(path, json={"prompt": f"queued {path} {time.time()}"}), queue
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_queued_timeout_is_a_504(monkeypatch, tmp_path):
+    def runaway_pipeline(*args, **kwargs):
+        raise pipeline.PipelineTimeout("board", 120)
+
+    response, queue = _generate_queued(monkeypatch, tmp_path, runaway_pipeline)
+    assert response.status_code == 504
+    assert response.json()["detail"] == "board stage timed out after 120s"
+
+    # Not retried, and the stream ends with the same event as in-process
+    stream, queue = _generate_queued(monkeypatch, tmp_path, runaway_pipeline, "/generate/stream")
+    assert 'event: timeout\ndata: {"detail": "board stage timed out after 120s", "stage": "board", "seconds": 120}' \
+        in stream.text
+    job = queue.get(stream.text.split('"job_id": "')[1][:32])
+    assert job["status"] == "failed" and job["attempts"] == 1
+    assert job["error_kind"] == "timeout" and job["error_data"] == {"stage": "board", "seconds": 120}
+
+
+def test_queued_preflight_failure_is_a_422(monkeypatch, tmp_path):
+    problems = [{"code": "duplicate_ref", "severity": "error", "message": "R1 is used by two parts", "ref": "R1"}]
+
+    def unbuildable_pipeline(*args, **kwargs):
+        raise pipeline.PreflightFailed(problems)
+
+    response, queue = _generate_queued(monkeypatch, tmp_path, unbuildable_pipeline)
+    assert response.status_code == 422
+    assert response.json()["detail"] == {"message": "Netlist preflight failed (1 error: R1 is used by two parts)",
+                                         "problems": problems}
+
+    stream, queue = _generate_queued(monkeypatch, tmp_path, unbuildable_pipeline, "/generate/stream")
+    assert stream.text.count("event: preflight") == 1
+    assert '"problems": [{"code": "duplicate_ref"' in stream.text
+    job = queue.get(stream.text.split('"job_id": "')[1][:32])
+    assert job["status"] == "failed" and job["attempts"] == 1
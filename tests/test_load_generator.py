@@ -0,0 +1,72 @@
+import sys
+import os
+import asyncio
+import random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from loadtest.load_generator import DEFAULT_PROMPTS, arrival_times, load_prompts, percentile, run_load, summarize
+
+
+def test_percentiles_are_nearest_rank():
+    values = list(range(1, 101))
+    random.Random(0).shuffle(values)
+    assert [percentile(values, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_arrivals_hold_the_target_rate():
+    assert arrival_times(4, 3) == [0.0, 0.25, 0.5]
+    poisson = arrival_times(10, 2000, "poisson", random.Random(1))
+    assert poisson == sorted(poisson)
+    # 2000 requests at 10/s take about 200 s
+    assert 180 < poisson[-1] < 220
+
+
+def test_corpus_loads():
+    prompts = load_prompts(DEFAULT_PROMPTS)
+    assert len(prompts) >= 10
+    assert all(p and not p.startswith("#") for p in prompts)
+    assert any("\n" in p for p in prompts)
+
+
+def test_summary_counts_errors_and_stages():
+    ok = {"latency": 1.0, "status": 200, "error": None, "timings": {"board": 0.5}, "coalesced": False}
+    samples = [ok, dict(ok, latency=3.0, coalesced=True),
+               dict(ok, status=429, timings=None), dict(ok, status=None, error="timeout")]
+    summary = summarize(samples, 2.0)
+    assert summary["succeeded"] == 2 and summary["error_rate"] == 0.5
+    assert summary["errors"] == {"http_429": 1, "timeout": 1}
+    assert summary["throughput_rps"] == 1.0 and summary["coalesced"] == 1
+    assert summary["latency"]["p50"] == 1.0 and summary["latency"]["max"] == 3.0
+    assert summary["stages"]["board"]["mean"] == 0.5
+
+
+class _Request(BaseModel):
+    prompt: str
+
+
+def test_run_against_an_app():
+    app = FastAPI()
+    seen = []
+
+    @app.post("/generate")
+    async def generate(request: _Request):
+        seen.append(request.prompt)
+        if len(seen) % 5 == 0:
+            raise HTTPException(status_code=500, detail="boom")
+        await asyncio.sleep(0.01)
+        return {"timings": {"parse": 0.001, "board": 0.01}}
+
+    transport = httpx.ASGITransport(app=app)
+    summary = asyncio.run(run_load("http://test", ["a", "b", "c"], rps=200, count=20, seed=3,
+                                   transport=transport))
+    assert summary["requests"] == 20 and len(seen) == 20
+    assert summary["errors"] == {"http_500": 4}
+    assert set(seen) == {"a", "b", "c"}
+    assert set(summary["stages"]) == {"parse", "board"}
+    assert summary["latency"]["p50"] >= 0.01
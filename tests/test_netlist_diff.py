@@ -0,0 +1,49 @@
+import pytest
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.netlist_diff import diff_netlists
+from src.schematic_generator import generate_schematic
+
+def _netlist(names):
+    return generate_schematic([{"name": n, "quantity": 1} for n in names], [])
+
+def test_identical_netlists_keep_everything():
+    old = _netlist(["Arduino", "LED", "Resistor"])
+    diff = diff_netlists(old, _netlist(["Arduino", "LED", "Resistor"]))
+
+    assert diff["added"] == [] and diff["removed"] == []
+    assert len(diff["ref_map"]) == 3
+    assert diff["reroute_nets"] == [] and diff["extended_nets"] == {}
+    assert len(diff["net_map"]) == len(old["nets"])
+
+def test_added_part_extends_gnd_only():
+    old = _netlist(["Arduino", "LED", "Resistor"])
+    new = _netlist(["Arduino", "LED", "Resistor", "Capacitor"])
+    diff = diff_netlists(old, new)
+
+    assert diff["added"] == ["C4"]
+    assert list(diff["extended_nets"]) == ["GND"]
+    assert diff["extended_nets"]["GND"]["added_nodes"] == [("C4", "1")]
+    # LED/resistor pair is untouched
+    assert "Net-(D2-R3)" in diff["net_map"]
+
+def test_renumbered_refs_are_matched_by_identity():
+    old = _netlist(["LED", "Resistor"])
+    # Inserting a part in front renumbers D1/R2 to D2/R3
+    new = _netlist(["Capacitor", "LED", "Resistor"])
+    diff = diff_netlists(old, new)
+
+    assert diff["ref_map"] == {"D1": "D2", "R2": "R3"}
+    assert diff["net_map"]["Net-(D1-R2)"] == "Net-(D2-R3)"
+
+def test_removed_part_forces_reroute():
+    old = _netlist(["Arduino", "LED", "Resistor", "Capacitor"])
+    new = _netlist(["Arduino", "LED", "Resistor"])
+    diff = diff_netlists(old, new)
+
+    assert diff["removed"] == ["C4"]
+    assert "GND" in diff["reroute_nets"]
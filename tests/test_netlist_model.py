@@ -0,0 +1,57 @@
+import pytest
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.netlist_model import Netlist, encode_netlist, decode_netlist, load_netlist, MAGIC
+from src.schematic_generator import generate_schematic
+
+def _sample_netlist():
+    components = [
+        {"name": "Arduino", "quantity": 1},
+        {"name": "L293D", "quantity": 1},
+        {"name": "Motor", "quantity": 1},
+        {"name": "Battery", "quantity": 1},
+        {"name": "LED", "quantity": 1},
+        {"name": "Resistor", "quantity": 1}
+    ]
+    return generate_schematic(components, [])
+
+def test_binary_roundtrip():
+    netlist = _sample_netlist()
+    blob = encode_netlist(netlist)
+
+    assert blob[:4] == MAGIC
+    assert decode_netlist(blob) == netlist
+
+def test_strings_are_interned():
+    netlist = _sample_netlist()
+    model = Netlist.from_dict(netlist)
+
+    # "GND" appears once in the string table even though many nodes reference pin/net strings
+    assert model.strings.strings.count("GND") == 1
+    gnd = next(n for n in model.nets if model.s(n.name) == "GND")
+    assert len(gnd.nodes) == 2 * len(next(n for n in netlist["nets"] if n["name"] == "GND")["nodes"])
+
+def test_extra_fields_survive():
+    netlist = {
+        "design": {"source": "test"},
+        "components": [{"ref": "R1", "value": "Resistor", "footprint": "X:Y", "quantity": 1, "group": {"id": 3}}],
+        "nets": [{"name": "N1", "nodes": [{"ref": "R1", "pin": "1"}], "class": "signal", "routed": False}]
+    }
+    assert decode_netlist(encode_netlist(netlist)) == netlist
+
+def test_load_netlist_sniffs_format():
+    netlist = _sample_netlist()
+    assert load_netlist(encode_netlist(netlist)) == netlist
+
+    import json
+    assert load_netlist(json.dumps(netlist).encode("utf-8")) == netlist
+
+def test_rejects_unknown_version():
+    blob = bytearray(encode_netlist(_sample_netlist()))
+    blob[4] = 99
+    with pytest.raises(ValueError):
+        decode_netlist(bytes(blob))
@@ -41,3 +41,98 @@ def test_parse_connection():
     # Note: precise extraction depends on parser accuracy, so we check for presence
     assert "LM7805" in conn["from"] or "LM7805" in conn["to"]
     assert "capacitor" in conn["to"] or "capacitor" in conn["from"]
+
+LIST_PROMPT = """# Components
+- **Arduino Uno** - main controller
+- 2x LED
+1. Push Button - for input
+
+| Part | Qty |
+|------|-----|
+| Capacitor | 3 |
+Resistor x 4
+"""
+
+def _spy_model(monkeypatch):
+    # A blank spaCy pipeline (tokenizer only) that records what it is given
+    import spacy
+    from src import nlp_parser
+    model = spacy.blank("en")
+    seen = []
+    pipe = model.pipe
+    def recording_pipe(texts, **kwargs):
+        texts = list(texts)
+        seen.extend(texts)
+        return pipe(texts, **kwargs)
+    monkeypatch.setattr(model, "pipe", recording_pipe)
+    monkeypatch.setattr(nlp_parser, "nlp", model)
+    monkeypatch.setattr(nlp_parser, "_nlp_loaded", True)
+    return seen
+
+def test_structured_prompt_skips_spacy(monkeypatch):
+    from src import nlp_parser
+    seen = _spy_model(monkeypatch)
+    before = nlp_parser.PARSE_TIER.value(tier="structured")
+
+    result = parse_requirements(LIST_PROMPT)
+    assert seen == []
+    assert [(c["name"], c["quantity"]) for c in result["components"]] == [
+        ("Arduino Uno", 1), ("LED", 2), ("Push Button", 1), ("Capacitor", 3), ("Resistor", 4)]
+    assert nlp_parser.PARSE_TIER.value(tier="structured") == before + 1
+
+def test_only_narrative_reaches_spacy(monkeypatch):
+    from src import nlp_parser
+    seen = _spy_model(monkeypatch)
+    before = nlp_parser.PARSE_TIER.value(tier="spacy")
+
+    text = LIST_PROMPT + "- Connect the LED to the resistor\n\nAlso add a buzzer\nnear the edge.\n"
+    result = parse_requirements(text)
+    assert seen == ["Connect the LED to the resistor", "Also add a buzzer near the edge."]
+    names = [c["name"] for c in result["components"]]
+    assert "buzzer" in names
+    # Parts already listed are not added again from the sentences
+    assert names.count("LED") == 1
+    assert nlp_parser.PARSE_TIER.value(tier="spacy") == before + 1
+
+def test_quantities_and_patterns():
+    from src.nlp_parser import parse_quantity, split_tiers
+    assert parse_quantity(["twenty", "four"]) == (24, None)
+    assert parse_quantity(["a", "dozen"]) == (12, None)
+    assert parse_quantity(["two", "hundred", "and", "fifty", "six"]) == (256, None)
+    assert parse_quantity(["16x16"]) == (256, (16, 16))
+    assert parse_quantity(["a"]) is None and parse_quantity(["red"]) is None
+
+    components, _, _, _ = split_tiers("- 16x16 LED matrix\n- Twelve LEDs in a ring\n- 8 resistors\n- Buzzer\n")
+    assert components == [
+        {"name": "LED matrix", "quantity": 256, "type": "BOM", "pattern": "grid", "rows": 16, "cols": 16},
+        {"name": "LEDs in a ring", "quantity": 12, "type": "BOM", "pattern": "circular"},
+        {"name": "resistors", "quantity": 8, "type": "BOM"},
+        {"name": "Buzzer", "quantity": 1, "type": "MarkdownList"}]
+
+def test_narrative_counts():
+    from src.nlp_parser import _quantity_before
+    assert _quantity_before("Build a board with 8 red ") == (8, None)
+    assert _quantity_before("with a dozen ") == (12, None)
+    assert _quantity_before("an 8x8 ") == (64, (8, 8))
+    # A count belongs to the part right after it
+    assert _quantity_before("with 3 LEDs and ") is None
+    assert _quantity_before("powered by an LM7805 ") is None
+
+def test_bom_lines_listing_several_parts():
+    from src.nlp_parser import split_tiers
+
+    def parts(text):
+        components, paragraphs, _, _ = split_tiers(text)
+        return [(c["name"], c["quantity"]) for c in components], paragraphs
+
+    assert parts("8 LEDs and 8 resistors") == ([("LEDs", 8), ("resistors", 8)], [])
+    assert parts("2 LEDs, 1 buzzer") == ([("LEDs", 2), ("buzzer", 1)], [])
+    assert parts("4 LEDs with resistors") == ([("LEDs", 4), ("resistors", 1)], [])
+    assert parts("- 3 LEDs + a battery") == ([("LEDs", 3), ("battery", 1)], [])
+    # Still one part
+    assert parts("LED x 8") == ([("LED", 8)], [])
+    assert parts("2x 10k ohm resistor") == ([("10k ohm resistor", 2)], [])
+    # Sentences go to the spaCy tier
+    assert parts("8 LEDs and make them blink") == ([], ["8 LEDs and make them blink"])
+    assert parts("2 LEDs or 3 buzzers") == ([], ["2 LEDs or 3 buzzers"])
+    assert parts("Add a sealed box and 2 LEDs") == ([], ["Add a sealed box and 2 LEDs"])
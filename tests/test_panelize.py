@@ -0,0 +1,123 @@
+import sys
+import os
+import json
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import jobs
+from src import main
+from src.panelize import PanelError, panelize
+
+HEADER = """%TF.GenerationSoftware,KiCad,Pcbnew,9.0.7*%
+%TF.FileFunction,{function}*%
+%FSLAX46Y46*%
+%MOMM*%
+%LPD*%
+G01*
+G04 APERTURE LIST*
+%ADD10C,{aperture}*%
+G04 APERTURE END LIST*
+"""
+
+EDGE = HEADER.format(function="Profile,NP", aperture="0.100000") + """D10*
+X0Y0D02*
+X40000000Y0D01*
+X40000000Y-20000000D01*
+X0Y-20000000D01*
+X0Y0D01*
+M02*
+"""
+
+COPPER = HEADER.format(function="Copper,L1,Top", aperture="1.600000") + """D10*
+X10000000Y-10000000D03*
+X30000000Y-10000000D03*
+M02*
+"""
+
+DRILL = """M48
+FMAT,2
+METRIC
+T1C0.800
+%
+G90
+G05
+T1
+X10.0Y-10.0
+X30.0Y-10.0
+M30
+"""
+
+
+def _gerbers(path):
+    os.makedirs(path, exist_ok=True)
+    for name, text in (("design-Edge_Cuts.gm1", EDGE), ("design-F_Cu.gtl", COPPER), ("design.drl", DRILL)):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(text)
+    with open(os.path.join(path, "design-job.gbrjob"), "w") as f:
+        json.dump({"GeneralSpecs": {"Size": {"X": 40, "Y": 20}}}, f)
+    return path
+
+
+def test_step_and_repeat_keeps_one_copy_of_the_board(tmp_path):
+    src = _gerbers(str(tmp_path / "gerbers"))
+    out = str(tmp_path / "panel")
+    info = panelize(src, out, cols=3, rows=2, gap=2.0, rail=5.0)
+
+    assert info["panel_size_mm"] == [3 * 40 + 2 * 2 + 2 * 2 + 2 * 5, 2 * 20 + 2 + 2 * 2 + 2 * 5]
+
+    copper = open(os.path.join(out, "design-F_Cu.gtl")).read()
+    assert "%SRX3Y2I42.000000J22.000000*%" in copper
+    assert copper.count("X10000000Y-10000000D03*") == 1 # referenced, not copied
+    assert copper.count("D03*") == 2 + 3 # board pads + fiducials
+    assert copper.rstrip().endswith("M02*")
+
+    # Every original hit once per copy, plus the mouse-bite perforations
+    drill = open(os.path.join(out, "design.drl")).read().splitlines()
+    t1 = drill[drill.index("T1") + 1:drill.index("T2")]
+    assert len(t1) == 2 * 6
+    assert "X52Y-10" in t1 # (10, -10) shifted one pitch right
+    assert "T2C0.500" in drill
+
+    job = json.load(open(os.path.join(out, "design-job.gbrjob")))
+    assert job["GeneralSpecs"]["Size"] == {"X": info["panel_size_mm"][0], "Y": info["panel_size_mm"][1]}
+
+
+def test_vscore_writes_score_lines(tmp_path):
+    src = _gerbers(str(tmp_path / "gerbers"))
+    out = str(tmp_path / "panel")
+    info = panelize(src, out, cols=2, rows=2, separation="vscore", rail=5.0)
+    assert info["panel_size_mm"] == [2 * 40 + 10, 2 * 20 + 10]
+    score = open(os.path.join(out, "design-VScore.gbr")).read()
+    assert score.count("D01*") == 3 + 3 # 3 horizontal + 3 vertical cuts
+    edge = open(os.path.join(out, "design-Edge_Cuts.gm1")).read()
+    assert "%SR" not in edge # boards butt together; only the panel outline is routed
+
+
+def test_invalid_options(tmp_path):
+    src = _gerbers(str(tmp_path / "gerbers"))
+    with pytest.raises(PanelError):
+        panelize(src, str(tmp_path / "p"), cols=2, rows=2, rail=0)
+    with pytest.raises(PanelError):
+        panelize(src, str(tmp_path / "p"), cols=2, rows=2, separation="laser")
+
+
+def test_panel_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    job_id = jobs.new_job_id()
+    _gerbers(os.path.join(jobs.job_dir(job_id, create=True), "gerbers"))
+
+    client = TestClient(main.app)
+    response = client.post(f"/jobs/{job_id}/panel", json={"cols": 2, "rows": 3})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["panel_url"].startswith(f"/jobs/{job_id}/panel-")
+
+    archive = client.get(body["panel_url"])
+    assert archive.status_code == 200
+    names = zipfile.ZipFile(__import__("io").BytesIO(archive.content)).namelist()
+    assert "design-F_Cu.gtl" in names
+
+    assert client.post(f"/jobs/{jobs.new_job_id()}/panel", json={}).status_code == 404
+    assert client.post(f"/jobs/{job_id}/panel", json={"separation": "laser"}).status_code == 400
@@ -0,0 +1,109 @@
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import footprint_index
+from src import jobs
+from src import main
+from src import pipeline
+from src import preflight
+from src.preflight import check_netlist, footprint_pads
+
+HEADER = "Connector_PinHeader_2.54mm:PinHeader_1x04_P2.54mm_Vertical"
+LED = "LED_THT:LED_D5.0mm"
+
+
+@pytest.fixture(autouse=True)
+def no_footprint_index(monkeypatch, tmp_path):
+    # Pads from the built-in table, whatever index the machine has
+    monkeypatch.setattr(footprint_index, "INDEX_PATH", str(tmp_path / "missing.sqlite3"))
+    monkeypatch.setattr(footprint_index, "_default_index", None)
+    monkeypatch.setattr(preflight, "_footprints", {})
+
+
+def _netlist(components, nets):
+    return {"components": [{"ref": ref, "value": ref, "footprint": fp, "quantity": 1} for ref, fp in components],
+            "nets": [{"name": name, "class": "signal", "nodes": [{"ref": r, "pin": p} for r, p in nodes]}
+                     for name, nodes in nets]}
+
+
+def _nodes(netlist):
+    return {net["name"]: [(n["ref"], n["pin"]) for n in net["nodes"]] for net in netlist["nets"]}
+
+
+def test_pad_table():
+    assert footprint_pads(HEADER) == (True, ("1", "2", "3", "4"))
+    assert footprint_pads("Package_DIP:DIP-16_W7.62mm")[1][-1] == "16"
+    assert len(footprint_pads("Package_TO_SOT_THT:TO-220-15_P2.54x2.54mm_Staggered_LeadDown")[1]) == 15
+    assert footprint_pads(LED) == (True, ("1", "2"))
+    assert footprint_pads("Unknown_Footprint") == (False, None)
+    # Not known: pins are not checked
+    assert footprint_pads("RF_Module:ESP-12E") == (True, None)
+
+
+def test_missing_pins_move_to_free_pads():
+    netlist = _netlist([("J1", HEADER), ("D1", LED), ("D2", LED)],
+                       [("A", [("J1", "5"), ("D1", "2")]), ("B", [("J1", "1"), ("D2", "2")]),
+                        ("C", [("D1", "3"), ("D2", "11")])])
+    fixed, problems = check_netlist(netlist, fix=True)
+    assert [(p["code"], p["severity"], p.get("fix")) for p in problems] == [
+        ("missing_pin", "fixed", "moved to pad 2"),
+        ("missing_pin", "fixed", "moved to pad 1"),
+        ("missing_pin", "fixed", "moved to pad 1"),
+    ]
+    assert "pads 1-4" in problems[0]["message"]
+    assert _nodes(fixed) == {"A": [("J1", "2"), ("D1", "2")], "B": [("J1", "1"), ("D2", "2")],
+                             "C": [("D1", "1"), ("D2", "1")]}
+    # The input is left alone
+    assert netlist["nets"][0]["nodes"][0]["pin"] == "5"
+
+
+def test_conflicts_single_nodes_and_unknown_parts():
+    terminal = "TerminalBlock_Phoenix:TerminalBlock_Phoenix_MKDS-1,5-2-5.08_1x02_P5.08mm_Horizontal"
+    netlist = _netlist([("M1", terminal), ("U1", "Package_DIP:DIP-16_W7.62mm"), ("U2", "Unknown_Footprint")],
+                       [("GND", [("M1", "1"), ("U1", "4"), ("U1", "4")]), ("OUT_A", [("U1", "3"), ("M1", "1")]),
+                        ("OUT_B", [("U1", "6"), ("M1", "2"), ("X9", "1")]), ("SENSE", [("U2", "3")])])
+    fixed, problems = check_netlist(netlist, fix=True)
+    codes = [(p["code"], p["severity"]) for p in problems]
+    assert codes == [("unknown_ref", "fixed"), ("unknown_footprint", "fixed"), ("pad_conflict", "warning"),
+                     ("single_node_net", "fixed"), ("single_node_net", "fixed")]
+    # The pad stays in the last net, as KiCad would leave it
+    assert _nodes(fixed) == {"OUT_A": [("U1", "3"), ("M1", "1")], "OUT_B": [("U1", "6"), ("M1", "2")]}
+    assert [c["footprint"] for c in fixed["components"]][2] == \
+        "Connector_PinHeader_2.54mm:PinHeader_1x03_P2.54mm_Vertical"
+
+    clean = _netlist([("D1", LED), ("D2", LED)], [("A", [("D1", "1"), ("D2", "1")])])
+    assert check_netlist(clean, fix=True) == (clean, [])
+
+
+def test_what_cannot_be_fixed():
+    assert check_netlist({"components": [], "nets": []})[1][0]["code"] == "no_components"
+    duplicate = _netlist([("D1", LED), ("D1", LED)], [("A", [("D1", "1"), ("D1", "2")])])
+    assert [p["severity"] for p in check_netlist(duplicate, fix=True)[1]] == ["error"]
+
+    strict = check_netlist(_netlist([("J1", HEADER), ("D1", LED)], [("A", [("J1", "5"), ("D1", "2")])]), fix=False)[1]
+    assert [(p["code"], p["severity"], p["fix"]) for p in strict] == [("missing_pin", "error", "moved to pad 1")]
+
+
+def test_failed_preflight_skips_kicad(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    monkeypatch.setattr(preflight, "PREFLIGHT_FIX", False)
+    monkeypatch.setattr(pipeline, "parse_stage", lambda prompt: {
+        "components": [{"name": "LED", "quantity": 1}], "connections": []})
+
+    def no_board(*args, **kwargs):
+        raise AssertionError("KiCad started")
+
+    monkeypatch.setattr(pipeline, "board_stage", no_board)
+    client = TestClient(main.app)
+    response = client.post("/generate", json={"prompt": "an LED"})
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["problems"][0]["code"] == "single_node_net"
+    assert detail["message"].startswith("Netlist preflight failed (1 error: Net GND has 1 node")
+
+    monkeypatch.setattr(preflight, "PREFLIGHT_FIX", True)
+    netlist, problems = pipeline.preflight_stage(pipeline.netlist_stage({"components": [{"name": "LED"}]}))
+    assert netlist["nets"] == [] and problems[0]["severity"] == "fixed"
@@ -0,0 +1,81 @@
+import sys
+import os
+import threading
+import time
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.process_runner import (ProcessCancelled, ProcessTimeout, ResourceLimits, kicad_limits,
+                                run_process)
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="process groups / rlimits are POSIX")
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie still answers kill(0) until its parent reaps it
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return True
+
+
+def test_output_and_input_are_captured():
+    result = run_process([sys.executable, "-c", "import sys; print(sys.stdin.read().upper())"], input=b"abc")
+    assert result.returncode == 0
+    assert result.stdout.strip() == "ABC"
+    assert result.limit_hit() is None
+
+
+@posix_only
+def test_timeout_kills_the_whole_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    # The shell's background child would survive a kill of the shell alone
+    cmd = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+    started = time.monotonic()
+    with pytest.raises(ProcessTimeout) as e:
+        run_process(cmd, timeout=0.5)
+    assert e.value.seconds == 0.5
+    assert time.monotonic() - started < 10
+    grandchild = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(grandchild)
+
+
+def test_cancel_stops_the_child():
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    with pytest.raises(ProcessCancelled):
+        run_process([sys.executable, "-c", "import time; time.sleep(30)"], cancel_event=cancel)
+    assert time.monotonic() - started < 10
+
+
+@posix_only
+def test_cpu_limit_is_reported():
+    limits = ResourceLimits(cpu_seconds=1)
+    result = run_process([sys.executable, "-c", "while True: pass"], timeout=30, limits=limits)
+    assert result.returncode != 0
+    assert result.limit_hit() is not None
+
+
+@posix_only
+def test_memory_limit_fails_the_child():
+    limits = ResourceLimits(memory_mb=256)
+    result = run_process([sys.executable, "-c", "x = bytearray(1024 * 1024 * 1024)"], timeout=30, limits=limits)
+    assert result.returncode != 0
+    assert "MemoryError" in result.stderr
+
+
+def test_kicad_limits_follow_the_timeout(monkeypatch):
+    monkeypatch.delenv("KICAD_CPU_SECONDS", raising=False)
+    monkeypatch.setenv("KICAD_MEMORY_MB", "2048")
+    limits = kicad_limits(90)
+    assert (limits.memory_mb, limits.cpu_seconds) == (2048, 90)
+    assert kicad_limits(None).cpu_seconds == 0
@@ -0,0 +1,159 @@
+import sys
+import os
+import math
+import random
+import time
+from fastapi.testclient import TestClient
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import jobs
+from src import main
+from src.ratsnest import Ratsnest, delaunay_edges, minimum_airwires
+
+BOARD = """(kicad_pcb (version 20241229) (generator "pcbnew")
+  (net 0 "")
+  (net 1 "GND")
+  (net 2 "SIG")
+  (footprint "R" (layer "F.Cu") (at 10 10)
+    (property "Reference" "R1")
+    (pad "1" thru_hole circle (at -2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "GND"))
+    (pad "2" thru_hole circle (at 2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 2 "SIG")))
+  (footprint "R" (layer "F.Cu") (at 30 10 90)
+    (property "Reference" "R2")
+    (pad "1" thru_hole circle (at -2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "GND"))
+    (pad "2" thru_hole circle (at 2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 2 "SIG")))
+  (footprint "C" (layer "F.Cu") (at 20 30)
+    (property "Reference" "C1")
+    (pad "1" thru_hole circle (at -2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 1 "GND"))
+    (pad "2" thru_hole circle (at 2 0) (size 1.6 1.6) (drill 0.8) (layers "*.Cu") (net 0 "")))
+  (segment (start 8 10) (end 8 20) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 8 20) (end 30 20) (width 0.25) (layer "F.Cu") (net 1))
+  (segment (start 30 20) (end 30 12) (width 0.25) (layer "F.Cu") (net 1))
+)
+"""
+
+
+def _mst_length(points):
+    # Prim, O(n^2), as the reference
+    n = len(points)
+    done, dist, total = [False] * n, [math.inf] * n, 0.0
+    dist[0] = 0.0
+    for _ in range(n):
+        u = min((i for i in range(n) if not done[i]), key=lambda i: dist[i])
+        done[u] = True
+        total += dist[u]
+        for v in range(n):
+            if not done[v]:
+                dist[v] = min(dist[v], math.dist(points[u], points[v]))
+    return total
+
+
+def test_airwires_are_a_minimum_spanning_tree():
+    rnd = random.Random(7)
+    cases = [
+        [(rnd.uniform(0, 100), rnd.uniform(0, 100)) for _ in range(150)],
+        [(rnd.randrange(8) * 2.54, rnd.randrange(8) * 2.54) for _ in range(60)], # grid: cocircular + duplicates
+        [(i * 1.27, 5.0) for i in range(20)], # collinear
+    ]
+    for points in cases:
+        airwires, _ = minimum_airwires(points)
+        assert len(airwires) == len(points) - 1
+        length = sum(math.dist(points[a], points[b]) for a, b in airwires)
+        assert abs(length - _mst_length(points)) < 1e-6
+
+
+def test_delaunay_edge_count_is_linear():
+    rnd = random.Random(3)
+    points = [(rnd.randrange(10 ** 6), rnd.randrange(10 ** 6)) for _ in range(500)]
+    edges = delaunay_edges(points)
+    assert len(points) - 1 <= len(edges) <= 3 * len(points) - 6
+
+
+def test_board_ratsnest_and_unrouted():
+    rats = Ratsnest.from_board_text(BOARD)
+    payload = rats.payload()
+    assert payload["refs"] == ["R1", "R2", "C1"]
+    assert payload["nets"] == ["GND", "SIG"]
+    # R2 is rotated 90 degrees: its pad 1 (-2, 0) lands at (30, 12)
+    pad = payload["pad_number"].index("1", 2)
+    assert payload["pad_xy"][2 * pad:2 * pad + 2] == [30.0, 12.0]
+    assert payload["pad_net"][5] == -1
+
+    triples = lambda flat: [tuple(flat[i:i + 3]) for i in range(0, len(flat), 3)]
+    gnd, sig = payload["nets"].index("GND"), payload["nets"].index("SIG")
+    assert len([t for t in triples(payload["airwires"]) if t[0] == gnd]) == 2
+    # R1.1 and R2.1 are joined by copper; only C1 (and the SIG net) still need routing
+    unrouted = triples(payload["unrouted"])
+    assert sorted(t[0] for t in unrouted) == [gnd, sig]
+    assert any(4 in t[1:] for t in unrouted if t[0] == gnd)
+
+
+def test_move_updates_only_touched_nets():
+    rats = Ratsnest.from_board_text(BOARD)
+    before = rats.payload()
+    assert rats.move("C1", 60, 60) == ["GND"]
+    after = rats.payload()
+    assert after["pad_xy"][8:12] == [58.0, 60.0, 62.0, 60.0]
+    assert after["airwires"] != before["airwires"] or after["unrouted"] != before["unrouted"]
+    sig = after["nets"].index("SIG")
+    sig_wires = lambda p: [p["airwires"][i:i + 3] for i in range(0, len(p["airwires"]), 3) if p["airwires"][i] == sig]
+    assert sig_wires(after) == sig_wires(before)
+
+
+def _long_net_board(n):
+    # One net: two pads joined by a serpentine of n short segments, with a
+    # layer change through a via halfway, plus a pad left unconnected
+    lines = ['(kicad_pcb (net 0 "") (net 1 "N")',
+             '(footprint "J" (at 0 0) (property "Reference" "J1")'
+             ' (pad "1" thru_hole circle (at 0 0) (size 1.6 1.6) (layers "*.Cu") (net 1 "N"))'
+             ' (pad "2" thru_hole circle (at 0 -10) (size 1.6 1.6) (layers "*.Cu") (net 1 "N")))']
+    x, y = 0.0, 0.0
+    for i in range(n):
+        layer = "F.Cu" if i < n // 2 else "B.Cu"
+        if i == n // 2:
+            lines.append(f'(via (at {x:g} {y:g}) (size 0.8) (drill 0.4) (net 1))')
+        nx, ny = (x + 0.5, y) if (i // 40) % 2 == 0 else (x, y + 0.5)
+        if (i // 40) % 4 == 2:
+            nx, ny = x - 0.5, y
+        lines.append(f'(segment (start {x:g} {y:g}) (end {nx:g} {ny:g}) (width 0.25) (layer "{layer}") (net 1))')
+        x, y = nx, ny
+    lines.append(f'(footprint "J" (at {x:g} {y:g}) (property "Reference" "J2")'
+                 f' (pad "1" thru_hole circle (at 0 0) (size 1.6 1.6) (layers "*.Cu") (net 1 "N")))')
+    return "\n".join(lines) + "\n)"
+
+
+def test_long_nets_load_in_near_linear_time():
+    def timed(n):
+        text = _long_net_board(n)
+        started = time.perf_counter()
+        rats = Ratsnest.from_board_text(text)
+        elapsed = time.perf_counter() - started
+        # J1.1 reaches J2.1 through every segment and the via; J1.2 does not
+        assert rats.results["N"][1] == [(0, 1)]
+        started = time.perf_counter()
+        rats.move("J1", 0, 0)
+        return max(elapsed, time.perf_counter() - started)
+
+    small, large = timed(200), timed(1600)
+    assert large < small * 8 * 3
+    assert large < 1.0
+
+
+def test_ratsnest_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    job_id = jobs.new_job_id()
+    with open(os.path.join(jobs.job_dir(job_id, create=True), "design.kicad_pcb"), "w") as f:
+        f.write(BOARD)
+
+    client = TestClient(main.app)
+    response = client.get(f"/jobs/{job_id}/ratsnest")
+    assert response.status_code == 200
+    assert response.json()["refs"] == ["R1", "R2", "C1"]
+
+    moved = client.post(f"/jobs/{job_id}/ratsnest/move", json={"moves": [{"ref": "R1", "x": 0, "y": 0}]})
+    assert moved.status_code == 200
+    assert moved.json()["updated_nets"] == ["GND", "SIG"]
+    assert moved.json()["pad_xy"][:2] == [-2.0, 0.0]
+
+    assert client.post(f"/jobs/{job_id}/ratsnest/move", json={"moves": [{"ref": "X9", "x": 0, "y": 0}]}).status_code == 404
+    assert client.get(f"/jobs/{jobs.new_job_id()}/ratsnest").status_code == 404
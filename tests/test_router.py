@@ -0,0 +1,112 @@
+import sys
+import os
+import random
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.router import Router
+
+
+def _channel_board():
+    # Single layer, a wall at x=5 with gaps at y=1 and y=5. Both nets prefer
+    # the y=1 gap; only negotiation moves one of them to the other.
+    router = Router((0, 0, 10, 6), pitch=1.0, clearance=0.1, layers=1)
+    for y in range(7):
+        if y not in (1, 5):
+            router.add_obstacle(4.9, y - 0.1, 5.1, y + 0.1)
+    router.add_net("A", [(0, 1), (10, 1)])
+    router.add_net("B", [(2, 2), (8, 2)])
+    return router
+
+
+def _cells(router, name):
+    segments, _ = router.tracks(name)
+    cells = set()
+    for layer, x0, y0, x1, y1 in segments:
+        steps = int(max(abs(x1 - x0), abs(y1 - y0)) / router.pitch)
+        for i in range(steps + 1):
+            t = i / steps if steps else 0
+            cells.add((layer, round(x0 + (x1 - x0) * t, 3), round(y0 + (y1 - y0) * t, 3)))
+    return cells
+
+
+def test_single_pass_overlaps_negotiation_resolves():
+    greedy = _channel_board().route(workers=1, max_iterations=1)
+    assert greedy["overused_cells"] > 0
+
+    router = _channel_board()
+    stats = router.route(workers=1)
+    assert stats["routed"] == 2 and stats["overused_cells"] == 0
+    assert not _cells(router, "A") & _cells(router, "B")
+    for name in ("A", "B"):
+        xs = {x for _, x, _ in _cells(router, name)}
+        assert 5.0 in xs # crossed the wall through a gap
+
+
+def test_nets_left_sharing_cells_are_unrouted():
+    # Stopped before negotiation resolves: B's route would short A's
+    router = _channel_board()
+    stats = router.route(workers=1, max_iterations=1)
+    assert stats["overused_cells"] > 0
+    assert stats["routed"] == 1 and len(stats["unrouted"]) == 1
+    unrouted = stats["unrouted"][0]
+    kept = "A" if unrouted == "B" else "B"
+    assert router.tracks(unrouted) == ([], [])
+    assert _cells(router, kept)
+
+
+def test_tracks_avoid_other_nets_pads():
+    router = Router((0, 0, 20, 10), layers=1)
+    router.add_obstacle(9, 3, 11, 7, net="X") # Pad of another net in the way
+    router.add_net("N", [(2, 5), (18, 5)])
+    stats = router.route(workers=1)
+    assert stats["unrouted"] == []
+    for _, x, y in _cells(router, "N"):
+        assert not (8.5 < x < 11.5 and 2.5 < y < 7.5)
+
+
+def test_unroutable_net_is_reported():
+    router = Router((0, 0, 10, 10), layers=1)
+    router.add_obstacle(4.5, -1, 5.5, 11) # Full-height keep-out
+    router.add_net("N", [(2, 5), (8, 5)])
+    assert router.route(workers=1)["unrouted"] == ["N"]
+
+
+def test_joined_terminals_are_not_reconnected():
+    # A and B are already connected (kept copper); C only has to reach the nearer one
+    router = Router((0, 0, 20, 10), layers=1)
+    router.add_net("N", [(2, 5), (18, 5), (16, 8)], joined=2)
+    stats = router.route(workers=1)
+    assert stats["nets"] == 1 and stats["routed"] == 1
+    cells = _cells(router, "N")
+    assert max(y for _, _, y in cells) == 8 and min(x for _, x, _ in cells) >= 16
+
+    router = Router((0, 0, 20, 10), layers=1)
+    router.add_net("N", [(2, 5), (18, 5)], joined=2)
+    assert router.route(workers=1)["nets"] == 0
+
+
+def test_two_layers_use_vias():
+    router = Router((0, 0, 10, 10))
+    router.add_obstacle(4.5, -1, 5.5, 11, layers=[0]) # Wall on F.Cu only
+    router.add_net("N", [(2, 5), (8, 5)], layers=[[0], [0]]) # SMD pads
+    assert router.route(workers=1)["routed"] == 1
+    segments, vias = router.tracks("N")
+    assert len(vias) >= 2
+    assert any(layer == 1 for layer, *_ in segments)
+
+
+def test_dense_board_in_parallel():
+    rnd = random.Random(1)
+    sites = [(2 + x * 2.54, 2 + y * 2.54) for x in range(18) for y in range(18)]
+    rnd.shuffle(sites)
+    router = Router((0, 0, 50, 50))
+    for i in range(25):
+        pads = [sites.pop() for _ in range(rnd.choice([2, 2, 3]))]
+        for x, y in pads:
+            router.add_obstacle(x - 0.8, y - 0.8, x + 0.8, y + 0.8, net=f"N{i}")
+        router.add_net(f"N{i}", pads, width=0.8 if i % 5 == 0 else 0.25)
+
+    stats = router.route(workers=2)
+    assert stats["workers"] == 2
+    assert stats["routed"] == 25 and stats["unrouted"] == []
+    assert stats["overused_cells"] == 0
@@ -25,10 +25,40 @@ def test_generate_schematic():
     netlist = generate_schematic(components, connections)
     
     assert "components" in netlist
-    assert len(netlist["components"]) == 2
+    # Two capacitors: one part each, numbered on from the regulator
+    assert [c["ref"] for c in netlist["components"]] == ["U1", "C2", "C3"]
+    assert netlist["arrays"] == [{"refs": ["C2", "C3"], "pattern": "row", "rows": 1, "cols": 2}]
     assert "nets" in netlist
-    assert len(netlist["nets"]) == 1
+    # The explicit connection, and GND across both capacitors
+    assert [n["name"] for n in netlist["nets"]] == ["Net-(U1-C3)", "GND"]
     
     # Check if footprints are assigned
     for comp in netlist["components"]:
         assert comp["footprint"] != "Unknown_Footprint"
+
+def test_quantities_expand_into_arrays():
+    netlist = generate_schematic([
+        {"name": "LED", "quantity": 64, "pattern": "grid", "rows": 8, "cols": 8},
+        {"name": "LED", "quantity": 12, "pattern": "circular"},
+        {"name": "Resistor", "quantity": 20},
+    ], [])
+    refs = [c["ref"] for c in netlist["components"]]
+    assert len(refs) == len(set(refs)) == 96
+    assert refs[0] == "D1" and refs[64] == "D65" and refs[-1] == "R96"
+    assert all(c["quantity"] == 1 for c in netlist["components"])
+    assert [(a["pattern"], a["rows"], a["cols"], len(a["refs"])) for a in netlist["arrays"]] == [
+        ("grid", 8, 8, 64), ("circular", 1, 12, 12), ("grid", 4, 5, 20)]
+    # Twenty resistors pair with the first twenty LEDs
+    assert len(netlist["blocks"]) == 20
+
+def test_prompt_counts_reach_the_netlist():
+    from src.nlp_parser import parse_requirements
+    for prompt in ("8 LEDs and 8 resistors", "- 8 LEDs and 8 resistors", "8 LEDs, 8 resistors"):
+        parsed = parse_requirements(prompt)
+        netlist = generate_schematic(parsed["components"], parsed["connections"])
+        refs = [c["ref"] for c in netlist["components"]]
+        assert [r for r in refs if r.startswith("D")] == [f"D{i}" for i in range(1, 9)]
+        assert [r for r in refs if r.startswith("R")] == [f"R{i}" for i in range(9, 17)]
+        assert {c["value"] for c in netlist["components"]} == {"LEDs", "resistors"}
+        # Every LED gets its own resistor
+        assert len(netlist["blocks"]) == 8
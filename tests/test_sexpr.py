@@ -0,0 +1,22 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import sexpr
+
+
+def test_parse_nested_and_quoted():
+    tree = sexpr.parse('(footprint "R_0805" (descr "Resistor \\"SMD\\"") (pad "1" smd rect (at -1 0 90) (size 1 1.2)))')
+    assert tree[0] == "footprint" and tree[1] == "R_0805"
+    assert sexpr.value(tree, "descr") == 'Resistor "SMD"'
+    pad = sexpr.find(tree, "pad")
+    assert pad[:4] == ["pad", "1", "smd", "rect"]
+    assert sexpr.floats(sexpr.find(pad, "at")) == [-1.0, 0.0, 90.0]
+
+
+def test_parse_errors():
+    with pytest.raises(sexpr.SExprError):
+        sexpr.parse("(a (b)")
+    with pytest.raises(sexpr.SExprError):
+        sexpr.parse(")")
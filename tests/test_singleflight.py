@@ -0,0 +1,77 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.singleflight import SingleFlight, normalize_prompt, netlist_key
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert [r for r, _ in results] == ["result"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+
+def test_exceptions_are_shared_and_not_cached():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def fail():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+    first = asyncio.run(main())
+    assert all(isinstance(e, ValueError) for e in first)
+    assert len(runs) == 1
+
+    asyncio.run(main())
+    assert len(runs) == 2
+
+
+def test_abandon_only_when_last_waiter_leaves():
+    flight = SingleFlight("test")
+    abandoned = []
+
+    async def work():
+        await asyncio.sleep(10)
+
+    async def main():
+        a = asyncio.ensure_future(flight.do("k", work, on_abandon=lambda: abandoned.append(1)))
+        b = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        a.cancel()
+        await asyncio.sleep(0.01)
+        assert abandoned == []
+        b.cancel()
+        await asyncio.sleep(0.01)
+        assert abandoned == [1]
+
+    asyncio.run(main())
+
+
+def test_normalize_prompt_keeps_lines_and_case():
+    assert normalize_prompt("  Add a  LED\t and resistor \n- R1 ") == "Add a LED and resistor\n- R1"
+    assert normalize_prompt("add led") != normalize_prompt("Add LED")
+
+
+def test_netlist_key_ignores_key_order():
+    a = {"components": [{"ref": "R1", "value": "10k"}], "nets": []}
+    b = {"nets": [], "components": [{"value": "10k", "ref": "R1"}]}
+    assert netlist_key(a) == netlist_key(b)
@@ -0,0 +1,103 @@
+from fastapi.testclient import TestClient
+import sys
+import os
+import json
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import app
+from src import jobs
+from src import pipeline
+
+client = TestClient(app)
+
+def _parse_events(body):
+    events = []
+    for chunk in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in chunk.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_emits_stages_in_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    monkeypatch.setattr(pipeline, "parse_stage", lambda prompt: {
+        "original_text": prompt,
+        "components": [{"name": "LED", "quantity": 1, "type": "NOUN"}, {"name": "Resistor", "quantity": 1, "type": "NOUN"}],
+        "connections": []
+    })
+
+    def fake_board(netlist, job_dir, cancel_event=None, base_dir=None):
+        path = os.path.join(job_dir, pipeline.PCB_FILENAME)
+        with open(path, "w") as f:
+            f.write("(kicad_pcb)")
+        return path
+
+    monkeypatch.setattr(pipeline, "board_stage", fake_board)
+    monkeypatch.setattr(pipeline, "gerber_stage", lambda pcb_path, job_dir, cancel_event=None: None)
+
+    response = client.post("/generate/stream", json={"prompt": "Add an LED and a resistor"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_events(response.text)
+    assert [e for e, _ in events] == ["parsed", "netlist", "job", "board", "gerbers", "done"]
+
+    job_id = dict(events)["job"]["job_id"]
+    board = dict(events)["board"]
+    assert board["download_url"] == f"/jobs/{job_id}/design.kicad_pcb"
+    assert dict(events)["done"]["status"] == "success"
+
+    # Artifact is downloadable from the job-scoped URL
+    download = client.get(board["download_url"])
+    assert download.status_code == 200
+    assert download.content == b"(kicad_pcb)"
+
+def test_stream_empty_prompt(monkeypatch):
+    monkeypatch.setattr(pipeline, "parse_stage", lambda prompt: {"components": [], "connections": []})
+    events = _parse_events(client.post("/generate/stream", json={"prompt": "nothing"}).text)
+    assert [e for e, _ in events] == ["parsed", "done"]
+    assert events[-1][1]["status"] == "warning"
+
+def test_job_file_rejects_traversal():
+    job_id = jobs.new_job_id()
+    assert jobs.job_file(job_id, "../main.py") is None
+    assert jobs.job_file("../src", "main.py") is None
+
+def test_cancel_unknown_job():
+    assert client.delete(f"/jobs/{jobs.new_job_id()}").status_code == 404
+
+def test_leaving_after_the_job_event_releases_the_build(monkeypatch, tmp_path):
+    import asyncio
+    from starlette.requests import Request
+    from src import main
+
+    monkeypatch.setattr(jobs, "JOBS_ROOT", str(tmp_path))
+    monkeypatch.setattr(pipeline, "parse_stage", lambda prompt: {
+        "components": [{"name": "LED", "quantity": 1}, {"name": "Resistor", "quantity": 1}], "connections": []})
+
+    def slow_board(netlist, job_dir, cancel_event=None, base_dir=None):
+        # Only the cancel from the departing client ends it
+        if not cancel_event.wait(5):
+            raise AssertionError("build not cancelled")
+        raise pipeline.PipelineCancelled("cancelled")
+
+    monkeypatch.setattr(pipeline, "board_stage", slow_board)
+
+    async def leave_after_job_event():
+        http_request = Request({"type": "http", "method": "POST", "path": "/generate/stream",
+                                "headers": [], "client": ("127.0.0.1", 1234)})
+        response = await main.generate_design_stream(main.DesignRequest(prompt="an LED"), http_request)
+        body = response.body_iterator
+        async for chunk in body:
+            if chunk.startswith("event: job"):
+                break
+        assert len(main._build_jobs) == 1
+        await body.aclose() # Client disconnect
+        for _ in range(200):
+            if not main.build_flight.in_flight():
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(leave_after_job_event())
+    assert main._build_jobs == {} and main.build_flight.in_flight() == 0
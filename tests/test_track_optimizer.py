@@ -0,0 +1,111 @@
+import sys
+import os
+import random
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.track_optimizer import Pad, Segment, Via, optimize
+
+MM = 1000000
+W = 250000
+
+
+def _pads(net, *centres, layers=(0, 31)):
+    return [Pad(net, layers, x - MM, y - MM, x + MM, y + MM) for x, y in centres]
+
+
+def test_collinear_and_overlapping_segments_merge():
+    pads = _pads("A", (0, 0), (10 * MM, 0))
+    segments = [
+        Segment("A", 0, 0, 0, 3 * MM, 0, W),
+        Segment("A", 0, 3 * MM, 0, 6 * MM, 0, W),
+        Segment("A", 0, 10 * MM, 0, 5 * MM, 0, W), # reversed and overlapping
+    ]
+    out, _, stats = optimize(segments, [], pads)
+    assert [(s.x0, s.y0, s.x1, s.y1) for s in out] == [(0, 0, 10 * MM, 0)]
+    assert stats["merged"] == 2
+    assert stats["segments_before"] - stats["segments_after"] == 2
+
+
+def test_junction_is_not_merged_away():
+    # A T: the branch ends where the two horizontal pieces meet
+    pads = _pads("A", (0, 0), (10 * MM, 0), (5 * MM, 8 * MM))
+    segments = [
+        Segment("A", 0, 0, 0, 5 * MM, 0, W),
+        Segment("A", 0, 5 * MM, 0, 10 * MM, 0, W),
+        Segment("A", 0, 5 * MM, 0, 5 * MM, 8 * MM, W),
+    ]
+    out, _, stats = optimize(segments, [], pads)
+    assert len(out) == 3 and stats["merged"] == 0 and stats["stubs_removed"] == 0
+
+
+def test_dangling_stubs_removed_transitively():
+    pads = _pads("A", (0, 0), (10 * MM, 0))
+    segments = [
+        Segment("A", 0, 0, 0, 10 * MM, 0, W),
+        Segment("A", 0, 4 * MM, 0, 4 * MM, 5 * MM, W),
+        Segment("A", 0, 4 * MM, 5 * MM, 7 * MM, 5 * MM, W),
+        Segment("B", 0, 0, 20 * MM, 1 * MM, 20 * MM, W), # different net, goes nowhere
+        Segment("", 0, 0, 30 * MM, 1 * MM, 30 * MM, W), # no net: left alone
+    ]
+    out, _, stats = optimize(segments, [], pads)
+    assert stats["stubs_removed"] == 3
+    assert sorted(s.net for s in out) == ["", "A"]
+
+
+def test_vias_kept_only_when_joining_layers():
+    pads = _pads("A", (0, 0)) + _pads("A", (10 * MM, 0), layers=(31,))
+    segments = [
+        Segment("A", 0, 0, 0, 5 * MM, 0, W),
+        Segment("A", 31, 5 * MM, 0, 10 * MM, 0, W),
+        Segment("A", 0, 0, 0, 0, 5 * MM, W), # to a via that only has F.Cu copper
+        Segment("G", 0, 20 * MM, 0, 20 * MM, 5 * MM, W),
+    ]
+    vias = [Via("A", 5 * MM, 0, 800000), Via("A", 0, 5 * MM, 800000),
+            Via("G", 20 * MM, 5 * MM, 800000), Via("A", 30 * MM, 30 * MM, 800000)]
+    pads += _pads("G", (20 * MM, 0))
+    out, out_vias, stats = optimize(segments, vias, pads, zone_nets=["G"])
+    # Layer change kept, stitching via of the zone net kept, the rest removed
+    assert sorted((v.net, v.x, v.y) for v in out_vias) == [("A", 5 * MM, 0), ("G", 20 * MM, 5 * MM)]
+    assert stats["vias_removed"] == 2
+    assert stats["stubs_removed"] == 1
+
+
+def test_corner_smoothing():
+    pads = _pads("A", (0, 0), (10 * MM, 10 * MM))
+    segments = [Segment("A", 0, 0, 0, 10 * MM, 0, W), Segment("A", 0, 10 * MM, 0, 10 * MM, 10 * MM, W)]
+    assert optimize(segments, [], pads)[2]["corners_smoothed"] == 0
+
+    segments = [Segment("A", 0, 0, 0, 10 * MM, 0, W), Segment("A", 0, 10 * MM, 0, 10 * MM, 10 * MM, W)]
+    out, _, stats = optimize(segments, [], pads, smooth=True, chamfer=MM)
+    assert stats["corners_smoothed"] == 1
+    diagonal = [s for s in out if s.x0 != s.x1 and s.y0 != s.y1]
+    assert len(diagonal) == 1
+    d = diagonal[0]
+    assert abs(d.x1 - d.x0) == abs(d.y1 - d.y0) == MM
+
+
+def test_scales_near_linearly():
+    def board(n):
+        rnd = random.Random(n)
+        segments, pads = [], []
+        for i in range(n):
+            y = i * 2 * MM
+            net = f"N{i}"
+            pads += _pads(net, (0, y), (40 * MM, y))
+            # Fragmented run plus a stub
+            cuts = sorted(rnd.sample(range(3, 38), 8))
+            xs = [0] + [c * MM for c in cuts] + [40 * MM]
+            segments += [Segment(net, 0, a, y, b, y, W) for a, b in zip(xs, xs[1:])]
+            segments.append(Segment(net, 0, 20 * MM, y, 20 * MM, y + MM // 2, W))
+        return segments, pads
+
+    def timed(n):
+        segments, pads = board(n)
+        started = time.perf_counter()
+        out, _, stats = optimize(segments, [], pads)
+        assert len(out) == n
+        return time.perf_counter() - started
+
+    small, large = timed(200), timed(1600)
+    assert large < small * 8 * 3